@@ -0,0 +1,171 @@
+"""
+Load driver for chat2api.
+
+Replays N concurrent OpenAI (``/v1/chat/completions``) and Claude
+(``/v1/messages``) clients against a running chat2api and reports TTFB,
+tokens/sec, CPU per request and event-loop lag. CPU and lag come from the
+``/benchmark/stats`` probe, so start chat2api through ``benchmark.serve``:
+
+    python -m benchmark.mock_upstream --port 5100
+    CHATGPT_BASE_URL=http://127.0.0.1:5100 python -m benchmark.serve --port 5005
+    python -m benchmark.driver --url http://127.0.0.1:5005 --concurrency 50 --requests 10 --api mixed
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import time
+
+from curl_cffi.requests import AsyncSession
+
+PROMPT = "Write a short story about a fox."
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    index = min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))
+    return values[index]
+
+
+def build_request(api, model, stream):
+    if api == "claude":
+        return "/v1/messages", {
+            "model": model or "claude-3-5-sonnet-20241022",
+            "max_tokens": 4096,
+            "messages": [{"role": "user", "content": PROMPT}],
+            "stream": stream,
+        }
+    return "/v1/chat/completions", {
+        "model": model or "gpt-4o",
+        "messages": [{"role": "user", "content": PROMPT}],
+        "stream": stream,
+    }
+
+
+def stream_text(api, line):
+    if not line.startswith("data: "):
+        return None
+    payload = line[6:]
+    if payload.startswith("[DONE]"):
+        return None
+    try:
+        data = json.loads(payload)
+    except json.JSONDecodeError:
+        return None
+    if api == "claude":
+        if data.get("type") == "content_block_delta":
+            return data.get("delta", {}).get("text")
+        return None
+    choices = data.get("choices") or [{}]
+    return choices[0].get("delta", {}).get("content")
+
+
+def response_text(api, data):
+    if api == "claude":
+        return "".join(block.get("text", "") for block in data.get("content", []))
+    return data["choices"][0]["message"]["content"]
+
+
+async def run_request(session, args, api):
+    path, body = build_request(api, args.model, args.stream)
+    headers = {"Authorization": f"Bearer {args.token}", "Content-Type": "application/json"}
+    result = {"api": api, "ok": False, "ttfb": None, "duration": 0.0, "tokens": 0}
+    start = time.perf_counter()
+    try:
+        r = await session.post(args.url + path, headers=headers, json=body, stream=args.stream, timeout=args.timeout)
+        if r.status_code != 200:
+            result["error"] = f"HTTP {r.status_code}"
+            return result
+        if args.stream:
+            async for line in r.aiter_lines():
+                text = stream_text(api, line.decode("utf-8"))
+                if text:
+                    if result["ttfb"] is None:
+                        result["ttfb"] = time.perf_counter() - start
+                    result["tokens"] += 1
+        else:
+            text = response_text(api, r.json())
+            result["ttfb"] = time.perf_counter() - start
+            result["tokens"] = len(text.split())
+        result["ok"] = True
+    except Exception as e:
+        result["error"] = str(e)
+    finally:
+        result["duration"] = time.perf_counter() - start
+    return result
+
+
+async def client(session, args, index, results):
+    for i in range(args.requests):
+        if args.api == "mixed":
+            api = "claude" if (index + i) % 2 else "openai"
+        else:
+            api = args.api
+        results.append(await run_request(session, args, api))
+
+
+async def get_stats(session, url):
+    try:
+        r = await session.get(url + "/benchmark/stats", timeout=5)
+        return r.json() if r.status_code == 200 else None
+    except Exception:
+        return None
+
+
+def report(results, elapsed, stats_before, stats_after):
+    ok = [r for r in results if r["ok"]]
+    failed = len(results) - len(ok)
+    ttfb = [r["ttfb"] for r in ok if r["ttfb"] is not None]
+    rates = [r["tokens"] / r["duration"] for r in ok if r["duration"] > 0]
+    total_tokens = sum(r["tokens"] for r in ok)
+
+    print(f"requests:        {len(ok)} ok, {failed} failed")
+    print(f"wall time:       {elapsed:.2f}s  ({len(ok) / elapsed:.1f} req/s)")
+    if ttfb:
+        print(f"ttfb:            p50 {percentile(ttfb, 50) * 1000:.1f}ms  p95 {percentile(ttfb, 95) * 1000:.1f}ms"
+              f"  p99 {percentile(ttfb, 99) * 1000:.1f}ms  max {max(ttfb) * 1000:.1f}ms")
+    if rates:
+        print(f"tokens/sec:      per stream median {statistics.median(rates):.1f}  aggregate {total_tokens / elapsed:.1f}")
+    if stats_before and stats_after and ok:
+        cpu = stats_after["cpu_time"] - stats_before["cpu_time"]
+        print(f"server cpu:      {cpu:.2f}s total  {cpu / len(ok) * 1000:.2f}ms/request")
+        lag = stats_after["loop_lag"]
+        if lag["samples"]:
+            print(f"event-loop lag:  mean {lag['total'] / lag['samples'] * 1000:.2f}ms  max {lag['max'] * 1000:.1f}ms"
+                  f"  >10ms {lag['over_10ms']}  >100ms {lag['over_100ms']}")
+    errors = {}
+    for r in results:
+        if not r["ok"]:
+            errors[r.get("error", "unknown")] = errors.get(r.get("error", "unknown"), 0) + 1
+    for error, count in errors.items():
+        print(f"error x{count}:       {error}")
+
+
+async def main(args):
+    results = []
+    async with AsyncSession(max_clients=args.concurrency) as session:
+        try:
+            await session.post(args.url + "/benchmark/stats/reset", timeout=5)
+        except Exception:
+            pass
+        stats_before = await get_stats(session, args.url)
+        start = time.perf_counter()
+        await asyncio.gather(*[client(session, args, i, results) for i in range(args.concurrency)])
+        elapsed = time.perf_counter() - start
+        stats_after = await get_stats(session, args.url)
+    report(results, elapsed, stats_before, stats_after)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay concurrent OpenAI/Claude clients against chat2api")
+    parser.add_argument("--url", default="http://127.0.0.1:5005", help="chat2api base url, including api prefix")
+    parser.add_argument("--token", default="eyJhbGciOi-benchmark", help="bearer token sent to chat2api")
+    parser.add_argument("--api", choices=["openai", "claude", "mixed"], default="mixed")
+    parser.add_argument("--model", default=None)
+    parser.add_argument("--concurrency", type=int, default=10, help="number of concurrent clients")
+    parser.add_argument("--requests", type=int, default=5, help="requests per client")
+    parser.add_argument("--no-stream", dest="stream", action="store_false")
+    parser.add_argument("--timeout", type=float, default=120)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,167 @@
+"""
+Local mock of the chatgpt.com backend used by the chat2api benchmarks.
+
+Implements just enough of the upstream surface for ChatService:
+sentinel chat-requirements (with a configurable proof-of-work difficulty),
+the conversation SSE stream with cumulative-parts events, and the file
+upload endpoints.
+
+    python -m benchmark.mock_upstream --port 5100 --pow-difficulty 0fffff --tokens 200
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+import uuid
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import HTMLResponse, StreamingResponse
+
+app = FastAPI()
+
+settings = {
+    "host": "127.0.0.1",
+    "port": 5100,
+    "pow_difficulty": "0fffff",
+    "pow_required": True,
+    "tokens": 200,
+    "token_delay": 0.005,
+    "first_token_delay": 0.05,
+}
+
+WORDS = ["the", "quick", "brown", "fox", "jumps", "over", "lazy", "dog", "and", "keeps", "running", "far", "away"]
+
+
+def sse(data):
+    return f"data: {json.dumps(data)}\n\n"
+
+
+def message_event(conversation_id, message_id, role, status, parts, end_turn=None):
+    return {
+        "message": {
+            "id": message_id,
+            "author": {"role": role, "name": None, "metadata": {}},
+            "create_time": time.time(),
+            "update_time": None,
+            "content": {"content_type": "text", "parts": parts},
+            "status": status,
+            "end_turn": end_turn,
+            "weight": 1.0,
+            "metadata": {"model_slug": "gpt-4o", "default_model_slug": "gpt-4o"},
+            "recipient": "all",
+        },
+        "conversation_id": conversation_id,
+        "error": None,
+    }
+
+
+@app.get("/", response_class=HTMLResponse)
+async def index():
+    return (
+        '<html data-build="prod-benchmark">'
+        '<script src="https://cdn.oaistatic.com/_next/static/chunks/main.js?dpl=prod-benchmark"></script>'
+        "</html>"
+    )
+
+
+@app.post("/backend-api/sentinel/chat-requirements")
+@app.post("/backend-anon/sentinel/chat-requirements")
+async def chat_requirements():
+    return {
+        "persona": "chatgpt-paid",
+        "token": f"gAAAAAB{uuid.uuid4().hex}",
+        "turnstile": {"required": False},
+        "proofofwork": {
+            "required": settings["pow_required"],
+            "seed": format(random.random()),
+            "difficulty": settings["pow_difficulty"],
+        },
+    }
+
+
+@app.post("/backend-api/conversation")
+@app.post("/backend-anon/conversation")
+async def conversation(request: Request):
+    body = await request.json()
+    conversation_id = body.get("conversation_id") or str(uuid.uuid4())
+    user_message = (body.get("messages") or [{}])[-1]
+    tokens = settings["tokens"]
+
+    async def event_stream():
+        yield sse({
+            "message": {**user_message, "status": "finished_successfully"},
+            "conversation_id": conversation_id,
+            "error": None,
+        })
+        message_id = str(uuid.uuid4())
+        await asyncio.sleep(settings["first_token_delay"])
+        yield sse(message_event(conversation_id, message_id, "assistant", "in_progress", [""]))
+        text = ""
+        for i in range(tokens):
+            text += ("" if i == 0 else " ") + WORDS[i % len(WORDS)]
+            yield sse(message_event(conversation_id, message_id, "assistant", "in_progress", [text]))
+            if settings["token_delay"]:
+                await asyncio.sleep(settings["token_delay"])
+        yield sse(message_event(conversation_id, message_id, "assistant", "finished_successfully", [text], end_turn=True))
+        yield "data: [DONE]\n\n"
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream; charset=utf-8")
+
+
+@app.post("/backend-api/files")
+async def create_file(request: Request):
+    body = await request.json()
+    file_id = f"file-{uuid.uuid4().hex[:24]}"
+    upload_url = f"http://{settings['host']}:{settings['port']}/upload/{file_id}?name={body.get('file_name', '')}"
+    return {"status": "success", "upload_url": upload_url, "file_id": file_id}
+
+
+@app.put("/upload/{file_id}", status_code=201)
+async def upload_file(file_id: str, request: Request):
+    await request.body()
+    return {}
+
+
+@app.post("/backend-api/files/{file_id}/uploaded")
+async def file_uploaded(file_id: str):
+    return {"status": "success", "download_url": f"http://{settings['host']}:{settings['port']}/download/{file_id}"}
+
+
+@app.get("/backend-api/files/{file_id}")
+async def file_status(file_id: str):
+    return {"id": file_id, "retrieval_index_status": "success"}
+
+
+@app.get("/backend-api/files/{file_id}/download")
+async def file_download(file_id: str):
+    return {"status": "success", "download_url": f"http://{settings['host']}:{settings['port']}/download/{file_id}"}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mock chatgpt.com backend for chat2api benchmarks")
+    parser.add_argument("--host", default=settings["host"])
+    parser.add_argument("--port", type=int, default=settings["port"])
+    parser.add_argument("--pow-difficulty", default=settings["pow_difficulty"],
+                        help="hex difficulty returned by chat-requirements, e.g. 0fffff (easy) or 00003a (hard)")
+    parser.add_argument("--no-pow", action="store_true", help="do not require proof of work")
+    parser.add_argument("--tokens", type=int, default=settings["tokens"], help="words streamed per response")
+    parser.add_argument("--token-delay", type=float, default=settings["token_delay"], help="seconds between events")
+    parser.add_argument("--first-token-delay", type=float, default=settings["first_token_delay"])
+    args = parser.parse_args()
+
+    settings.update({
+        "host": args.host,
+        "port": args.port,
+        "pow_difficulty": args.pow_difficulty,
+        "pow_required": not args.no_pow,
+        "tokens": args.tokens,
+        "token_delay": args.token_delay,
+        "first_token_delay": args.first_token_delay,
+    })
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
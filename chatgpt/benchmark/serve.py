@@ -0,0 +1,80 @@
+"""
+Run chat2api with benchmark probes attached.
+
+Adds a background task that samples event-loop lag and a
+``GET /benchmark/stats`` route reporting process CPU time and lag, so the
+driver can attribute CPU per request. Point chat2api at the mock upstream
+through the usual environment variables:
+
+    CHATGPT_BASE_URL=http://127.0.0.1:5100 python -m benchmark.serve --port 5005
+"""
+import argparse
+import asyncio
+import time
+
+import uvicorn
+from fastapi import APIRouter
+
+from app import app
+
+router = APIRouter()
+
+loop_lag = {
+    "interval": 0.01,
+    "samples": 0,
+    "total": 0.0,
+    "max": 0.0,
+    "over_10ms": 0,
+    "over_100ms": 0,
+}
+
+
+async def sample_loop_lag():
+    interval = loop_lag["interval"]
+    while True:
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        lag = max(time.perf_counter() - start - interval, 0.0)
+        loop_lag["samples"] += 1
+        loop_lag["total"] += lag
+        loop_lag["max"] = max(loop_lag["max"], lag)
+        if lag > 0.01:
+            loop_lag["over_10ms"] += 1
+        if lag > 0.1:
+            loop_lag["over_100ms"] += 1
+
+
+async def start_loop_lag_sampler():
+    asyncio.create_task(sample_loop_lag())
+
+
+@router.get("/benchmark/stats")
+async def benchmark_stats():
+    return {
+        "cpu_time": time.process_time(),
+        "wall_time": time.perf_counter(),
+        "loop_lag": dict(loop_lag),
+    }
+
+
+@router.post("/benchmark/stats/reset")
+async def reset_benchmark_stats():
+    loop_lag.update({"samples": 0, "total": 0.0, "max": 0.0, "over_10ms": 0, "over_100ms": 0})
+    return {"status": "success"}
+
+
+# app.py registers a catch-all route when the gateway is disabled, so the probes must come first.
+app.router.routes[0:0] = router.routes
+app.add_event_handler("startup", start_loop_lag_sampler)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="chat2api with benchmark probes")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5005)
+    args = parser.parse_args()
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -379,7 +379,8 @@ class ChatService:
                     return stream_response(self, res, self.resp_model, self.max_tokens)
                 else:
                     return await format_not_stream_response(
-                        stream_response(self, res, self.resp_model, self.max_tokens),
+                        self,
+                        res,
                         self.prompt_tokens,
                         self.max_tokens,
                         self.resp_model,
@@ -0,0 +1,66 @@
+import asyncio
+
+from utils.Logger import logger
+
+
+class AssetResolver:
+    def __init__(self, service):
+        self.service = service
+        self.lookups = {}
+        self.pending = []
+
+    def _lookup(self, key, factory):
+        task = self.lookups.get(key)
+        if task and (not task.done() or self._result(task)):
+            return task
+        task = asyncio.create_task(factory())
+        self.lookups[key] = task
+        return task
+
+    @staticmethod
+    def _result(task):
+        if task.cancelled() or task.exception() is not None:
+            return None
+        return task.result()
+
+    def attachment_url(self, file_id, conversation_id):
+        return self._lookup(f"attachment:{file_id}", lambda: self.service.get_attachment_url(file_id, conversation_id))
+
+    def download_url(self, file_id):
+        return self._lookup(f"download:{file_id}", lambda: self.service.get_download_url(file_id))
+
+    def response_file_url(self, conversation_id, message_id, sandbox_path):
+        return self._lookup(
+            f"sandbox:{sandbox_path}",
+            lambda: self.service.get_response_file_url(conversation_id, message_id, sandbox_path),
+        )
+
+    def splice(self, task, template, fallback=""):
+        if task.done():
+            return self._render(task, template, fallback)
+        if not any(pending_task is task for pending_task, _, _ in self.pending):
+            self.pending.append((task, template, fallback))
+        return ""
+
+    def _render(self, task, template, fallback):
+        url = self._result(task)
+        return template.format(url) if url else fallback
+
+    def ready(self):
+        text = ""
+        while self.pending and self.pending[0][0].done():
+            text += self._render(*self.pending.pop(0))
+        return text
+
+    async def drain(self):
+        if self.pending:
+            await asyncio.wait([task for task, _, _ in self.pending])
+        return self.ready()
+
+    def close(self):
+        for task in self.lookups.values():
+            if not task.done():
+                task.cancel()
+        if self.pending:
+            logger.info(f"Dropped {len(self.pending)} unresolved assets")
+        self.pending.clear()
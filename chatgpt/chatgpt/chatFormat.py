@@ -13,31 +13,25 @@ from fastapi import HTTPException
 from api.files import get_file_content
 from api.models import model_system_fingerprint
 from api.tokens import split_tokens_from_content, calculate_image_tokens, num_tokens_from_messages
+from chatgpt.assetResolver import AssetResolver
 from utils.Logger import logger
 
 moderation_message = "I'm sorry, I cannot provide or engage in any content related to pornography, violence, or any unethical material. If you have any other questions or need assistance, please feel free to let me know. I'll do my best to provide support and assistance."
 
 
-async def format_not_stream_response(response, prompt_tokens, max_tokens, model):
+async def format_not_stream_response(service, response, prompt_tokens, max_tokens, model):
     chat_id = f"chatcmpl-{''.join(random.choice(string.ascii_letters + string.digits) for _ in range(29))}"
     system_fingerprint_list = model_system_fingerprint.get(model, None)
     system_fingerprint = random.choice(system_fingerprint_list) if system_fingerprint_list else None
     created_time = int(time.time())
-    all_text = ""
-    async for chunk in response:
-        try:
-            if chunk.startswith("data: [DONE]"):
-                break
-            elif not chunk.startswith("data: "):
-                continue
-            else:
-                chunk = json.loads(chunk[6:])
-                if not chunk["choices"][0].get("delta"):
-                    continue
-                all_text += chunk["choices"][0]["delta"]["content"]
-        except Exception as e:
-            logger.error(f"Error: {chunk}, error: {str(e)}")
-            continue
+    text_parts = []
+    async for event in response_deltas(service, response, max_tokens):
+        if event is None:
+            break
+        delta_content = event[0].get("content")
+        if delta_content:
+            text_parts.append(delta_content)
+    all_text = "".join(text_parts)
     content, completion_tokens, finish_reason = await split_tokens_from_content(all_text, max_tokens, model)
     message = {
         "role": "assistant",
@@ -131,15 +125,6 @@ async def stream_response(service, response, model, max_tokens):
     system_fingerprint_list = model_system_fingerprint.get(model, None)
     system_fingerprint = random.choice(system_fingerprint_list) if system_fingerprint_list else None
     created_time = int(time.time())
-    completion_tokens = 0
-    len_last_content = 0
-    len_last_citation = 0
-    last_message_id = None
-    last_role = None
-    last_content_type = None
-    last_status = None
-    model_slug = None
-    end = False
 
     chunk_new_data = {
         "id": chat_id,
@@ -159,12 +144,53 @@ async def stream_response(service, response, model, max_tokens):
         chunk_new_data["system_fingerprint"] = system_fingerprint
     yield f"data: {json.dumps(chunk_new_data)}\n\n"
 
+    async for event in response_deltas(service, response, max_tokens):
+        if event is None:
+            yield "data: [DONE]\n\n"
+            continue
+        delta, finish_reason, message_id, conversation_id = event
+        chunk_new_data["choices"][0]["delta"] = delta
+        chunk_new_data["choices"][0]["finish_reason"] = finish_reason
+        if not service.history_disabled:
+            chunk_new_data.update({
+                "message_id": message_id,
+                "conversation_id": conversation_id,
+            })
+        yield f"data: {json.dumps(chunk_new_data)}\n\n"
+
+
+async def response_deltas(service, response, max_tokens):
+    # Yields (delta, finish_reason, message_id, conversation_id), or None where the stream ends with [DONE]
+    asset_resolver = AssetResolver(service)
+    try:
+        async for event in interpret_response(asset_resolver, response, max_tokens):
+            yield event
+    finally:
+        asset_resolver.close()
+
+
+async def interpret_response(asset_resolver, response, max_tokens):
+    completion_tokens = 0
+    len_last_content = 0
+    len_last_citation = 0
+    last_message_id = None
+    last_role = None
+    last_content_type = None
+    last_status = None
+    model_slug = None
+    conversation_id = None
+    end = False
+
     async for chunk in response:
         chunk = chunk.decode("utf-8")
         if end:
             logger.info(f"Response Model: {model_slug}")
-            yield "data: [DONE]\n\n"
-            break
+            yield None
+            return
+        asset_text = asset_resolver.ready()
+        if asset_text:
+            completion_tokens += 1
+            yield {"content": asset_text}, None, last_message_id, conversation_id
         try:
             if chunk.startswith("data: {"):
                 chunk_old_data = json.loads(chunk[6:])
@@ -177,6 +203,13 @@ async def stream_response(service, response, model, max_tokens):
 
                 status = message.get("status")
                 message_id = message.get("id")
+                # Images still resolving belong to the previous message; flush them before
+                # the next one starts so they do not land in the middle of its text.
+                if last_message_id and message_id != last_message_id and asset_resolver.pending:
+                    asset_text = await asset_resolver.drain()
+                    if asset_text:
+                        completion_tokens += 1
+                        yield {"content": asset_text}, None, last_message_id, conversation_id
                 content = message.get("content", {})
                 recipient = message.get("recipient", "")
                 meta_data = message.get("metadata", {})
@@ -241,8 +274,8 @@ async def stream_response(service, response, model, max_tokens):
                                 if last_role != role:
                                     new_text = f"\n```{new_text}"
                             else:
-                                image_download_url = await service.get_attachment_url(file_id, conversation_id)
-                                new_text = f"\n```\n![image]({image_download_url})\n"
+                                image_task = asset_resolver.attachment_url(file_id, conversation_id)
+                                new_text = "\n```\n" + asset_resolver.splice(image_task, "![image]({})\n")
                     else:
                         text = content.get("text", "")
                         if outer_content_type == "code" and last_content_type != "code":
@@ -272,7 +305,7 @@ async def stream_response(service, response, model, max_tokens):
                 elif status == "finished_successfully":
                     if content.get("content_type") == "multimodal_text":
                         parts = content.get("parts", [])
-                        delta = {}
+                        image_text = ""
                         for part in parts:
                             if isinstance(part, str):
                                 continue
@@ -282,16 +315,15 @@ async def stream_response(service, response, model, max_tokens):
                                 if part.get('asset_pointer').startswith('file-service://'):
                                     file_id = part.get('asset_pointer').replace('file-service://', '')
                                     logger.debug(f"file_id: {file_id}")
-                                    image_download_url = await service.get_download_url(file_id)
-                                    logger.debug(f"image_download_url: {image_download_url}")
-                                    if image_download_url:
-                                        delta = {"content": f"\n```\n![image]({image_download_url})\n"}
-                                    else:
-                                        delta = {"content": f"\n```\nFailed to load the image.\n"}
+                                    image_task = asset_resolver.download_url(file_id)
+                                    image_text += "\n```\n" + asset_resolver.splice(
+                                        image_task, "![image]({})\n", "Failed to load the image.\n"
+                                    )
                                 else:
                                     file_id = part.get('asset_pointer').replace('sediment://', '')
-                                    image_download_url = await service.get_attachment_url(file_id, conversation_id)
-                                    delta = {"content": f"\n![image]({image_download_url})\n"}
+                                    image_task = asset_resolver.attachment_url(file_id, conversation_id)
+                                    image_text += "\n" + asset_resolver.splice(image_task, "![image]({})\n")
+                        delta = {"content": image_text} if image_text else {}
                     elif message.get("end_turn"):
                         part = content.get("parts", [])[0]
                         new_text = part[len_last_content:]
@@ -299,8 +331,11 @@ async def stream_response(service, response, model, max_tokens):
                             matches = re.findall(r'\(sandbox:(.*?)\)', part)
                             if matches:
                                 file_url_content = ""
-                                for i, sandbox_path in enumerate(matches):
-                                    file_download_url = await service.get_response_file_url(conversation_id, message_id, sandbox_path)
+                                file_download_urls = await asyncio.gather(*[
+                                    asset_resolver.response_file_url(conversation_id, message_id, sandbox_path)
+                                    for sandbox_path in matches
+                                ])
+                                for i, file_download_url in enumerate(file_download_urls):
                                     if file_download_url:
                                         file_url_content += f"\n```\n\n![File {i+1}]({file_download_url})\n"
                                 delta = {"content": file_url_content}
@@ -323,18 +358,20 @@ async def stream_response(service, response, model, max_tokens):
                 last_status = status
                 if not end and not delta.get("content"):
                     delta = {"role": "assistant", "content": ""}
-                chunk_new_data["choices"][0]["delta"] = delta
-                chunk_new_data["choices"][0]["finish_reason"] = finish_reason
-                if not service.history_disabled:
-                    chunk_new_data.update({
-                        "message_id": message_id,
-                        "conversation_id": conversation_id,
-                    })
+                if end:
+                    asset_text = await asset_resolver.drain()
+                    if asset_text:
+                        completion_tokens += 1
+                        yield {"content": asset_text}, None, message_id, conversation_id
                 completion_tokens += 1
-                yield f"data: {json.dumps(chunk_new_data)}\n\n"
+                yield delta, finish_reason, message_id, conversation_id
             elif chunk.startswith("data: [DONE]"):
                 logger.info(f"Response Model: {model_slug}")
-                yield "data: [DONE]\n\n"
+                asset_text = await asset_resolver.drain()
+                if asset_text:
+                    yield {"content": asset_text}, None, last_message_id, conversation_id
+                yield None
+                return
             else:
                 continue
         except Exception as e:
@@ -342,10 +379,13 @@ async def stream_response(service, response, model, max_tokens):
                 chunk_data = json.loads(chunk[6:])
                 if chunk_data.get("error"):
                     logger.error(f"Error: {chunk_data.get('error')}")
-                    yield "data: [DONE]\n\n"
-                    break
+                    yield None
+                    return
             logger.error(f"Error: {chunk}, details: {str(e)}")
             continue
+    asset_text = await asset_resolver.drain()
+    if asset_text:
+        yield {"content": asset_text}, None, last_message_id, conversation_id
 
 
 def get_url_from_content(content):
@@ -4,7 +4,6 @@ FastAPI应用初始化和生命周期管理
 
 import asyncio
 import multiprocessing
-import queue  # <-- FIX: Added missing import for queue.Empty
 import sys
 import time
 from asyncio import Lock, Queue
@@ -19,7 +18,7 @@ from starlette.types import ASGIApp
 import stream
 
 # --- 导入集中状态模块 ---
-from api_utils.server_state import state
+from api_utils.server_state import PageWorker, state
 
 # --- browser_utils模块导入 ---
 from browser_utils import (
@@ -31,13 +30,19 @@ from browser_utils import (
 )
 
 # --- FIX: Replaced star import with explicit imports ---
-from config import EXCLUDED_MODELS_FILENAME, NO_PROXY_ENV, get_environment_variable
+from config import (
+    EXCLUDED_MODELS_FILENAME,
+    NO_PROXY_ENV,
+    PAGE_POOL_SIZE,
+    get_environment_variable,
+)
 
 # --- logging_utils模块导入 ---
 from logging_utils import restore_original_streams, setup_server_logging
 
 # --- models模块导入 ---
 from models import WebSocketConnectionManager
+from stream.channel import StreamChannel
 
 from . import auth_utils
 
@@ -66,15 +71,20 @@ def _initialize_globals() -> None:
     state.logger.debug("API keys and global locks initialized.")
 
 
-def _initialize_proxy_settings() -> None:
-    """Configure Playwright proxy settings based on environment."""
+def _initialize_proxy_settings(port_offset: int = 0) -> None:
+    """Configure Playwright proxy settings based on environment.
+
+    Args:
+        port_offset: 页面序号，每个页面使用自己的流式代理端口 (STREAM_PORT + 序号)
+    """
     STREAM_PORT = get_environment_variable("STREAM_PORT")
     if STREAM_PORT == "0":
         proxy_server_env = get_environment_variable(
             "HTTPS_PROXY"
         ) or get_environment_variable("HTTP_PROXY")
     else:
-        proxy_server_env = f"http://127.0.0.1:{STREAM_PORT or 3120}/"
+        port = int(STREAM_PORT or 3120) + port_offset
+        proxy_server_env = f"http://127.0.0.1:{port}/"
 
     if proxy_server_env:
         state.PLAYWRIGHT_PROXY_SETTINGS = {"server": proxy_server_env}
@@ -87,39 +97,37 @@ def _initialize_proxy_settings() -> None:
         state.logger.debug("[代理] 未配置")
 
 
-async def _start_stream_proxy() -> None:
-    """Start the stream proxy subprocess if configured."""
+async def _start_stream_proxy(port_offset: int = 0) -> None:
+    """Start the stream proxy subprocess if configured.
+
+    Args:
+        port_offset: 页面序号，每个页面使用自己的流式代理端口 (STREAM_PORT + 序号)
+    """
     STREAM_PORT = get_environment_variable("STREAM_PORT")
     if STREAM_PORT != "0":
-        port = int(STREAM_PORT or 3120)
+        port = int(STREAM_PORT or 3120) + port_offset
         STREAM_PROXY_SERVER_ENV = (
             get_environment_variable("UNIFIED_PROXY_CONFIG")
             or get_environment_variable("HTTPS_PROXY")
             or get_environment_variable("HTTP_PROXY")
         )
         state.logger.info(f"[系统] 启动流式代理服务 (端口: {port})")
-        state.STREAM_QUEUE = multiprocessing.Queue()
+        state.STREAM_CHANNEL = StreamChannel()
+        channel_address = await state.STREAM_CHANNEL.start()
         state.STREAM_PROCESS = multiprocessing.Process(
             target=stream.start,
-            args=(state.STREAM_QUEUE, port, STREAM_PROXY_SERVER_ENV),
+            args=(channel_address, port, STREAM_PROXY_SERVER_ENV),
         )
         state.STREAM_PROCESS.start()
         state.logger.debug(
             "STREAM proxy process started. Waiting for 'READY' signal..."
         )
 
-        # Wait for the proxy to be ready
+        # Wait for the proxy to connect back and report ready
         try:
-            # Use asyncio.to_thread to wait for the blocking queue.get()
-            # Set a timeout to avoid waiting forever
-            ready_signal = await asyncio.to_thread(state.STREAM_QUEUE.get, timeout=15)
-            if ready_signal == "READY":
-                state.logger.info("[系统] 流式代理就绪")
-            else:
-                state.logger.warning(
-                    f"Received unexpected signal from proxy: {ready_signal}"
-                )
-        except queue.Empty:
+            await state.STREAM_CHANNEL.wait_ready(timeout=15)
+            state.logger.info("[系统] 流式代理就绪")
+        except asyncio.TimeoutError:
             state.logger.error(
                 "Timed out waiting for STREAM proxy to become ready. Startup will likely fail."
             )
@@ -162,14 +170,66 @@ async def _initialize_browser_and_page() -> None:
         state.model_list_fetch_event.set()
 
 
-async def _shutdown_resources() -> None:
-    """Gracefully shut down all resources."""
-    logger = state.logger
-    logger.debug("[系统] 正在关闭资源...")
+async def _initialize_page_worker(worker: PageWorker) -> None:
+    """Open one additional page of the page pool. Runs with `worker` as the current page."""
+    from api_utils.auth_manager import auth_manager
 
-    # Signal all streaming generators to exit immediately
-    state.should_exit = True
+    state.processing_lock = Lock()
+    state.model_switching_lock = Lock()
+    state.params_cache_lock = Lock()
+    _initialize_proxy_settings(worker.index)
+    await _start_stream_proxy(worker.index)
+
+    # 每个页面优先使用一个未被其他页面占用的认证文件
+    profile = await auth_manager.find_unused_profile(
+        exclude=[w.auth_profile for w in state.page_workers if w.auth_profile]
+    )
+    if profile is None:
+        profile = state.page_workers[0].auth_profile
+        state.logger.warning(
+            f"[页面池] 没有未占用的认证文件，页面 {worker.index} 与页面 0 共用认证"
+        )
+    worker.auth_profile = profile
+
+    state.page_instance, state.is_page_ready = await _initialize_page_logic(
+        state.browser_instance, storage_state_path=profile
+    )
+    if not state.is_page_ready:
+        raise RuntimeError(f"Page {worker.index} initialization failed.")
+    await _handle_initial_model_state_and_storage(state.page_instance)
+    await enable_temporary_chat_mode(state.page_instance)
 
+
+async def _initialize_page_workers() -> None:
+    """Open the additional pages of the page pool when PAGE_POOL_SIZE > 1."""
+    from api_utils.auth_manager import auth_manager
+
+    if PAGE_POOL_SIZE <= 1 or not state.browser_instance or not state.is_page_ready:
+        return
+
+    state.auth_profile = auth_manager.current_profile
+    for index in range(1, PAGE_POOL_SIZE):
+        worker = PageWorker(index)
+        with state.use_page_worker(worker):
+            try:
+                await _initialize_page_worker(worker)
+            except asyncio.CancelledError:
+                _stop_stream_proxy()
+                raise
+            except Exception as e:
+                state.logger.error(
+                    f"[页面池] 页面 {index} 初始化失败，跳过: {e}", exc_info=True
+                )
+                _stop_stream_proxy()
+                continue
+        state.page_workers.append(worker)
+        state.logger.info(f"[页面池] 页面 {index} 就绪")
+    state.logger.info(f"[页面池] 共 {len(state.page_workers)} 个页面可处理请求")
+
+
+def _stop_stream_proxy() -> None:
+    """Stop the current page's stream proxy subprocess, if running."""
+    logger = state.logger
     if state.STREAM_PROCESS:
         state.STREAM_PROCESS.terminate()
         # Wait for process to terminate with timeout to avoid atexit hang
@@ -178,15 +238,28 @@ async def _shutdown_resources() -> None:
             logger.warning("STREAM proxy did not terminate, killing...")
             state.STREAM_PROCESS.kill()
             state.STREAM_PROCESS.join(timeout=1)
-        # Close the queue to prevent resource leaks
-        if state.STREAM_QUEUE:
+        # Close the channel to prevent resource leaks
+        if state.STREAM_CHANNEL:
             try:
-                state.STREAM_QUEUE.close()
-                state.STREAM_QUEUE.join_thread()
+                state.STREAM_CHANNEL.close()
             except Exception:
                 pass
         logger.debug("STREAM proxy terminated.")
 
+
+async def _shutdown_resources() -> None:
+    """Gracefully shut down all resources."""
+    logger = state.logger
+    logger.debug("[系统] 正在关闭资源...")
+
+    # Signal all streaming generators to exit immediately
+    state.should_exit = True
+
+    _stop_stream_proxy()
+    for worker in state.page_workers[1:]:
+        with state.use_page_worker(worker):
+            _stop_stream_proxy()
+
     if state.worker_task and not state.worker_task.done():
         logger.debug("Cancelling worker task...")
         state.worker_task.cancel()
@@ -231,6 +304,7 @@ async def lifespan(app: FastAPI):
     try:
         await _start_stream_proxy()
         await _initialize_browser_and_page()
+        await _initialize_page_workers()
 
         launch_mode = get_environment_variable("LAUNCH_MODE", "unknown")
         if state.is_page_ready or launch_mode == "direct_debug_no_browser":
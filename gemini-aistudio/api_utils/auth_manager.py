@@ -2,7 +2,7 @@ import asyncio
 import glob
 import logging
 import os
-from typing import List, Optional, Set
+from typing import Iterable, List, Optional, Set
 
 from launcher.config import SAVED_AUTH_DIR
 
@@ -35,26 +35,36 @@ class AuthManager:
         profiles = await loop.run_in_executor(None, glob.glob, pattern)
         return sorted(profiles)  # Sort for deterministic order
 
-    async def get_next_profile(self) -> str:
+    def _unused_profiles(
+        self, profiles: List[str], exclude: Optional[Iterable[str]] = None
+    ) -> List[str]:
+        # 获取已失败配置文件的 basename 集合 (避免路径差异导致的重复)
+        skipped = {os.path.basename(p) for p in self.failed_profiles}
+        if self.current_profile:
+            skipped.add(os.path.basename(self.current_profile))  # 也排除当前配置文件
+        skipped.update(os.path.basename(p) for p in exclude or () if p)
+
+        # Filter out failed profiles by basename comparison
+        return [p for p in profiles if os.path.basename(p) not in skipped]
+
+    async def find_unused_profile(
+        self, exclude: Optional[Iterable[str]] = None
+    ) -> Optional[str]:
+        """
+        Return a profile that has not failed and is not in `exclude` (profiles
+        used by other pages), without switching to it. None if there is none.
+        """
+        available = self._unused_profiles(await self.get_available_profiles(), exclude)
+        return available[0] if available else None
+
+    async def get_next_profile(self, exclude: Optional[Iterable[str]] = None) -> str:
         """
         Get the next available profile that hasn't failed yet.
+        Profiles in `exclude` (used by other pages) are skipped as well.
         Raises RuntimeError if no profiles are available.
         """
         profiles = await self.get_available_profiles()
-
-        # 获取已失败配置文件的 basename 集合 (避免路径差异导致的重复)
-        failed_basenames = {os.path.basename(p) for p in self.failed_profiles}
-        current_basename = (
-            os.path.basename(self.current_profile) if self.current_profile else None
-        )
-
-        # Filter out failed profiles by basename comparison
-        available = [
-            p
-            for p in profiles
-            if os.path.basename(p) not in failed_basenames
-            and os.path.basename(p) != current_basename  # 也排除当前配置文件
-        ]
+        available = self._unused_profiles(profiles, exclude)
 
         if not available:
             msg = f"All authentication profiles exhausted. Failed: {len(self.failed_profiles)}, Total: {len(profiles)}"
@@ -7,7 +7,17 @@ import asyncio
 import logging
 import time
 from asyncio import Event, Future, Lock, Queue, Task
-from typing import Any, Callable, Dict, List, Optional, Set, Tuple, Union
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Callable,
+    Dict,
+    List,
+    Optional,
+    Set,
+    Tuple,
+    Union,
+)
 
 from fastapi import HTTPException, Request
 from fastapi.responses import JSONResponse, StreamingResponse
@@ -17,6 +27,9 @@ from api_utils.context_types import QueueItem
 from logging_utils import set_request_id, set_source
 from models import ChatCompletionRequest
 
+if TYPE_CHECKING:
+    from api_utils.server_state import PageWorker
+
 from .error_utils import (
     client_cancelled,
     client_disconnected,
@@ -30,6 +43,8 @@ class QueueManager:
         self.logger = logging.getLogger("queue_worker")
         self.was_last_request_streaming = False
         self.last_request_completion_time = 0.0
+        # Requests served ahead of the queue head to avoid a model switch
+        self.affinity_reorders = 0
 
         # These will be initialized from server.py or created if missing
         self.request_queue: Optional[Queue[QueueItem]] = None
@@ -141,9 +156,85 @@ class QueueManager:
             return None
 
         try:
-            return await asyncio.wait_for(self.request_queue.get(), timeout=5.0)
+            head = await asyncio.wait_for(self.request_queue.get(), timeout=5.0)
         except asyncio.TimeoutError:
             return None
+        return self._select_by_model_affinity(head)
+
+    def _preferred_model_ids(self) -> Set[str]:
+        """Models runnable without a switch: the current page's, or each idle page's."""
+        from api_utils.server_state import state
+
+        workers = state.page_workers
+        if len(workers) > 1:
+            return {
+                w.current_ai_studio_model_id
+                for w in workers
+                if not w.busy and w.current_ai_studio_model_id
+            }
+        current = state.current_ai_studio_model_id
+        return {current} if current else set()
+
+    def _select_by_model_affinity(self, head: QueueItem) -> QueueItem:
+        """
+        Pick the request to process next, batching requests by target model.
+
+        If the head of the queue needs a model switch, the first request within
+        the next QUEUE_REORDER_WINDOW that runs on an already loaded model is served
+        first. Requests queued longer than QUEUE_MAX_REORDER_DELAY are never
+        overtaken, so a request for another model waits at most that long
+        before its switch happens.
+        """
+        from config import QUEUE_MAX_REORDER_DELAY, QUEUE_REORDER_WINDOW
+
+        queue = self.request_queue
+        if QUEUE_REORDER_WINDOW <= 0 or queue is None or queue.empty():
+            return head
+
+        preferred = self._preferred_model_ids()
+        if not preferred:
+            return head
+
+        def runs_without_switch(item: QueueItem) -> bool:
+            model_id = _requested_model_id(item)
+            return model_id is None or model_id in preferred
+
+        def is_overdue(item: QueueItem) -> bool:
+            waited = time.time() - item.get("enqueue_time", 0)
+            return waited >= QUEUE_MAX_REORDER_DELAY
+
+        if head.get("cancelled", False) or runs_without_switch(head):
+            return head
+        if is_overdue(head):
+            return head
+
+        # Drain the whole queue so the rest can be put back in their original order
+        pending: List[QueueItem] = [head]
+        while True:
+            try:
+                pending.append(queue.get_nowait())
+            except asyncio.QueueEmpty:
+                break
+
+        chosen = head
+        for item in pending[1 : QUEUE_REORDER_WINDOW + 1]:
+            if is_overdue(item):
+                break
+            if not item.get("cancelled", False) and runs_without_switch(item):
+                chosen = item
+                break
+
+        for item in pending:
+            if item is not chosen:
+                queue.put_nowait(item)
+
+        if chosen is not head:
+            self.affinity_reorders += 1
+            self.logger.debug(
+                f"(Worker) 模型亲和调度: 请求 {chosen.get('req_id')} 先于 "
+                f"{head.get('req_id')} 处理 (无需切换模型)"
+            )
+        return chosen
 
     async def handle_streaming_delay(
         self, req_id: str, is_streaming_request: bool
@@ -696,6 +787,7 @@ class QueueManager:
         set_request_id(req_id)
 
         from api_utils.auth_manager import auth_manager
+        from api_utils.server_state import state
         from browser_utils.initialization.core import (
             close_page_logic,
             enable_temporary_chat_mode,
@@ -706,38 +798,56 @@ class QueueManager:
         )
         from config import get_environment_variable
 
-        # 标记当前配置文件为失败
-        auth_manager.mark_profile_failed()
+        # 标记当前页面的配置文件为失败
+        auth_manager.mark_profile_failed(state.auth_profile)
 
-        # 获取下一个配置文件
-        next_profile = await auth_manager.get_next_profile()
+        # 获取下一个配置文件 (跳过其他页面正在使用的配置文件)
+        current_worker = state.current_page_worker
+        next_profile = await auth_manager.get_next_profile(
+            exclude=[
+                w.auth_profile for w in state.page_workers if w is not current_worker
+            ]
+        )
+        state.auth_profile = next_profile
         self.logger.info(f"(Recovery) 切换到配置文件: {next_profile}")
 
-        # 1. 关闭现有页面
-        await close_page_logic()
-
-        # 2. 关闭浏览器连接以获取全新状态
-        from api_utils.server_state import state
-
-        if state.browser_instance and state.browser_instance.is_connected():
-            await state.browser_instance.close()
-            state.is_browser_connected = False
-            self.logger.info("(Recovery) 浏览器连接已关闭")
-
-        # 3. 重新连接到 Camoufox
-        ws_endpoint = get_environment_variable("CAMOUFOX_WS_ENDPOINT")
-        if not ws_endpoint:
-            raise RuntimeError("CAMOUFOX_WS_ENDPOINT not available for reconnection")
+        if len(state.page_workers) > 1:
+            # 页面池中其他页面仍在使用浏览器连接，只替换当前页面的上下文
+            old_page = state.page_instance
+            await close_page_logic()
+            if old_page:
+                try:
+                    await old_page.context.close()
+                except asyncio.CancelledError:
+                    raise
+                except Exception as close_err:
+                    self.logger.warning(f"(Recovery) 关闭页面上下文失败: {close_err}")
+        else:
+            # 1. 关闭现有页面
+            await close_page_logic()
+
+            # 2. 关闭浏览器连接以获取全新状态
+            if state.browser_instance and state.browser_instance.is_connected():
+                await state.browser_instance.close()
+                state.is_browser_connected = False
+                self.logger.info("(Recovery) 浏览器连接已关闭")
+
+            # 3. 重新连接到 Camoufox
+            ws_endpoint = get_environment_variable("CAMOUFOX_WS_ENDPOINT")
+            if not ws_endpoint:
+                raise RuntimeError(
+                    "CAMOUFOX_WS_ENDPOINT not available for reconnection"
+                )
 
-        if not state.playwright_manager:
-            raise RuntimeError("Playwright manager not available")
+            if not state.playwright_manager:
+                raise RuntimeError("Playwright manager not available")
 
-        self.logger.info("(Recovery) 重新连接到浏览器...")
-        state.browser_instance = await state.playwright_manager.firefox.connect(
-            ws_endpoint, timeout=30000
-        )
-        state.is_browser_connected = True
-        self.logger.info(f"(Recovery) 已连接: {state.browser_instance.version}")
+            self.logger.info("(Recovery) 重新连接到浏览器...")
+            state.browser_instance = await state.playwright_manager.firefox.connect(
+                ws_endpoint, timeout=30000
+            )
+            state.is_browser_connected = True
+            self.logger.info(f"(Recovery) 已连接: {state.browser_instance.version}")
 
         # 4. 使用新配置文件初始化页面
         state.page_instance, state.is_page_ready = await initialize_page_logic(
@@ -757,27 +867,138 @@ class QueueManager:
             raise RuntimeError("(Recovery) 页面初始化失败，无法完成配置文件切换")
 
 
+def _requested_model_id(request_item: QueueItem) -> Optional[str]:
+    """AI Studio model ID a queued request asks for, or None if it takes the current model."""
+    from config import MODEL_NAME
+
+    model = getattr(request_item["request_data"], "model", None)
+    if not model or model == MODEL_NAME:
+        return None
+    return model.split("/")[-1]
+
+
+class PageWorkerPool:
+    """
+    Runs queued requests on several browser pages at once (PAGE_POOL_SIZE > 1).
+
+    Each page worker processes one request at a time with its own QueueManager.
+    A request goes to an idle worker, preferably one whose page is already on
+    the requested model so that no model switch is needed.
+    """
+
+    def __init__(self, workers: List["PageWorker"]) -> None:
+        from api_utils.server_state import state
+
+        self.workers = workers
+        self.managers: Dict[int, QueueManager] = {}
+        for worker in workers:
+            with state.use_page_worker(worker):
+                manager = QueueManager()
+                manager.initialize_globals()
+            self.managers[worker.index] = manager
+        self.tasks: Set[Task[None]] = set()
+        self._worker_released = Event()
+
+    def idle_workers(self) -> List["PageWorker"]:
+        return [w for w in self.workers if not w.busy]
+
+    async def wait_for_idle_worker(self, timeout: float = 5.0) -> bool:
+        """Wait until a worker is idle. Returns False on timeout."""
+        while not self.idle_workers():
+            self._worker_released.clear()
+            try:
+                await asyncio.wait_for(self._worker_released.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                return False
+        return True
+
+    def choose_worker(self, model_id: Optional[str]) -> "PageWorker":
+        """Pick an idle worker: ready and on the model, then ready, then any."""
+        idle = self.idle_workers()
+        ready = [w for w in idle if w.is_page_ready] or idle
+        if model_id:
+            for worker in ready:
+                if worker.current_ai_studio_model_id == model_id:
+                    return worker
+        return ready[0]
+
+    def dispatch(self, request_item: QueueItem) -> "PageWorker":
+        """Start processing a request on an idle worker. Call after wait_for_idle_worker."""
+        from api_utils.server_state import state
+
+        worker = self.choose_worker(_requested_model_id(request_item))
+        worker.busy = True
+        # The task copies the context, so per-page state resolves to this worker
+        with state.use_page_worker(worker):
+            task = asyncio.create_task(self._run(worker, request_item))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+        return worker
+
+    async def _run(self, worker: "PageWorker", request_item: QueueItem) -> None:
+        manager = self.managers[worker.index]
+        try:
+            await manager.process_request(request_item)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            manager.logger.error(
+                f"(Worker) Page {worker.index} failed to process request: {e}",
+                exc_info=True,
+            )
+        finally:
+            worker.busy = False
+            self._worker_released.set()
+
+    async def stop(self) -> None:
+        for task in list(self.tasks):
+            task.cancel()
+        if self.tasks:
+            await asyncio.gather(*self.tasks, return_exceptions=True)
+
+
 async def queue_worker() -> None:
     """Main queue worker entry point."""
+    from api_utils.server_state import state
+
     manager = QueueManager()
     manager.initialize_globals()
 
     logger = manager.logger
     logger.info("--- Queue Worker Started ---")
 
-    while True:
-        try:
-            await manager.check_queue_disconnects()
+    pool: Optional[PageWorkerPool] = None
+    if len(state.page_workers) > 1:
+        pool = PageWorkerPool(state.page_workers)
+        logger.info(f"--- Dispatching to {len(state.page_workers)} pages ---")
 
-            request_item = await manager.get_next_request()
-            if request_item:
-                await manager.process_request(request_item)
+    try:
+        while True:
+            try:
+                await manager.check_queue_disconnects()
+
+                if pool is not None:
+                    if not await pool.wait_for_idle_worker():
+                        continue
+                    request_item = await manager.get_next_request()
+                    if request_item:
+                        pool.dispatch(request_item)
+                    continue
 
-        except asyncio.CancelledError:
-            logger.info("--- Queue Worker Cancelled ---")
-            break
-        except Exception as e:
-            logger.error(f"(Worker) Unexpected error in main loop: {e}", exc_info=True)
-            await asyncio.sleep(1)  # Prevent tight loop on error
+                request_item = await manager.get_next_request()
+                if request_item:
+                    await manager.process_request(request_item)
+
+            except asyncio.CancelledError:
+                logger.info("--- Queue Worker Cancelled ---")
+                break
+            except Exception as e:
+                logger.error(
+                    f"(Worker) Unexpected error in main loop: {e}", exc_info=True
+                )
+                await asyncio.sleep(1)  # Prevent tight loop on error
+    finally:
+        if pool is not None:
+            await pool.stop()
 
     logger.info("--- Queue Worker Stopped ---")
@@ -317,7 +317,7 @@ async def _handle_auxiliary_stream_response(
     submit_button_locator: Locator,
     check_client_disconnected: CheckClientDisconnected,
 ) -> Optional[Tuple[Optional[Event], Locator, CheckClientDisconnected]]:
-    """Auxiliary stream response path: converts STREAM_QUEUE data to OpenAI compatible SSE/JSON.
+    """Auxiliary stream response path: converts STREAM_CHANNEL data to OpenAI compatible SSE/JSON.
 
     - Streaming mode: Returns StreamingResponse, pushing delta and final usage incrementally.
     - Non-streaming mode: Aggregates final content and function calls, returns JSONResponse.
@@ -345,8 +345,14 @@ async def _handle_auxiliary_stream_response(
                 stream_state,
             )
             if not result_future.done():
+                from api_utils.server_state import state
+
+                # The body is iterated outside the worker task; keep it on this page's stream queue
                 result_future.set_result(
-                    StreamingResponse(stream_gen_func, media_type="text/event-stream")
+                    StreamingResponse(
+                        state.bind_page_worker(stream_gen_func),
+                        media_type="text/event-stream",
+                    )
                 )
             else:
                 if not completion_event.is_set():
@@ -375,6 +381,11 @@ async def _handle_auxiliary_stream_response(
         reasoning_content: Optional[str] = None
         functions: Optional[List[Dict[str, Any]]] = None
         final_data_from_aux_stream: Optional[Dict[str, Any]] = None
+        # The proxy sends deltas; join them once the done frame arrives
+        body_parts: List[str] = []
+        reason_parts: List[str] = []
+        function_parts: List[Dict[str, Any]] = []
+        body_seen = False
 
         # Non-streaming: Consume auxiliary queue final result and assemble JSON response
         async for raw_data in use_stream_response(req_id):
@@ -396,10 +407,17 @@ async def _handle_auxiliary_stream_response(
                 continue
 
             final_data_from_aux_stream = data
+            if isinstance(data.get("body"), str):
+                body_seen = True
+                body_parts.append(data["body"])
+            if isinstance(data.get("reason"), str):
+                reason_parts.append(data["reason"])
+            if isinstance(data.get("function"), list):
+                function_parts.extend(data["function"])
             if data.get("done"):
-                content = data.get("body")
-                reasoning_content = data.get("reason")
-                functions = data.get("function")
+                content = "".join(body_parts) if body_seen else None
+                reasoning_content = "".join(reason_parts)
+                functions = function_parts
                 break
 
         if (
@@ -647,7 +665,7 @@ async def _process_request_refactored(  # pyright: ignore[reportUnusedFunction]
         try:
             from api_utils import clear_stream_queue
 
-            await clear_stream_queue()
+            await clear_stream_queue(req_id)
         except asyncio.CancelledError:
             raise
         except Exception as clear_err:
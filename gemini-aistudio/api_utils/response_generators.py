@@ -40,14 +40,13 @@ async def gen_sse_from_aux_stream(
     set_request_id(req_id)
 
     # Stream start logged by use_stream_response
-
-    last_reason_pos = 0
-    last_body_pos = 0
     chat_completion_id = f"{CHAT_COMPLETION_ID_PREFIX}{req_id}-{int(time.time())}-{random.randint(100, 999)}"
     created_timestamp = int(time.time())
 
-    full_reasoning_content = ""
-    full_body_content = ""
+    # The proxy sends deltas; keep the parts for usage and the final tool calls
+    reasoning_parts: List[str] = []
+    body_parts: List[str] = []
+    functions: List[Any] = []
     data_receiving = False
 
     try:
@@ -94,12 +93,10 @@ async def gen_sse_from_aux_stream(
                 cast(List[Any], function_raw) if isinstance(function_raw, list) else []
             )
 
-            if reason:
-                full_reasoning_content = reason
-            if body:
-                full_body_content = body
+            functions.extend(function)
 
-            if len(reason) > last_reason_pos:
+            if reason:
+                reasoning_parts.append(reason)
                 output = {
                     "id": chat_completion_id,
                     "object": "chat.completion.chunk",
@@ -111,24 +108,24 @@ async def gen_sse_from_aux_stream(
                             "delta": {
                                 "role": "assistant",
                                 "content": None,
-                                "reasoning_content": reason[last_reason_pos:],
+                                "reasoning_content": reason,
                             },
                             "finish_reason": None,
                             "native_finish_reason": None,
                         }
                     ],
                 }
-                last_reason_pos = len(reason)
                 yield f"data: {json.dumps(output, ensure_ascii=False, separators=(',', ':'))}\n\n"
 
-            if len(body) > last_body_pos:
+            if body:
+                body_parts.append(body)
                 finish_reason_val: Optional[str] = None
                 if done:
                     finish_reason_val = "stop"
 
                 delta_content: Dict[str, Any] = {
                     "role": "assistant",
-                    "content": body[last_body_pos:],
+                    "content": body,
                 }
                 choice_item: Dict[str, Any] = {
                     "index": 0,
@@ -137,9 +134,9 @@ async def gen_sse_from_aux_stream(
                     "native_finish_reason": finish_reason_val,
                 }
 
-                if done and function and len(function) > 0:
+                if done and functions:
                     tool_calls_list: List[Dict[str, Any]] = []
-                    for func_idx, function_call_data in enumerate(function):
+                    for func_idx, function_call_data in enumerate(functions):
                         if isinstance(function_call_data, dict):
                             typed_func_data: Dict[str, Any] = cast(
                                 Dict[str, Any], function_call_data
@@ -169,12 +166,11 @@ async def gen_sse_from_aux_stream(
                     "created": created_timestamp,
                     "choices": [choice_item],
                 }
-                last_body_pos = len(body)
                 yield f"data: {json.dumps(output, ensure_ascii=False, separators=(',', ':'))}\n\n"
             elif done:
-                if function and len(function) > 0:
+                if functions:
                     tool_calls_list: List[Dict[str, Any]] = []
-                    for func_idx, function_call_data in enumerate(function):
+                    for func_idx, function_call_data in enumerate(functions):
                         if isinstance(function_call_data, dict):
                             typed_func_data: Dict[str, Any] = cast(
                                 Dict[str, Any], function_call_data
@@ -239,6 +235,8 @@ async def gen_sse_from_aux_stream(
         raise
     finally:
         # Stream end - cleanup follows
+        full_body_content = "".join(body_parts)
+        full_reasoning_content = "".join(reasoning_parts)
         try:
             usage_stats = calculate_usage_stats(
                 [msg.model_dump() for msg in request.messages],
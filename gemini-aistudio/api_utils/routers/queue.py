@@ -76,10 +76,13 @@ async def get_queue_status(
 
     queue_length = len(queue_items)
 
+    from api_utils.server_state import state
+
     return JSONResponse(
         content={
             "queue_length": queue_length,
             "is_processing_locked": processing_lock.locked(),
+            "page_workers": [worker.stats() for worker in state.page_workers],
             "items": sorted(
                 [
                     {
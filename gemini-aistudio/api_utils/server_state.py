@@ -10,13 +10,31 @@ Usage:
     # Access state attributes
     page = state.page_instance
     state.current_ai_studio_model_id = "new-model"
+
+Page state (page, current model, parameter cache, locks, stream queue) is kept
+per page worker. With PAGE_POOL_SIZE > 1 the browser runs several pages, and
+the per-page attributes of `state` resolve to the worker serving the current
+task (see `ServerState.use_page_worker`); elsewhere they resolve to the first
+page, so single-page code is unchanged.
 """
 
 import asyncio
 import logging
 import multiprocessing
+import os
 from asyncio import Event, Lock, Queue, Task
-from typing import TYPE_CHECKING, Any, Dict, List, Optional, Set
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    AsyncGenerator,
+    Dict,
+    Iterator,
+    List,
+    Optional,
+    Set,
+)
 
 if TYPE_CHECKING:
     from playwright.async_api import (
@@ -31,6 +49,64 @@ if TYPE_CHECKING:
 
     from api_utils.context_types import QueueItem
     from models.logging import WebSocketConnectionManager
+    from stream.channel import StreamChannel
+
+
+class PageWorker:
+    """State of one browser page that serves requests."""
+
+    def __init__(self, index: int = 0) -> None:
+        self.index = index
+        self.page_instance: Optional["AsyncPage"] = None
+        self.is_page_ready: bool = False
+        self.current_ai_studio_model_id: Optional[str] = None
+        self.model_switching_lock: Optional[Lock] = None
+        self.page_params_cache: Dict[str, Any] = {}
+        self.params_cache_lock: Optional[Lock] = None
+        self.processing_lock: Optional[Lock] = None
+        self.STREAM_CHANNEL: Optional["StreamChannel"] = None
+        self.STREAM_PROCESS: Optional[multiprocessing.Process] = None
+        self.PLAYWRIGHT_PROXY_SETTINGS: Optional[Dict[str, str]] = None
+        self.auth_profile: Optional[str] = None
+        self.busy: bool = False
+
+    def stats(self) -> Dict[str, Any]:
+        page = self.page_instance
+        return {
+            "index": self.index,
+            "ready": bool(self.is_page_ready and page and not page.is_closed()),
+            "busy": self.busy,
+            "model": self.current_ai_studio_model_id,
+            "auth_profile": os.path.basename(self.auth_profile)
+            if self.auth_profile
+            else None,
+        }
+
+
+# The page worker serving the current task; None means the first page
+_current_page_worker: ContextVar[Optional[PageWorker]] = ContextVar(
+    "current_page_worker", default=None
+)
+
+
+class _PageWorkerAttribute:
+    """ServerState attribute stored on the current page worker."""
+
+    def __set_name__(self, owner: type, name: str) -> None:
+        self.name = name
+
+    def __get__(self, obj: Optional["ServerState"], objtype: Optional[type] = None):
+        if obj is None:
+            return self
+        return getattr(obj.current_page_worker, self.name)
+
+    def __set__(self, obj: "ServerState", value: Any) -> None:
+        setattr(obj.current_page_worker, self.name, value)
+
+    def __delete__(self, obj: "ServerState") -> None:
+        # Restores the default, so patching the attribute in tests can be undone
+        worker = obj.current_page_worker
+        setattr(worker, self.name, getattr(PageWorker(worker.index), self.name))
 
 
 class ServerState:
@@ -41,45 +117,45 @@ class ServerState:
     Using a class allows for better organization and easier testing (state can be reset).
     """
 
+    # --- Per-page state (see PageWorker) ---
+    page_instance = _PageWorkerAttribute()
+    is_page_ready = _PageWorkerAttribute()
+    current_ai_studio_model_id = _PageWorkerAttribute()
+    model_switching_lock = _PageWorkerAttribute()
+    page_params_cache = _PageWorkerAttribute()
+    params_cache_lock = _PageWorkerAttribute()
+    processing_lock = _PageWorkerAttribute()
+    STREAM_CHANNEL = _PageWorkerAttribute()
+    STREAM_PROCESS = _PageWorkerAttribute()
+    PLAYWRIGHT_PROXY_SETTINGS = _PageWorkerAttribute()
+    auth_profile = _PageWorkerAttribute()
+
     def __init__(self) -> None:
         """Initialize all state variables with default values."""
         self.reset()
 
     def reset(self) -> None:
         """Reset all state to initial values. Useful for testing."""
-        # --- Stream Queue ---
-        self.STREAM_QUEUE: Optional[multiprocessing.Queue] = None
-        self.STREAM_PROCESS: Optional[multiprocessing.Process] = None
+        # --- Page Workers (the first one always exists) ---
+        self.page_workers: List[PageWorker] = [PageWorker(0)]
 
         # --- Playwright/Browser State ---
         self.playwright_manager: Optional["AsyncPlaywright"] = None
         self.browser_instance: Optional["AsyncBrowser"] = None
-        self.page_instance: Optional["AsyncPage"] = None
         self.is_playwright_ready: bool = False
         self.is_browser_connected: bool = False
-        self.is_page_ready: bool = False
         self.is_initializing: bool = False
 
-        # --- Proxy Configuration ---
-        self.PLAYWRIGHT_PROXY_SETTINGS: Optional[Dict[str, str]] = None
-
         # --- Model State ---
         self.global_model_list_raw_json: Optional[str] = None
         self.parsed_model_list: List[Dict[str, Any]] = []
         self.model_list_fetch_event: Event = asyncio.Event()
-        self.current_ai_studio_model_id: Optional[str] = None
-        self.model_switching_lock: Optional[Lock] = None
         self.excluded_model_ids: Set[str] = set()
 
         # --- Request Processing State ---
         self.request_queue: "Optional[Queue[QueueItem]]" = None
-        self.processing_lock: Optional[Lock] = None
         self.worker_task: "Optional[Task[None]]" = None
 
-        # --- Parameter Cache ---
-        self.page_params_cache: Dict[str, Any] = {}
-        self.params_cache_lock: Optional[Lock] = None
-
         # --- Debug Logging State ---
         self.console_logs: List[Dict[str, Any]] = []
         self.network_log: Dict[str, List[Dict[str, Any]]] = {
@@ -99,6 +175,43 @@ class ServerState:
         self.console_logs = []
         self.network_log = {"requests": [], "responses": []}
 
+    @property
+    def current_page_worker(self) -> PageWorker:
+        """The page worker serving the current task (the first page by default)."""
+        worker = _current_page_worker.get()
+        return worker if worker is not None else self.page_workers[0]
+
+    @contextmanager
+    def use_page_worker(self, worker: PageWorker) -> Iterator[PageWorker]:
+        """Resolve per-page state to `worker` in this block and in tasks created in it."""
+        token = _current_page_worker.set(worker)
+        try:
+            yield worker
+        finally:
+            _current_page_worker.reset(token)
+
+    def bind_page_worker(
+        self, agen: AsyncGenerator[Any, None]
+    ) -> AsyncGenerator[Any, None]:
+        """
+        Wrap a response generator so that it sees the current page worker.
+
+        Streaming bodies are iterated by the server in a task of their own,
+        which does not inherit the worker task's context.
+        """
+        worker = self.current_page_worker
+
+        async def bound() -> AsyncGenerator[Any, None]:
+            # The driving task only iterates this body, so the value is not reset
+            _current_page_worker.set(worker)
+            try:
+                async for item in agen:
+                    yield item
+            finally:
+                await agen.aclose()
+
+        return bound()
+
 
 # Global singleton instance
 state = ServerState()
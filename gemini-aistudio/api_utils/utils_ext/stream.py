@@ -1,29 +1,27 @@
 import asyncio
-import json
-from typing import Any, AsyncGenerator
+from typing import Any, AsyncGenerator, Optional
 
 from logging_utils import set_request_id
 
+# Wait for chunks in slices so a shutdown is noticed while the stream is idle
+_WAIT_SLICE_SECONDS = 1.0
+# End the stream if the proxy sends nothing for this long
+_MAX_IDLE_SECONDS = 30.0
 
-async def use_stream_response(req_id: str) -> AsyncGenerator[Any, None]:
-    import queue
 
+async def use_stream_response(req_id: str) -> AsyncGenerator[Any, None]:
     from api_utils.server_state import state
-    from server import STREAM_QUEUE, logger
+    from server import STREAM_CHANNEL, logger
 
     set_request_id(req_id)
-    if STREAM_QUEUE is None:
-        logger.warning("STREAM_QUEUE is None, 无法使用流响应")
+    if STREAM_CHANNEL is None:
+        logger.warning("STREAM_CHANNEL is None, 无法使用流响应")
         return
 
     logger.info("开始使用流响应")
 
-    empty_count = 0
-    max_empty_retries = 300
-    data_received = False
-    has_content = False
+    idle_seconds = 0.0
     received_items_count = 0
-    stale_done_ignored = False
 
     try:
         while True:
@@ -33,122 +31,21 @@ async def use_stream_response(req_id: str) -> AsyncGenerator[Any, None]:
                 return
 
             try:
-                data = STREAM_QUEUE.get_nowait()
-                if data is None:
-                    logger.debug("[Stream] 接收到流结束标志 (None)")
-                    break
-                empty_count = 0
-                data_received = True
-                received_items_count += 1
-
-                if isinstance(data, str):
-                    try:
-                        parsed_data = json.loads(data)
-
-                        # FAIL-FAST: 检测来自 stream proxy 的错误信号
-                        if parsed_data.get("error") is True:
-                            error_status = parsed_data.get("status", 500)
-                            error_message = parsed_data.get(
-                                "message", "Unknown upstream error"
-                            )
-                            logger.error(
-                                f"[UPSTREAM ERROR] Detected from stream proxy: {error_status} - {error_message}"
-                            )
-
-                            # 根据状态码抛出相应异常，立即中止并触发重试逻辑
-                            from models.exceptions import (
-                                QuotaExceededError,
-                                UpstreamError,
-                            )
-
-                            if error_status == 429 or "quota" in error_message.lower():
-                                logger.warning(
-                                    "[FAIL-FAST] Raising QuotaExceededError for tier switch"
-                                )
-                                raise QuotaExceededError(
-                                    message=f"AI Studio quota exceeded: {error_message}",
-                                    req_id=req_id,
-                                )
-                            else:
-                                logger.warning(
-                                    "[FAIL-FAST] Raising UpstreamError for tier switch"
-                                )
-                                raise UpstreamError(
-                                    message=f"AI Studio error: {error_message}",
-                                    req_id=req_id,
-                                    status_code=error_status,
-                                )
-
-                        if parsed_data.get("done") is True:
-                            body = parsed_data.get("body", "")
-                            reason = parsed_data.get("reason", "")
-                            if body or reason:
-                                has_content = True
-                            logger.debug(
-                                f"[Stream] 捕获完成标志 (body:{len(body)}, reason:{len(reason)}, count:{received_items_count})"
-                            )
-                            if (
-                                not has_content
-                                and received_items_count == 1
-                                and not stale_done_ignored
-                            ):
-                                logger.warning(
-                                    "[STALE DATA] 收到done=True但没有任何内容，且这是第一个接收的项目！可能是队列残留的旧数据，尝试忽略并继续等待..."
-                                )
-                                stale_done_ignored = True
-                                continue
-                            yield parsed_data
-                            break
-                        else:
-                            body = parsed_data.get("body", "")
-                            reason = parsed_data.get("reason", "")
-                            if body or reason:
-                                has_content = True
-                            stale_done_ignored = False
-                            yield parsed_data
-                    except json.JSONDecodeError:
-                        logger.debug("[Stream] 返回非 JSON 字符串数据")
-                        has_content = True
-                        stale_done_ignored = False
-                        yield data
-                else:
-                    yield data
-                    if isinstance(data, dict):
-                        body = data.get("body", "")
-                        reason = data.get("reason", "")
-                        if body or reason:
-                            has_content = True
-                        if data.get("done") is True:
-                            logger.debug(
-                                f"[Stream] 捕获完成标志 (body:{len(body)}, reason:{len(reason)}, count:{received_items_count})"
-                            )
-                            if (
-                                not has_content
-                                and received_items_count == 1
-                                and not stale_done_ignored
-                            ):
-                                logger.warning(
-                                    "[STALE DATA] 收到done=True但没有任何内容，且这是第一个接收的项目！可能是队列残留的旧数据，尝试忽略并继续等待..."
-                                )
-                                stale_done_ignored = True
-                                continue
-                            break
-                        else:
-                            stale_done_ignored = False
-            except (queue.Empty, asyncio.QueueEmpty):
-                empty_count += 1
-                if empty_count % 50 == 0:
+                data = await STREAM_CHANNEL.get(req_id, timeout=_WAIT_SLICE_SECONDS)
+            except asyncio.TimeoutError:
+                idle_seconds += _WAIT_SLICE_SECONDS
+                if idle_seconds % 5 == 0:
                     logger.debug(
-                        f"[Stream] 等待数据... ({empty_count}/{max_empty_retries}, 已接收:{received_items_count})"
+                        f"[Stream] 等待数据... ({idle_seconds:.0f}/{_MAX_IDLE_SECONDS:.0f}s, 已接收:{received_items_count})"
                     )
-                if empty_count >= max_empty_retries:
-                    if not data_received:
+                if idle_seconds >= _MAX_IDLE_SECONDS:
+                    if received_items_count == 0:
                         logger.error(
-                            "流响应队列空读取次数达到上限且未收到任何数据，可能是辅助流未启动或出错"
+                            "流响应等待超时且未收到任何数据，可能是辅助流未启动或出错"
                         )
                     else:
                         logger.warning(
-                            f"流响应队列空读取次数达到上限 ({max_empty_retries})，结束读取"
+                            f"流响应 {_MAX_IDLE_SECONDS:.0f} 秒内未收到新数据，结束读取"
                         )
                     yield {
                         "done": True,
@@ -157,8 +54,31 @@ async def use_stream_response(req_id: str) -> AsyncGenerator[Any, None]:
                         "function": [],
                     }
                     return
-                await asyncio.sleep(0.1)
                 continue
+
+            if data is None:
+                logger.debug("[Stream] 接收到流结束标志 (None)")
+                break
+            idle_seconds = 0.0
+            received_items_count += 1
+
+            if not isinstance(data, dict):
+                logger.debug("[Stream] 返回非字典数据")
+                yield data
+                continue
+
+            # FAIL-FAST: 检测来自 stream proxy 的错误信号
+            if data.get("error") is True:
+                _raise_upstream_error(req_id, data)
+
+            yield data
+            if data.get("done") is True:
+                body = data.get("body", "")
+                reason = data.get("reason", "")
+                logger.debug(
+                    f"[Stream] 捕获完成标志 (body:{len(body)}, reason:{len(reason)}, count:{received_items_count})"
+                )
+                break
     except asyncio.CancelledError:
         raise
     except Exception as e:
@@ -168,34 +88,45 @@ async def use_stream_response(req_id: str) -> AsyncGenerator[Any, None]:
         pass  # Stream completion logged by capture flag
 
 
-async def clear_stream_queue():
-    import queue
-
-    from server import STREAM_QUEUE, logger
-
-    if STREAM_QUEUE is None:
+def _raise_upstream_error(req_id: str, data: dict) -> None:
+    """根据状态码抛出相应异常，立即中止并触发重试逻辑"""
+    from models.exceptions import QuotaExceededError, UpstreamError
+    from server import logger
+
+    error_status = data.get("status", 500)
+    error_message = data.get("message", "Unknown upstream error")
+    logger.error(
+        f"[UPSTREAM ERROR] Detected from stream proxy: {error_status} - {error_message}"
+    )
+
+    if error_status == 429 or "quota" in error_message.lower():
+        logger.warning("[FAIL-FAST] Raising QuotaExceededError for tier switch")
+        raise QuotaExceededError(
+            message=f"AI Studio quota exceeded: {error_message}",
+            req_id=req_id,
+        )
+    logger.warning("[FAIL-FAST] Raising UpstreamError for tier switch")
+    raise UpstreamError(
+        message=f"AI Studio error: {error_message}",
+        req_id=req_id,
+        status_code=error_status,
+    )
+
+
+async def clear_stream_queue(req_id: Optional[str] = None):
+    """
+    Discard buffered stream data and make req_id the request the proxy's
+    chunks belong to (None between requests). Chunks tagged with any other
+    request are dropped by the channel.
+    """
+    from server import STREAM_CHANNEL, logger
+
+    if STREAM_CHANNEL is None:
         logger.debug("[Stream] 队列未初始化或已禁用，跳过清空")
         return
 
-    cleared_count = 0
-    while True:
-        try:
-            data_chunk = await asyncio.to_thread(STREAM_QUEUE.get_nowait)
-            cleared_count += 1
-            if cleared_count <= 3:
-                logger.debug(
-                    f"[Stream] 清空队列项 #{cleared_count}: {type(data_chunk).__name__}"
-                )
-        except queue.Empty:
-            logger.debug(f"[Stream] 队列已清空 (共 {cleared_count} 项)")
-            break
-        except asyncio.CancelledError:
-            raise
-        except Exception as e:
-            logger.error(
-                f"清空流式队列时发生意外错误 (已清空{cleared_count}项): {e}",
-                exc_info=True,
-            )
-            break
-
-    # [Stream] 队列已清空 log above is sufficient
+    try:
+        cleared_count = STREAM_CHANNEL.begin(req_id)
+        logger.debug(f"[Stream] 队列已清空 (共 {cleared_count} 项)")
+    except Exception as e:
+        logger.error(f"清空流式队列时发生意外错误: {e}", exc_info=True)
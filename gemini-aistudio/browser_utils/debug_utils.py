@@ -231,7 +231,7 @@ async def capture_system_context(
             },
             "queues": {
                 "request_queue_size": get_qsize(server.request_queue),
-                "stream_queue_active": server.STREAM_QUEUE is not None,
+                "stream_channel_active": server.STREAM_CHANNEL is not None,
             },
             "locks": {
                 "processing_lock_locked": is_locked(server.processing_lock),
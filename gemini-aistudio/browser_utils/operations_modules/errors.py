@@ -223,9 +223,9 @@ async def save_minimal_snapshot(
                 else None,
             }
 
-            # 流队列
-            sq = getattr(server, "STREAM_QUEUE", None)
-            metadata["application_state"]["stream_queue_active"] = sq is not None
+            # 流式代理通道
+            sc = getattr(server, "STREAM_CHANNEL", None)
+            metadata["application_state"]["stream_channel_active"] = sc is not None
 
         except Exception as server_err:
             metadata["application_state"] = {"error": str(server_err)}
@@ -82,6 +82,9 @@ __all__ = [
     "LOG_DIR",
     "APP_LOG_FILE_PATH",
     "NO_PROXY_ENV",
+    "PAGE_POOL_SIZE",
+    "QUEUE_REORDER_WINDOW",
+    "QUEUE_MAX_REORDER_DELAY",
     "ENABLE_SCRIPT_INJECTION",
     "USERSCRIPT_PATH",
     # 新增页面元素选择器
@@ -76,6 +76,17 @@ def get_int_env(key: str, default: int = 0) -> int:
 # 注意：代理配置现在在 api_utils/app.py 中动态设置，根据 STREAM_PORT 环境变量决定
 NO_PROXY_ENV = os.environ.get("NO_PROXY")
 
+# --- 页面池配置 ---
+# 浏览器中并行处理请求的页面数量。每个页面使用独立的浏览器上下文、认证文件
+# (auth_profiles/saved 中未被占用的配置) 和流式代理端口 (STREAM_PORT + 页面序号)
+PAGE_POOL_SIZE = max(1, get_int_env("PAGE_POOL_SIZE", 1))
+
+# --- 队列调度配置 ---
+# 模型亲和调度：在队首之后的 N 个请求中优先处理与当前页面模型相同的请求，减少模型切换。0 表示严格 FIFO
+QUEUE_REORDER_WINDOW = max(0, get_int_env("QUEUE_REORDER_WINDOW", 8))
+# 请求排队超过此秒数后不再被后来的请求插队 (防止饥饿)
+QUEUE_MAX_REORDER_DELAY = float(os.environ.get("QUEUE_MAX_REORDER_DELAY", "20"))
+
 # --- 脚本注入配置 ---
 ENABLE_SCRIPT_INJECTION = get_boolean_env("ENABLE_SCRIPT_INJECTION", False)
 ONLY_COLLECT_CURRENT_USER_ATTACHMENTS = get_boolean_env(
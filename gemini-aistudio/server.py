@@ -19,8 +19,8 @@ from api_utils.server_state import state
 
 # 定义需要转发到 state 的属性名称
 _STATE_ATTRS = {
-    # Stream Queue
-    "STREAM_QUEUE",
+    # Stream Proxy
+    "STREAM_CHANNEL",
     "STREAM_PROCESS",
     # Playwright/Browser State
     "playwright_manager",
@@ -8,20 +8,22 @@ def start(*args, **kwargs):
     启动流式代理服务器，兼容位置参数和关键字参数
 
     位置参数模式（与参考文件兼容）：
-        start(queue, port, proxy)
+        start(channel_address, port, proxy)
 
     关键字参数模式：
-        start(queue=queue, port=port, proxy=proxy)
+        start(channel_address=channel_address, port=port, proxy=proxy)
+
+    channel_address 为主进程 StreamChannel 的监听地址 (见 stream.channel)
     """
     if args:
         # 位置参数模式（与参考文件兼容）
-        queue = args[0] if len(args) > 0 else None
+        channel_address = args[0] if len(args) > 0 else None
         port = args[1] if len(args) > 1 else None
         proxy = args[2] if len(args) > 2 else None
     else:
         # 关键字参数模式
-        queue = kwargs.get("queue", None)
+        channel_address = kwargs.get("channel_address", None)
         port = kwargs.get("port", None)
         proxy = kwargs.get("proxy", None)
 
-    asyncio.run(main.builtin(queue=queue, port=port, proxy=proxy))
+    asyncio.run(main.builtin(channel_address=channel_address, port=port, proxy=proxy))
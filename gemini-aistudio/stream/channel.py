@@ -0,0 +1,226 @@
+"""
+IPC channel between the stream proxy process and the API process.
+
+Messages are JSON objects sent as length-prefixed frames (4-byte big-endian
+length followed by UTF-8 JSON) over a Unix socket, or a loopback TCP socket
+where Unix sockets are unavailable. The API end listens; the proxy connects.
+
+Frames from the API to the proxy:
+    {"type": "begin", "req_id": ...}   request whose responses follow
+Frames from the proxy to the API:
+    {"type": "ready"}                  proxy is listening
+    {"type": "chunk", "req_id": ..., "data": {...}}
+                                       data holds only the text and function
+                                       calls that are new since the last chunk
+
+Every chunk carries the ID of the request that was active when the browser
+sent the intercepted call, so a late chunk from an earlier request is dropped
+instead of being read as part of the next one.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import shutil
+import socket
+import struct
+import tempfile
+from typing import Any, Dict, Optional, Tuple, Union
+
+# Unix socket path, or (host, port) for the loopback TCP fallback
+ChannelAddress = Union[str, Tuple[str, int]]
+
+_HEADER = struct.Struct(">I")
+MAX_FRAME_SIZE = 64 * 1024 * 1024
+
+
+def encode_frame(message: Dict[str, Any]) -> bytes:
+    """Encode a message as a length-prefixed JSON frame."""
+    payload = json.dumps(message, ensure_ascii=False).encode("utf-8")
+    return _HEADER.pack(len(payload)) + payload
+
+
+async def read_frame(reader: asyncio.StreamReader) -> Optional[Dict[str, Any]]:
+    """Read one frame. Returns None when the peer closed the connection."""
+    try:
+        header = await reader.readexactly(_HEADER.size)
+    except (asyncio.IncompleteReadError, ConnectionError):
+        return None
+    (length,) = _HEADER.unpack(header)
+    if length > MAX_FRAME_SIZE:
+        raise ValueError(f"Stream channel frame too large: {length} bytes")
+    try:
+        payload = await reader.readexactly(length)
+    except (asyncio.IncompleteReadError, ConnectionError):
+        return None
+    return json.loads(payload.decode("utf-8"))
+
+
+def _use_unix_socket() -> bool:
+    return hasattr(socket, "AF_UNIX") and os.name != "nt"
+
+
+class StreamChannel:
+    """API end of the channel: accepts the proxy and buffers the active request's chunks."""
+
+    def __init__(self) -> None:
+        self.logger = logging.getLogger("AIStudioProxyServer")
+        self.address: Optional[ChannelAddress] = None
+        self.request_id: Optional[str] = None
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._socket_dir: Optional[str] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._ready = asyncio.Event()
+        self._items: "asyncio.Queue[Optional[Dict[str, Any]]]" = asyncio.Queue()
+        self._closed = False
+
+    async def start(self) -> ChannelAddress:
+        """Start listening. Returns the address to hand to the proxy process."""
+        if _use_unix_socket():
+            self._socket_dir = tempfile.mkdtemp(prefix="aistudio-stream-")
+            path = os.path.join(self._socket_dir, "stream.sock")
+            self._server = await asyncio.start_unix_server(self._handle_proxy, path)
+            self.address = path
+        else:
+            self._server = await asyncio.start_server(
+                self._handle_proxy, "127.0.0.1", 0
+            )
+            self.address = self._server.sockets[0].getsockname()[:2]
+        return self.address
+
+    async def wait_ready(self, timeout: float) -> None:
+        """Wait for the proxy's ready frame. Raises asyncio.TimeoutError."""
+        await asyncio.wait_for(self._ready.wait(), timeout=timeout)
+
+    def begin(self, req_id: Optional[str]) -> int:
+        """
+        Make req_id the active request (None: no request) and tell the proxy.
+
+        Returns the number of buffered chunks that were discarded.
+        """
+        dropped = self._items.qsize()
+        self.request_id = req_id
+        self._items = asyncio.Queue()
+        self._send({"type": "begin", "req_id": req_id})
+        return dropped
+
+    async def get(self, req_id: str, timeout: float) -> Optional[Dict[str, Any]]:
+        """
+        Wait for the next chunk of req_id. None means the channel was closed.
+
+        Raises asyncio.TimeoutError if nothing arrives within timeout.
+        """
+        if self.request_id != req_id:
+            self.begin(req_id)
+        if self._closed and self._items.empty():
+            return None
+        return await asyncio.wait_for(self._items.get(), timeout=timeout)
+
+    def close(self) -> None:
+        """Stop listening and wake up readers with the end-of-stream marker."""
+        self._closed = True
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+        if self._server is not None:
+            self._server.close()
+            self._server = None
+        if self._socket_dir is not None:
+            shutil.rmtree(self._socket_dir, ignore_errors=True)
+            self._socket_dir = None
+        self._items.put_nowait(None)
+
+    def _send(self, message: Dict[str, Any]) -> None:
+        if self._writer is None or self._writer.is_closing():
+            return
+        try:
+            self._writer.write(encode_frame(message))
+        except (ConnectionError, RuntimeError) as e:
+            self.logger.warning(f"[Stream] 通道发送失败: {e}")
+
+    async def _handle_proxy(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        if self._writer is not None:
+            self._writer.close()
+        self._writer = writer
+        if self.request_id is not None:
+            self._send({"type": "begin", "req_id": self.request_id})
+
+        stale_count = 0
+        try:
+            while True:
+                message = await read_frame(reader)
+                if message is None:
+                    break
+                kind = message.get("type")
+                if kind == "chunk":
+                    if message.get("req_id") == self.request_id:
+                        self._items.put_nowait(message.get("data"))
+                    else:
+                        stale_count += 1
+                        self.logger.debug(
+                            f"[Stream] 丢弃非当前请求的数据 "
+                            f"(req_id={message.get('req_id')}, 共 {stale_count} 项)"
+                        )
+                elif kind == "ready":
+                    self._ready.set()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.logger.error(f"[Stream] 读取流式代理通道出错: {e}", exc_info=True)
+        finally:
+            if self._writer is writer:
+                self._writer = None
+            writer.close()
+
+
+class ProxyChannel:
+    """Proxy end of the channel: reports readiness and sends intercepted chunks."""
+
+    def __init__(self, address: ChannelAddress) -> None:
+        self.address = address
+        self.logger = logging.getLogger("proxy_server")
+        # Request announced by the API; responses are tagged with it
+        self.request_id: Optional[str] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._reader_task: Optional["asyncio.Task[None]"] = None
+
+    async def connect(self) -> None:
+        if isinstance(self.address, str):
+            reader, self._writer = await asyncio.open_unix_connection(self.address)
+        else:
+            host, port = self.address
+            reader, self._writer = await asyncio.open_connection(host, port)
+        self._reader_task = asyncio.create_task(self._read_control(reader))
+
+    async def send_ready(self) -> None:
+        await self._send({"type": "ready"})
+
+    async def send(self, data: Dict[str, Any], req_id: Optional[str]) -> None:
+        """Send an intercepted chunk tagged with the request it belongs to."""
+        await self._send({"type": "chunk", "req_id": req_id, "data": data})
+
+    def close(self) -> None:
+        if self._reader_task is not None:
+            self._reader_task.cancel()
+            self._reader_task = None
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+    async def _send(self, message: Dict[str, Any]) -> None:
+        if self._writer is None:
+            return
+        self._writer.write(encode_frame(message))
+        await self._writer.drain()
+
+    async def _read_control(self, reader: asyncio.StreamReader) -> None:
+        while True:
+            message = await read_frame(reader)
+            if message is None:
+                self.logger.warning("[Proxy] 主进程通道已关闭")
+                return
+            if message.get("type") == "begin":
+                self.request_id = message.get("req_id")
@@ -3,7 +3,7 @@ import logging
 import re
 import sys
 import zlib
-from typing import Any, Dict, Tuple, Union
+from typing import Any, Dict, List, Optional, Tuple, Union
 
 from logging_utils.setup import ColoredFormatter
 
@@ -91,9 +91,6 @@ class HttpInterceptor:
 
     def parse_response(self, response_data: bytes) -> Dict[str, Any]:
         pattern = rb'\[\[\[null,.*?]],"model"]'
-        matches = []
-        for match_obj in re.finditer(pattern, response_data):
-            matches.append(match_obj.group(0))
 
         resp = {
             "reason": "",
@@ -101,30 +98,37 @@ class HttpInterceptor:
             "function": [],
         }
 
-        # Print each full match
-        for match in matches:
-            try:
-                json_data = json.loads(match)
-                payload = json_data[0][0]
-            except Exception:
-                continue
-
-            if len(payload) == 2:  # body
-                resp["body"] = resp["body"] + payload[1]
-            elif (
-                len(payload) == 11
-                and payload[1] is None
-                and isinstance(payload[10], list)
-            ):  # function
-                array_tool_calls = payload[10]
-                func_name = array_tool_calls[0]
-                params = self.parse_toolcall_params(array_tool_calls[1])
-                resp["function"].append({"name": func_name, "params": params})
-            elif len(payload) > 2:  # reason
-                resp["reason"] = resp["reason"] + payload[1]
+        for match_obj in re.finditer(pattern, response_data):
+            self.merge_frame(resp, match_obj.group(0))
 
         return resp
 
+    def merge_frame(self, resp: Dict[str, Any], frame: bytes) -> None:
+        """Add one [[[null,...]],"model"] frame to resp (body, reason or function)."""
+        try:
+            json_data = json.loads(frame)
+            payload = json_data[0][0]
+        except Exception:
+            return
+
+        if len(payload) == 2:  # body
+            resp["body"] = resp["body"] + payload[1]
+        elif (
+            len(payload) == 11 and payload[1] is None and isinstance(payload[10], list)
+        ):  # function
+            array_tool_calls = payload[10]
+            func_name = array_tool_calls[0]
+            params = self.parse_toolcall_params(array_tool_calls[1])
+            resp["function"].append({"name": func_name, "params": params})
+        elif len(payload) > 2:  # reason
+            resp["reason"] = resp["reason"] + payload[1]
+
+    def create_response_parser(
+        self, headers: Dict[str, str], status_code: int = 200
+    ) -> "ResponseParser":
+        """Incremental parser for one intercepted response (see ResponseParser)."""
+        return ResponseParser(headers, interceptor=self, status_code=status_code)
+
     def parse_toolcall_params(self, args: Any) -> Dict[str, Any]:
         try:
             params = args[0]
@@ -189,3 +193,206 @@ class HttpInterceptor:
 
             response_body = response_body[length_crlf_idx + 2 + length + 2 :]
         return bytes(chunked_data), False
+
+
+class ChunkedDecoder:
+    """
+    Incremental decoder for a chunked transfer-encoded body.
+
+    Each feed() call only looks at the new bytes and returns the payload they
+    complete, including the partial data of a chunk that is still arriving.
+    Once the terminating chunk and trailers are read, done is set and any
+    bytes after the body are kept in tail.
+    """
+
+    _SIZE, _DATA, _DATA_END, _TRAILER = range(4)
+
+    def __init__(self) -> None:
+        self._buffer = bytearray()
+        self._state = self._SIZE
+        self._remaining = 0
+        self.done = False
+        self.tail = b""
+
+    def feed(self, data: bytes) -> bytes:
+        if self.done:
+            self.tail += data
+            return b""
+
+        buffer = self._buffer
+        buffer.extend(data)
+        out = bytearray()
+        pos = 0
+        while not self.done:
+            if self._state in (self._SIZE, self._TRAILER):
+                eol = buffer.find(b"\r\n", pos)
+                if eol == -1:
+                    break
+                line = bytes(buffer[pos:eol])
+                pos = eol + 2
+                if self._state == self._TRAILER:
+                    self.done = not line
+                    continue
+                # Chunk extensions (";name=value") are ignored
+                size = int(line.split(b";", 1)[0].strip(), 16)
+                if size == 0:
+                    self._state = self._TRAILER
+                else:
+                    self._remaining = size
+                    self._state = self._DATA
+            elif self._state == self._DATA:
+                available = min(self._remaining, len(buffer) - pos)
+                if available == 0:
+                    break
+                out += buffer[pos : pos + available]
+                pos += available
+                self._remaining -= available
+                if self._remaining == 0:
+                    self._state = self._DATA_END
+            else:  # CRLF after chunk data
+                if len(buffer) - pos < 2:
+                    break
+                pos += 2
+                self._state = self._SIZE
+
+        if self.done:
+            self.tail = bytes(buffer[pos:])
+            buffer.clear()
+        else:
+            del buffer[:pos]
+        return bytes(out)
+
+
+class ModelFrameExtractor:
+    """
+    Streaming equivalent of finditer(rb'\\[\\[\\[null,.*?]],"model"]', text).
+
+    Text is fed in pieces; complete frames are returned as soon as their
+    closing bracket arrives. Only the unfinished frame (or a possible prefix
+    of the next one) is kept, and no byte is scanned twice.
+    """
+
+    _START = b"[[[null,"
+    _END = b']],"model"]'
+
+    def __init__(self) -> None:
+        self._buffer = bytearray()
+        # Offset in the pending frame up to which the end marker was searched
+        self._scanned = 0
+
+    def feed(self, data: bytes) -> List[bytes]:
+        buffer = self._buffer
+        buffer.extend(data)
+        frames: List[bytes] = []
+        while True:
+            if not buffer.startswith(self._START):
+                start = buffer.find(self._START)
+                if start == -1:
+                    # Keep what could be the beginning of a start marker
+                    del buffer[: max(0, len(buffer) - len(self._START) + 1)]
+                    self._scanned = 0
+                    break
+                del buffer[:start]
+                self._scanned = 0
+
+            scan_from = max(len(self._START), self._scanned)
+            end = buffer.find(self._END, scan_from)
+            # Like the regex's ".", a frame cannot span lines
+            newline = buffer.find(b"\n", scan_from, len(buffer) if end == -1 else end)
+            if newline != -1:
+                del buffer[:1]
+                self._scanned = 0
+                continue
+            if end == -1:
+                self._scanned = max(scan_from, len(buffer) - len(self._END) + 1)
+                break
+
+            frame_end = end + len(self._END)
+            frames.append(bytes(buffer[:frame_end]))
+            del buffer[:frame_end]
+            self._scanned = 0
+        return frames
+
+
+class ResponseParser:
+    """
+    Incremental parser for one intercepted HTTP response body.
+
+    feed() takes body bytes as they arrive and returns only what is new: the
+    body and reason text and function calls of the frames completed by those
+    bytes, plus done once the response has ended. The chunked decoder,
+    decompressor and frame extractor keep their state between calls, so the
+    cost per byte stays constant. Without an interceptor the parser only
+    tracks where the response ends (for responses that are not sniffed).
+    """
+
+    def __init__(
+        self,
+        headers: Dict[str, str],
+        interceptor: Optional[HttpInterceptor] = None,
+        status_code: int = 200,
+    ) -> None:
+        lowered = {k.lower(): v.strip().lower() for k, v in headers.items()}
+        self.interceptor = interceptor
+        self._chunks: Optional[ChunkedDecoder] = None
+        # Body bytes still expected (Content-Length); None means chunked or until close
+        self._remaining: Optional[int] = None
+        if 100 <= status_code < 200 or status_code in (204, 304):
+            self._remaining = 0
+        elif "chunked" in lowered.get("transfer-encoding", ""):
+            self._chunks = ChunkedDecoder()
+        elif lowered.get("content-length", "").isdigit():
+            self._remaining = int(lowered["content-length"])
+
+        encoding = lowered.get("content-encoding", "")
+        # None: no header, decided from the first body bytes
+        self._compressed: Optional[bool] = (
+            encoding in ("gzip", "x-gzip", "deflate") if encoding else None
+        )
+        self._decompressor = zlib.decompressobj(wbits=zlib.MAX_WBITS | 32)
+        self._frames = ModelFrameExtractor()
+        self.done = self._remaining == 0
+        self.tail = b""
+
+    def feed(self, data: bytes) -> Dict[str, Any]:
+        delta: Dict[str, Any] = {"reason": "", "body": "", "function": []}
+        if self.done:
+            # The decompressor is already flushed; later bytes belong to the next response
+            self.tail += data
+            delta["done"] = True
+            return delta
+        payload = self._take_body(data)
+        if self.interceptor is not None and (payload or self.done):
+            for frame in self._frames.feed(self._decode(payload)):
+                self.interceptor.merge_frame(delta, frame)
+        delta["done"] = self.done
+        return delta
+
+    def _take_body(self, data: bytes) -> bytes:
+        if self.done:
+            self.tail += data
+            return b""
+        if self._chunks is not None:
+            payload = self._chunks.feed(data)
+            if self._chunks.done:
+                self.done = True
+                self.tail = self._chunks.tail
+            return payload
+        if self._remaining is None:
+            return data
+        payload = data[: self._remaining]
+        self.tail = data[self._remaining :]
+        self._remaining -= len(payload)
+        self.done = self._remaining == 0
+        return payload
+
+    def _decode(self, payload: bytes) -> bytes:
+        if self._compressed is None and payload:
+            # gzip or zlib header
+            self._compressed = payload[:1] in (b"\x1f", b"\x78")
+        if not self._compressed:
+            return payload
+        text = self._decompressor.decompress(payload)
+        if self.done:
+            text += self._decompressor.flush()
+        return text
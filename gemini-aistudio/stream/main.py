@@ -3,9 +3,10 @@ import asyncio
 import logging
 import sys
 from pathlib import Path
-from typing import Any, Optional
+from typing import Optional
 
 from logging_utils import GridFormatter, set_source
+from stream.channel import ChannelAddress, ProxyChannel
 from stream.proxy_server import ProxyServer
 
 
@@ -71,7 +72,7 @@ async def main() -> None:
         port=args.port,
         intercept_domains=args.domains,
         upstream_proxy=args.proxy,
-        queue=None,
+        channel=None,
     )
 
     try:
@@ -86,7 +87,9 @@ async def main() -> None:
 
 
 async def builtin(
-    queue: Optional[Any] = None, port: Optional[int] = None, proxy: Optional[str] = None
+    channel_address: Optional[ChannelAddress] = None,
+    port: Optional[int] = None,
+    proxy: Optional[str] = None,
 ) -> None:
     # Set up logging with GridFormatter for consistent output
     set_source("PROXY")
@@ -115,7 +118,7 @@ async def builtin(
         port=port,
         intercept_domains=["*.google.com"],
         upstream_proxy=proxy,
-        queue=queue,
+        channel=ProxyChannel(channel_address) if channel_address else None,
     )
 
     try:
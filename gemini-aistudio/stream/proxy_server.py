@@ -1,12 +1,12 @@
 import asyncio
-import json
 import logging
 import ssl
 from pathlib import Path
-from typing import Any, List, Optional
+from typing import Dict, List, Optional, Tuple
 
 from stream.cert_manager import CertificateManager
-from stream.interceptors import HttpInterceptor
+from stream.channel import ProxyChannel
+from stream.interceptors import HttpInterceptor, ResponseParser
 from stream.proxy_connector import ProxyConnector
 
 
@@ -21,13 +21,13 @@ class ProxyServer:
         port: int = 3120,
         intercept_domains: Optional[List[str]] = None,
         upstream_proxy: Optional[str] = None,
-        queue: Optional[Any] = None,
+        channel: Optional[ProxyChannel] = None,
     ):
         self.host = host
         self.port = port
         self.intercept_domains = intercept_domains or []
         self.upstream_proxy = upstream_proxy
-        self.queue = queue
+        self.channel = channel
 
         # Initialize components
         self.cert_manager = CertificateManager()
@@ -286,10 +286,12 @@ class ProxyServer:
         client_buffer = bytearray()
         server_buffer = bytearray()
         should_sniff = False
+        # Request the API announced when the sniffed call was sent
+        sniff_req_id: Optional[str] = None
 
         # Parse HTTP headers from client
         async def _process_client_data():
-            nonlocal client_buffer, should_sniff
+            nonlocal client_buffer, should_sniff, sniff_req_id
 
             try:
                 while True:
@@ -321,6 +323,9 @@ class ProxyServer:
                         # Check if we should intercept this request
                         if "GenerateContent" in path or "generateContent" in path:
                             should_sniff = True
+                            sniff_req_id = (
+                                self.channel.request_id if self.channel else None
+                            )
                             self.logger.debug(
                                 f"[Proxy] 检测到 GenerateContent 请求: {path[:60]}..."
                             )
@@ -362,9 +367,18 @@ class ProxyServer:
                 except Exception:
                     pass
 
-        # Parse HTTP headers from server
+        # Parse server responses one at a time. Each response gets its own
+        # ResponseParser, so every byte is decoded once and only new text is
+        # sent to the API process.
         async def _process_server_data():
-            nonlocal server_buffer, should_sniff
+            nonlocal server_buffer
+
+            parser: Optional[ResponseParser] = None
+            sniffing = False
+            # After an interception error the rest of the connection is only forwarded
+            passthrough = False
+            # Set once the API process can no longer be reached over the channel
+            channel_lost = False
 
             try:
                 while True:
@@ -372,87 +386,76 @@ class ProxyServer:
                     if not data:
                         break
 
-                    server_buffer.extend(data)
-                    if b"\r\n\r\n" in server_buffer:
-                        # Split headers and body
-                        headers_end = server_buffer.find(b"\r\n\r\n") + 4
-                        headers_data = server_buffer[:headers_end]
-                        body_data = server_buffer[headers_end:]
+                    pending = data
+                    while pending and not passthrough:
+                        if parser is None:
+                            server_buffer.extend(pending)
+                            pending = b""
+                            headers_end = server_buffer.find(b"\r\n\r\n")
+                            if headers_end == -1:
+                                break
+                            headers_end += 4
+                            status_code, status_message, headers = (
+                                self._parse_response_head(
+                                    bytes(server_buffer[:headers_end])
+                                )
+                            )
+                            pending = bytes(server_buffer[headers_end:])
+                            server_buffer.clear()
 
-                        # Parse status line and headers
-                        lines = headers_data.split(b"\r\n")
+                            # Check if this is a response to a GenerateContent request
+                            sniffing = (
+                                should_sniff and status_code < 400 and not channel_lost
+                            )
+                            if should_sniff and status_code >= 400 and not channel_lost:
+                                await self._send_upstream_error(
+                                    status_code, status_message, sniff_req_id
+                                )
+                            if sniffing:
+                                parser = self.interceptor.create_response_parser(
+                                    headers, status_code
+                                )
+                            else:
+                                parser = ResponseParser(
+                                    headers, status_code=status_code
+                                )
 
-                        # 解析 HTTP 状态行 (例如: "HTTP/1.1 429 Too Many Requests")
-                        status_code = 200  # 默认假设成功
-                        status_message = "OK"
-                        if lines and lines[0]:
-                            try:
-                                status_line = lines[0].decode("utf-8")
-                                parts = status_line.split(" ", 2)
-                                if len(parts) >= 2:
-                                    status_code = int(parts[1])
-                                    status_message = parts[2] if len(parts) > 2 else ""
-                            except (ValueError, UnicodeDecodeError):
-                                # 解析失败，保持默认值
-                                pass
-
-                        # Parse headers
-                        headers: dict[str, str] = {}
-                        for i in range(1, len(lines)):
-                            if not lines[i]:
-                                continue
-                            try:
-                                key, value = lines[i].decode("utf-8").split(":", 1)
-                                headers[key.strip()] = value.strip()
-                            except ValueError:
-                                continue
-
-                        # Check if this is a response to a GenerateContent request
-                        if should_sniff:
-                            try:
-                                # 检查 HTTP 状态码 - 如果是错误响应，立即发送错误信号
-                                if status_code >= 400:
+                        try:
+                            delta = parser.feed(pending)
+                        except Exception as e:
+                            self.logger.error(
+                                f"Error during response interception: {e}",
+                                exc_info=True,
+                            )
+                            passthrough = True
+                            break
+                        pending = parser.tail
+
+                        if sniffing and self.channel is not None:
+                            if (
+                                delta.get("body")
+                                or delta.get("reason")
+                                or delta.get("function")
+                                or delta.get("done")
+                            ):
+                                try:
+                                    await self.channel.send(delta, sniff_req_id)
+                                except asyncio.CancelledError:
+                                    raise
+                                except Exception as e:
+                                    # Keep forwarding to the browser; only sniffing stops
                                     self.logger.error(
-                                        f"[UPSTREAM ERROR] {status_code} {status_message}"
-                                    )
-                                    if self.queue is not None:
-                                        error_payload = {
-                                            "error": True,
-                                            "status": status_code,
-                                            "message": f"{status_code} {status_message}",
-                                            "done": True,
-                                        }
-                                        self.queue.put(json.dumps(error_payload))
-                                        self.logger.warning(
-                                            f"[FAIL-FAST] Error payload sent to queue: {error_payload}"
-                                        )
-                                else:
-                                    # 正常响应，按原逻辑处理
-                                    resp = await self.interceptor.process_response(
-                                        bytes(body_data), host, "", headers
+                                        f"Error sending intercepted data: {e}",
+                                        exc_info=True,
                                     )
+                                    channel_lost = True
+                                    sniffing = False
+                            if delta.get("done"):
+                                self.logger.debug("[Proxy] 流完成")
+                        if parser.done:
+                            parser = None
 
-                                    if self.queue is not None:
-                                        self.queue.put(json.dumps(resp))
-                                        # Only log on completion to reduce noise
-                                        if resp.get("done", False):
-                                            body_len = len(resp.get("body", ""))
-                                            reason_len = len(resp.get("reason", ""))
-                                            self.logger.debug(
-                                                f"[Proxy] 流完成: body={body_len}, reason={reason_len}"
-                                            )
-                            except asyncio.CancelledError:
-                                raise
-                            except Exception as e:
-                                self.logger.error(
-                                    f"Error during response interception: {e}",
-                                    exc_info=True,
-                                )
-
-                    # Not enough data to parse headers, forward as is
                     client_writer.write(data)
-                    if b"0\r\n\r\n" in server_buffer:
-                        server_buffer.clear()
             except asyncio.CancelledError:
                 raise
             except Exception as e:
@@ -490,6 +493,60 @@ class ProxyServer:
             except asyncio.CancelledError:
                 pass
 
+    @staticmethod
+    def _parse_response_head(head: bytes) -> Tuple[int, str, Dict[str, str]]:
+        """Parse a response status line and headers."""
+        lines = head.split(b"\r\n")
+
+        # 解析 HTTP 状态行 (例如: "HTTP/1.1 429 Too Many Requests")
+        status_code = 200  # 默认假设成功
+        status_message = "OK"
+        if lines and lines[0]:
+            try:
+                status_line = lines[0].decode("utf-8")
+                parts = status_line.split(" ", 2)
+                if len(parts) >= 2:
+                    status_code = int(parts[1])
+                    status_message = parts[2] if len(parts) > 2 else ""
+            except (ValueError, UnicodeDecodeError):
+                # 解析失败，保持默认值
+                pass
+
+        headers: Dict[str, str] = {}
+        for line in lines[1:]:
+            if not line:
+                continue
+            try:
+                key, value = line.decode("utf-8").split(":", 1)
+                headers[key.strip()] = value.strip()
+            except ValueError:
+                continue
+        return status_code, status_message, headers
+
+    async def _send_upstream_error(
+        self, status_code: int, status_message: str, req_id: Optional[str]
+    ) -> None:
+        """错误响应: 立即发送错误信号"""
+        self.logger.error(f"[UPSTREAM ERROR] {status_code} {status_message}")
+        if self.channel is None:
+            return
+        error_payload = {
+            "error": True,
+            "status": status_code,
+            "message": f"{status_code} {status_message}",
+            "done": True,
+        }
+        try:
+            await self.channel.send(error_payload, req_id)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.logger.error(f"Error during response interception: {e}", exc_info=True)
+            return
+        self.logger.warning(
+            f"[FAIL-FAST] Error payload sent to channel: {error_payload}"
+        )
+
     async def start(self) -> None:
         """
         Start the proxy server
@@ -499,10 +556,11 @@ class ProxyServer:
         addr = server.sockets[0].getsockname()
         self.logger.debug(f"[Proxy] 服务地址: {addr}")
 
-        # --- FIX: Send "READY" signal after server starts listening ---
-        if self.queue:
+        # Connect to the API process and report ready once listening
+        if self.channel:
             try:
-                self.queue.put("READY")
+                await self.channel.connect()
+                await self.channel.send_ready()
                 self.logger.debug("[Proxy] 已发送 READY 信号到主进程")
             except Exception as e:
                 self.logger.error(f"Failed to send 'READY' signal: {e}", exc_info=True)
@@ -0,0 +1,47 @@
+"""API utils test fixtures."""
+
+import asyncio
+import time
+from typing import cast
+from unittest.mock import MagicMock
+
+import pytest
+
+from api_utils.context_types import QueueItem
+
+
+@pytest.fixture
+def make_item():
+    """
+    Factory fixture for queue items asking for a given model.
+
+    Args:
+        req_id: Request ID of the item
+        model: Model name of the request (with or without the "models/" prefix)
+        age: Seconds the item has already been queued (default: 0.0)
+
+    Returns:
+        Function that creates QueueItem dicts
+
+    Example:
+        def test_order(make_item):
+            item = make_item("r1", "gemini-a", age=60.0)
+    """
+
+    def _make(req_id: str, model: str, age: float = 0.0) -> QueueItem:
+        request_data = MagicMock()
+        request_data.model = model
+        request_data.stream = False
+        return cast(
+            QueueItem,
+            {
+                "req_id": req_id,
+                "request_data": request_data,
+                "http_request": MagicMock(),
+                "result_future": asyncio.Future(),
+                "enqueue_time": time.time() - age,
+                "cancelled": False,
+            },
+        )
+
+    return _make
@@ -1,5 +1,4 @@
 import asyncio
-import queue
 from unittest.mock import AsyncMock, MagicMock, patch
 
 import pytest
@@ -9,6 +8,7 @@ from api_utils.app import (
     APIKeyAuthMiddleware,
     _initialize_browser_and_page,
     _initialize_globals,
+    _initialize_page_workers,
     _initialize_proxy_settings,
     _setup_logging,
     _shutdown_resources,
@@ -310,12 +310,12 @@ async def test_start_stream_proxy_disabled():
 @pytest.mark.asyncio
 async def test_start_stream_proxy_success():
     """Test _start_stream_proxy success path."""
-    state.STREAM_QUEUE = None
+    state.STREAM_CHANNEL = None
     state.STREAM_PROCESS = None
 
     with (
         patch("api_utils.app.get_environment_variable") as mock_get_env,
-        patch("multiprocessing.Queue") as mock_queue_cls,
+        patch("api_utils.app.StreamChannel") as mock_channel_cls,
         patch("multiprocessing.Process") as mock_process_cls,
     ):
         mock_get_env.side_effect = lambda key, default=None: {
@@ -323,20 +323,26 @@ async def test_start_stream_proxy_success():
             "UNIFIED_PROXY_CONFIG": "http://upstream:8080",
         }.get(key, default)
 
-        mock_queue = MagicMock()
-        mock_queue.get.return_value = "READY"
-        mock_queue_cls.return_value = mock_queue
+        mock_channel = MagicMock()
+        mock_channel.start = AsyncMock(return_value="/tmp/stream.sock")
+        mock_channel.wait_ready = AsyncMock()
+        mock_channel_cls.return_value = mock_channel
 
         mock_process = MagicMock()
         mock_process_cls.return_value = mock_process
 
         await _start_stream_proxy()
 
-        assert state.STREAM_QUEUE is not None
+        assert state.STREAM_CHANNEL is mock_channel
         assert state.STREAM_PROCESS is not None
         mock_process.start.assert_called_once()
-        # Verify queue.get was called (via asyncio.to_thread, so we check the mock)
-        mock_queue.get.assert_called()
+        # The proxy process is given the channel address to connect back to
+        assert mock_process_cls.call_args[1]["args"] == (
+            "/tmp/stream.sock",
+            3120,
+            "http://upstream:8080",
+        )
+        mock_channel.wait_ready.assert_awaited_once_with(timeout=15)
 
 
 @pytest.mark.asyncio
@@ -344,42 +350,19 @@ async def test_start_stream_proxy_timeout():
     """Test _start_stream_proxy timeout waiting for READY."""
     with (
         patch("api_utils.app.get_environment_variable", return_value="3120"),
-        patch("multiprocessing.Queue") as mock_queue_cls,
+        patch("api_utils.app.StreamChannel") as mock_channel_cls,
         patch("multiprocessing.Process"),
         patch("server.logger"),
-        patch("asyncio.to_thread", side_effect=queue.Empty),
     ):
-        mock_queue = MagicMock()
-        mock_queue_cls.return_value = mock_queue
+        mock_channel = MagicMock()
+        mock_channel.start = AsyncMock(return_value="/tmp/stream.sock")
+        mock_channel.wait_ready = AsyncMock(side_effect=asyncio.TimeoutError)
+        mock_channel_cls.return_value = mock_channel
 
         with pytest.raises(RuntimeError, match="STREAM proxy failed to start in time"):
             await _start_stream_proxy()
 
 
-@pytest.mark.asyncio
-async def test_start_stream_proxy_unexpected_signal():
-    """Test _start_stream_proxy receiving unexpected signal."""
-    mock_logger = MagicMock()
-    state.logger = mock_logger
-
-    with (
-        patch("api_utils.app.get_environment_variable", return_value="3120"),
-        patch("multiprocessing.Queue") as mock_queue_cls,
-        patch("multiprocessing.Process"),
-    ):
-        mock_queue = MagicMock()
-        mock_queue.get.return_value = "ERROR"
-        mock_queue_cls.return_value = mock_queue
-
-        # Mock asyncio.to_thread to return the value directly since we can't easily mock the thread execution
-        with patch("asyncio.to_thread", return_value="ERROR"):
-            await _start_stream_proxy()
-
-        mock_logger.warning.assert_called_with(
-            "Received unexpected signal from proxy: ERROR"
-        )
-
-
 @pytest.mark.asyncio
 async def test_initialize_browser_and_page_missing_endpoint():
     """Test _initialize_browser_and_page raises error if endpoint missing."""
@@ -551,10 +534,10 @@ async def test_shutdown_resources_process_join_and_terminate():
     """
     mock_stream_process = MagicMock()
     mock_stream_process.is_alive.return_value = False  # Process terminates successfully
-    mock_stream_queue = MagicMock()
+    mock_stream_channel = MagicMock()
 
     state.STREAM_PROCESS = mock_stream_process
-    state.STREAM_QUEUE = mock_stream_queue
+    state.STREAM_CHANNEL = mock_stream_channel
 
     with patch("api_utils.app._close_page_logic", new_callable=AsyncMock):
         await _shutdown_resources()
@@ -565,9 +548,8 @@ async def test_shutdown_resources_process_join_and_terminate():
     mock_stream_process.join.assert_called_with(timeout=3)
     # Verify kill was NOT called since process terminated successfully
     mock_stream_process.kill.assert_not_called()
-    # Verify queue was closed
-    mock_stream_queue.close.assert_called_once()
-    mock_stream_queue.join_thread.assert_called_once()
+    # Verify channel was closed
+    mock_stream_channel.close.assert_called_once()
 
 
 @pytest.mark.asyncio
@@ -580,10 +562,10 @@ async def test_shutdown_resources_process_kill_fallback():
     mock_stream_process = MagicMock()
     # Process is still alive after terminate
     mock_stream_process.is_alive.return_value = True
-    mock_stream_queue = MagicMock()
+    mock_stream_channel = MagicMock()
 
     state.STREAM_PROCESS = mock_stream_process
-    state.STREAM_QUEUE = mock_stream_queue
+    state.STREAM_CHANNEL = mock_stream_channel
 
     with patch("api_utils.app._close_page_logic", new_callable=AsyncMock):
         await _shutdown_resources()
@@ -597,20 +579,20 @@ async def test_shutdown_resources_process_kill_fallback():
 
 
 @pytest.mark.asyncio
-async def test_shutdown_resources_queue_cleanup_error_handling():
+async def test_shutdown_resources_channel_cleanup_error_handling():
     """Test _shutdown_resources handles queue cleanup errors gracefully.
 
-    Regression test: Ensures queue cleanup exceptions don't prevent
+    Regression test: Ensures channel cleanup exceptions don't prevent
     the rest of shutdown from completing.
     """
     mock_stream_process = MagicMock()
     mock_stream_process.is_alive.return_value = False
-    mock_stream_queue = MagicMock()
-    # Simulate queue cleanup error
-    mock_stream_queue.close.side_effect = Exception("Queue already closed")
+    mock_stream_channel = MagicMock()
+    # Simulate channel cleanup error
+    mock_stream_channel.close.side_effect = Exception("Channel already closed")
 
     state.STREAM_PROCESS = mock_stream_process
-    state.STREAM_QUEUE = mock_stream_queue
+    state.STREAM_CHANNEL = mock_stream_channel
 
     # Should not raise exception
     with patch("api_utils.app._close_page_logic", new_callable=AsyncMock):
@@ -622,13 +604,13 @@ async def test_shutdown_resources_queue_cleanup_error_handling():
 
 @pytest.mark.asyncio
 async def test_shutdown_resources_no_process_no_queue():
-    """Test _shutdown_resources handles case where process/queue don't exist.
+    """Test _shutdown_resources handles case where process/channel don't exist.
 
     Regression test: Ensures shutdown doesn't fail when resources were never
     created (e.g., startup failed early).
     """
     state.STREAM_PROCESS = None
-    state.STREAM_QUEUE = None
+    state.STREAM_CHANNEL = None
     state.worker_task = None
     state.page_instance = None
     state.browser_instance = None
@@ -760,3 +742,84 @@ async def test_api_key_auth_middleware_excluded_path_subpath():
 
         # 验证: 返回了 call_next 的响应
         assert response is not None
+
+
+@pytest.mark.asyncio
+async def test_initialize_page_workers_opens_extra_pages():
+    """Test that each extra page gets its own stream port, auth profile and page."""
+    state.browser_instance = MagicMock()
+    state.is_page_ready = True
+    state.page_instance = MagicMock()
+    state.current_ai_studio_model_id = "model-0"
+
+    pages = [MagicMock(), MagicMock()]
+    profiles = iter(["/saved/auth1.json", "/saved/auth2.json"])
+    mock_auth_manager = MagicMock()
+    mock_auth_manager.current_profile = "/active/auth0.json"
+    mock_auth_manager.find_unused_profile = AsyncMock(
+        side_effect=lambda exclude: next(profiles)
+    )
+
+    async def fake_model_state(page):
+        state.current_ai_studio_model_id = f"model-{pages.index(page) + 1}"
+
+    with (
+        patch("api_utils.app.PAGE_POOL_SIZE", 3),
+        patch("api_utils.auth_manager.auth_manager", mock_auth_manager),
+        patch(
+            "api_utils.app._start_stream_proxy", new_callable=AsyncMock
+        ) as mock_start,
+        patch(
+            "api_utils.app._initialize_page_logic",
+            new_callable=AsyncMock,
+            side_effect=[(pages[0], True), (pages[1], True)],
+        ) as mock_init_page,
+        patch(
+            "api_utils.app._handle_initial_model_state_and_storage",
+            side_effect=fake_model_state,
+        ),
+        patch("api_utils.app.enable_temporary_chat_mode", new_callable=AsyncMock),
+        patch("api_utils.app.get_environment_variable", return_value="3120"),
+    ):
+        await _initialize_page_workers()
+
+    assert [w.index for w in state.page_workers] == [0, 1, 2]
+    assert [call.args[0] for call in mock_start.call_args_list] == [1, 2]
+    assert mock_init_page.call_args_list[1].kwargs == {
+        "storage_state_path": "/saved/auth2.json"
+    }
+    first, second, third = state.page_workers
+    assert first.auth_profile == "/active/auth0.json"
+    assert first.current_ai_studio_model_id == "model-0"
+    assert (second.page_instance, second.current_ai_studio_model_id) == (
+        pages[0],
+        "model-1",
+    )
+    assert third.PLAYWRIGHT_PROXY_SETTINGS["server"] == "http://127.0.0.1:3122/"
+    assert third.processing_lock is not first.processing_lock
+
+
+@pytest.mark.asyncio
+async def test_initialize_page_workers_skips_failed_page():
+    """Test that a page failing to open is left out of the pool."""
+    state.browser_instance = MagicMock()
+    state.is_page_ready = True
+    mock_auth_manager = MagicMock()
+    mock_auth_manager.find_unused_profile = AsyncMock(return_value=None)
+
+    with (
+        patch("api_utils.app.PAGE_POOL_SIZE", 2),
+        patch("api_utils.auth_manager.auth_manager", mock_auth_manager),
+        patch("api_utils.app._start_stream_proxy", new_callable=AsyncMock),
+        patch(
+            "api_utils.app._initialize_page_logic",
+            new_callable=AsyncMock,
+            side_effect=RuntimeError("navigation failed"),
+        ),
+        patch("api_utils.app._stop_stream_proxy") as mock_stop,
+        patch("api_utils.app.get_environment_variable", return_value="0"),
+    ):
+        await _initialize_page_workers()
+
+    assert len(state.page_workers) == 1
+    mock_stop.assert_called_once()
@@ -165,3 +165,33 @@ def test_mark_profile_failed(manager):
 def test_global_instance():
     """Ensure global instance exists."""
     assert isinstance(auth_manager, AuthManager)
+
+
+@pytest.mark.asyncio
+async def test_get_next_profile_skips_excluded(manager):
+    """Test that profiles used by other pages are skipped."""
+    mock_profiles = ["/dir/auth1.json", "/dir/auth2.json", "/dir/auth3.json"]
+
+    with patch.object(
+        manager, "get_available_profiles", new_callable=AsyncMock
+    ) as mock_get:
+        mock_get.return_value = mock_profiles
+
+        next_p = await manager.get_next_profile(exclude=["/other/auth1.json"])
+        assert next_p == "/dir/auth2.json"
+
+
+@pytest.mark.asyncio
+async def test_find_unused_profile(manager):
+    """Test finding a profile for another page without switching to it."""
+    mock_profiles = ["/dir/auth1.json", "/dir/auth2.json"]
+    manager.current_profile = "/dir/auth1.json"
+
+    with patch.object(
+        manager, "get_available_profiles", new_callable=AsyncMock
+    ) as mock_get:
+        mock_get.return_value = mock_profiles
+
+        assert await manager.find_unused_profile() == "/dir/auth2.json"
+        assert manager.current_profile == "/dir/auth1.json"
+        assert await manager.find_unused_profile(exclude=["/dir/auth2.json"]) is None
@@ -0,0 +1,137 @@
+"""
+Tests for the page worker pool in api_utils.queue_worker (PAGE_POOL_SIZE > 1).
+
+Test Strategy:
+- Use REAL asyncio.Queue / Event and real PageWorker state
+- Mock only QueueManager.process_request (the browser interaction)
+"""
+
+import asyncio
+from unittest.mock import AsyncMock, patch
+
+import pytest
+
+from api_utils.queue_worker import PageWorkerPool, _requested_model_id, queue_worker
+from api_utils.server_state import PageWorker, state
+
+
+@pytest.fixture
+def two_pages():
+    """Server state with two ready pages on different models."""
+    state.reset()
+    state.request_queue = asyncio.Queue()
+    state.current_ai_studio_model_id = "gemini-a"
+    state.is_page_ready = True
+    second = PageWorker(1)
+    second.current_ai_studio_model_id = "gemini-b"
+    second.is_page_ready = True
+    state.page_workers.append(second)
+    yield state.page_workers
+    state.reset()
+
+
+def test_requested_model_id(make_item):
+    """Model names are reduced to the AI Studio ID; the proxy model name means no preference."""
+    from config import MODEL_NAME
+
+    assert _requested_model_id(make_item("r1", "models/gemini-b")) == "gemini-b"
+    assert _requested_model_id(make_item("r2", MODEL_NAME)) is None
+
+
+def test_pool_workers_get_their_own_locks(two_pages):
+    """Each page worker has its own processing lock."""
+    pool = PageWorkerPool(two_pages)
+
+    first, second = (pool.managers[w.index] for w in two_pages)
+    assert first.processing_lock is two_pages[0].processing_lock
+    assert second.processing_lock is two_pages[1].processing_lock
+    assert first.processing_lock is not second.processing_lock
+
+
+def test_choose_worker_prefers_page_on_requested_model(two_pages):
+    """An idle page already on the requested model is chosen."""
+    pool = PageWorkerPool(two_pages)
+
+    assert pool.choose_worker("gemini-b") is two_pages[1]
+    assert pool.choose_worker("gemini-a") is two_pages[0]
+    assert pool.choose_worker("gemini-c") is two_pages[0]
+
+    two_pages[1].busy = True
+    assert pool.choose_worker("gemini-b") is two_pages[0]
+
+    two_pages[1].busy = False
+    two_pages[0].is_page_ready = False
+    assert pool.choose_worker("gemini-a") is two_pages[1]
+
+
+@pytest.mark.asyncio
+async def test_dispatch_runs_requests_concurrently_on_their_pages(two_pages, make_item):
+    """Two requests run at the same time, each seeing its own page's state."""
+    pool = PageWorkerPool(two_pages)
+    both_started = asyncio.Event()
+    started = []
+    seen_models = {}
+
+    async def fake_process(item):
+        seen_models[item["req_id"]] = state.current_ai_studio_model_id
+        started.append(item["req_id"])
+        if len(started) == 2:
+            both_started.set()
+        await both_started.wait()
+
+    for manager in pool.managers.values():
+        manager.process_request = fake_process
+
+    assert pool.dispatch(make_item("r1", "models/gemini-b")) is two_pages[1]
+    assert pool.dispatch(make_item("r2", "models/gemini-b")) is two_pages[0]
+    assert pool.idle_workers() == []
+
+    await asyncio.wait_for(both_started.wait(), timeout=1)
+    await asyncio.gather(*pool.tasks)
+
+    assert seen_models == {"r1": "gemini-b", "r2": "gemini-a"}
+    assert all(not w.busy for w in two_pages)
+    assert await pool.wait_for_idle_worker(timeout=0.01) is True
+
+
+@pytest.mark.asyncio
+async def test_wait_for_idle_worker_times_out_when_all_busy(two_pages):
+    """With every page busy, waiting gives up after the timeout."""
+    pool = PageWorkerPool(two_pages)
+    for worker in two_pages:
+        worker.busy = True
+
+    assert await pool.wait_for_idle_worker(timeout=0.01) is False
+
+
+@pytest.mark.asyncio
+async def test_worker_released_after_processing_error(two_pages, make_item):
+    """A page is released even if processing raises."""
+    pool = PageWorkerPool(two_pages)
+    pool.managers[1].process_request = AsyncMock(side_effect=RuntimeError("boom"))
+
+    pool.dispatch(make_item("r1", "models/gemini-b"))
+    await asyncio.gather(*pool.tasks)
+
+    assert two_pages[1].busy is False
+
+
+@pytest.mark.asyncio
+@pytest.mark.timeout(5)
+async def test_queue_worker_dispatches_to_pool(two_pages, make_item):
+    """queue_worker hands queued requests to the pool when there are several pages."""
+    processed = asyncio.Event()
+    calls = []
+
+    async def fake_process(self, item):
+        calls.append((item["req_id"], state.current_page_worker.index))
+        processed.set()
+
+    with patch("api_utils.queue_worker.QueueManager.process_request", fake_process):
+        await state.request_queue.put(make_item("r1", "models/gemini-b"))
+        worker_task = asyncio.create_task(queue_worker())
+        await asyncio.wait_for(processed.wait(), timeout=2)
+        worker_task.cancel()
+        await asyncio.gather(worker_task, return_exceptions=True)
+
+    assert calls == [("r1", 1)]
@@ -0,0 +1,154 @@
+"""
+Tests for model-affinity scheduling in QueueManager.get_next_request.
+
+Test Strategy:
+- Use a REAL asyncio.Queue and real server state
+- Control the reorder window / max delay by patching config values
+"""
+
+import asyncio
+from typing import List
+from unittest.mock import patch
+
+import pytest
+
+from api_utils.context_types import QueueItem
+from api_utils.queue_worker import QueueManager
+from api_utils.server_state import PageWorker, state
+
+
+@pytest.fixture
+def manager():
+    """QueueManager over a real queue, with the page on gemini-a."""
+    state.reset()
+    state.request_queue = asyncio.Queue()
+    state.current_ai_studio_model_id = "gemini-a"
+    queue_manager = QueueManager()
+    queue_manager.request_queue = state.request_queue
+    yield queue_manager
+    state.reset()
+
+
+async def fill(queue_manager: QueueManager, items: List[QueueItem]) -> None:
+    assert queue_manager.request_queue is not None
+    for item in items:
+        await queue_manager.request_queue.put(item)
+
+
+async def drain_order(queue_manager: QueueManager) -> List[str]:
+    order = []
+    assert queue_manager.request_queue is not None
+    while not queue_manager.request_queue.empty():
+        item = await queue_manager.get_next_request()
+        assert item is not None
+        order.append(item["req_id"])
+    return order
+
+
+@pytest.mark.asyncio
+async def test_requests_for_current_model_are_batched(manager, make_item):
+    """Requests for the loaded model go first; the rest keep their order."""
+    await fill(
+        manager,
+        [
+            make_item("b1", "gemini-b"),
+            make_item("a1", "gemini-a"),
+            make_item("b2", "gemini-b"),
+            make_item("a2", "models/gemini-a"),
+        ],
+    )
+
+    assert await drain_order(manager) == ["a1", "a2", "b1", "b2"]
+    assert manager.affinity_reorders == 2
+
+
+@pytest.mark.asyncio
+async def test_overdue_request_is_not_overtaken(manager, make_item):
+    """A request waiting longer than QUEUE_MAX_REORDER_DELAY is served in order."""
+    await fill(
+        manager,
+        [make_item("b1", "gemini-b", age=60.0), make_item("a1", "gemini-a")],
+    )
+
+    with patch("config.QUEUE_MAX_REORDER_DELAY", 20.0):
+        assert await drain_order(manager) == ["b1", "a1"]
+    assert manager.affinity_reorders == 0
+
+
+@pytest.mark.asyncio
+async def test_reorder_window_limits_lookahead(manager, make_item):
+    """Only QUEUE_REORDER_WINDOW requests behind the head are considered."""
+    await fill(
+        manager,
+        [
+            make_item("b1", "gemini-b"),
+            make_item("b2", "gemini-b"),
+            make_item("a1", "gemini-a"),
+        ],
+    )
+
+    with patch("config.QUEUE_REORDER_WINDOW", 1):
+        first = await manager.get_next_request()
+    assert first is not None and first["req_id"] == "b1"
+
+
+@pytest.mark.asyncio
+async def test_zero_window_is_strict_fifo(manager, make_item):
+    """QUEUE_REORDER_WINDOW=0 disables reordering."""
+    await fill(manager, [make_item("b1", "gemini-b"), make_item("a1", "gemini-a")])
+
+    with patch("config.QUEUE_REORDER_WINDOW", 0):
+        assert await drain_order(manager) == ["b1", "a1"]
+
+
+@pytest.mark.asyncio
+async def test_proxy_model_name_needs_no_switch(manager, make_item):
+    """Requests for the proxy's own model name run on whatever model is loaded."""
+    from config import MODEL_NAME
+
+    await fill(manager, [make_item("b1", "gemini-b"), make_item("any", MODEL_NAME)])
+
+    first = await manager.get_next_request()
+    assert first is not None and first["req_id"] == "any"
+
+
+@pytest.mark.asyncio
+async def test_cancelled_requests_are_not_promoted(manager, make_item):
+    """A cancelled request is not moved ahead of the head."""
+    cancelled = make_item("a1", "gemini-a")
+    cancelled["cancelled"] = True
+    await fill(manager, [make_item("b1", "gemini-b"), cancelled])
+
+    assert await drain_order(manager) == ["b1", "a1"]
+
+
+@pytest.mark.asyncio
+async def test_pool_mode_prefers_models_of_idle_pages(manager, make_item):
+    """With several pages, any idle page's model counts as loaded."""
+    second = PageWorker(1)
+    second.current_ai_studio_model_id = "gemini-b"
+    state.page_workers.append(second)
+    await fill(
+        manager,
+        [
+            make_item("c1", "gemini-c"),
+            make_item("b1", "gemini-b"),
+            make_item("a1", "gemini-a"),
+        ],
+    )
+
+    first = await manager.get_next_request()
+    assert first is not None and first["req_id"] == "b1"
+
+    second.busy = True
+    second_pick = await manager.get_next_request()
+    assert second_pick is not None and second_pick["req_id"] == "a1"
+
+
+@pytest.mark.asyncio
+async def test_unknown_current_model_keeps_fifo(manager, make_item):
+    """Before the page reports a model, requests are served in order."""
+    state.current_ai_studio_model_id = None
+    await fill(manager, [make_item("b1", "gemini-b"), make_item("a1", "gemini-a")])
+
+    assert await drain_order(manager) == ["b1", "a1"]
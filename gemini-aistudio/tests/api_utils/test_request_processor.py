@@ -656,7 +656,7 @@ class TestAuxiliaryStreamResponse:
         mock_stream_data = [
             {"body": "Hello", "done": False},
             {"body": " world", "done": False},
-            {"body": "Hello world", "done": True, "reason": None, "function": []},
+            {"body": "", "done": True, "reason": None, "function": []},
         ]
 
         async def mock_stream_gen(req_id):
@@ -37,11 +37,11 @@ class TestGenSSEFromAuxStream:
         completion_event = asyncio.Event()
         check_disconnect = MagicMock()
 
-        # Mock stream data showing incremental text
+        # Mock stream data: the proxy sends only the new text of each update
         stream_data = [
             {"body": "Hello", "reason": "", "done": False},
-            {"body": "Hello World", "reason": "", "done": False},
-            {"body": "Hello World!", "reason": "", "done": True},
+            {"body": " World", "reason": "", "done": False},
+            {"body": "!", "reason": "", "done": True},
         ]
 
         async def mock_stream_gen(rid):
@@ -94,11 +94,7 @@ class TestGenSSEFromAuxStream:
 
         stream_data = [
             {"reason": "Analyzing the problem...", "body": "", "done": False},
-            {
-                "reason": "Analyzing the problem... Formulating answer.",
-                "body": "",
-                "done": False,
-            },
+            {"reason": " Formulating answer.", "body": "", "done": False},
             {"reason": "", "body": "The solution is 42", "done": True},
         ]
 
@@ -682,7 +678,7 @@ async def test_gen_sse_from_aux_stream_body_with_tool_calls(
     stream_data = [
         {"body": "Let me search", "reason": "", "done": False, "function": []},
         {
-            "body": "Let me search for that",
+            "body": " for that",
             "reason": "",
             "done": True,
             "function": function_data,
@@ -796,6 +792,53 @@ async def test_gen_sse_from_aux_stream_tool_calls_only_in_final_chunk(
     assert found_tools
 
 
+@pytest.mark.asyncio
+async def test_gen_sse_from_aux_stream_collects_tool_calls_across_deltas(
+    mock_request, mock_event, mock_check_disconnect
+):
+    """Tool calls sent in earlier deltas are all emitted with the done chunk."""
+    stream_data = [
+        {"body": "", "reason": "", "done": False, "function": [{"name": "a"}]},
+        {"body": "", "reason": "", "done": False, "function": [{"name": "b"}]},
+        {"body": "", "reason": "", "done": True, "function": []},
+    ]
+
+    async def mock_stream_gen(rid):
+        for item in stream_data:
+            yield item
+
+    with (
+        patch(
+            "api_utils.response_generators.use_stream_response",
+            side_effect=mock_stream_gen,
+        ),
+        patch(
+            "api_utils.response_generators.calculate_usage_stats",
+            return_value={"total_tokens": 8},
+        ),
+    ):
+        chunks = [
+            chunk
+            async for chunk in gen_sse_from_aux_stream(
+                "test_tools_deltas",
+                mock_request,
+                "model",
+                mock_check_disconnect,
+                mock_event,
+                None,
+            )
+        ]
+
+    tool_chunks = [
+        json.loads(chunk.replace("data: ", "").strip())
+        for chunk in chunks
+        if "tool_calls" in chunk
+    ]
+    assert len(tool_chunks) == 1
+    tool_calls = tool_chunks[0]["choices"][0]["delta"]["tool_calls"]
+    assert [call["function"]["name"] for call in tool_calls] == ["a", "b"]
+
+
 # ==================== ERROR HANDLING TESTS ====================
 
 
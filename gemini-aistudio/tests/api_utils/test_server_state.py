@@ -5,10 +5,12 @@ Focus: Test ServerState class methods and module-level __getattr__.
 Strategy: Test clear_debug_logs and backward compatibility __getattr__.
 """
 
+import asyncio
+
 import pytest
 
 from api_utils import server_state
-from api_utils.server_state import ServerState, state
+from api_utils.server_state import PageWorker, ServerState, state
 
 
 @pytest.fixture
@@ -94,3 +96,73 @@ def test_state_singleton():
 
     # 验证: 是同一个实例
     assert state is state2
+
+
+def test_page_attributes_resolve_to_first_page_by_default(fresh_state):
+    """
+    测试场景: 未指定页面工作器时访问页面状态
+    预期: 读写第一个页面的状态
+    """
+    fresh_state.current_ai_studio_model_id = "model-a"
+
+    assert fresh_state.page_workers[0].current_ai_studio_model_id == "model-a"
+    assert fresh_state.current_page_worker is fresh_state.page_workers[0]
+
+
+def test_use_page_worker_scopes_page_attributes(fresh_state):
+    """
+    测试场景: 在 use_page_worker 块内访问页面状态
+    预期: 读写该页面的状态，块结束后恢复为第一个页面
+    """
+    worker = PageWorker(1)
+    fresh_state.page_workers.append(worker)
+    fresh_state.current_ai_studio_model_id = "model-a"
+
+    with fresh_state.use_page_worker(worker):
+        assert fresh_state.current_ai_studio_model_id is None
+        fresh_state.current_ai_studio_model_id = "model-b"
+        fresh_state.page_params_cache["temperature"] = 0.5
+
+    assert fresh_state.current_ai_studio_model_id == "model-a"
+    assert fresh_state.page_params_cache == {}
+    assert worker.current_ai_studio_model_id == "model-b"
+    assert worker.page_params_cache == {"temperature": 0.5}
+
+
+@pytest.mark.asyncio
+async def test_tasks_and_bound_generators_keep_page_worker(fresh_state):
+    """
+    测试场景: 在页面工作器块内创建任务，以及绑定到页面的响应生成器
+    预期: 任务和生成器 (即使在其他任务中迭代) 都看到该页面的状态
+    """
+    worker = PageWorker(1)
+    worker.current_ai_studio_model_id = "model-b"
+    fresh_state.page_workers.append(worker)
+
+    async def read_model():
+        return fresh_state.current_ai_studio_model_id
+
+    async def gen():
+        yield fresh_state.current_ai_studio_model_id
+
+    with fresh_state.use_page_worker(worker):
+        task = asyncio.create_task(read_model())
+        bound = fresh_state.bind_page_worker(gen())
+
+    async def consume():
+        return [item async for item in bound]
+
+    assert await task == "model-b"
+    assert await asyncio.create_task(consume()) == ["model-b"]
+    assert fresh_state.current_ai_studio_model_id is None
+
+
+def test_deleting_page_attribute_restores_default(fresh_state):
+    """
+    测试场景: 删除页面属性 (unittest.mock.patch 退出时的行为)
+    预期: 恢复为默认值
+    """
+    fresh_state.page_params_cache = {"a": 1}
+    del fresh_state.page_params_cache
+
+    assert fresh_state.page_params_cache == {}
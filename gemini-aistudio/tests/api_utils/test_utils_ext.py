@@ -1,6 +1,5 @@
+import asyncio
 import base64
-import json
-import queue
 from unittest.mock import AsyncMock, MagicMock, mock_open, patch
 
 import pytest
@@ -249,18 +248,23 @@ async def test_use_helper_get_response_exception():
 # --- stream.py tests ---
 
 
+def make_channel(items):
+    """StreamChannel stand-in whose get() yields items; exceptions are raised."""
+    channel = MagicMock()
+    channel.get = AsyncMock(side_effect=items)
+    return channel
+
+
 @pytest.mark.asyncio
 async def test_use_stream_response_success():
-    # Setup queue data
-    q_data = [
-        json.dumps({"body": "chunk1", "done": False}),
-        json.dumps({"body": "chunk2", "done": True}),
-    ]
-
-    mock_queue = MagicMock()
-    mock_queue.get_nowait.side_effect = q_data + [queue.Empty()]
+    channel = make_channel(
+        [
+            {"body": "chunk1", "done": False},
+            {"body": "chunk2", "done": True},
+        ]
+    )
 
-    with patch("server.STREAM_QUEUE", mock_queue), patch("server.logger"):
+    with patch("server.STREAM_CHANNEL", channel), patch("server.logger"):
         chunks = []
         async for chunk in use_stream_response("req1"):
             chunks.append(chunk)
@@ -268,30 +272,27 @@ async def test_use_stream_response_success():
         assert len(chunks) == 2
         assert chunks[0]["body"] == "chunk1"
         assert chunks[1]["done"] is True
+        # Chunks are read for this request only
+        assert channel.get.call_args[0][0] == "req1"
 
 
 @pytest.mark.asyncio
-async def test_use_stream_response_queue_none():
-    with patch("server.STREAM_QUEUE", None), patch("server.logger") as mock_logger:
+async def test_use_stream_response_channel_none():
+    with patch("server.STREAM_CHANNEL", None), patch("server.logger") as mock_logger:
         chunks = []
         async for chunk in use_stream_response("req1"):
             chunks.append(chunk)
 
         assert len(chunks) == 0
-        mock_logger.warning.assert_called_with("STREAM_QUEUE is None, 无法使用流响应")
+        mock_logger.warning.assert_called_with("STREAM_CHANNEL is None, 无法使用流响应")
 
 
 @pytest.mark.asyncio
 async def test_use_stream_response_timeout():
-    # Simulate queue empty until timeout
-    mock_queue = MagicMock()
-    mock_queue.get_nowait.side_effect = queue.Empty
+    # Nothing arrives: every wait slice times out
+    channel = make_channel(asyncio.TimeoutError)
 
-    with (
-        patch("server.STREAM_QUEUE", mock_queue),
-        patch("server.logger"),
-        patch("asyncio.sleep", new_callable=AsyncMock) as mock_sleep,
-    ):
+    with patch("server.STREAM_CHANNEL", channel), patch("server.logger"):
         chunks = []
         async for chunk in use_stream_response("req1"):
             chunks.append(chunk)
@@ -300,80 +301,111 @@ async def test_use_stream_response_timeout():
         assert len(chunks) == 1
         assert chunks[0]["reason"] == "internal_timeout"
         assert chunks[0]["done"] is True
-        # Should have slept around 299 times (300 retries, sleep after each fail except last check)
-        assert mock_sleep.call_count >= 299
+        # 30 seconds of 1 second wait slices
+        assert channel.get.call_count == 30
 
 
 @pytest.mark.asyncio
-async def test_use_stream_response_mixed_types():
-    # Test non-JSON string and dictionary data
-    q_data = [
-        "not-json",  # Should trigger JSONDecodeError path
-        {"body": "dict-body", "done": False},  # Dictionary directly
-        json.dumps({"body": "final", "done": True}),
-    ]
+async def test_use_stream_response_data_resets_idle_timeout():
+    # Data arriving between idle slices restarts the idle timer
+    items = [asyncio.TimeoutError] * 29 + [{"body": "late", "done": False}]
+    items += [asyncio.TimeoutError] * 29 + [{"body": "", "done": True}]
+    channel = make_channel(items)
+
+    with patch("server.STREAM_CHANNEL", channel), patch("server.logger"):
+        chunks = []
+        async for chunk in use_stream_response("req1"):
+            chunks.append(chunk)
 
-    mock_queue = MagicMock()
-    mock_queue.get_nowait.side_effect = q_data
+        assert [c["body"] for c in chunks] == ["late", ""]
+        assert chunks[-1].get("reason") is None
 
-    with patch("server.STREAM_QUEUE", mock_queue), patch("server.logger"):
+
+@pytest.mark.asyncio
+async def test_use_stream_response_non_dict_data():
+    # Non-dict data is passed through unchanged
+    channel = make_channel(
+        [
+            "raw-text",
+            {"body": "dict-body", "done": False},
+            {"body": "final", "done": True},
+        ]
+    )
+
+    with patch("server.STREAM_CHANNEL", channel), patch("server.logger"):
         chunks = []
         async for chunk in use_stream_response("req1"):
             chunks.append(chunk)
 
         assert len(chunks) == 3
-        assert chunks[0] == "not-json"
+        assert chunks[0] == "raw-text"
         assert chunks[1]["body"] == "dict-body"
         assert chunks[2]["done"] is True
 
 
 @pytest.mark.asyncio
-async def test_use_stream_response_ignore_stale_done():
-    # First item is done=True with no content (stale), should be ignored
-    # Second item is real content
-    # Third item is real done
-    q_data = [
-        json.dumps({"done": True, "body": "", "reason": ""}),
-        json.dumps({"body": "real content", "done": False}),
-        json.dumps({"done": True, "body": "", "reason": ""}),
-    ]
+async def test_use_stream_response_empty_done_ends_stream():
+    # An empty done frame is this request's own (stale frames never reach it)
+    channel = make_channel([{"done": True, "body": "", "reason": ""}])
+
+    with patch("server.STREAM_CHANNEL", channel), patch("server.logger"):
+        chunks = []
+        async for chunk in use_stream_response("req1"):
+            chunks.append(chunk)
+
+        assert len(chunks) == 1
+        assert chunks[0]["done"] is True
+        assert channel.get.call_count == 1
 
-    mock_queue = MagicMock()
-    mock_queue.get_nowait.side_effect = q_data
 
-    with patch("server.STREAM_QUEUE", mock_queue), patch("server.logger"):
+@pytest.mark.asyncio
+async def test_use_stream_response_stops_on_shutdown():
+    channel = make_channel([{"body": "chunk", "done": False}])
+
+    with (
+        patch("server.STREAM_CHANNEL", channel),
+        patch("server.logger"),
+        patch("api_utils.server_state.state.should_exit", True),
+    ):
         chunks = []
         async for chunk in use_stream_response("req1"):
             chunks.append(chunk)
 
-        # Should contain 2 items: real content and final done. Stale done ignored.
-        assert len(chunks) == 2
-        assert chunks[0]["body"] == "real content"
-        assert chunks[1]["done"] is True
+        assert chunks == []
+        channel.get.assert_not_called()
 
 
 @pytest.mark.asyncio
 async def test_clear_stream_queue():
-    mock_queue = MagicMock()
-    # 2 items then Empty
-    mock_queue.get_nowait.side_effect = ["item1", "item2", queue.Empty]
+    channel = MagicMock()
+    channel.begin.return_value = 2
 
     with (
-        patch("server.STREAM_QUEUE", mock_queue),
+        patch("server.STREAM_CHANNEL", channel),
         patch("server.logger") as mock_logger,
-        patch("asyncio.to_thread", side_effect=mock_queue.get_nowait),
     ):
-        await clear_stream_queue()
+        await clear_stream_queue("req1")
 
-        # Should have called get_nowait 3 times via to_thread
-        # Verify debug log for queue cleared
+        # Announces the new request, discarding buffered chunks
+        channel.begin.assert_called_once_with("req1")
         debug_calls = [str(c) for c in mock_logger.debug.call_args_list]
-        assert any("队列已清空" in c or "[Stream]" in c for c in debug_calls)
+        assert any("队列已清空 (共 2 项)" in c for c in debug_calls)
+
+
+@pytest.mark.asyncio
+async def test_clear_stream_queue_without_request():
+    channel = MagicMock()
+    channel.begin.return_value = 0
+
+    with patch("server.STREAM_CHANNEL", channel), patch("server.logger"):
+        await clear_stream_queue()
+
+        channel.begin.assert_called_once_with(None)
 
 
 @pytest.mark.asyncio
 async def test_clear_stream_queue_none():
-    with patch("server.STREAM_QUEUE", None), patch("server.logger") as mock_logger:
+    with patch("server.STREAM_CHANNEL", None), patch("server.logger") as mock_logger:
         await clear_stream_queue()
         mock_logger.debug.assert_called_with("[Stream] 队列未初始化或已禁用，跳过清空")
 
@@ -382,7 +414,7 @@ async def test_clear_stream_queue_none():
 Extended tests for api_utils/utils_ext/stream.py - Edge case coverage.
 
 Focus: Cover uncovered error paths, exception handling, and edge cases.
-Strategy: Test None signal, error detection, dict stale data, exceptions.
+Strategy: Test None signal, error detection, exceptions.
 """
 
 from models.exceptions import QuotaExceededError, UpstreamError
@@ -391,13 +423,12 @@ from models.exceptions import QuotaExceededError, UpstreamError
 @pytest.mark.asyncio
 async def test_use_stream_response_none_signal():
     """
-    测试场景: 接收到 None 作为流结束信号
-    预期: 正常结束,不返回任何内容 (lines 28-30)
+    测试场景: 接收到 None 作为流结束信号 (通道关闭)
+    预期: 正常结束,不返回任何内容
     """
-    mock_queue = MagicMock()
-    mock_queue.get_nowait.side_effect = [None]  # None 是结束信号
+    channel = make_channel([None])  # None 是结束信号
 
-    with patch("server.STREAM_QUEUE", mock_queue), patch("server.logger"):
+    with patch("server.STREAM_CHANNEL", channel), patch("server.logger"):
         chunks = []
         async for chunk in use_stream_response("req1"):
             chunks.append(chunk)
@@ -409,16 +440,16 @@ async def test_use_stream_response_none_signal():
 async def test_use_stream_response_quota_exceeded_error():
     """
     测试场景: 接收到 quota 错误信号 (status 429)
-    预期: 抛出 QuotaExceededError (lines 44-65)
+    预期: 抛出 QuotaExceededError
     """
-    error_data = json.dumps(
-        {"error": True, "status": 429, "message": "Quota exceeded for this project"}
-    )
-
-    mock_queue = MagicMock()
-    mock_queue.get_nowait.side_effect = [error_data]
-
-    with patch("server.STREAM_QUEUE", mock_queue), patch("server.logger"):
+    error_data = {
+        "error": True,
+        "status": 429,
+        "message": "Quota exceeded for this project",
+    }
+    channel = make_channel([error_data])
+
+    with patch("server.STREAM_CHANNEL", channel), patch("server.logger"):
         with pytest.raises(QuotaExceededError) as exc_info:
             async for chunk in use_stream_response("req1"):
                 pass
@@ -431,16 +462,16 @@ async def test_use_stream_response_quota_exceeded_error():
 async def test_use_stream_response_quota_error_by_message():
     """
     测试场景: 错误信息包含 "quota" 关键字
-    预期: 抛出 QuotaExceededError (lines 58-65)
+    预期: 抛出 QuotaExceededError
     """
-    error_data = json.dumps(
-        {"error": True, "status": 500, "message": "Your project quota has been reached"}
-    )
-
-    mock_queue = MagicMock()
-    mock_queue.get_nowait.side_effect = [error_data]
-
-    with patch("server.STREAM_QUEUE", mock_queue), patch("server.logger"):
+    error_data = {
+        "error": True,
+        "status": 500,
+        "message": "Your project quota has been reached",
+    }
+    channel = make_channel([error_data])
+
+    with patch("server.STREAM_CHANNEL", channel), patch("server.logger"):
         with pytest.raises(QuotaExceededError):
             async for chunk in use_stream_response("req1"):
                 pass
@@ -450,16 +481,12 @@ async def test_use_stream_response_quota_error_by_message():
 async def test_use_stream_response_upstream_error():
     """
     测试场景: 接收到非 quota 的上游错误 (status 500)
-    预期: 抛出 UpstreamError (lines 66-74)
+    预期: 抛出 UpstreamError
     """
-    error_data = json.dumps(
-        {"error": True, "status": 500, "message": "Internal server error"}
-    )
-
-    mock_queue = MagicMock()
-    mock_queue.get_nowait.side_effect = [error_data]
+    error_data = {"error": True, "status": 500, "message": "Internal server error"}
+    channel = make_channel([error_data])
 
-    with patch("server.STREAM_QUEUE", mock_queue), patch("server.logger"):
+    with patch("server.STREAM_CHANNEL", channel), patch("server.logger"):
         with pytest.raises(UpstreamError) as exc_info:
             async for chunk in use_stream_response("req1"):
                 pass
@@ -469,61 +496,19 @@ async def test_use_stream_response_upstream_error():
         assert exc_info.value.context.get("status_code") == 500
 
 
-@pytest.mark.asyncio
-async def test_use_stream_response_dict_with_stale_done():
-    """
-    测试场景: 字典格式数据,第一个是 stale done (无内容)
-    预期: Yields stale done, continues instead of breaking (lines 116-129)
-    Note: Dict format ALWAYS yields first (line 109), then checks stale.
-    """
-    q_data = [
-        {"done": True, "body": "", "reason": ""},  # Stale done (dict format)
-        {"body": "real content", "done": False},  # Real data
-        {"done": True, "body": "final", "reason": ""},  # Real done
-    ]
-
-    mock_queue = MagicMock()
-    mock_queue.get_nowait.side_effect = q_data
-
-    with (
-        patch("server.STREAM_QUEUE", mock_queue),
-        patch("server.logger") as mock_logger,
-    ):
-        chunks = []
-        async for chunk in use_stream_response("req1"):
-            chunks.append(chunk)
-
-        # Dict always yields first, so all 3 chunks yielded
-        # But stale detection prevents breaking on first done
-        assert len(chunks) == 3
-        assert chunks[0]["done"] is True  # Stale done yielded
-        assert chunks[1]["body"] == "real content"
-        assert chunks[2]["done"] is True  # Real done
-
-        # Verify stale warning was logged (line 124)
-        warning_calls = [
-            c for c in mock_logger.warning.call_args_list if "STALE DATA" in str(c)
-        ]
-        assert len(warning_calls) > 0
-
-
 @pytest.mark.asyncio
 async def test_use_stream_response_timeout_after_data():
     """
     测试场景: 接收部分数据后超时
-    预期: 记录警告并返回超时信号 (line 144)
+    预期: 记录警告并返回超时信号
     """
-    q_data = [
-        json.dumps({"body": "some data", "done": False}),
-    ] + [queue.Empty] * 301  # 先收到数据,然后一直空
-
-    mock_queue = MagicMock()
-    mock_queue.get_nowait.side_effect = q_data
+    channel = make_channel(
+        [{"body": "some data", "done": False}] + [asyncio.TimeoutError] * 30
+    )
 
     with (
-        patch("server.STREAM_QUEUE", mock_queue),
+        patch("server.STREAM_CHANNEL", channel),
         patch("server.logger") as mock_logger,
-        patch("asyncio.sleep", new_callable=AsyncMock),
     ):
         chunks = []
         async for chunk in use_stream_response("req1"):
@@ -534,11 +519,8 @@ async def test_use_stream_response_timeout_after_data():
         assert chunks[0]["body"] == "some data"
         assert chunks[1]["reason"] == "internal_timeout"
 
-        # Verify warning was logged (line 144)
         warning_calls = [
-            c
-            for c in mock_logger.warning.call_args_list
-            if "空读取次数达到上限" in str(c)
+            c for c in mock_logger.warning.call_args_list if "未收到新数据" in str(c)
         ]
         assert len(warning_calls) > 0
 
@@ -547,20 +529,18 @@ async def test_use_stream_response_timeout_after_data():
 async def test_use_stream_response_generic_exception():
     """
     测试场景: 在处理过程中发生异常
-    预期: 记录错误并重新抛出 (lines 156-158)
+    预期: 记录错误并重新抛出
     """
-    mock_queue = MagicMock()
-    mock_queue.get_nowait.side_effect = RuntimeError("Unexpected error")
+    channel = make_channel(RuntimeError("Unexpected error"))
 
     with (
-        patch("server.STREAM_QUEUE", mock_queue),
+        patch("server.STREAM_CHANNEL", channel),
         patch("server.logger") as mock_logger,
     ):
         with pytest.raises(RuntimeError, match="Unexpected error"):
             async for chunk in use_stream_response("req1"):
                 pass
 
-        # Verify error was logged (line 157)
         error_calls = [
             c for c in mock_logger.error.call_args_list if "使用流响应时出错" in str(c)
         ]
@@ -571,50 +551,23 @@ async def test_use_stream_response_generic_exception():
 async def test_clear_stream_queue_exception_during_clear():
     """
     测试场景: 清空队列时发生异常
-    预期: 记录错误并停止清空 (lines 189-194)
+    预期: 记录错误但不抛出
     """
-    mock_queue = MagicMock()
-    # Get 2 items, then raise exception
-    mock_queue.get_nowait.side_effect = ["item1", "item2", RuntimeError("Queue error")]
+    channel = MagicMock()
+    channel.begin.side_effect = RuntimeError("Channel error")
 
     with (
-        patch("server.STREAM_QUEUE", mock_queue),
+        patch("server.STREAM_CHANNEL", channel),
         patch("server.logger") as mock_logger,
     ):
-        await clear_stream_queue()
-
-        # Should have gotten 2 items before exception
-        assert mock_queue.get_nowait.call_count == 3
+        await clear_stream_queue("req1")
 
-        # Verify error was logged (line 190-193)
         error_calls = [
             c
             for c in mock_logger.error.call_args_list
             if "清空流式队列时发生意外错误" in str(c)
         ]
         assert len(error_calls) > 0
-        assert "已清空2项" in error_calls[0][0][0]
-
-
-@pytest.mark.asyncio
-async def test_clear_stream_queue_empty_queue():
-    """
-    测试场景: 清空一个空队列
-    预期: 记录信息日志
-    """
-    mock_queue = MagicMock()
-    mock_queue.get_nowait.side_effect = queue.Empty  # Immediately empty
-
-    with (
-        patch("server.STREAM_QUEUE", mock_queue),
-        patch("server.logger") as mock_logger,
-        patch("asyncio.to_thread", side_effect=queue.Empty),
-    ):
-        await clear_stream_queue()
-
-        # Verify debug log for empty queue cleared
-        debug_calls = [str(c) for c in mock_logger.debug.call_args_list]
-        assert any("队列已清空" in c or "[Stream]" in c for c in debug_calls)
 
 
 """
@@ -52,7 +52,7 @@ def mock_server_state():
     state.page_instance = None
     state.console_logs = []
     state.network_log = {}
-    state.STREAM_QUEUE = None
+    state.STREAM_CHANNEL = None
     state.PLAYWRIGHT_PROXY_SETTINGS = None
     return state
 
@@ -51,7 +51,7 @@ def mock_server_module():
     setattr(mock_module, "browser_instance", browser_mock)
     setattr(mock_module, "parsed_model_list", [])
     setattr(mock_module, "log_ws_manager", MagicMock())
-    setattr(mock_module, "STREAM_QUEUE", MagicMock())
+    setattr(mock_module, "STREAM_CHANNEL", MagicMock())
     setattr(mock_module, "STREAM_PROCESS", AsyncMock())
     setattr(mock_module, "PLAYWRIGHT_PROXY_SETTINGS", {})
     setattr(mock_module, "is_initializing", False)
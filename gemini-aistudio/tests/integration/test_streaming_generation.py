@@ -366,9 +366,9 @@ class TestStreamingDataIntegrity:
 
     async def test_incremental_content_deltas(self, make_chat_request):
         """
-        Test that content deltas are correctly calculated.
+        Test that content deltas from the proxy are passed through.
 
-        Verifies incremental updates show only new content.
+        Verifies each update shows only its new content.
         """
         req_id = "int-test-deltas"
         request = make_chat_request(stream=True)
@@ -377,8 +377,8 @@ class TestStreamingDataIntegrity:
 
         stream_data = [
             {"body": "Hello", "reason": "", "done": False},
-            {"body": "Hello world", "reason": "", "done": False},
-            {"body": "Hello world!", "reason": "", "done": True},
+            {"body": " world", "reason": "", "done": False},
+            {"body": "!", "reason": "", "done": True},
         ]
 
         async def mock_stream_gen(rid):
@@ -0,0 +1,143 @@
+"""
+Tests for stream/channel.py - the stream proxy <-> API process channel.
+
+Test Strategy:
+- Framing is tested against a real asyncio.StreamReader
+- StreamChannel and ProxyChannel are connected over a REAL local socket
+"""
+
+import asyncio
+import struct
+from unittest.mock import patch
+
+import pytest
+
+from stream.channel import (
+    MAX_FRAME_SIZE,
+    ProxyChannel,
+    StreamChannel,
+    encode_frame,
+    read_frame,
+)
+
+
+def reader_with(data: bytes) -> asyncio.StreamReader:
+    reader = asyncio.StreamReader()
+    reader.feed_data(data)
+    reader.feed_eof()
+    return reader
+
+
+@pytest.mark.asyncio
+async def test_frame_round_trip():
+    """Frames decode back to the original messages, in order."""
+    messages = [{"type": "ready"}, {"type": "chunk", "data": {"body": "你好"}}]
+    reader = reader_with(b"".join(encode_frame(m) for m in messages))
+
+    assert await read_frame(reader) == messages[0]
+    assert await read_frame(reader) == messages[1]
+    assert await read_frame(reader) is None
+
+
+@pytest.mark.asyncio
+async def test_truncated_frame_reads_as_closed():
+    """A connection closed mid-frame is treated as closed."""
+    reader = reader_with(encode_frame({"type": "ready"})[:-2])
+
+    assert await read_frame(reader) is None
+
+
+@pytest.mark.asyncio
+async def test_oversized_frame_is_rejected():
+    reader = reader_with(struct.pack(">I", MAX_FRAME_SIZE + 1))
+
+    with pytest.raises(ValueError, match="too large"):
+        await read_frame(reader)
+
+
+async def wait_until(condition, timeout: float = 2.0) -> None:
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not condition():
+        assert asyncio.get_running_loop().time() < deadline, "condition not met"
+        await asyncio.sleep(0.01)
+
+
+@pytest.fixture(params=["unix", "tcp"])
+async def connected(request):
+    """A listening StreamChannel with a connected ProxyChannel."""
+    with patch("stream.channel._use_unix_socket", return_value=request.param == "unix"):
+        channel = StreamChannel()
+        address = await channel.start()
+    proxy = ProxyChannel(address)
+    await proxy.connect()
+    await proxy.send_ready()
+    await channel.wait_ready(timeout=2)
+    yield channel, proxy
+    proxy.close()
+    channel.close()
+
+
+@pytest.mark.asyncio
+async def test_chunks_are_delivered_to_the_active_request(connected):
+    channel, proxy = connected
+
+    channel.begin("req-1")
+    await wait_until(lambda: proxy.request_id == "req-1")
+    await proxy.send({"body": "hello", "done": False}, proxy.request_id)
+
+    assert await channel.get("req-1", timeout=2) == {"body": "hello", "done": False}
+
+
+@pytest.mark.asyncio
+async def test_chunks_of_other_requests_are_dropped(connected):
+    """A late chunk from a previous request never reaches the next one."""
+    channel, proxy = connected
+
+    channel.begin("req-2")
+    await proxy.send({"body": "stale", "done": True}, "req-1")
+    await proxy.send({"body": "fresh", "done": False}, "req-2")
+
+    assert await channel.get("req-2", timeout=2) == {"body": "fresh", "done": False}
+    with pytest.raises(asyncio.TimeoutError):
+        await channel.get("req-2", timeout=0.1)
+
+
+@pytest.mark.asyncio
+async def test_begin_discards_buffered_chunks(connected):
+    channel, proxy = connected
+
+    channel.begin("req-1")
+    await proxy.send({"body": "unread"}, "req-1")
+    await wait_until(lambda: channel._items.qsize() == 1)
+
+    assert channel.begin(None) == 1
+    await wait_until(lambda: proxy.request_id is None)
+
+
+@pytest.mark.asyncio
+async def test_close_ends_waiting_readers(connected):
+    channel, _proxy = connected
+    channel.begin("req-1")
+
+    reader = asyncio.create_task(channel.get("req-1", timeout=2))
+    await asyncio.sleep(0)
+    channel.close()
+
+    assert await reader is None
+    assert await channel.get("req-1", timeout=2) is None
+
+
+@pytest.mark.asyncio
+async def test_active_request_is_sent_to_late_proxy_connection():
+    """A proxy that connects after begin() still learns the active request."""
+    channel = StreamChannel()
+    address = await channel.start()
+    try:
+        channel.begin("req-1")
+        proxy = ProxyChannel(address)
+        await proxy.connect()
+
+        await wait_until(lambda: proxy.request_id == "req-1")
+        proxy.close()
+    finally:
+        channel.close()
@@ -0,0 +1,189 @@
+"""
+Tests for the incremental response parsing in stream/interceptors.py.
+
+Test Strategy:
+- Build REAL gzip-compressed, chunked AI Studio responses
+- Feed them in pieces of every size and compare with the one-shot parser
+"""
+
+import json
+import re
+import zlib
+
+import pytest
+
+from stream.interceptors import (
+    ChunkedDecoder,
+    HttpInterceptor,
+    ModelFrameExtractor,
+    ResponseParser,
+)
+
+
+def body_frame(text: str) -> bytes:
+    return json.dumps([[[None, text]], "model"], separators=(",", ":")).encode()
+
+
+def reason_frame(text: str) -> bytes:
+    return json.dumps(
+        [
+            [[None, text, None, None, None, None, None, None, None, None, None, 1]],
+            "model",
+        ],
+        separators=(",", ":"),
+    ).encode()
+
+
+def function_frame(name: str) -> bytes:
+    payload = [None] * 10 + [[name, [[["query", [1, 2, "python"]]]]]]
+    return json.dumps([[payload], "model"], separators=(",", ":")).encode()
+
+
+def gzip_bytes(data: bytes) -> bytes:
+    compressor = zlib.compressobj(wbits=zlib.MAX_WBITS | 16)
+    return compressor.compress(data) + compressor.flush()
+
+
+def chunked(data: bytes, size: int = 16) -> bytes:
+    out = b""
+    for i in range(0, len(data), size):
+        piece = data[i : i + size]
+        out += f"{len(piece):x}\r\n".encode() + piece + b"\r\n"
+    return out + b"0\r\n\r\n"
+
+
+def pieces(data: bytes, size: int):
+    return [data[i : i + size] for i in range(0, len(data), size)]
+
+
+def merge(deltas):
+    result = {"reason": "", "body": "", "function": [], "done": False}
+    for delta in deltas:
+        result["reason"] += delta["reason"]
+        result["body"] += delta["body"]
+        result["function"].extend(delta["function"])
+        result["done"] = result["done"] or delta["done"]
+    return result
+
+
+# Text in the shape AI Studio streams: one JSON line per update
+TEXT = b"".join(
+    [
+        b'[[[["header"]]]\n,',
+        b"[" + reason_frame("Thinking ") + b"]\n,",
+        b"[" + reason_frame("hard.") + b"]\n,",
+        b"[" + body_frame("Hello ") + b"]\n,",
+        b"[" + body_frame("世界") + b"]\n,",
+        b"[" + function_frame("search") + b"]\n]",
+    ]
+)
+GZIP_HEADERS = {"Content-Encoding": "gzip", "Transfer-Encoding": "chunked"}
+
+
+class TestChunkedDecoder:
+    def test_decodes_across_any_split(self):
+        encoded = chunked(b"0123456789abcdef" * 4, size=7)
+        for size in range(1, 12):
+            decoder = ChunkedDecoder()
+            out = b"".join(decoder.feed(piece) for piece in pieces(encoded, size))
+            assert out == b"0123456789abcdef" * 4
+            assert decoder.done
+
+    def test_partial_chunk_data_is_emitted_immediately(self):
+        decoder = ChunkedDecoder()
+        assert decoder.feed(b"a\r\nhello") == b"hello"
+        assert decoder.feed(b"world\r\n") == b"world"
+        assert not decoder.done
+
+    def test_extensions_trailers_and_tail(self):
+        decoder = ChunkedDecoder()
+        out = decoder.feed(b"5;ext=1\r\nhello\r\n0\r\nX-Trailer: 1\r\n\r\nHTTP/1.1")
+        assert out == b"hello"
+        assert decoder.done
+        assert decoder.tail == b"HTTP/1.1"
+
+    def test_invalid_size_raises(self):
+        with pytest.raises(ValueError):
+            ChunkedDecoder().feed(b"zz\r\n")
+
+
+class TestModelFrameExtractor:
+    def test_matches_regex_across_any_split(self):
+        expected = re.findall(rb'\[\[\[null,.*?]],"model"]', TEXT)
+        for size in (1, 2, 5, 13, len(TEXT)):
+            extractor = ModelFrameExtractor()
+            frames = [f for piece in pieces(TEXT, size) for f in extractor.feed(piece)]
+            assert frames == expected
+
+    def test_frame_cannot_span_lines(self):
+        extractor = ModelFrameExtractor()
+        assert extractor.feed(b'[[[null,"a"\n]],"model"]') == []
+        assert extractor.feed(body_frame("b")) == [body_frame("b")]
+
+    def test_buffer_stays_small_without_frames(self):
+        extractor = ModelFrameExtractor()
+        for _ in range(100):
+            extractor.feed(b"x" * 1000)
+        assert len(extractor._buffer) < len(b"[[[null,")
+
+
+class TestResponseParser:
+    @pytest.fixture
+    def interceptor(self):
+        return HttpInterceptor()
+
+    @pytest.mark.asyncio
+    async def test_deltas_add_up_to_one_shot_result(self, interceptor):
+        """Any split of a gzip+chunked response yields the one-shot result."""
+        raw = chunked(gzip_bytes(TEXT), size=40)
+        expected = await interceptor.process_response(raw, "host", "", {})
+
+        for size in (1, 3, 17, 64, len(raw)):
+            parser = interceptor.create_response_parser(GZIP_HEADERS)
+            deltas = [parser.feed(piece) for piece in pieces(raw, size)]
+            assert merge(deltas) == expected
+            assert [d["done"] for d in deltas].count(True) == 1
+
+    def test_each_feed_returns_only_new_text(self, interceptor):
+        parser = interceptor.create_response_parser({"Transfer-Encoding": "chunked"})
+
+        first = parser.feed(chunked(b"[" + body_frame("Hello ") + b"]\n,")[:-5])
+        second = parser.feed(chunked(b"[" + body_frame("world") + b"]\n")[:-5])
+        last = parser.feed(b"0\r\n\r\n")
+
+        assert first["body"] == "Hello "
+        assert second["body"] == "world"
+        assert last == {"reason": "", "body": "", "function": [], "done": True}
+
+    def test_uncompressed_body_is_detected(self, interceptor):
+        parser = interceptor.create_response_parser({"Transfer-Encoding": "chunked"})
+        delta = parser.feed(chunked(body_frame("plain")))
+        assert delta["body"] == "plain"
+        assert delta["done"]
+
+    def test_content_length_framing_keeps_next_response(self, interceptor):
+        body = body_frame("hi")
+        parser = interceptor.create_response_parser({"Content-Length": str(len(body))})
+        delta = parser.feed(body + b"HTTP/1.1 200 OK\r\n")
+        assert delta["body"] == "hi"
+        assert parser.done
+        assert parser.tail == b"HTTP/1.1 200 OK\r\n"
+
+    def test_feed_after_done_only_collects_tail(self, interceptor):
+        raw = chunked(gzip_bytes(TEXT), size=40)
+        parser = interceptor.create_response_parser(GZIP_HEADERS)
+        assert parser.feed(raw)["done"]
+
+        for extra in (b"HTTP/1.1", b" 200 OK"):
+            delta = parser.feed(extra)
+            assert delta == {"reason": "", "body": "", "function": [], "done": True}
+        assert parser.tail == b"HTTP/1.1 200 OK"
+
+    def test_bodyless_status_is_done_immediately(self):
+        assert ResponseParser({}, status_code=204).done
+
+    def test_framing_only_parser_extracts_nothing(self):
+        parser = ResponseParser({"Transfer-Encoding": "chunked"})
+        delta = parser.feed(chunked(body_frame("hidden")))
+        assert delta["body"] == ""
+        assert parser.done
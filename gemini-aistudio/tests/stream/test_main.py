@@ -217,7 +217,7 @@ async def test_builtin_with_default_port():
         from stream.main import builtin
 
         # Call builtin with port=None (line 110 should execute)
-        await builtin(queue=None, port=None, proxy=None)
+        await builtin(channel_address=None, port=None, proxy=None)
 
         # Verify ProxyServer was created with default port 3120
         mock_proxy_class.assert_called_once()
@@ -246,7 +246,7 @@ async def test_builtin_keyboard_interrupt_handling():
         from stream.main import builtin
 
         # Run builtin() - KeyboardInterrupt should be caught
-        await builtin(queue=None, port=3120, proxy=None)
+        await builtin(channel_address=None, port=3120, proxy=None)
 
         # Verify shutdown message was logged (line 124)
         mock_logger.info.assert_any_call("Shutting down proxy server")
@@ -268,7 +268,7 @@ async def test_builtin_cancelled_error_re_raising():
 
         # Run builtin() - CancelledError should be re-raised
         with pytest.raises(asyncio.CancelledError):
-            await builtin(queue=None, port=3120, proxy=None)
+            await builtin(channel_address=None, port=3120, proxy=None)
 
 
 @pytest.mark.asyncio
@@ -294,7 +294,7 @@ async def test_builtin_generic_exception_handling():
         from stream.main import builtin
 
         # Run builtin() - generic exception should be caught
-        await builtin(queue=None, port=3120, proxy=None)
+        await builtin(channel_address=None, port=3120, proxy=None)
 
         # Verify error was logged (line 128)
         mock_logger.error.assert_called_once_with(
@@ -3,6 +3,7 @@ from unittest.mock import AsyncMock, MagicMock, patch
 
 import pytest
 
+from stream.interceptors import ResponseParser
 from stream.proxy_server import ProxyServer
 
 
@@ -272,9 +273,9 @@ class TestProxyServer:
         mock_writer.close.assert_called()
 
     @pytest.mark.asyncio
-    async def test_server_start_queue_ready(self, server):
-        mock_queue = MagicMock()
-        server.queue = mock_queue
+    async def test_server_start_channel_ready(self, server):
+        mock_channel = AsyncMock()
+        server.channel = mock_channel
 
         # Mock asyncio.start_server to return a mock server
         mock_server = AsyncMock()
@@ -290,7 +291,8 @@ class TestProxyServer:
             except asyncio.CancelledError:
                 pass
 
-        mock_queue.put.assert_called_with("READY")
+        mock_channel.connect.assert_awaited_once()
+        mock_channel.send_ready.assert_awaited_once()
 
     @pytest.mark.asyncio
     async def test_forward_data_with_interception_flow(self, server, mock_writer):
@@ -315,10 +317,13 @@ class TestProxyServer:
 
         # Mock interceptor
         server.interceptor.process_request = AsyncMock(return_value=b"Body")
-        server.interceptor.process_response = AsyncMock(return_value={"data": "test"})
+        parser = MagicMock(spec=ResponseParser, tail=b"", done=True)
+        parser.feed.return_value = {"body": "test", "done": True}
+        server.interceptor.create_response_parser = MagicMock(return_value=parser)
 
-        # Mock queue
-        server.queue = MagicMock()
+        # Mock channel
+        server.channel = AsyncMock()
+        server.channel.request_id = "req-1"
 
         await server._forward_data_with_interception(
             client_reader, client_writer, server_reader, server_writer, "example.com"
@@ -326,8 +331,8 @@ class TestProxyServer:
 
         # Verify interception occurred
         server.interceptor.process_request.assert_called()
-        server.interceptor.process_response.assert_called()
-        server.queue.put.assert_called()
+        parser.feed.assert_called_with(b"{}")
+        server.channel.send.assert_awaited_with({"body": "test", "done": True}, "req-1")
 
     @pytest.mark.asyncio
     async def test_forward_data_with_interception_flow_slow_cancellation(
@@ -356,7 +361,7 @@ class TestProxyServer:
         server_reader.read.side_effect = slow_read
 
         server.interceptor.process_request = AsyncMock(return_value=b"Body")
-        server.queue = MagicMock()
+        server.channel = AsyncMock()
 
         await server._forward_data_with_interception(
             client_reader, client_writer, server_reader, server_writer, "example.com"
@@ -439,10 +444,10 @@ class TestProxyServer:
             await task
 
     @pytest.mark.asyncio
-    async def test_start_server_queue_error(self, server):
-        mock_queue = MagicMock()
-        server.queue = mock_queue
-        mock_queue.put.side_effect = Exception("Queue error")
+    async def test_start_server_channel_error(self, server):
+        mock_channel = AsyncMock()
+        server.channel = mock_channel
+        mock_channel.connect.side_effect = ConnectionRefusedError("Channel error")
 
         mock_server = AsyncMock()
         mock_server.sockets = [MagicMock()]
@@ -455,9 +460,7 @@ class TestProxyServer:
             except asyncio.CancelledError:
                 pass
 
-        # Should log error but not crash before serve_forever
-        # If it crashed, serve_forever wouldn't be called (but we mocked it to raise CancelledError)
-        # We can check if logger.error was called
-        # But we didn't mock logger in fixture explicitly, it uses real logger or default.
-        # Let's check if queue.put was called.
-        mock_queue.put.assert_called_with("READY")
+        # Should log the error and still serve (serve_forever raised CancelledError)
+        mock_channel.connect.assert_awaited_once()
+        mock_channel.send_ready.assert_not_awaited()
+        mock_server.serve_forever.assert_awaited()
@@ -206,10 +206,8 @@ async def test_forward_data_with_interception_http_error_response(
 
     When the upstream returns an error status, we should:
     1. Log the error
-    2. Send an error payload to the queue (fail-fast)
+    2. Send an error payload over the channel (fail-fast)
     """
-    import json
-
     client_reader = AsyncMock()
     client_writer = MagicMock()
     client_writer.write = MagicMock()
@@ -217,9 +215,10 @@ async def test_forward_data_with_interception_http_error_response(
     server_writer = MagicMock()
     server_writer.drain = AsyncMock()
 
-    # Setup a queue to capture error payload
-    mock_queue = MagicMock()
-    proxy_server.queue = mock_queue
+    # Setup a channel to capture error payload
+    mock_channel = AsyncMock()
+    mock_channel.request_id = "req-1"
+    proxy_server.channel = mock_channel
 
     # Client sends a GenerateContent request
     client_data = b"POST /GenerateContent HTTP/1.1\r\nHost: example.com\r\n\r\nBody"
@@ -236,10 +235,10 @@ async def test_forward_data_with_interception_http_error_response(
         client_reader, client_writer, server_reader, server_writer, "example.com"
     )
 
-    # Verify error payload was sent to queue
-    mock_queue.put.assert_called()
-    call_args = mock_queue.put.call_args[0][0]
-    parsed = json.loads(call_args)
+    # Verify error payload was sent, tagged with the sniffed request
+    mock_channel.send.assert_awaited()
+    parsed, req_id = mock_channel.send.call_args[0]
+    assert req_id == "req-1"
     assert parsed["error"] is True
     assert parsed["status"] == 429
     assert "429" in parsed["message"]
@@ -352,9 +351,9 @@ async def test_forward_data_with_interception_response_parsing_error(
 
     # Setup interceptor to fail during response processing
     mock_deps["interceptor"].process_request = AsyncMock(return_value=b"processed")
-    mock_deps["interceptor"].process_response = AsyncMock(
-        side_effect=ValueError("Failed to parse response")
-    )
+    parser = MagicMock()
+    parser.feed.side_effect = ValueError("Failed to parse response")
+    mock_deps["interceptor"].create_response_parser = MagicMock(return_value=parser)
 
     await proxy_server._forward_data_with_interception(
         client_reader, client_writer, server_reader, server_writer, "example.com"
@@ -9,11 +9,12 @@ These functions represent ~210 lines of untested code (50% of proxy_server.py).
 """
 
 import asyncio
-import multiprocessing
 from unittest.mock import AsyncMock, MagicMock, patch
 
 import pytest
 
+from stream.channel import ProxyChannel
+from stream.interceptors import HttpInterceptor, ResponseParser
 from stream.proxy_server import ProxyServer
 
 # ==================== TEST HELPERS ====================
@@ -119,7 +120,12 @@ def mock_interceptor():
     with patch("stream.proxy_server.HttpInterceptor") as mock:
         instance = mock.return_value
         instance.process_request = AsyncMock(side_effect=lambda data, *args: data)
-        instance.process_response = AsyncMock(return_value={"text": "mocked response"})
+        # Real incremental parser, so responses are framed and parsed as in production
+        instance.create_response_parser = MagicMock(
+            side_effect=lambda headers, status_code=200: ResponseParser(
+                headers, interceptor=HttpInterceptor(), status_code=status_code
+            )
+        )
         yield instance
 
 
@@ -127,13 +133,25 @@ def mock_interceptor():
 def proxy_server(mock_cert_manager, mock_proxy_connector, mock_interceptor):
     """Create ProxyServer instance with mocked dependencies."""
     with patch("logging.getLogger"):
-        queue = multiprocessing.Queue()
         server = ProxyServer(
-            host="127.0.0.1", port=3120, intercept_domains=["*.google.com"], queue=queue
+            host="127.0.0.1",
+            port=3120,
+            intercept_domains=["*.google.com"],
+            channel=make_channel(),
         )
         return server
 
 
+def make_channel() -> MagicMock:
+    """ProxyChannel stand-in that records what is sent to the API process."""
+    channel = MagicMock(spec=ProxyChannel)
+    channel.request_id = "req-1"
+    channel.connect = AsyncMock()
+    channel.send_ready = AsyncMock()
+    channel.send = AsyncMock()
+    return channel
+
+
 # ==================== TESTS: _forward_data (No Interception) ====================
 
 
@@ -300,10 +318,10 @@ async def test_interception_skips_non_generate_content_requests(
 
 @pytest.mark.asyncio
 @pytest.mark.timeout(5)
-async def test_interception_handles_response_and_queues_data(
+async def test_interception_handles_response_and_sends_data(
     proxy_server, mock_interceptor
 ):
-    """Test that intercepted responses are processed and queued."""
+    """Test that intercepted responses are processed and sent to the API process."""
     client_reader, client_writer = create_stream_pair()
     server_reader, server_writer = create_stream_pair()
 
@@ -315,12 +333,13 @@ async def test_interception_handles_response_and_queues_data(
         b'{"test":1}'
     )
 
-    # Response with headers
+    # Chunked response carrying one body frame
+    frame = b'[[[null,"intercepted response"]],"model"]'
     http_response = (
         b"HTTP/1.1 200 OK\r\n"
         b"Content-Type: application/json\r\n"
-        b"\r\n"
-        b'{"candidates":[{"content":"response"}]}'
+        b"Transfer-Encoding: chunked\r\n"
+        b"\r\n" + f"{len(frame):x}\r\n".encode() + frame + b"\r\n0\r\n\r\n"
     )
 
     client_reader.feed_data(http_request)
@@ -329,8 +348,53 @@ async def test_interception_handles_response_and_queues_data(
     server_reader.feed_data(http_response)
     server_reader.feed_eof()
 
-    # Mock interceptor to return specific data
-    mock_interceptor.process_response.return_value = {"text": "intercepted response"}
+    await proxy_server._forward_data_with_interception(
+        client_reader,
+        client_writer,
+        server_reader,
+        server_writer,
+        host="generativelanguage.googleapis.com",
+    )
+
+    # Verify a parser was created for the response
+    mock_interceptor.create_response_parser.assert_called_once()
+
+    # Verify the delta was sent, tagged with the request active when it was sniffed
+    proxy_server.channel.send.assert_awaited_once_with(
+        {
+            "reason": "",
+            "body": "intercepted response",
+            "function": [],
+            "done": True,
+        },
+        "req-1",
+    )
+
+
+@pytest.mark.asyncio
+@pytest.mark.timeout(5)
+async def test_interception_sends_only_new_text_per_read(proxy_server):
+    """Each server read is parsed once; the API gets deltas, not the whole text."""
+    client_reader, client_writer = create_stream_pair()
+    server_reader, server_writer = create_stream_pair()
+
+    client_reader.feed_data(
+        b"POST /v1/models/gemini:generateContent HTTP/1.1\r\n"
+        b"Content-Length: 2\r\n"
+        b"\r\n"
+        b"{}"
+    )
+
+    def chunk(text: str) -> bytes:
+        frame = f'[[[null,"{text}"]],"model"]\n'.encode()
+        return f"{len(frame):x}\r\n".encode() + frame + b"\r\n"
+
+    server_reader.feed_data(
+        b"HTTP/1.1 200 OK\r\nTransfer-Encoding: chunked\r\n\r\n" + chunk("Hello ")
+    )
+    server_reader.feed_data(chunk("world"))
+    server_reader.feed_data(b"0\r\n\r\n")
+    server_reader.feed_eof()
 
     await proxy_server._forward_data_with_interception(
         client_reader,
@@ -340,11 +404,52 @@ async def test_interception_handles_response_and_queues_data(
         host="generativelanguage.googleapis.com",
     )
 
-    # Verify interceptor was called for response
-    mock_interceptor.process_response.assert_called()
+    sent = [call.args[0] for call in proxy_server.channel.send.await_args_list]
+    assert [(d["body"], d["done"]) for d in sent] == [
+        ("Hello ", False),
+        ("world", False),
+        ("", True),
+    ]
+
+
+@pytest.mark.asyncio
+@pytest.mark.timeout(5)
+async def test_interception_keeps_forwarding_when_channel_send_fails(proxy_server):
+    """A lost API connection stops sniffing but not forwarding to the browser."""
+    client_reader, client_writer = create_stream_pair()
+    server_reader, server_writer = create_stream_pair()
+    proxy_server.channel.send.side_effect = ConnectionResetError("gone")
+
+    client_reader.feed_data(
+        b"POST /v1/models/gemini:generateContent HTTP/1.1\r\n"
+        b"Content-Length: 2\r\n"
+        b"\r\n"
+        b"{}"
+    )
+
+    def chunk(text: str) -> bytes:
+        frame = f'[[[null,"{text}"]],"model"]\n'.encode()
+        return f"{len(frame):x}\r\n".encode() + frame + b"\r\n"
+
+    reads = [
+        b"HTTP/1.1 200 OK\r\nTransfer-Encoding: chunked\r\n\r\n" + chunk("Hello "),
+        chunk("world"),
+        b"0\r\n\r\n",
+    ]
+    for data in reads:
+        server_reader.feed_data(data)
+    server_reader.feed_eof()
+
+    await proxy_server._forward_data_with_interception(
+        client_reader,
+        client_writer,
+        server_reader,
+        server_writer,
+        host="generativelanguage.googleapis.com",
+    )
 
-    # Verify response was queued (if queue exists)
-    # Note: queue operations happen in the code, we can't easily verify without integration test
+    assert proxy_server.channel.send.await_count == 1
+    assert client_writer.get_data() == b"".join(reads)
 
 
 @pytest.mark.asyncio
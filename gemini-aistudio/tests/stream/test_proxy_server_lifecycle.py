@@ -10,11 +10,11 @@ These tests focus on the untested control flow and error handling paths.
 """
 
 import asyncio
-import multiprocessing
 from unittest.mock import AsyncMock, MagicMock, patch
 
 import pytest
 
+from stream.channel import ProxyChannel
 from stream.proxy_server import ProxyServer
 
 # ==================== FIXTURES ====================
@@ -47,13 +47,25 @@ def mock_deps():
 @pytest.fixture
 def proxy_server(mock_deps):
     """Create ProxyServer with mocked dependencies."""
-    queue = multiprocessing.Queue()
     server = ProxyServer(
-        host="127.0.0.1", port=3120, intercept_domains=["*.google.com"], queue=queue
+        host="127.0.0.1",
+        port=3120,
+        intercept_domains=["*.google.com"],
+        channel=make_channel(),
     )
     return server
 
 
+def make_channel() -> MagicMock:
+    """ProxyChannel stand-in that records what is sent to the API process."""
+    channel = MagicMock(spec=ProxyChannel)
+    channel.request_id = "req-1"
+    channel.connect = AsyncMock()
+    channel.send_ready = AsyncMock()
+    channel.send = AsyncMock()
+    return channel
+
+
 # ==================== TESTS: handle_client ====================
 
 
@@ -342,7 +354,7 @@ async def test_handle_connect_server_connection_fails(proxy_server, mock_deps):
 @pytest.mark.asyncio
 @pytest.mark.timeout(5)
 async def test_start_creates_server_and_signals_ready(proxy_server):
-    """Test start() creates server and sends READY signal to queue."""
+    """Test start() creates server and sends READY signal over the channel."""
     mock_server = MagicMock()
     mock_socket = MagicMock()
     mock_socket.getsockname.return_value = ("127.0.0.1", 3120)
@@ -370,20 +382,21 @@ async def test_start_creates_server_and_signals_ready(proxy_server):
         # Verify server was created
         mock_start_server.assert_called_once()
 
-        # Verify READY signal was sent to queue
-        # Note: queue.put is called, we can't easily verify without real queue
+        # Verify the channel was connected and READY was sent
+        proxy_server.channel.connect.assert_awaited_once()
+        proxy_server.channel.send_ready.assert_awaited_once()
 
 
 @pytest.mark.asyncio
 @pytest.mark.timeout(5)
-async def test_start_handles_queue_none(mock_deps):
-    """Test start() works when queue is None (no signaling)."""
-    # Create server without queue
+async def test_start_handles_channel_none(mock_deps):
+    """Test start() works when channel is None (no signaling)."""
+    # Create server without channel
     server = ProxyServer(
         host="127.0.0.1",
         port=3120,
         intercept_domains=["*.google.com"],
-        queue=None,  # No queue
+        channel=None,  # No channel
     )
 
     mock_server = MagicMock()
@@ -410,7 +423,7 @@ async def test_start_handles_queue_none(mock_deps):
         except asyncio.CancelledError:
             pass
 
-        # Should not crash even without queue
+        # Should not crash even without channel
         mock_start_server.assert_called_once()
 
 
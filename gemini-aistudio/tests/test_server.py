@@ -14,7 +14,7 @@ class TestServerModuleLogic:
         # Import the set directly to test its contents
         # We define what we expect based on the server module design
         expected_attrs = {
-            "STREAM_QUEUE",
+            "STREAM_CHANNEL",
             "STREAM_PROCESS",
             "playwright_manager",
             "browser_instance",
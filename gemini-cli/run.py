@@ -1,8 +1,96 @@
+"""
+Server entry point.
+With WORKERS > 1, that many worker processes are started. Each binds its own
+socket to the same port with SO_REUSEPORT, so the kernel spreads connections
+across them, and they share credential state through SHARED_STATE_DIR.
+"""
 import os
+import sys
+import time
+import signal
+import socket
+import logging
+import multiprocessing
+
 import uvicorn
-from src.main import app
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def _bind(host: str, port: int) -> socket.socket:
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    sock.bind((host, port))
+    return sock
+
+
+def _serve_worker(host: str, port: int):
+    sock = _bind(host, port)
+    config = uvicorn.Config("src.main:app", host=host, port=port)
+    uvicorn.Server(config).run(sockets=[sock])
+
+
+def _login_once():
+    """Run the browser login here if there are no credentials, rather than in every worker."""
+    from src.config import CREDENTIAL_FILE, GEMINI_CREDENTIALS_DIR, GEMINI_CREDENTIALS_LIST
+    if os.getenv("GEMINI_CREDENTIALS") or os.path.exists(CREDENTIAL_FILE) or GEMINI_CREDENTIALS_DIR or GEMINI_CREDENTIALS_LIST:
+        return
+    from src.auth import get_credentials
+    logging.info("No credentials found. Starting OAuth authentication flow...")
+    if not get_credentials(allow_oauth_flow=True):
+        logging.error("Authentication failed. Workers will start but will not function until credentials are provided.")
+
+
+def run_workers(host: str, port: int, workers: int):
+    """Start the worker processes and restart any that exit until stopped."""
+    os.environ.setdefault("SHARED_STATE_DIR", os.path.join(SCRIPT_DIR, ".worker_state"))
+    _login_once()
+
+    context = multiprocessing.get_context("spawn")
+
+    def start():
+        process = context.Process(target=_serve_worker, args=(host, port), daemon=False)
+        process.start()
+        return process
+
+    processes = [start() for _ in range(workers)]
+    logging.info(f"Started {workers} workers on {host}:{port} (pids {', '.join(str(p.pid) for p in processes)})")
+
+    stopping = False
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+
+    while not stopping:
+        for index, process in enumerate(processes):
+            if not process.is_alive() and not stopping:
+                logging.warning(f"Worker {process.pid} exited with code {process.exitcode}, restarting it")
+                processes[index] = start()
+        time.sleep(1)
+    for process in processes:
+        process.join()
+
 
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
     host = os.getenv("HOST", "0.0.0.0")
     port = int(os.getenv("PORT", "8888"))
-    uvicorn.run(app, host=host, port=port)
\ No newline at end of file
+    workers = int(os.getenv("WORKERS", "1"))
+    if workers > 1 and (not hasattr(socket, "SO_REUSEPORT") or sys.platform == "win32"):
+        logging.warning("WORKERS > 1 needs SO_REUSEPORT and file locking, which this platform lacks; starting a single worker")
+        workers = 1
+
+    if workers > 1:
+        run_workers(host, port, workers)
+    else:
+        from src.main import app
+        uvicorn.run(app, host=host, port=port)
@@ -2,7 +2,9 @@ import os
 import json
 import base64
 import time
+import asyncio
 import logging
+import httpx
 from datetime import datetime
 from fastapi import Request, HTTPException, Depends
 from fastapi.security import HTTPBasic
@@ -14,15 +16,16 @@ from google_auth_oauthlib.flow import Flow
 from google.auth.transport.requests import Request as GoogleAuthRequest
 
 from .utils import get_user_agent, get_client_metadata
+from .http_client import get_http_client
 from .config import (
     CLIENT_ID, CLIENT_SECRET, SCOPES, CREDENTIAL_FILE,
     CODE_ASSIST_ENDPOINT, GEMINI_AUTH_PASSWORD
 )
 
 # --- Global State ---
+# Legacy single-credential state; per-account state lives in credential_pool
 credentials = None
 user_project_id = None
-onboarding_complete = False
 credentials_from_env = False  # Track if credentials came from environment variable
 
 security = HTTPBasic()
@@ -81,12 +84,21 @@ def authenticate_user(request: Request):
         headers={"WWW-Authenticate": "Basic"},
     )
 
-def save_credentials(creds, project_id=None):
+def save_credentials(creds, project_id=None, path=None):
+    """
+    Persist credentials (and optionally the project ID) to disk.
+
+    Args:
+        creds: Google OAuth credentials
+        project_id: Project ID to store alongside the token
+        path: Credential file to write; defaults to CREDENTIAL_FILE
+    """
     global credentials_from_env
+    target_file = path or CREDENTIAL_FILE
     
     # Don't save credentials to file if they came from environment variable,
     # but still save project_id if provided and no file exists or file lacks project_id
-    if credentials_from_env:
+    if path is None and credentials_from_env:
         if project_id and os.path.exists(CREDENTIAL_FILE):
             try:
                 with open(CREDENTIAL_FILE, "r") as f:
@@ -121,9 +133,9 @@ def save_credentials(creds, project_id=None):
     
     if project_id:
         creds_data["project_id"] = project_id
-    elif os.path.exists(CREDENTIAL_FILE):
+    elif os.path.exists(target_file):
         try:
-            with open(CREDENTIAL_FILE, "r") as f:
+            with open(target_file, "r") as f:
                 existing_data = json.load(f)
                 if "project_id" in existing_data:
                     creds_data["project_id"] = existing_data["project_id"]
@@ -131,10 +143,51 @@ def save_credentials(creds, project_id=None):
             pass
     
     
-    with open(CREDENTIAL_FILE, "w") as f:
+    with open(target_file, "w") as f:
         json.dump(creds_data, f, indent=2)
     
 
+def credentials_from_info(raw_creds_data):
+    """
+    Build Credentials from a stored OAuth JSON object.
+    Accepts the same formats as get_credentials (access_token/scope aliases,
+    timezone-suffixed expiry) and falls back to a refresh-token-only credential.
+
+    Args:
+        raw_creds_data: Parsed credential JSON
+
+    Returns:
+        google.oauth2.credentials.Credentials
+    """
+    if not raw_creds_data.get("refresh_token"):
+        raise ValueError("Credential has no refresh_token")
+
+    creds_data = raw_creds_data.copy()
+    if "access_token" in creds_data and "token" not in creds_data:
+        creds_data["token"] = creds_data["access_token"]
+    if "scope" in creds_data and "scopes" not in creds_data:
+        creds_data["scopes"] = creds_data["scope"].split()
+
+    expiry_str = creds_data.get("expiry")
+    if isinstance(expiry_str, str) and ("+00:00" in expiry_str or "Z" in expiry_str):
+        try:
+            parsed_expiry = datetime.fromisoformat(expiry_str.replace('Z', '+00:00'))
+            creds_data["expiry"] = datetime.utcfromtimestamp(parsed_expiry.timestamp()).strftime("%Y-%m-%dT%H:%M:%SZ")
+        except ValueError:
+            del creds_data["expiry"]
+
+    try:
+        return Credentials.from_authorized_user_info(creds_data, SCOPES)
+    except Exception as e:
+        logging.warning(f"Failed to parse credential normally ({e}), using refresh token only")
+        return Credentials.from_authorized_user_info({
+            "client_id": raw_creds_data.get("client_id", CLIENT_ID),
+            "client_secret": raw_creds_data.get("client_secret", CLIENT_SECRET),
+            "refresh_token": raw_creds_data["refresh_token"],
+            "token_uri": "https://oauth2.googleapis.com/token",
+        }, SCOPES)
+
+
 def get_credentials(allow_oauth_flow=True):
     """Loads credentials matching gemini-cli OAuth2 flow."""
     global credentials, credentials_from_env, user_project_id
@@ -433,18 +486,11 @@ def get_credentials(allow_oauth_flow=True):
     finally:
         oauthlib.oauth2.rfc6749.parameters.validate_token_parameters = original_validate
 
-def onboard_user(creds, project_id):
-    """Ensures the user is onboarded, matching gemini-cli setupUser behavior."""
-    global onboarding_complete
-    if onboarding_complete:
-        return
-
-    if creds.expired and creds.refresh_token:
-        try:
-            creds.refresh(GoogleAuthRequest())
-            save_credentials(creds)
-        except Exception as e:
-            raise Exception(f"Failed to refresh credentials during onboarding: {str(e)}")
+async def onboard_user(creds, project_id):
+    """
+    Ensures the user is onboarded, matching gemini-cli setupUser behavior.
+    Callers are expected to hold a fresh token and to cache the outcome.
+    """
     headers = {
         "Authorization": f"Bearer {creds.token}",
         "Content-Type": "application/json",
@@ -456,11 +502,11 @@ def onboard_user(creds, project_id):
         "metadata": get_client_metadata(project_id),
     }
     
+    client = get_http_client()
     try:
-        import requests
-        resp = requests.post(
+        resp = await client.post(
             f"{CODE_ASSIST_ENDPOINT}/v1internal:loadCodeAssist",
-            data=json.dumps(load_assist_payload),
+            content=json.dumps(load_assist_payload),
             headers=headers,
         )
         resp.raise_for_status()
@@ -487,7 +533,6 @@ def onboard_user(creds, project_id):
             raise ValueError("This account requires setting the GOOGLE_CLOUD_PROJECT env var.")
 
         if load_data.get("currentTier"):
-            onboarding_complete = True
             return
 
         onboard_req_payload = {
@@ -497,67 +542,41 @@ def onboard_user(creds, project_id):
         }
 
         while True:
-            onboard_resp = requests.post(
+            onboard_resp = await client.post(
                 f"{CODE_ASSIST_ENDPOINT}/v1internal:onboardUser",
-                data=json.dumps(onboard_req_payload),
+                content=json.dumps(onboard_req_payload),
                 headers=headers,
             )
             onboard_resp.raise_for_status()
             lro_data = onboard_resp.json()
 
             if lro_data.get("done"):
-                onboarding_complete = True
                 break
             
-            time.sleep(5)
+            await asyncio.sleep(5)
 
-    except requests.exceptions.HTTPError as e:
+    except httpx.HTTPStatusError as e:
         raise Exception(f"User onboarding failed. Please check your Google Cloud project permissions and try again. Error: {e.response.text if hasattr(e, 'response') else str(e)}")
     except Exception as e:
         raise Exception(f"User onboarding failed due to an unexpected error: {str(e)}")
 
-def get_user_project_id(creds):
-    """Gets the user's project ID matching gemini-cli setupUser logic."""
-    global user_project_id
-    
-    # Priority 1: Check environment variable first (always check, even if user_project_id is set)
+async def get_user_project_id(creds):
+    """
+    Gets the user's project ID matching gemini-cli setupUser logic.
+
+    Args:
+        creds: Google OAuth credentials with a fresh token
+
+    Returns:
+        The project ID; callers are responsible for caching and persisting it
+    """
+    # Priority 1: Check environment variable first
     env_project_id = os.getenv("GOOGLE_CLOUD_PROJECT")
     if env_project_id:
         logging.info(f"Using project ID from GOOGLE_CLOUD_PROJECT environment variable: {env_project_id}")
-        user_project_id = env_project_id
-        save_credentials(creds, user_project_id)
-        return user_project_id
-    
-    # If we already have a cached project_id and no env var override, use it
-    if user_project_id:
-        logging.info(f"Using cached project ID: {user_project_id}")
-        return user_project_id
+        return env_project_id
 
-    # Priority 2: Check cached project ID in credential file
-    if os.path.exists(CREDENTIAL_FILE):
-        try:
-            with open(CREDENTIAL_FILE, "r") as f:
-                creds_data = json.load(f)
-                cached_project_id = creds_data.get("project_id")
-                if cached_project_id:
-                    logging.info(f"Using cached project ID from credential file: {cached_project_id}")
-                    user_project_id = cached_project_id
-                    return user_project_id
-        except Exception as e:
-            logging.warning(f"Could not read project_id from credential file: {e}")
-
-    # Priority 3: Make API call to discover project ID
-    # Ensure we have valid credentials for the API call
-    if creds.expired and creds.refresh_token:
-        try:
-            logging.info("Refreshing credentials before project ID discovery...")
-            creds.refresh(GoogleAuthRequest())
-            save_credentials(creds)
-            logging.info("Credentials refreshed successfully for project ID discovery")
-        except Exception as e:
-            logging.error(f"Failed to refresh credentials while getting project ID: {e}")
-            # Continue with existing credentials - they might still work
-    
+    # Priority 2: Make API call to discover project ID
     if not creds.token:
         raise Exception("No valid access token available for project ID discovery")
     
@@ -572,11 +591,10 @@ def get_user_project_id(creds):
     }
 
     try:
-        import requests
         logging.info("Attempting to discover project ID via API call...")
-        resp = requests.post(
+        resp = await get_http_client().post(
             f"{CODE_ASSIST_ENDPOINT}/v1internal:loadCodeAssist",
-            data=json.dumps(probe_payload),
+            content=json.dumps(probe_payload),
             headers=headers,
         )
         resp.raise_for_status()
@@ -586,13 +604,10 @@ def get_user_project_id(creds):
             raise ValueError("Could not find 'cloudaicompanionProject' in loadCodeAssist response.")
 
         logging.info(f"Discovered project ID via API: {discovered_project_id}")
-        user_project_id = discovered_project_id
-        save_credentials(creds, user_project_id)
-        
-        return user_project_id
-    except requests.exceptions.HTTPError as e:
+        return discovered_project_id
+    except httpx.HTTPStatusError as e:
         logging.error(f"HTTP error during project ID discovery: {e}")
-        if hasattr(e, 'response') and e.response:
+        if e.response is not None:
             logging.error(f"Response status: {e.response.status_code}, body: {e.response.text}")
         raise Exception(f"Failed to discover project ID via API: {e}")
     except Exception as e:
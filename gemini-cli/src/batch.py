@@ -0,0 +1,583 @@
+"""
+Batch - OpenAI-style offline batch jobs.
+An uploaded JSONL of chat requests is worked through in the background with
+bounded concurrency over the credential pool. Results are appended to an output
+JSONL as rows finish, which doubles as the checkpoint: after a restart, rows
+whose custom_id is already in the output or error file are skipped. Failed rows
+are retried with exponential backoff.
+
+With several workers, the worker running a batch holds a lock file for it until
+the batch ends or the process exits. The refresh leader periodically resumes
+batches whose lock is free, so a batch left by a dead worker is picked up. A
+cancel received by another worker is left as a marker file the owner polls.
+"""
+import os
+import json
+import time
+import uuid
+import random
+import asyncio
+import logging
+from typing import Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows: no flock, a single process owns every batch
+    fcntl = None
+
+from .credential_pool import credential_pool
+from .models import OpenAIChatCompletionRequest
+from .openai_transformers import openai_request_to_gemini, gemini_response_to_openai
+from .claude_transformers import claude_request_to_gemini, gemini_response_to_claude
+from .google_api_client import send_gemini_request, build_gemini_payload_from_openai
+from .shared_state import shared_state
+from .config import (
+    BATCH_DIR,
+    BATCH_CONCURRENCY_PER_CREDENTIAL,
+    BATCH_MAX_RETRIES,
+    BATCH_RETRY_BASE_SECONDS,
+    BATCH_RETRY_MAX_SECONDS
+)
+
+SUPPORTED_ENDPOINTS = ("/v1/chat/completions", "/v1/messages")
+# Upstream statuses worth retrying; anything else is final
+_RETRYABLE_STATUSES = (429, 500, 502, 503, 504)
+# Batches in these states are resumed on startup
+_ACTIVE_STATUSES = ("validating", "in_progress", "finalizing", "cancelling")
+# Username batch rows are queued under, so interactive users keep their fair share
+BATCH_USERNAME = "batch"
+# Interval between checks for a cancel requested through another worker
+_CANCEL_POLL_SECONDS = 1.0
+# Interval between leader scans for batches whose worker has exited
+_RESUME_POLL_SECONDS = 30.0
+
+
+class BatchError(Exception):
+    """Invalid batch or file request."""
+
+    def __init__(self, message: str, status_code: int = 400):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def _write_json(path: str, data: dict):
+    """Write a JSON document atomically (write a temp file, then rename)."""
+    # Per process, since another worker may write the same batch (a cancel)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+
+def _truncate_partial_line(path: str):
+    """Drop a trailing line left incomplete by a crash, so appends stay valid JSONL."""
+    if not os.path.exists(path):
+        return
+    with open(path, "rb+") as f:
+        f.seek(0, os.SEEK_END)
+        size = f.tell()
+        if size == 0:
+            return
+        f.seek(max(0, size - 1))
+        if f.read(1) == b"\n":
+            return
+        # Scan back for the last newline
+        pos = size
+        while pos > 0:
+            step = min(65536, pos)
+            f.seek(pos - step)
+            chunk = f.read(step)
+            newline = chunk.rfind(b"\n")
+            if newline >= 0:
+                f.truncate(pos - step + newline + 1)
+                return
+            pos -= step
+        f.truncate(0)
+
+
+class BatchManager:
+    """Stores uploaded files and batch objects on disk and runs batches in the background."""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.files_dir = os.path.join(directory, "files")
+        self.batches_dir = os.path.join(directory, "batches")
+        self._tasks = {}  # batch id -> running task
+        self._running = {}  # batch id -> batch object being updated by its task
+        self._owner_fds = {}  # batch id -> descriptor holding its owner lock
+        self._progress_saved_at = {}  # batch id -> monotonic time of the last progress save
+        self._resumer = None
+
+    def _ensure_dirs(self):
+        os.makedirs(self.files_dir, exist_ok=True)
+        os.makedirs(self.batches_dir, exist_ok=True)
+
+    # Files
+
+    def _file_path(self, file_id: str) -> str:
+        return os.path.join(self.files_dir, f"{file_id}.jsonl")
+
+    def _file_meta_path(self, file_id: str) -> str:
+        return os.path.join(self.files_dir, f"{file_id}.json")
+
+    def create_file(self, content: bytes, filename: str, purpose: str) -> dict:
+        """
+        Store an uploaded file.
+
+        Returns:
+            OpenAI file object
+        """
+        self._ensure_dirs()
+        file_id = "file-" + uuid.uuid4().hex
+        with open(self._file_path(file_id), "wb") as f:
+            f.write(content)
+        meta = {
+            "id": file_id,
+            "object": "file",
+            "bytes": len(content),
+            "created_at": int(time.time()),
+            "filename": filename,
+            "purpose": purpose,
+        }
+        _write_json(self._file_meta_path(file_id), meta)
+        return meta
+
+    def _new_output_file(self, filename: str, purpose: str) -> dict:
+        file_id = "file-" + uuid.uuid4().hex
+        open(self._file_path(file_id), "wb").close()
+        meta = {
+            "id": file_id,
+            "object": "file",
+            "bytes": 0,
+            "created_at": int(time.time()),
+            "filename": filename,
+            "purpose": purpose,
+        }
+        _write_json(self._file_meta_path(file_id), meta)
+        return meta
+
+    def get_file(self, file_id: str) -> dict:
+        path = self._file_meta_path(os.path.basename(file_id))
+        if not os.path.exists(path):
+            raise BatchError(f"No such file: {file_id}", 404)
+        with open(path, encoding="utf-8") as f:
+            meta = json.load(f)
+        # Output files grow while their batch runs
+        meta["bytes"] = os.path.getsize(self._file_path(meta["id"]))
+        return meta
+
+    def file_content_path(self, file_id: str) -> str:
+        return self._file_path(self.get_file(file_id)["id"])
+
+    # Batches
+
+    def _batch_path(self, batch_id: str) -> str:
+        return os.path.join(self.batches_dir, f"{batch_id}.json")
+
+    def _cancel_marker_path(self, batch_id: str) -> str:
+        return os.path.join(self.batches_dir, f"{batch_id}.cancel")
+
+    def _save(self, batch: dict):
+        _write_json(self._batch_path(batch["id"]), batch)
+
+    def _claim(self, batch_id: str) -> bool:
+        """
+        Take the owner lock of a batch. Fails while another worker (or task) runs
+        it; the lock is released when the owner finishes or its process exits.
+        """
+        if batch_id in self._owner_fds:
+            return False
+        if fcntl is None:
+            self._owner_fds[batch_id] = None
+            return True
+        fd = os.open(os.path.join(self.batches_dir, f"{batch_id}.lock"), os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            return False
+        self._owner_fds[batch_id] = fd
+        return True
+
+    def _release(self, batch_id: str):
+        fd = self._owner_fds.pop(batch_id, None)
+        if fd is not None:
+            os.close(fd)
+
+    def get_batch(self, batch_id: str) -> dict:
+        if batch_id in self._running:
+            return self._running[batch_id]
+        path = self._batch_path(os.path.basename(batch_id))
+        if not os.path.exists(path):
+            raise BatchError(f"No such batch: {batch_id}", 404)
+        with open(path, encoding="utf-8") as f:
+            batch = json.load(f)
+        # Cancelled through this worker while another one runs it
+        if batch["status"] in ("validating", "in_progress") and os.path.exists(self._cancel_marker_path(batch["id"])):
+            batch["status"] = "cancelling"
+        return batch
+
+    def list_batches(self, limit: int = 20, after: Optional[str] = None) -> dict:
+        if not os.path.isdir(self.batches_dir):
+            return {"object": "list", "data": [], "has_more": False}
+        batches = [self.get_batch(name[:-5]) for name in os.listdir(self.batches_dir) if name.endswith(".json")]
+        batches.sort(key=lambda batch: batch["created_at"], reverse=True)
+        if after is not None:
+            ids = [batch["id"] for batch in batches]
+            batches = batches[ids.index(after) + 1:] if after in ids else []
+        page = batches[:limit]
+        return {
+            "object": "list",
+            "data": page,
+            "first_id": page[0]["id"] if page else None,
+            "last_id": page[-1]["id"] if page else None,
+            "has_more": len(batches) > limit,
+        }
+
+    def create_batch(self, input_file_id: str, endpoint: str, completion_window: str = "24h",
+                     metadata: Optional[dict] = None) -> dict:
+        """
+        Create a batch over an uploaded file and start running it.
+
+        Returns:
+            OpenAI batch object
+        """
+        if endpoint not in SUPPORTED_ENDPOINTS:
+            raise BatchError(f"Unsupported endpoint {endpoint}; use one of {', '.join(SUPPORTED_ENDPOINTS)}")
+        # Store the checked ID, never the raw value, since it becomes part of a path
+        input_file_id = self.get_file(input_file_id)["id"]
+        now = int(time.time())
+        batch = {
+            "id": "batch_" + uuid.uuid4().hex,
+            "object": "batch",
+            "endpoint": endpoint,
+            "errors": None,
+            "input_file_id": input_file_id,
+            "completion_window": completion_window,
+            "status": "validating",
+            "output_file_id": None,
+            "error_file_id": None,
+            "created_at": now,
+            "in_progress_at": None,
+            "expires_at": now + 24 * 3600,
+            "finalizing_at": None,
+            "completed_at": None,
+            "failed_at": None,
+            "expired_at": None,
+            "cancelling_at": None,
+            "cancelled_at": None,
+            "request_counts": {"total": 0, "completed": 0, "failed": 0},
+            "metadata": metadata,
+        }
+        self._save(batch)
+        self._claim(batch["id"])
+        self._start(batch)
+        return batch
+
+    def cancel_batch(self, batch_id: str) -> dict:
+        batch = self.get_batch(batch_id)
+        if batch["status"] not in ("validating", "in_progress"):
+            raise BatchError(f"Cannot cancel a batch with status {batch['status']}", 409)
+        batch["status"] = "cancelling"
+        batch["cancelling_at"] = int(time.time())
+        task = self._tasks.get(batch["id"])
+        if task is not None:
+            self._save(batch)
+            task.cancel()
+        elif self._claim(batch["id"]):
+            self._finish_cancel(batch)
+            self._release(batch["id"])
+        else:
+            # Another worker runs it and would overwrite the status on its next save;
+            # the marker survives that and the owner finishes the cancel
+            open(self._cancel_marker_path(batch["id"]), "w").close()
+            self._save(batch)
+        return batch
+
+    def resume(self):
+        """Restart batches that are not running in any worker (after a restart or a worker exit)."""
+        if not os.path.isdir(self.batches_dir):
+            return
+        for name in os.listdir(self.batches_dir):
+            if not name.endswith(".json"):
+                continue
+            batch_id = name[:-5]
+            if batch_id in self._tasks:
+                continue
+            if self.get_batch(batch_id)["status"] not in _ACTIVE_STATUSES or not self._claim(batch_id):
+                continue
+            # Re-read under the lock: the previous owner may have finished it meanwhile
+            batch = self.get_batch(batch_id)
+            if batch["status"] not in _ACTIVE_STATUSES:
+                self._release(batch_id)
+                continue
+            if batch["status"] == "cancelling":
+                self._finish_cancel(batch)
+                self._release(batch_id)
+            else:
+                logging.info(f"Resuming batch {batch_id} ({batch['request_counts']['completed']} rows done)")
+                self._start(batch)
+
+    def start_resumer(self):
+        """Start the background task that resumes orphaned batches while this worker leads."""
+        if self._resumer is None or self._resumer.done():
+            self._resumer = asyncio.create_task(self._resume_loop())
+
+    async def _resume_loop(self):
+        while True:
+            # Only the leader scans; another worker takes over when it exits
+            if shared_state.try_lead():
+                try:
+                    self.resume()
+                except Exception as e:
+                    logging.error(f"Batch resume failed: {str(e)}")
+            await asyncio.sleep(_RESUME_POLL_SECONDS)
+
+    async def stop(self):
+        if self._resumer is not None:
+            self._resumer.cancel()
+            await asyncio.gather(self._resumer, return_exceptions=True)
+            self._resumer = None
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            # Batches stay in_progress on disk and resume on the next start
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def _start(self, batch: dict):
+        batch_id = batch["id"]
+        self._running[batch_id] = batch
+        task = asyncio.create_task(self._run(batch))
+        self._tasks[batch_id] = task
+
+        def forget(_):
+            self._tasks.pop(batch_id, None)
+            self._running.pop(batch_id, None)
+            self._progress_saved_at.pop(batch_id, None)
+            self._release(batch_id)
+
+        task.add_done_callback(forget)
+
+    def _finish_cancel(self, batch: dict):
+        batch["status"] = "cancelled"
+        batch["cancelled_at"] = int(time.time())
+        self._save(batch)
+        try:
+            os.remove(self._cancel_marker_path(batch["id"]))
+        except FileNotFoundError:
+            pass
+
+    def _cancel_requested(self, batch: dict) -> bool:
+        """Adopt a cancel another worker recorded for this batch. Returns True if it is cancelling."""
+        if batch["status"] != "cancelling" and os.path.exists(self._cancel_marker_path(batch["id"])):
+            batch["status"] = "cancelling"
+            batch["cancelling_at"] = batch["cancelling_at"] or int(time.time())
+        return batch["status"] == "cancelling"
+
+    async def _watch_cancel(self, batch: dict, task: asyncio.Task):
+        """Cancel a batch's task once a cancel marker shows up, even while its rows are stalled."""
+        while not self._cancel_requested(batch):
+            await asyncio.sleep(_CANCEL_POLL_SECONDS)
+        task.cancel()
+
+    async def _run(self, batch: dict):
+        watcher = asyncio.create_task(self._watch_cancel(batch, asyncio.current_task()))
+        try:
+            await self._process(batch)
+        except asyncio.CancelledError:
+            if self._cancel_requested(batch):
+                self._finish_cancel(batch)
+            else:
+                # Server shutdown: stays in_progress and resumes on the next start
+                self._save(batch)
+            raise
+        except Exception as e:
+            logging.error(f"Batch {batch['id']} failed: {str(e)}", exc_info=True)
+            batch["status"] = "failed"
+            batch["failed_at"] = int(time.time())
+            batch["errors"] = {"object": "list", "data": [{"code": "batch_failed", "message": str(e), "line": None}]}
+            self._save(batch)
+        finally:
+            watcher.cancel()
+
+    async def _process(self, batch: dict):
+        if batch["output_file_id"] is None:
+            batch["output_file_id"] = self._new_output_file(f"{batch['id']}_output.jsonl", "batch_output")["id"]
+            batch["error_file_id"] = self._new_output_file(f"{batch['id']}_error.jsonl", "batch_output")["id"]
+        output_path = self._file_path(batch["output_file_id"])
+        error_path = self._file_path(batch["error_file_id"])
+
+        # Checkpoint: rows already written are not sent again
+        done = set()
+        completed = failed = 0
+        for path in (output_path, error_path):
+            _truncate_partial_line(path)
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    row = json.loads(line)
+                    done.add(row["custom_id"])
+                    if path == output_path:
+                        completed += 1
+                    else:
+                        failed += 1
+
+        total, errors = self._validate(batch)
+        if errors:
+            batch["status"] = "failed"
+            batch["failed_at"] = int(time.time())
+            batch["errors"] = {"object": "list", "data": errors[:100]}
+            self._save(batch)
+            return
+
+        batch["status"] = "in_progress"
+        batch["in_progress_at"] = batch["in_progress_at"] or int(time.time())
+        batch["request_counts"] = {"total": total, "completed": completed, "failed": failed}
+        self._save_unless_cancelled(batch)
+
+        concurrency = max(1, BATCH_CONCURRENCY_PER_CREDENTIAL * max(1, len(credential_pool.accounts)))
+        slots = asyncio.Semaphore(concurrency)
+        pending = set()
+        with open(output_path, "a", encoding="utf-8") as output, open(error_path, "a", encoding="utf-8") as error_file:
+            async def run_row(row: dict):
+                try:
+                    ok, result = await self._execute(batch["endpoint"], row, batch["expires_at"])
+                    (output if ok else error_file).write(json.dumps(result) + "\n")
+                    (output if ok else error_file).flush()
+                    batch["request_counts"]["completed" if ok else "failed"] += 1
+                    self._save_progress(batch)
+                finally:
+                    slots.release()
+
+            try:
+                with open(self._file_path(batch["input_file_id"]), encoding="utf-8") as input_file:
+                    for line in input_file:
+                        if not line.strip():
+                            continue
+                        row = json.loads(line)
+                        if row["custom_id"] in done:
+                            continue
+                        await slots.acquire()
+                        task = asyncio.create_task(run_row(row))
+                        pending.add(task)
+                        task.add_done_callback(pending.discard)
+                    if pending:
+                        await asyncio.gather(*pending)
+            except BaseException:
+                for task in pending:
+                    task.cancel()
+                await asyncio.gather(*pending, return_exceptions=True)
+                raise
+
+        if self._cancel_requested(batch):
+            raise asyncio.CancelledError()
+        batch["status"] = "finalizing"
+        batch["finalizing_at"] = int(time.time())
+        self._save(batch)
+        batch["status"] = "completed"
+        batch["completed_at"] = int(time.time())
+        self._save(batch)
+        logging.info(f"Batch {batch['id']} completed: {batch['request_counts']}")
+
+    def _save_progress(self, batch: dict, interval: float = 1.0):
+        """Persist a batch's request counts at most once per interval."""
+        now = time.monotonic()
+        if now - self._progress_saved_at.get(batch["id"], 0.0) >= interval:
+            self._progress_saved_at[batch["id"]] = now
+            self._save_unless_cancelled(batch)
+
+    def _save_unless_cancelled(self, batch: dict):
+        """Save a running batch, or stop it instead if another worker cancelled it."""
+        if self._cancel_requested(batch):
+            raise asyncio.CancelledError()
+        self._save(batch)
+
+    def _validate(self, batch: dict):
+        """Check every input row before starting. Returns (row count, list of line errors)."""
+        total = 0
+        errors = []
+        seen = set()
+        with open(self._file_path(batch["input_file_id"]), encoding="utf-8") as input_file:
+            for line_number, line in enumerate(input_file, 1):
+                if not line.strip():
+                    continue
+                total += 1
+                try:
+                    row = json.loads(line)
+                except ValueError:
+                    errors.append({"code": "invalid_json_line", "message": "Line is not valid JSON", "line": line_number})
+                    continue
+                custom_id = row.get("custom_id") if isinstance(row, dict) else None
+                if not isinstance(custom_id, str) or custom_id in seen:
+                    errors.append({"code": "invalid_custom_id", "message": "custom_id must be a unique string", "line": line_number})
+                elif row.get("url", batch["endpoint"]) != batch["endpoint"]:
+                    errors.append({"code": "mismatched_url", "message": f"url must be {batch['endpoint']}", "line": line_number})
+                elif not isinstance(row.get("body"), dict):
+                    errors.append({"code": "invalid_body", "message": "body must be an object", "line": line_number})
+                seen.add(custom_id)
+        return total, errors
+
+    async def _execute(self, endpoint: str, row: dict, expires_at: float):
+        """
+        Run one row, retrying retryable failures with exponential backoff. While
+        every credential is cooling down after a 429, the row waits for the quota
+        to reset without using up its retries (until the batch expires).
+
+        Returns:
+            (succeeded, output/error row)
+        """
+        custom_id = row["custom_id"]
+        attempt = 0
+        while True:
+            try:
+                status_code, body = await self._send(endpoint, row["body"])
+            except Exception as e:
+                return False, self._result_row(custom_id, None, None, {"code": "invalid_request", "message": str(e)})
+            if status_code == 200:
+                return True, self._result_row(custom_id, status_code, body, None)
+            cooldown = credential_pool.seconds_until_available() if status_code == 429 else 0.0
+            if cooldown > 0 and time.time() + cooldown < expires_at:
+                logging.info(f"Batch row {custom_id} waiting {cooldown:.0f}s for credential quota")
+                await asyncio.sleep(cooldown)
+                continue
+            if status_code not in _RETRYABLE_STATUSES or attempt >= BATCH_MAX_RETRIES:
+                return False, self._result_row(custom_id, status_code, body, None)
+            delay = min(BATCH_RETRY_MAX_SECONDS, BATCH_RETRY_BASE_SECONDS * 2 ** attempt)
+            attempt += 1
+            logging.info(f"Batch row {custom_id} got {status_code}, retry {attempt}/{BATCH_MAX_RETRIES} in {delay:.1f}s")
+            await asyncio.sleep(delay * random.uniform(0.5, 1.0))
+
+    @staticmethod
+    def _result_row(custom_id: str, status_code: Optional[int], body, error: Optional[dict]) -> dict:
+        return {
+            "id": "batch_req_" + uuid.uuid4().hex,
+            "custom_id": custom_id,
+            "response": None if status_code is None else {
+                "status_code": status_code,
+                "request_id": uuid.uuid4().hex,
+                "body": body,
+            },
+            "error": error,
+        }
+
+    async def _send(self, endpoint: str, body: dict):
+        """Convert and send one request body. Returns (status code, response body in the endpoint's format)."""
+        body = dict(body, stream=False)
+        if endpoint == "/v1/messages":
+            gemini_request_data = claude_request_to_gemini(body)
+        else:
+            gemini_request_data = openai_request_to_gemini(OpenAIChatCompletionRequest(**body))
+        gemini_payload = build_gemini_payload_from_openai(gemini_request_data)
+
+        response = await send_gemini_request(gemini_payload, is_streaming=False, username=BATCH_USERNAME)
+        try:
+            data = json.loads(response.body)
+        except ValueError:
+            data = {"error": {"message": response.body.decode("utf-8", "ignore")}}
+        if response.status_code != 200:
+            return response.status_code, data
+        if endpoint == "/v1/messages":
+            return 200, gemini_response_to_claude(data, body.get("model"))
+        return 200, gemini_response_to_openai(data, body.get("model"))
+
+
+batch_manager = BatchManager(BATCH_DIR)
@@ -0,0 +1,129 @@
+"""
+Batch API Routes - OpenAI-compatible /v1/files and /v1/batches endpoints.
+Files are uploaded as multipart form data (as the OpenAI SDK does) or as a raw
+JSONL body; batches over them run in the background (see batch.py).
+"""
+import json
+import logging
+from email.parser import BytesParser
+from email.policy import HTTP
+from typing import Optional
+
+from fastapi import APIRouter, Request, Response, Depends
+from fastapi.responses import FileResponse
+
+from .auth import authenticate_user
+from .batch import batch_manager, BatchError
+
+router = APIRouter()
+
+
+def _error_response(message: str, status_code: int) -> Response:
+    return Response(
+        content=json.dumps({
+            "error": {
+                "message": message,
+                "type": "invalid_request_error",
+                "code": status_code
+            }
+        }),
+        status_code=status_code,
+        media_type="application/json"
+    )
+
+
+def _parse_multipart(content_type: str, body: bytes) -> dict:
+    """
+    Parse multipart/form-data with the standard library.
+
+    Returns:
+        {field name: (filename or None, content bytes)}
+    """
+    message = BytesParser(policy=HTTP).parsebytes(
+        b"Content-Type: " + content_type.encode("latin-1") + b"\r\n\r\n" + body
+    )
+    fields = {}
+    for part in message.iter_parts():
+        name = part.get_param("name", header="content-disposition")
+        if name:
+            fields[name] = (part.get_filename(), part.get_payload(decode=True) or b"")
+    return fields
+
+
+@router.post("/v1/files")
+async def create_file(request: Request, username: str = Depends(authenticate_user)):
+    """Upload a batch input file (JSONL, one request per line)."""
+    body = await request.body()
+    content_type = request.headers.get("content-type", "")
+    filename = "upload.jsonl"
+    purpose = request.query_params.get("purpose", "batch")
+    if content_type.startswith("multipart/form-data"):
+        fields = _parse_multipart(content_type, body)
+        if "file" not in fields:
+            return _error_response("Missing 'file' field", 400)
+        filename, body = fields["file"]
+        filename = filename or "upload.jsonl"
+        if "purpose" in fields:
+            purpose = fields["purpose"][1].decode("utf-8", "ignore")
+    if purpose != "batch":
+        return _error_response("Only files with purpose 'batch' are supported", 400)
+    file_object = batch_manager.create_file(body, filename, purpose)
+    logging.info(f"Stored batch input file {file_object['id']} ({len(body)} bytes) for {username}")
+    return file_object
+
+
+@router.get("/v1/files/{file_id}")
+async def get_file(file_id: str, username: str = Depends(authenticate_user)):
+    try:
+        return batch_manager.get_file(file_id)
+    except BatchError as e:
+        return _error_response(str(e), e.status_code)
+
+
+@router.get("/v1/files/{file_id}/content")
+async def get_file_content(file_id: str, username: str = Depends(authenticate_user)):
+    """Download a file; a running batch's output file holds the rows finished so far."""
+    try:
+        path = batch_manager.file_content_path(file_id)
+    except BatchError as e:
+        return _error_response(str(e), e.status_code)
+    return FileResponse(path, media_type="application/jsonl")
+
+
+@router.post("/v1/batches")
+async def create_batch(request: Request, username: str = Depends(authenticate_user)):
+    try:
+        data = json.loads(await request.body())
+        batch = batch_manager.create_batch(
+            data["input_file_id"],
+            data.get("endpoint", "/v1/chat/completions"),
+            data.get("completion_window", "24h"),
+            data.get("metadata")
+        )
+    except (ValueError, KeyError, TypeError) as e:
+        return _error_response(f"Invalid batch request: {str(e)}", 400)
+    except BatchError as e:
+        return _error_response(str(e), e.status_code)
+    logging.info(f"Created batch {batch['id']} over {batch['input_file_id']} for {username}")
+    return batch
+
+
+@router.get("/v1/batches")
+async def list_batches(limit: int = 20, after: Optional[str] = None, username: str = Depends(authenticate_user)):
+    return batch_manager.list_batches(limit, after)
+
+
+@router.get("/v1/batches/{batch_id}")
+async def get_batch(batch_id: str, username: str = Depends(authenticate_user)):
+    try:
+        return batch_manager.get_batch(batch_id)
+    except BatchError as e:
+        return _error_response(str(e), e.status_code)
+
+
+@router.post("/v1/batches/{batch_id}/cancel")
+async def cancel_batch(batch_id: str, username: str = Depends(authenticate_user)):
+    try:
+        return batch_manager.cancel_batch(batch_id)
+    except BatchError as e:
+        return _error_response(str(e), e.status_code)
@@ -1,335 +1,441 @@
-"""
-Claude API Transformers - Convert between Claude and Gemini formats.
-"""
-import uuid
-import logging
-from typing import Dict, Any, List
-
-
-def claude_request_to_gemini(claude_request: Dict[str, Any]) -> Dict[str, Any]:
-    """
-    Transform a Claude API request to Gemini format.
-
-    Claude format:
-    {
-        "model": "claude-3-5-sonnet-20241022",
-        "max_tokens": 1024,
-        "messages": [
-            {"role": "user", "content": "Hello"}
-        ],
-        "system": "You are a helpful assistant",
-        "temperature": 1.0,
-        "stream": false
-    }
-
-    Gemini format (via OpenAI compatibility):
-    {
-        "model": "gemini-2.5-pro",
-        "messages": [
-            {"role": "system", "content": "You are a helpful assistant"},
-            {"role": "user", "content": "Hello"}
-        ],
-        "max_tokens": 1024,
-        "temperature": 1.0,
-        "stream": false
-    }
-    """
-    try:
-        # Map Claude model to Gemini model
-        claude_model = claude_request.get('model', 'claude-3-5-sonnet-20241022')
-        gemini_model = _map_claude_model_to_gemini(claude_model)
-
-        # Convert messages
-        messages = []
-
-        # Add system message if present
-        if 'system' in claude_request:
-            system_content = claude_request['system']
-            if isinstance(system_content, str):
-                messages.append({
-                    "role": "system",
-                    "content": system_content
-                })
-            elif isinstance(system_content, list):
-                # Handle system message blocks
-                system_text = ""
-                for block in system_content:
-                    if block.get('type') == 'text':
-                        system_text += block.get('text', '')
-                if system_text:
-                    messages.append({
-                        "role": "system",
-                        "content": system_text
-                    })
-
-        # Convert Claude messages to OpenAI format
-        for msg in claude_request.get('messages', []):
-            role = msg.get('role')
-            content = msg.get('content')
-
-            # Handle content blocks
-            if isinstance(content, list):
-                # Claude uses content blocks
-                text_content = ""
-                for block in content:
-                    if block.get('type') == 'text':
-                        text_content += block.get('text', '')
-                    elif block.get('type') == 'image':
-                        # Handle image blocks if needed
-                        logging.warning("Image blocks in Claude messages are not yet fully supported")
-
-                # Only add message if there's actual content
-                if text_content.strip():
-                    messages.append({
-                        "role": role,
-                        "content": text_content
-                    })
-            else:
-                # Simple string content
-                if content and str(content).strip():
-                    messages.append({
-                        "role": role,
-                        "content": str(content)
-                    })
-
-        # Ensure we have at least one message
-        if not messages:
-            raise ValueError("At least one message is required")
-
-        # Build Gemini request
-        gemini_request = {
-            "model": gemini_model,
-            "messages": messages,
-            "stream": claude_request.get('stream', False)
-        }
-
-        # Map parameters
-        if 'max_tokens' in claude_request:
-            gemini_request['max_tokens'] = claude_request['max_tokens']
-
-        if 'temperature' in claude_request:
-            gemini_request['temperature'] = claude_request['temperature']
-
-        if 'top_p' in claude_request:
-            gemini_request['top_p'] = claude_request['top_p']
-
-        if 'top_k' in claude_request:
-            # Gemini supports top_k, OpenAI doesn't, but we can pass it through
-            gemini_request['top_k'] = claude_request['top_k']
-
-        if 'stop_sequences' in claude_request:
-            gemini_request['stop'] = claude_request['stop_sequences']
-
-        logging.debug(f"Transformed Claude request to Gemini format: {gemini_model}")
-        return gemini_request
-
-    except Exception as e:
-        logging.error(f"Error transforming Claude request: {str(e)}")
-        raise
-
-
-def gemini_response_to_claude(gemini_response: Dict[str, Any], model: str) -> Dict[str, Any]:
-    """
-    Transform a Gemini response to Claude format.
-
-    Gemini response (OpenAI format):
-    {
-        "id": "chatcmpl-...",
-        "object": "chat.completion",
-        "created": 1234567890,
-        "model": "gemini-2.5-pro",
-        "choices": [{
-            "index": 0,
-            "message": {
-                "role": "assistant",
-                "content": "Hello! How can I help you?"
-            },
-            "finish_reason": "stop"
-        }],
-        "usage": {
-            "prompt_tokens": 10,
-            "completion_tokens": 20,
-            "total_tokens": 30
-        }
-    }
-
-    Claude response:
-    {
-        "id": "msg_...",
-        "type": "message",
-        "role": "assistant",
-        "content": [
-            {
-                "type": "text",
-                "text": "Hello! How can I help you?"
-            }
-        ],
-        "model": "claude-3-5-sonnet-20241022",
-        "stop_reason": "end_turn",
-        "stop_sequence": null,
-        "usage": {
-            "input_tokens": 10,
-            "output_tokens": 20
-        }
-    }
-    """
-    try:
-        # Extract content from Gemini response
-        choices = gemini_response.get('choices', [])
-        if not choices:
-            raise ValueError("No choices in Gemini response")
-
-        first_choice = choices[0]
-        message = first_choice.get('message', {})
-        content_text = message.get('content', '')
-
-        # Map finish reason
-        finish_reason = first_choice.get('finish_reason', 'stop')
-        stop_reason = _map_finish_reason_to_claude(finish_reason)
-
-        # Extract usage
-        usage = gemini_response.get('usage', {})
-        input_tokens = usage.get('prompt_tokens', 0)
-        output_tokens = usage.get('completion_tokens', 0)
-
-        # Build Claude response
-        claude_response = {
-            "id": "msg_" + str(uuid.uuid4()).replace('-', '')[:29],
-            "type": "message",
-            "role": "assistant",
-            "content": [
-                {
-                    "type": "text",
-                    "text": content_text
-                }
-            ],
-            "model": model,
-            "stop_reason": stop_reason,
-            "stop_sequence": None,
-            "usage": {
-                "input_tokens": input_tokens,
-                "output_tokens": output_tokens
-            }
-        }
-
-        logging.debug(f"Transformed Gemini response to Claude format")
-        return claude_response
-
-    except Exception as e:
-        logging.error(f"Error transforming Gemini response: {str(e)}")
-        raise
-
-
-def gemini_stream_chunk_to_claude(gemini_chunk: Dict[str, Any], message_id: str) -> Dict[str, Any]:
-    """
-    Transform a Gemini streaming chunk to Claude format.
-
-    Gemini chunk (OpenAI format):
-    {
-        "id": "chatcmpl-...",
-        "object": "chat.completion.chunk",
-        "created": 1234567890,
-        "model": "gemini-2.5-pro",
-        "choices": [{
-            "index": 0,
-            "delta": {
-                "content": "Hello"
-            },
-            "finish_reason": null
-        }]
-    }
-
-    Claude chunk (content_block_delta event):
-    {
-        "type": "content_block_delta",
-        "index": 0,
-        "delta": {
-            "type": "text_delta",
-            "text": "Hello"
-        }
-    }
-    """
-    try:
-        choices = gemini_chunk.get('choices', [])
-        if not choices:
-            return None
-
-        first_choice = choices[0]
-        delta = first_choice.get('delta', {})
-        content = delta.get('content', '')
-
-        if not content:
-            return None
-
-        # Build Claude chunk
-        claude_chunk = {
-            "type": "content_block_delta",
-            "index": 0,
-            "delta": {
-                "type": "text_delta",
-                "text": content
-            }
-        }
-
-        return claude_chunk
-
-    except Exception as e:
-        logging.error(f"Error transforming Gemini chunk: {str(e)}")
-        return None
-
-
-def _map_claude_model_to_gemini(claude_model: str) -> str:
-    """
-    Map Claude model names to Gemini model names.
-    """
-    # Map Claude models to appropriate Gemini models
-    model_mapping = {
-        # Claude 3.5 Sonnet -> Gemini 2.5 Pro
-        'claude-3-5-sonnet-20241022': 'gemini-2.5-pro',
-        'claude-3-5-sonnet-20240620': 'gemini-2.5-pro',
-        'claude-3-5-sonnet': 'gemini-2.5-pro',
-
-        # Claude 3.5 Haiku -> Gemini 2.5 Flash
-        'claude-3-5-haiku-20241022': 'gemini-2.5-flash',
-        'claude-3-5-haiku': 'gemini-2.5-flash',
-
-        # Claude 3 Opus -> Gemini 2.5 Pro
-        'claude-3-opus-20240229': 'gemini-2.5-pro',
-        'claude-3-opus': 'gemini-2.5-pro',
-
-        # Claude 3 Sonnet -> Gemini 2.0 Flash
-        'claude-3-sonnet-20240229': 'gemini-2.0-flash',
-        'claude-3-sonnet': 'gemini-2.0-flash',
-
-        # Claude 3 Haiku -> Gemini 2.0 Flash Lite
-        'claude-3-haiku-20240307': 'gemini-2.0-flash-lite',
-        'claude-3-haiku': 'gemini-2.0-flash-lite',
-
-        # Claude 2 -> Gemini Flash
-        'claude-2.1': 'gemini-flash-latest',
-        'claude-2.0': 'gemini-flash-latest',
-        'claude-2': 'gemini-flash-latest',
-
-        # Claude Instant -> Gemini Flash Lite
-        'claude-instant-1.2': 'gemini-flash-lite-latest',
-        'claude-instant-1': 'gemini-flash-lite-latest',
-        'claude-instant': 'gemini-flash-lite-latest',
-    }
-
-    # Return mapped model or default to gemini-2.5-pro
-    return model_mapping.get(claude_model, 'gemini-2.5-pro')
-
-
-def _map_finish_reason_to_claude(finish_reason: str) -> str:
-    """
-    Map OpenAI finish reasons to Claude stop reasons.
-    """
-    reason_mapping = {
-        'stop': 'end_turn',
-        'length': 'max_tokens',
-        'content_filter': 'stop_sequence',
-        'function_call': 'end_turn',
-        'tool_calls': 'end_turn',
-    }
-
-    return reason_mapping.get(finish_reason, 'end_turn')
+"""
+Claude API Transformers - Convert between Anthropic Messages and Gemini formats.
+Requests are mapped straight to Gemini contents (text, images, documents,
+tool_use/tool_result and thinking blocks); responses are mapped straight from
+Gemini parts to Claude content blocks with usage taken from usageMetadata.
+"""
+import json
+import uuid
+import logging
+import mimetypes
+from typing import Dict, Any, List, Optional
+
+from .config import DEFAULT_SAFETY_SETTINGS, resolve_model, get_thinking_budget
+
+
+# Gemini finish reasons that mean the model declined to continue
+_REFUSAL_FINISH_REASONS = ("SAFETY", "RECITATION", "BLOCKLIST", "PROHIBITED_CONTENT", "SPII", "IMAGE_SAFETY")
+
+_TOOL_CHOICE_MODES = {"auto": "AUTO", "any": "ANY", "tool": "ANY", "none": "NONE"}
+
+
+def claude_request_to_gemini(claude_request: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Transform a Claude API request to a Gemini request.
+
+    Claude format:
+    {
+        "model": "claude-3-5-sonnet-20241022",
+        "max_tokens": 1024,
+        "system": "You are a helpful assistant",
+        "messages": [
+            {"role": "user", "content": "Hello"}
+        ],
+        "tools": [{"name": "get_weather", "input_schema": {...}}],
+        "thinking": {"type": "enabled", "budget_tokens": 2048}
+    }
+
+    Gemini format (as accepted by build_gemini_payload_from_openai):
+    {
+        "model": "gemini-2.5-pro",
+        "systemInstruction": {"parts": [{"text": "You are a helpful assistant"}]},
+        "contents": [
+            {"role": "user", "parts": [{"text": "Hello"}]}
+        ],
+        "tools": [{"functionDeclarations": [...]}],
+        "generationConfig": {"maxOutputTokens": 1024, "thinkingConfig": {...}},
+        "safetySettings": [...]
+    }
+    """
+    try:
+        claude_model = claude_request.get('model', 'claude-3-5-sonnet-20241022')
+        variant = resolve_model(_map_claude_model_to_gemini(claude_model))
+
+        contents = _claude_messages_to_contents(claude_request.get('messages', []))
+        if not contents:
+            raise ValueError("At least one message is required")
+
+        generation_config = {}
+        if 'max_tokens' in claude_request:
+            generation_config['maxOutputTokens'] = claude_request['max_tokens']
+        if 'temperature' in claude_request:
+            generation_config['temperature'] = claude_request['temperature']
+        if 'top_p' in claude_request:
+            generation_config['topP'] = claude_request['top_p']
+        if 'top_k' in claude_request:
+            generation_config['topK'] = claude_request['top_k']
+        if 'stop_sequences' in claude_request:
+            generation_config['stopSequences'] = claude_request['stop_sequences']
+
+        thinking_config = _thinking_config(claude_request.get('thinking'), variant)
+        if thinking_config is not None:
+            generation_config['thinkingConfig'] = thinking_config
+
+        gemini_request = {
+            "model": variant.base_model,
+            "contents": contents,
+            "generationConfig": generation_config,
+            "safetySettings": DEFAULT_SAFETY_SETTINGS,
+        }
+
+        system_text = _system_text(claude_request.get('system'))
+        if system_text:
+            gemini_request["systemInstruction"] = {"parts": [{"text": system_text}]}
+
+        tools = _claude_tools_to_gemini(claude_request.get('tools'))
+        if variant.tools:
+            tools.extend(variant.request_tools())
+        if tools:
+            gemini_request["tools"] = tools
+
+        tool_choice = claude_request.get('tool_choice')
+        if isinstance(tool_choice, dict) and tool_choice.get('type') in _TOOL_CHOICE_MODES:
+            calling_config = {"mode": _TOOL_CHOICE_MODES[tool_choice['type']]}
+            if tool_choice['type'] == 'tool' and tool_choice.get('name'):
+                calling_config["allowedFunctionNames"] = [tool_choice['name']]
+            gemini_request["toolConfig"] = {"functionCallingConfig": calling_config}
+
+        logging.debug(f"Transformed Claude request to Gemini format: {variant.base_model}")
+        return gemini_request
+
+    except Exception as e:
+        logging.error(f"Error transforming Claude request: {str(e)}")
+        raise
+
+
+def _system_text(system) -> str:
+    if isinstance(system, str):
+        return system
+    if isinstance(system, list):
+        return "".join(block.get('text', '') for block in system if block.get('type') == 'text')
+    return ""
+
+
+def _thinking_config(thinking, variant) -> Optional[dict]:
+    """Map the Claude "thinking" option onto the model variant's thinking defaults."""
+    if not variant.thinking_config:
+        return None
+    if isinstance(thinking, dict) and thinking.get('type') == 'enabled':
+        budget = thinking.get('budget_tokens')
+        return {
+            "thinkingBudget": budget if isinstance(budget, int) else variant.thinking_budget,
+            "includeThoughts": True
+        }
+    if isinstance(thinking, dict) and thinking.get('type') == 'disabled':
+        return {
+            "thinkingBudget": get_thinking_budget(variant.base_model + "-nothinking"),
+            "includeThoughts": False
+        }
+    if variant.thinking_budget is None:
+        return None
+    return {"thinkingBudget": variant.thinking_budget, "includeThoughts": variant.include_thoughts}
+
+
+def _claude_messages_to_contents(messages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Convert Claude messages to Gemini contents.
+
+    tool_result blocks only carry the tool_use id, so the function names of earlier
+    tool_use blocks are remembered to fill in functionResponse.name.
+    """
+    contents = []
+    tool_names = {}
+    for msg in messages:
+        role = "model" if msg.get('role') == 'assistant' else "user"
+        content = msg.get('content')
+        if not isinstance(content, list):
+            if content and str(content).strip():
+                contents.append({"role": role, "parts": [{"text": str(content)}]})
+            continue
+
+        parts = []
+        # Signature of a thinking block, carried to the part that follows it
+        signature = None
+        for block in content:
+            block_type = block.get('type')
+            part = None
+            if block_type == 'text':
+                if block.get('text'):
+                    part = {"text": block['text']}
+            elif block_type in ('image', 'document'):
+                part = _source_to_part(block.get('source') or {})
+            elif block_type == 'tool_use':
+                tool_names[block.get('id')] = block.get('name')
+                part = {"functionCall": {"name": block.get('name'), "args": block.get('input') or {}}}
+            elif block_type == 'tool_result':
+                name = tool_names.get(block.get('tool_use_id'), block.get('tool_use_id'))
+                result_text, result_parts = _tool_result_content(block.get('content'))
+                key = "error" if block.get('is_error') else "content"
+                parts.append({"functionResponse": {"name": name, "response": {key: result_text}}})
+                # Images returned by a tool follow its response
+                parts.extend(result_parts)
+                continue
+            elif block_type == 'thinking':
+                signature = block.get('signature') or None
+                if block.get('thinking'):
+                    parts.append({"text": block['thinking'], "thought": True})
+                continue
+            elif block_type == 'redacted_thinking':
+                continue
+            else:
+                logging.warning(f"Skipping unsupported Claude content block: {block_type}")
+
+            if part is None:
+                continue
+            if signature is not None:
+                part["thoughtSignature"] = signature
+                signature = None
+            parts.append(part)
+
+        if parts:
+            contents.append({"role": role, "parts": parts})
+    return contents
+
+
+def _source_to_part(source: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Convert an image/document source (base64 or URL) to an inlineData/fileData part."""
+    if source.get('type') == 'base64' and source.get('data'):
+        return {"inlineData": {"mimeType": source.get('media_type') or "image/png", "data": source['data']}}
+    if source.get('type') == 'url' and source.get('url'):
+        mime_type = source.get('media_type') or mimetypes.guess_type(source['url'])[0] or "image/jpeg"
+        return {"fileData": {"mimeType": mime_type, "fileUri": source['url']}}
+    if source.get('type') == 'text' and source.get('data'):
+        return {"text": source['data']}
+    logging.warning(f"Skipping unsupported Claude content source: {source.get('type')}")
+    return None
+
+
+def _tool_result_content(content):
+    """Split tool_result content into its text and any image parts."""
+    if content is None:
+        return "", []
+    if not isinstance(content, list):
+        return str(content), []
+    texts = []
+    parts = []
+    for block in content:
+        if block.get('type') == 'text':
+            texts.append(block.get('text', ''))
+        elif block.get('type') == 'image':
+            part = _source_to_part(block.get('source') or {})
+            if part is not None:
+                parts.append(part)
+    return "\n".join(texts), parts
+
+
+def _claude_tools_to_gemini(tools) -> List[Dict[str, Any]]:
+    """Convert Claude tool definitions to Gemini function declarations."""
+    if not tools:
+        return []
+    declarations = []
+    gemini_tools = []
+    for tool in tools:
+        tool_type = tool.get('type')
+        if tool_type and tool_type.startswith('web_search'):
+            # Anthropic's server-side web search maps onto Google Search grounding
+            gemini_tools.append({"googleSearch": {}})
+            continue
+        if 'input_schema' not in tool:
+            logging.warning(f"Skipping unsupported Claude tool: {tool.get('name') or tool_type}")
+            continue
+        declaration = {"name": tool.get('name'), "parametersJsonSchema": tool['input_schema']}
+        if tool.get('description'):
+            declaration["description"] = tool['description']
+        declarations.append(declaration)
+    if declarations:
+        gemini_tools.insert(0, {"functionDeclarations": declarations})
+    return gemini_tools
+
+
+def gemini_response_to_claude(gemini_response: Dict[str, Any], model: str) -> Dict[str, Any]:
+    """
+    Transform a Gemini response to Claude format.
+
+    Gemini response:
+    {
+        "candidates": [{
+            "content": {"role": "model", "parts": [{"text": "Hello!"}]},
+            "finishReason": "STOP"
+        }],
+        "usageMetadata": {"promptTokenCount": 10, "candidatesTokenCount": 20}
+    }
+
+    Claude response:
+    {
+        "id": "msg_...",
+        "type": "message",
+        "role": "assistant",
+        "content": [
+            {
+                "type": "text",
+                "text": "Hello!"
+            }
+        ],
+        "model": "claude-3-5-sonnet-20241022",
+        "stop_reason": "end_turn",
+        "stop_sequence": null,
+        "usage": {
+            "input_tokens": 10,
+            "output_tokens": 20
+        }
+    }
+    """
+    try:
+        candidates = gemini_response.get('candidates', [])
+        if not candidates:
+            raise ValueError("No candidates in Gemini response")
+
+        candidate = candidates[0]
+        content = []
+        for part in candidate.get('content', {}).get('parts', []):
+            if part.get('thought'):
+                block = {"type": "thinking", "thinking": part.get('text', ''), "signature": part.get('thoughtSignature', '')}
+                content.append(block)
+                continue
+            if part.get('thoughtSignature'):
+                # Signature of the preceding reasoning; attach it to the thinking block
+                if content and content[-1]["type"] == "thinking":
+                    content[-1]["signature"] = part['thoughtSignature']
+                else:
+                    content.append({"type": "thinking", "thinking": "", "signature": part['thoughtSignature']})
+            block = gemini_part_to_claude_block(part)
+            if block is None:
+                continue
+            if block["type"] == "text" and content and content[-1]["type"] == "text":
+                content[-1]["text"] += block["text"]
+            else:
+                content.append(block)
+
+        if not content:
+            content.append({"type": "text", "text": ""})
+
+        has_tool_use = any(block["type"] == "tool_use" for block in content)
+        claude_response = {
+            "id": new_message_id(),
+            "type": "message",
+            "role": "assistant",
+            "content": content,
+            "model": model,
+            "stop_reason": map_finish_reason_to_claude(candidate.get('finishReason'), has_tool_use),
+            "stop_sequence": None,
+            "usage": gemini_usage_to_claude(gemini_response.get('usageMetadata'))
+        }
+
+        logging.debug(f"Transformed Gemini response to Claude format")
+        return claude_response
+
+    except Exception as e:
+        logging.error(f"Error transforming Gemini response: {str(e)}")
+        raise
+
+
+def gemini_part_to_claude_block(part: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """
+    Convert a non-thought Gemini part to a Claude content block.
+
+    Returns:
+        A text or tool_use block, or None for parts Claude has no block for
+    """
+    if part.get('text') is not None:
+        return {"type": "text", "text": part['text']}
+    function_call = part.get('functionCall')
+    if function_call:
+        return {
+            "type": "tool_use",
+            "id": function_call.get('id') or "toolu_" + uuid.uuid4().hex[:24],
+            "name": function_call.get('name', ''),
+            "input": function_call.get('args') or {}
+        }
+    inline = part.get('inlineData')
+    if inline and inline.get('data'):
+        # Claude responses have no image block; embed as a Markdown data URI
+        mime = inline.get('mimeType') or "image/png"
+        if isinstance(mime, str) and mime.startswith("image/"):
+            return {"type": "text", "text": f"![image](data:{mime};base64,{inline['data']})"}
+    return None
+
+
+def gemini_usage_to_claude(usage_metadata: Optional[Dict[str, Any]]) -> Dict[str, int]:
+    """Map Gemini usageMetadata to Claude usage (thinking tokens count as output)."""
+    usage_metadata = usage_metadata or {}
+    cached = usage_metadata.get('cachedContentTokenCount', 0)
+    usage = {
+        "input_tokens": usage_metadata.get('promptTokenCount', 0) - cached,
+        "output_tokens": usage_metadata.get('candidatesTokenCount', 0) + usage_metadata.get('thoughtsTokenCount', 0)
+    }
+    if cached:
+        usage["cache_read_input_tokens"] = cached
+    return usage
+
+
+def map_finish_reason_to_claude(finish_reason: Optional[str], has_tool_use: bool = False) -> str:
+    """
+    Map Gemini finish reasons to Claude stop reasons.
+    """
+    if has_tool_use:
+        return 'tool_use'
+    if finish_reason == 'MAX_TOKENS':
+        return 'max_tokens'
+    if finish_reason in _REFUSAL_FINISH_REASONS:
+        return 'refusal'
+    return 'end_turn'
+
+
+def new_message_id() -> str:
+    return "msg_" + str(uuid.uuid4()).replace('-', '')[:29]
+
+
+def gemini_error_to_claude(body, status_code: int) -> Dict[str, Any]:
+    """Build a Claude error object from an upstream error body."""
+    message = f"API error: {status_code}"
+    try:
+        if isinstance(body, bytes):
+            body = body.decode('utf-8', "ignore")
+        error_data = json.loads(body)
+        if "error" in error_data:
+            message = error_data["error"].get("message", message)
+    except (json.JSONDecodeError, UnicodeDecodeError, AttributeError):
+        pass
+    return {"type": "error", "error": {"type": "api_error", "message": message}}
+
+
+def _map_claude_model_to_gemini(claude_model: str) -> str:
+    """
+    Map Claude model names to Gemini model names.
+    """
+    # Map Claude models to appropriate Gemini models
+    model_mapping = {
+        # Claude 3.5 Sonnet -> Gemini 2.5 Pro
+        'claude-3-5-sonnet-20241022': 'gemini-2.5-pro',
+        'claude-3-5-sonnet-20240620': 'gemini-2.5-pro',
+        'claude-3-5-sonnet': 'gemini-2.5-pro',
+
+        # Claude 3.5 Haiku -> Gemini 2.5 Flash
+        'claude-3-5-haiku-20241022': 'gemini-2.5-flash',
+        'claude-3-5-haiku': 'gemini-2.5-flash',
+
+        # Claude 3 Opus -> Gemini 2.5 Pro
+        'claude-3-opus-20240229': 'gemini-2.5-pro',
+        'claude-3-opus': 'gemini-2.5-pro',
+
+        # Claude 3 Sonnet -> Gemini 2.0 Flash
+        'claude-3-sonnet-20240229': 'gemini-2.0-flash',
+        'claude-3-sonnet': 'gemini-2.0-flash',
+
+        # Claude 3 Haiku -> Gemini 2.0 Flash Lite
+        'claude-3-haiku-20240307': 'gemini-2.0-flash-lite',
+        'claude-3-haiku': 'gemini-2.0-flash-lite',
+
+        # Claude 2 -> Gemini Flash
+        'claude-2.1': 'gemini-flash-latest',
+        'claude-2.0': 'gemini-flash-latest',
+        'claude-2': 'gemini-flash-latest',
+
+        # Claude Instant -> Gemini Flash Lite
+        'claude-instant-1.2': 'gemini-flash-lite-latest',
+        'claude-instant-1': 'gemini-flash-lite-latest',
+        'claude-instant': 'gemini-flash-lite-latest',
+    }
+
+    # Return mapped model or default to gemini-2.5-pro
+    return model_mapping.get(claude_model, 'gemini-2.5-pro')
@@ -3,6 +3,9 @@ Configuration constants for the Geminicli2api proxy server.
 Centralizes all configuration to avoid duplication across modules.
 """
 import os
+import copy
+import json
+from typing import NamedTuple, Optional
 
 # API Endpoints
 CODE_ASSIST_ENDPOINT = "https://cloudcode-pa.googleapis.com"
@@ -10,6 +13,14 @@ CODE_ASSIST_ENDPOINT = "https://cloudcode-pa.googleapis.com"
 # Client Configuration
 CLI_VERSION = "0.1.5"  # Match current gemini-cli version
 
+# Upstream HTTP connection pool (shared by all requests to CODE_ASSIST_ENDPOINT)
+HTTP2_ENABLED = os.getenv("HTTP2_ENABLED", "true").lower() in ("true", "1", "yes")
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "100"))
+HTTP_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("HTTP_MAX_KEEPALIVE_CONNECTIONS", "20"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "60"))
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "10"))
+HTTP_READ_TIMEOUT = float(os.getenv("HTTP_READ_TIMEOUT", "300"))
+
 # OAuth Configuration
 CLIENT_ID = os.getenv("GOOGLE_CLIENT_ID", "")
 CLIENT_SECRET = os.getenv("GOOGLE_CLIENT_SECRET", "")
@@ -23,6 +34,89 @@ SCOPES = [
 SCRIPT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 CREDENTIAL_FILE = os.path.join(SCRIPT_DIR, os.getenv("GOOGLE_APPLICATION_CREDENTIALS", "oauth_creds.json"))
 
+# Credential Pool
+# Directory of OAuth JSON files and/or a JSON array of credential objects.
+# When neither is set the single GEMINI_CREDENTIALS / CREDENTIAL_FILE credential is used.
+GEMINI_CREDENTIALS_DIR = os.getenv("GEMINI_CREDENTIALS_DIR", "")
+GEMINI_CREDENTIALS_LIST = os.getenv("GEMINI_CREDENTIALS_LIST", "")
+# Seconds an account is skipped after a 429 when the upstream gives no reset delay
+CREDENTIAL_COOLDOWN_SECONDS = float(os.getenv("CREDENTIAL_COOLDOWN_SECONDS", "60"))
+# Access tokens are renewed in the background this many seconds before they expire
+TOKEN_REFRESH_MARGIN_SECONDS = float(os.getenv("TOKEN_REFRESH_MARGIN_SECONDS", "300"))
+# Delay before retrying a failed background refresh
+TOKEN_REFRESH_RETRY_SECONDS = float(os.getenv("TOKEN_REFRESH_RETRY_SECONDS", "30"))
+
+# Adaptive concurrency: per-account AIMD limit on in-flight upstream requests
+ADAPTIVE_CONCURRENCY_ENABLED = os.getenv("ADAPTIVE_CONCURRENCY_ENABLED", "true").lower() in ("true", "1", "yes")
+ADAPTIVE_CONCURRENCY_INITIAL = float(os.getenv("ADAPTIVE_CONCURRENCY_INITIAL", "16"))
+ADAPTIVE_CONCURRENCY_MIN = float(os.getenv("ADAPTIVE_CONCURRENCY_MIN", "1"))
+ADAPTIVE_CONCURRENCY_MAX = float(os.getenv("ADAPTIVE_CONCURRENCY_MAX", "128"))
+# Factor the limit is multiplied by after a 429
+ADAPTIVE_CONCURRENCY_DECREASE = float(os.getenv("ADAPTIVE_CONCURRENCY_DECREASE", "0.5"))
+# Requests waiting for a free slot, shared fairly between authenticated users
+ADMISSION_QUEUE_MAX = int(os.getenv("ADMISSION_QUEUE_MAX", "1000"))
+ADMISSION_QUEUE_TIMEOUT_SECONDS = float(os.getenv("ADMISSION_QUEUE_TIMEOUT_SECONDS", "60"))
+# Relative queue shares per username, e.g. "alice:2,bob:1" (others get 1)
+ADMISSION_USER_WEIGHTS = os.getenv("ADMISSION_USER_WEIGHTS", "")
+
+# Streaming
+# Send OpenAI/Claude stream headers at once instead of after the upstream answers
+STREAM_EARLY_HEADERS = os.getenv("STREAM_EARLY_HEADERS", "true").lower() in ("true", "1", "yes")
+# Seconds without upstream output before a keep-alive frame is sent (0 disables)
+STREAM_HEARTBEAT_SECONDS = float(os.getenv("STREAM_HEARTBEAT_SECONDS", "15"))
+
+# Multi-Worker Mode
+# Directory where worker processes share credential state (run.py sets it when WORKERS > 1)
+SHARED_STATE_DIR = os.getenv("SHARED_STATE_DIR", "")
+# How often workers that are not the refresh leader pick up shared tokens and retry leadership
+SHARED_STATE_SYNC_SECONDS = float(os.getenv("SHARED_STATE_SYNC_SECONDS", "15"))
+
+# Batch API
+# Uploaded files, batch objects and result files are kept here
+BATCH_DIR = os.getenv("BATCH_DIR", os.path.join(SCRIPT_DIR, "batches"))
+# Rows of a batch in flight at once, per pooled credential
+BATCH_CONCURRENCY_PER_CREDENTIAL = int(os.getenv("BATCH_CONCURRENCY_PER_CREDENTIAL", "4"))
+BATCH_MAX_RETRIES = int(os.getenv("BATCH_MAX_RETRIES", "5"))
+# Retry delay doubles from the base up to the max
+BATCH_RETRY_BASE_SECONDS = float(os.getenv("BATCH_RETRY_BASE_SECONDS", "2"))
+BATCH_RETRY_MAX_SECONDS = float(os.getenv("BATCH_RETRY_MAX_SECONDS", "60"))
+
+# Token Counting
+# Count tokens for the count endpoints with upstream countTokens (local estimate otherwise)
+TOKEN_COUNT_UPSTREAM = os.getenv("TOKEN_COUNT_UPSTREAM", "true").lower() in ("true", "1", "yes")
+# Per-content token counts kept so growing conversations only count new turns
+TOKEN_COUNT_CACHE_MAX_ENTRIES = int(os.getenv("TOKEN_COUNT_CACHE_MAX_ENTRIES", "10000"))
+
+# Metrics
+# Serve Prometheus metrics on /metrics and record per-request metrics
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() in ("true", "1", "yes")
+
+# Request Conversion
+# Characters of converted OpenAI messages kept for reuse on later turns (0 disables)
+TRANSFORM_CACHE_MAX_CHARS = int(os.getenv("TRANSFORM_CACHE_MAX_CHARS", str(64 * 1024 * 1024)))
+
+# Response Cache (opt-in, only for temperature 0 requests)
+RESPONSE_CACHE_ENABLED = os.getenv("RESPONSE_CACHE_ENABLED", "false").lower() in ("true", "1", "yes")
+RESPONSE_CACHE_TTL_SECONDS = float(os.getenv("RESPONSE_CACHE_TTL_SECONDS", "300"))
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "1000"))
+RESPONSE_CACHE_MAX_BYTES = int(os.getenv("RESPONSE_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+
+# Request Coalescing (opt-in): concurrent identical deterministic requests share one upstream call
+REQUEST_COALESCING_ENABLED = os.getenv("REQUEST_COALESCING_ENABLED", "false").lower() in ("true", "1", "yes")
+# Events a shared stream may run ahead of its slowest subscriber
+REQUEST_COALESCING_BUFFER_EVENTS = int(os.getenv("REQUEST_COALESCING_BUFFER_EVENTS", "256"))
+
+# Context Cache (opt-in): upstream cachedContents for large repeated prompt prefixes
+CONTEXT_CACHE_ENABLED = os.getenv("CONTEXT_CACHE_ENABLED", "false").lower() in ("true", "1", "yes")
+CONTEXT_CACHE_ENDPOINT = os.getenv("CONTEXT_CACHE_ENDPOINT", "https://generativelanguage.googleapis.com/v1beta/cachedContents")
+# Smallest prefix (serialized characters) worth caching, and how often it must repeat first
+CONTEXT_CACHE_MIN_CHARS = int(os.getenv("CONTEXT_CACHE_MIN_CHARS", "32768"))
+CONTEXT_CACHE_MIN_HITS = int(os.getenv("CONTEXT_CACHE_MIN_HITS", "2"))
+CONTEXT_CACHE_TTL_SECONDS = float(os.getenv("CONTEXT_CACHE_TTL_SECONDS", "3600"))
+CONTEXT_CACHE_MAX_ENTRIES = int(os.getenv("CONTEXT_CACHE_MAX_ENTRIES", "256"))
+# Pause before trying to create caches again for an account after a failure
+CONTEXT_CACHE_RETRY_SECONDS = float(os.getenv("CONTEXT_CACHE_RETRY_SECONDS", "600"))
+
 # Authentication
 GEMINI_AUTH_PASSWORD = os.getenv("GEMINI_AUTH_PASSWORD", "123456")
 
@@ -341,3 +435,104 @@ def should_include_thoughts(model_name):
     else:
         # For all other modes, include thoughts
         return True
+
+
+# Resolved settings for one exposed model name
+class ModelVariant(NamedTuple):
+    name: str
+    base_model: str  # Model name sent to the API
+    search: bool
+    nothinking: bool
+    maxthinking: bool
+    thinking_config: bool  # False for models that reject a thinkingConfig
+    thinking_budget: Optional[int]
+    include_thoughts: bool
+    tools: tuple  # Tools injected into every request for this variant
+
+    def request_tools(self) -> list:
+        """Fresh copies of the variant's tools, safe for a request to modify."""
+        return copy.deepcopy(list(self.tools))
+
+
+def _build_model_variant(model_name):
+    search = is_search_model(model_name)
+    return ModelVariant(
+        name=model_name,
+        base_model=get_base_model_name(model_name),
+        search=search,
+        nothinking=is_nothinking_model(model_name),
+        maxthinking=is_maxthinking_model(model_name),
+        thinking_config="gemini-2.5-flash-image" not in model_name,
+        thinking_budget=get_thinking_budget(model_name),
+        include_thoughts=should_include_thoughts(model_name),
+        tools=({"googleSearch": {}},) if search else ()
+    )
+
+
+def _build_model_variant_table():
+    """Resolve every exposed model name, with and without the "models/" prefix."""
+    table = {}
+    for model in SUPPORTED_MODELS:
+        for name in (model["name"], model["name"].replace("models/", "")):
+            table[name] = _build_model_variant(name)
+    return table
+
+
+MODEL_VARIANTS = _build_model_variant_table()
+# Unlisted names clients send are resolved on demand and remembered up to this many
+_MAX_MODEL_VARIANTS = len(MODEL_VARIANTS) + 256
+
+
+def resolve_model(model_name):
+    """
+    Look up the settings for a model name.
+
+    Args:
+        model_name: Model name from the request, with or without "models/"
+
+    Returns:
+        ModelVariant
+    """
+    variant = MODEL_VARIANTS.get(model_name)
+    if variant is None:
+        variant = _build_model_variant(model_name)
+        if len(MODEL_VARIANTS) < _MAX_MODEL_VARIANTS:
+            MODEL_VARIANTS[model_name] = variant
+    return variant
+
+
+def _openai_model_entry(model):
+    # Remove "models/" prefix for OpenAI compatibility
+    model_id = model["name"].replace("models/", "")
+    return {
+        "id": model_id,
+        "object": "model",
+        "created": 1677610602,  # Static timestamp
+        "owned_by": "google",
+        "permission": [
+            {
+                "id": "modelperm-" + model_id.replace("/", "-"),
+                "object": "model_permission",
+                "created": 1677610602,
+                "allow_create_engine": False,
+                "allow_sampling": True,
+                "allow_logprobs": False,
+                "allow_search_indices": False,
+                "allow_view": True,
+                "allow_fine_tuning": False,
+                "organization": "*",
+                "group": None,
+                "is_blocking": False
+            }
+        ],
+        "root": model_id,
+        "parent": None
+    }
+
+
+# Model list responses, serialized once
+GEMINI_MODELS_RESPONSE = json.dumps({"models": SUPPORTED_MODELS}).encode("utf-8")
+OPENAI_MODELS_RESPONSE = json.dumps({
+    "object": "list",
+    "data": [_openai_model_entry(model) for model in SUPPORTED_MODELS]
+}).encode("utf-8")
@@ -0,0 +1,241 @@
+"""
+Context Cache - Proxy-managed Gemini context caching (cachedContent).
+Each request is fingerprinted as a hash chain over its systemInstruction/tools and
+every leading content. Once a large prefix has been seen in several requests, an
+upstream cached content is created for it and later requests starting with that
+prefix are rewritten to reference the cache and send only the remaining contents.
+Caches belong to a project, so entries are kept per pooled account.
+"""
+import json
+import time
+import asyncio
+import hashlib
+import logging
+from collections import OrderedDict
+from typing import Optional
+
+import httpx
+
+from .http_client import get_http_client
+from .utils import get_user_agent
+from .config import (
+    CONTEXT_CACHE_ENABLED,
+    CONTEXT_CACHE_ENDPOINT,
+    CONTEXT_CACHE_MIN_CHARS,
+    CONTEXT_CACHE_MIN_HITS,
+    CONTEXT_CACHE_TTL_SECONDS,
+    CONTEXT_CACHE_MAX_ENTRIES,
+    CONTEXT_CACHE_RETRY_SECONDS
+)
+
+# Request fields that move into the cached content; Gemini rejects requests that
+# set them alongside cachedContent
+_CACHED_FIELDS = ("systemInstruction", "tools", "toolConfig")
+# Stop using a cache this long before its upstream expiry
+_EXPIRY_MARGIN_SECONDS = 60
+_MAX_TRACKED_PREFIXES = 4096
+
+
+class CachedPrefix:
+    """An upstream cached content holding the first `length` contents of a request."""
+
+    __slots__ = ("name", "key", "length", "chars", "expires_at")
+
+    def __init__(self, name: str, key: tuple, length: int, chars: int, expires_at: float):
+        self.name = name
+        self.key = key
+        self.length = length
+        self.chars = chars
+        self.expires_at = expires_at
+
+
+def _prefix_chain(request: dict) -> list:
+    """
+    Fingerprint every cacheable prefix of a request.
+
+    Returns:
+        List of (digest, serialized chars) where item i covers the cached fields
+        plus the first i contents. The last content (the new turn) is never included.
+    """
+    head = {field: request[field] for field in _CACHED_FIELDS if field in request}
+    encoded = json.dumps(head, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    digest = hashlib.sha256(encoded.encode("utf-8"))
+    chars = len(encoded)
+    chain = [(digest.hexdigest(), chars)]
+    for content in request.get("contents", [])[:-1]:
+        encoded = json.dumps(content, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+        digest.update(b"\n")
+        digest.update(encoded.encode("utf-8"))
+        chars += len(encoded)
+        chain.append((digest.hexdigest(), chars))
+    return chain
+
+
+class ContextCacheManager:
+    """Detects stable request prefixes and maintains upstream cached contents for them."""
+
+    def __init__(self, enabled: bool, endpoint: str, min_chars: int, min_hits: int,
+                 ttl: float, max_entries: int, retry_seconds: float):
+        self.enabled = enabled
+        self.endpoint = endpoint
+        self.min_chars = min_chars
+        self.min_hits = min_hits
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.retry_seconds = retry_seconds
+        self.hits = 0
+        self.chars_saved = 0
+        self.created = 0
+        self.create_failures = 0
+        self.invalidated = 0
+        self._entries = OrderedDict()  # (account, model, digest) -> CachedPrefix
+        self._seen = OrderedDict()  # (model, digest) -> requests seen with this prefix
+        self._pending = {}  # (account, model, digest) -> creation task
+        self._disabled_until = {}  # account name -> time cache creation may be retried
+
+    async def apply(self, account, model: str, request: dict):
+        """
+        Rewrite a request to reference the longest live cached prefix, and schedule
+        creation of a cache for a newly stable prefix.
+
+        Args:
+            account: The pooled account the request is sent with (project already resolved)
+            model: Base model name
+            request: The Gemini "request" object; it is not modified
+
+        Returns:
+            (request to send, CachedPrefix used or None)
+        """
+        if not self.enabled or not isinstance(request, dict) or request.get("cachedContent") or not request.get("contents"):
+            return request, None
+        chain = _prefix_chain(request)
+        if chain[-1][1] < self.min_chars:
+            return request, None
+
+        now = time.monotonic()
+        best = None
+        for length in range(len(chain) - 1, -1, -1):
+            key = (account.name, model, chain[length][0])
+            entry = self._entries.get(key)
+            if entry is None:
+                continue
+            if entry.expires_at > now:
+                self._entries.move_to_end(key)
+                best = entry
+                break
+            del self._entries[key]
+
+        self._observe(account, model, request, chain, best, now)
+
+        if best is None:
+            return request, None
+        rewritten = {field: value for field, value in request.items() if field not in _CACHED_FIELDS}
+        rewritten["contents"] = request["contents"][best.length:]
+        rewritten["cachedContent"] = best.name
+        self.hits += 1
+        self.chars_saved += best.chars
+        return rewritten, best
+
+    def invalidate(self, account, entry: CachedPrefix):
+        """
+        Forget a cached content the upstream rejected. The prefix has to become
+        stable again and the account makes no new caches for CONTEXT_CACHE_RETRY_SECONDS,
+        so a cache the upstream does not accept is not recreated on the next request.
+        """
+        _, model, digest = entry.key
+        self._seen.pop((model, digest), None)
+        self._disabled_until[account.name] = time.monotonic() + self.retry_seconds
+        if self._entries.get(entry.key) is entry:
+            del self._entries[entry.key]
+            self.invalidated += 1
+            logging.info(f"Context cache {entry.name} invalidated, no new caches for {account.name} "
+                         f"for {self.retry_seconds:.0f}s")
+
+    def _observe(self, account, model: str, request: dict, chain: list, best: Optional[CachedPrefix], now: float):
+        """Count prefix sightings and start creating a cache for the longest stable one."""
+        stable = None
+        for length, (digest, chars) in enumerate(chain):
+            seen_key = (model, digest)
+            count = self._seen.pop(seen_key, 0) + 1
+            self._seen[seen_key] = count
+            if count >= self.min_hits and chars >= self.min_chars:
+                stable = length
+        while len(self._seen) > _MAX_TRACKED_PREFIXES:
+            self._seen.popitem(last=False)
+
+        if stable is None or now < self._disabled_until.get(account.name, 0.0):
+            return
+        digest, chars = chain[stable]
+        # Only worth another cache when it covers substantially more than the current one
+        if best is not None and chars - best.chars < self.min_chars:
+            return
+        key = (account.name, model, digest)
+        if key in self._entries or key in self._pending:
+            return
+        task = asyncio.create_task(self._create(account, model, request, stable, key, chars))
+        self._pending[key] = task
+        task.add_done_callback(lambda _: self._pending.pop(key, None))
+
+    async def _create(self, account, model: str, request: dict, length: int, key: tuple, chars: int):
+        body = {field: request[field] for field in _CACHED_FIELDS if field in request}
+        body["model"] = f"models/{model}"
+        if length:
+            body["contents"] = request["contents"][:length]
+        body["ttl"] = f"{int(self.ttl)}s"
+        headers = {
+            "Authorization": f"Bearer {account.creds.token}",
+            "Content-Type": "application/json",
+            "User-Agent": get_user_agent(),
+        }
+        if account.project_id:
+            headers["x-goog-user-project"] = account.project_id
+
+        try:
+            resp = await get_http_client().post(self.endpoint, content=json.dumps(body), headers=headers)
+        except httpx.HTTPError as e:
+            self._creation_failed(account, f"request failed: {str(e)}")
+            return
+        if resp.status_code != 200:
+            self._creation_failed(account, f"status {resp.status_code}: {resp.text[:200]}")
+            return
+        try:
+            name = resp.json()["name"]
+        except (ValueError, KeyError, TypeError):
+            self._creation_failed(account, "response has no cache name")
+            return
+
+        self._entries[key] = CachedPrefix(name, key, length, chars,
+                                          time.monotonic() + self.ttl - _EXPIRY_MARGIN_SECONDS)
+        self.created += 1
+        # Evicted caches simply expire upstream after their TTL
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        logging.info(f"Created context cache {name} for {model} ({chars} chars, {length} contents) on {account.name}")
+
+    def _creation_failed(self, account, reason: str):
+        self.create_failures += 1
+        self._disabled_until[account.name] = time.monotonic() + self.retry_seconds
+        logging.warning(f"Context cache creation failed for {account.name}, "
+                        f"retrying in {self.retry_seconds:.0f}s: {reason}")
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "chars_saved": self.chars_saved,
+            "created": self.created,
+            "create_failures": self.create_failures,
+            "invalidated": self.invalidated,
+        }
+
+
+context_cache = ContextCacheManager(
+    CONTEXT_CACHE_ENABLED,
+    CONTEXT_CACHE_ENDPOINT,
+    CONTEXT_CACHE_MIN_CHARS,
+    CONTEXT_CACHE_MIN_HITS,
+    CONTEXT_CACHE_TTL_SECONDS,
+    CONTEXT_CACHE_MAX_ENTRIES,
+    CONTEXT_CACHE_RETRY_SECONDS
+)
@@ -0,0 +1,713 @@
+"""
+Credential Pool - Spreads upstream requests across several Google accounts.
+Each account keeps its own token, project ID and onboarding state. Accounts are
+picked least-loaded first (round-robin among ties) and skipped while cooling
+down after a 429 RESOURCE_EXHAUSTED.
+
+Project IDs and onboarding are resolved once per account (at startup or first
+use) and kept in memory, so the request path does no file I/O and no setup
+HTTP calls. They are only re-resolved after the upstream rejects the account.
+Access tokens are renewed by a background task ahead of expiry, so requests
+find a valid token in memory.
+
+Each account also has an adaptive (AIMD) limit on concurrent upstream requests:
+it grows slowly while requests succeed and is cut on 429. Requests that find
+every account at its limit wait in a bounded queue that is shared fairly between
+authenticated users.
+
+When several worker processes serve the same accounts, tokens, project IDs and
+onboarding are shared between them through shared_state, and only the leader
+worker renews tokens in the background.
+"""
+import os
+import re
+import json
+import time
+import heapq
+import asyncio
+import logging
+import itertools
+from datetime import datetime, timezone
+from typing import List, Optional
+
+from google.auth.transport.requests import Request as GoogleAuthRequest
+
+from . import auth
+from .auth import credentials_from_info, save_credentials, get_user_project_id, onboard_user
+from .config import (
+    CREDENTIAL_FILE,
+    GEMINI_CREDENTIALS_DIR,
+    GEMINI_CREDENTIALS_LIST,
+    CREDENTIAL_COOLDOWN_SECONDS,
+    TOKEN_REFRESH_MARGIN_SECONDS,
+    TOKEN_REFRESH_RETRY_SECONDS,
+    ADAPTIVE_CONCURRENCY_ENABLED,
+    ADAPTIVE_CONCURRENCY_INITIAL,
+    ADAPTIVE_CONCURRENCY_MIN,
+    ADAPTIVE_CONCURRENCY_MAX,
+    ADAPTIVE_CONCURRENCY_DECREASE,
+    ADMISSION_QUEUE_MAX,
+    ADMISSION_QUEUE_TIMEOUT_SECONDS,
+    ADMISSION_USER_WEIGHTS,
+    SHARED_STATE_SYNC_SECONDS
+)
+from .metrics import (
+    registry,
+    CallbackGauge,
+    CREDENTIAL_REFRESHES,
+    STAGE_ADMISSION_WAIT,
+    STAGE_CREDENTIAL_REFRESH
+)
+from .shared_state import shared_state
+
+_RETRY_DELAY_RE = re.compile(r"^(\d+(?:\.\d+)?)(ms|s)$")
+_RESET_AFTER_RE = re.compile(r"reset after (\d+(?:\.\d+)?)s")
+
+
+class CredentialAccount:
+    """One Google account and its cached setup state."""
+
+    def __init__(self, name: str, creds, project_id: Optional[str] = None,
+                 path: Optional[str] = None, legacy: bool = False):
+        self.name = name
+        self.creds = creds
+        self.project_id = project_id
+        self.path = path  # File refreshed tokens are written back to, None for env credentials
+        self.legacy = legacy  # The single GEMINI_CREDENTIALS / CREDENTIAL_FILE credential
+        self.persisted_project_id = project_id  # Project ID currently stored on disk
+        self.onboarded = False
+        self.force_refresh = False
+        self.in_flight = 0
+        self.concurrency_limit = ADAPTIVE_CONCURRENCY_INITIAL
+        self.limit_epoch = 0  # Bumped on every decrease
+        self.cooldown_until = 0.0
+        self.retry_refresh_at = 0.0
+        self.invalidated_at = 0.0  # Wall-clock time of the last invalidate(), for shared setup state
+        self.setup_lock = asyncio.Lock()
+        self._refresh_task = None
+
+    def available(self, now: float) -> bool:
+        return now >= self.cooldown_until
+
+    def has_capacity(self) -> bool:
+        return not ADAPTIVE_CONCURRENCY_ENABLED or self.in_flight < int(self.concurrency_limit)
+
+    def load(self) -> float:
+        if not ADAPTIVE_CONCURRENCY_ENABLED:
+            return self.in_flight
+        return self.in_flight / self.concurrency_limit
+
+    def record_success(self):
+        """Additive increase: about one more slot per limit's worth of successes while the limit is in use."""
+        if self.in_flight * 2 >= self.concurrency_limit:
+            self.concurrency_limit = min(ADAPTIVE_CONCURRENCY_MAX, self.concurrency_limit + 1 / self.concurrency_limit)
+
+    def record_overload(self, epoch: int):
+        """
+        Multiplicative decrease after a 429. Requests sent before the last decrease
+        (an older epoch) do not shrink the limit again for the same overload.
+        """
+        if epoch != self.limit_epoch:
+            return
+        self.concurrency_limit = max(ADAPTIVE_CONCURRENCY_MIN, self.concurrency_limit * ADAPTIVE_CONCURRENCY_DECREASE)
+        self.limit_epoch += 1
+        logging.info(f"Credential {self.name} concurrency limit lowered to {self.concurrency_limit:.1f}")
+
+    async def persist(self):
+        """Write the current token and project ID back to this account's file, if any."""
+        if self.legacy:
+            await asyncio.to_thread(save_credentials, self.creds, self.project_id)
+        elif self.path:
+            await asyncio.to_thread(save_credentials, self.creds, self.project_id, self.path)
+        self.persisted_project_id = self.project_id
+
+    def token_valid(self) -> bool:
+        return bool(self.creds.token) and not self.creds.expired and not self.force_refresh
+
+    def seconds_until_refresh(self) -> float:
+        """Seconds until the background refresher should renew this token."""
+        if not self.creds.refresh_token:
+            return float("inf")
+        retry_in = self.retry_refresh_at - time.monotonic()
+        if retry_in > 0:
+            return retry_in
+        if self.force_refresh or not self.creds.token:
+            return 0.0
+        if self.creds.expiry is None:
+            return float("inf")
+        # google-auth keeps expiry as a naive UTC datetime
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+        return (self.creds.expiry - now).total_seconds() - TOKEN_REFRESH_MARGIN_SECONDS
+
+    async def ensure_token(self):
+        """Refresh the access token if it is missing or expired."""
+        if self.token_valid():
+            return
+        if not self.creds.refresh_token:
+            raise Exception(f"Credential {self.name} has no valid token and no refresh token")
+        await self.refresh()
+
+    async def refresh(self):
+        """Refresh the access token; concurrent callers share one in-flight refresh."""
+        if self._refresh_task is None or self._refresh_task.done():
+            self._refresh_task = asyncio.create_task(self._refresh())
+        # Shielded so a cancelled request does not abort the refresh other callers wait on
+        await asyncio.shield(self._refresh_task)
+
+    async def _refresh(self):
+        if not shared_state.enabled:
+            await self._refresh_upstream()
+            _spawn(self._persist_quietly())
+            return
+        # Another worker may have refreshed while this one waited for the lock
+        async with shared_state.locked(self.name):
+            if self.adopt_token(await asyncio.to_thread(shared_state.read, self.name)):
+                return
+            await self._refresh_upstream()
+            await self._persist_quietly()
+            await asyncio.to_thread(shared_state.update, self.name, {
+                "token": self.creds.token,
+                "expiry": self.creds.expiry.isoformat() if self.creds.expiry else None,
+            })
+
+    async def _refresh_upstream(self):
+        logging.info(f"Refreshing access token for credential {self.name}")
+        started = time.perf_counter()
+        try:
+            await asyncio.to_thread(self.creds.refresh, GoogleAuthRequest())
+        except Exception:
+            CREDENTIAL_REFRESHES.labels(self.name, "error").inc()
+            raise
+        STAGE_CREDENTIAL_REFRESH.observe(time.perf_counter() - started)
+        CREDENTIAL_REFRESHES.labels(self.name, "ok").inc()
+        self.force_refresh = False
+        self.retry_refresh_at = 0.0
+
+    def adopt_token(self, state: Optional[dict]) -> bool:
+        """
+        Take the access token another worker published if it differs from this
+        one's and is not yet expired.
+
+        Returns:
+            Whether the token was adopted
+        """
+        if not state or not state.get("token") or state["token"] == self.creds.token or not state.get("expiry"):
+            return False
+        expiry = datetime.fromisoformat(state["expiry"])
+        if expiry <= datetime.now(timezone.utc).replace(tzinfo=None):
+            return False
+        if self.token_valid() and self.creds.expiry is not None and expiry <= self.creds.expiry:
+            return False
+        self.creds.token = state["token"]
+        self.creds.expiry = expiry
+        self.force_refresh = False
+        self.retry_refresh_at = 0.0
+        shared_state.adopted += 1
+        logging.info(f"Credential {self.name} adopted an access token refreshed by another worker")
+        return True
+
+    def adopt_setup(self, state: Optional[dict]):
+        """Take the project ID and onboarding another worker published since the last invalidate()."""
+        if not state or not state.get("onboarded") or not state.get("project_id"):
+            return
+        if state.get("setup_at", 0.0) <= self.invalidated_at:
+            return
+        if not self.project_id:
+            self.project_id = self.persisted_project_id = state["project_id"]
+        if self.project_id == state["project_id"]:
+            self.onboarded = True
+
+    async def _persist_quietly(self):
+        try:
+            await self.persist()
+        except Exception as e:
+            logging.warning(f"Could not persist refreshed token for credential {self.name}: {e}")
+
+    async def ensure_ready(self):
+        """Make sure the account has a token, a project ID and has been onboarded."""
+        await self.ensure_token()
+        if self.project_id and self.onboarded:
+            return
+        async with self.setup_lock:
+            if not shared_state.enabled:
+                await self._setup()
+                return
+            if self.project_id and self.onboarded:
+                return
+            async with shared_state.locked(self.name):
+                self.adopt_setup(await asyncio.to_thread(shared_state.read, self.name))
+                if self.project_id and self.onboarded:
+                    return
+                await self._setup()
+                await asyncio.to_thread(shared_state.update, self.name, {
+                    "project_id": self.project_id,
+                    "onboarded": True,
+                    "setup_at": time.time(),
+                })
+
+    async def _setup(self):
+        """Resolve the project ID and onboard, skipping the steps already done."""
+        if not self.project_id:
+            self.project_id = await get_user_project_id(self.creds)
+        if self.project_id != self.persisted_project_id:
+            await self.persist()
+        if not self.onboarded:
+            await onboard_user(self.creds, self.project_id)
+            self.onboarded = True
+            logging.info(f"Credential {self.name} onboarded with project ID: {self.project_id}")
+
+    def invalidate(self, status_code: int):
+        """
+        Forget cached setup facts after the upstream rejected this account.
+        401 forces a token refresh; 403 also re-runs project discovery and onboarding.
+        """
+        self.onboarded = False
+        self.invalidated_at = time.time()
+        if status_code == 401:
+            self.force_refresh = True
+        elif not os.getenv("GOOGLE_CLOUD_PROJECT"):
+            self.project_id = None
+        logging.warning(f"Credential {self.name} was rejected with {status_code}, setup will be re-resolved")
+
+    def status(self, now: float) -> dict:
+        return {
+            "name": self.name,
+            "project_id": self.project_id,
+            "onboarded": self.onboarded,
+            "in_flight": self.in_flight,
+            "concurrency_limit": round(self.concurrency_limit, 2),
+            "cooldown_seconds": round(max(0.0, self.cooldown_until - now), 1),
+        }
+
+
+class AdmissionRejected(Exception):
+    """A request could not get an upstream slot (queue full or wait timed out)."""
+
+
+class _Waiter:
+    __slots__ = ("user", "exclude", "future")
+
+    def __init__(self, user: str, exclude):
+        self.user = user
+        self.exclude = exclude
+        self.future = asyncio.get_running_loop().create_future()
+
+
+class FairWaitQueue:
+    """
+    Requests waiting for an upstream slot, served in weighted fair order
+    (start-time fair queueing): each user's next waiter is tagged 1/weight after
+    their previous one, so one user's burst cannot starve the others.
+    """
+
+    def __init__(self, max_waiting: int, weights: dict):
+        self.max_waiting = max_waiting
+        self.weights = weights
+        self.per_user = {}
+        self.waited = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self._heap = []
+        self._seq = itertools.count()
+        self._virtual_time = 0.0
+        self._last_tag = {}
+
+    def __len__(self) -> int:
+        return sum(self.per_user.values())
+
+    def push(self, user: str, exclude) -> _Waiter:
+        tag = max(self._virtual_time, self._last_tag.get(user, 0.0)) + 1.0 / self.weights.get(user, 1.0)
+        self._last_tag[user] = tag
+        waiter = _Waiter(user, exclude)
+        heapq.heappush(self._heap, (tag, next(self._seq), waiter))
+        self.per_user[user] = self.per_user.get(user, 0) + 1
+        return waiter
+
+    def leave(self, waiter: _Waiter, waited: float):
+        count = self.per_user.get(waiter.user, 0) - 1
+        if count > 0:
+            self.per_user[waiter.user] = count
+        else:
+            self.per_user.pop(waiter.user, None)
+        self.waited += 1
+        self.total_wait += waited
+        self.max_wait = max(self.max_wait, waited)
+
+    def dispatch(self, acquire):
+        """
+        Hand free slots to waiters in fair order; acquire(exclude) returns an account or None.
+        A waiter whose excluded accounts are the only free ones stays queued without
+        holding up the waiters behind it.
+        """
+        skipped = []
+        try:
+            while self._heap:
+                entry = heapq.heappop(self._heap)
+                tag, _, waiter = entry
+                if waiter.future.done():
+                    continue
+                account = acquire(waiter.exclude)
+                if account is None:
+                    skipped.append(entry)
+                    if not waiter.exclude:
+                        # No account is free for anyone
+                        return
+                    continue
+                self._virtual_time = tag
+                waiter.future.set_result(account)
+        finally:
+            for entry in skipped:
+                heapq.heappush(self._heap, entry)
+
+
+# Waiters re-run dispatch this often, since cooldowns expire without a release
+_DISPATCH_POLL_SECONDS = 1.0
+
+
+class CredentialPool:
+    """Selects accounts for upstream requests and tracks their quota cooldowns."""
+
+    def __init__(self):
+        self.accounts: List[CredentialAccount] = []
+        self._next = 0
+        self._load_lock = asyncio.Lock()
+        self._refresher = None
+        self._queue = FairWaitQueue(ADMISSION_QUEUE_MAX, _parse_user_weights(ADMISSION_USER_WEIGHTS))
+
+    async def load(self, allow_oauth_flow: bool = False) -> int:
+        """
+        Load accounts from GEMINI_CREDENTIALS_DIR / GEMINI_CREDENTIALS_LIST,
+        falling back to the single legacy credential.
+
+        Args:
+            allow_oauth_flow: Whether the legacy loader may start the browser login
+
+        Returns:
+            Number of loaded accounts
+        """
+        async with self._load_lock:
+            if self.accounts:
+                return len(self.accounts)
+            accounts = await asyncio.to_thread(_load_pool_accounts)
+            if not accounts:
+                creds = await asyncio.to_thread(auth.get_credentials, allow_oauth_flow)
+                if creds:
+                    project_id = auth.user_project_id or await asyncio.to_thread(_read_project_id, CREDENTIAL_FILE)
+                    accounts = [CredentialAccount("default", creds, project_id, legacy=True)]
+            # GOOGLE_CLOUD_PROJECT overrides stored project IDs; it is written back once by prepare_all
+            env_project_id = os.getenv("GOOGLE_CLOUD_PROJECT")
+            if env_project_id:
+                for account in accounts:
+                    account.project_id = env_project_id
+            self.accounts = accounts
+            if accounts:
+                logging.info(f"Credential pool loaded {len(accounts)} account(s)")
+                self.start_refresher()
+            return len(accounts)
+
+    async def prepare_all(self):
+        """Refresh, resolve project IDs and onboard every account, logging failures."""
+        async def prepare(account):
+            try:
+                await account.ensure_ready()
+            except Exception as e:
+                logging.error(f"Setup failed for credential {account.name}: {e}")
+        await asyncio.gather(*(prepare(account) for account in self.accounts))
+
+    def start_refresher(self):
+        """Start the background task that renews tokens before they expire."""
+        if self._refresher is None or self._refresher.done():
+            self._refresher = asyncio.create_task(self._refresh_loop())
+
+    async def stop_refresher(self):
+        if self._refresher is not None:
+            self._refresher.cancel()
+            try:
+                await self._refresher
+            except asyncio.CancelledError:
+                pass
+            self._refresher = None
+
+    async def _refresh_loop(self):
+        while True:
+            if not shared_state.try_lead():
+                # Another worker renews tokens in the background; pick up what it publishes
+                await self._sync_shared_tokens()
+                await asyncio.sleep(SHARED_STATE_SYNC_SECONDS)
+                continue
+            delay = TOKEN_REFRESH_MARGIN_SECONDS
+            due = []
+            for account in self.accounts:
+                wait = account.seconds_until_refresh()
+                if wait <= 0:
+                    due.append(account)
+                else:
+                    delay = min(delay, wait)
+            if due:
+                results = await asyncio.gather(*(account.refresh() for account in due), return_exceptions=True)
+                for account, result in zip(due, results):
+                    if isinstance(result, Exception):
+                        logging.error(f"Background token refresh failed for credential {account.name}: {result}")
+                        account.retry_refresh_at = time.monotonic() + TOKEN_REFRESH_RETRY_SECONDS
+                        delay = min(delay, TOKEN_REFRESH_RETRY_SECONDS)
+            if shared_state.enabled:
+                # Also pick up tokens other workers refreshed on demand
+                delay = min(delay, SHARED_STATE_SYNC_SECONDS)
+                await self._sync_shared_tokens()
+            await asyncio.sleep(max(delay, 1.0))
+
+    async def _sync_shared_tokens(self):
+        states = await asyncio.to_thread(lambda: [shared_state.read(account.name) for account in self.accounts])
+        for account, state in zip(self.accounts, states):
+            try:
+                account.adopt_token(state)
+            except (ValueError, TypeError) as e:
+                logging.warning(f"Ignoring invalid shared state for credential {account.name}: {e}")
+
+    def acquire(self, exclude=()) -> Optional[CredentialAccount]:
+        """
+        Pick the least-loaded account that is not cooling down and is below its
+        concurrency limit, round-robin among ties.
+
+        Args:
+            exclude: Accounts already tried for this request
+
+        Returns:
+            The account with its in-flight count incremented, or None
+        """
+        now = time.monotonic()
+        count = len(self.accounts)
+        best = None
+        for offset in range(count):
+            account = self.accounts[(self._next + offset) % count]
+            if account in exclude or not account.available(now) or not account.has_capacity():
+                continue
+            if best is None or account.load() < best.load():
+                best = account
+        if best is None:
+            return None
+        self._next = (self.accounts.index(best) + 1) % count
+        best.in_flight += 1
+        return best
+
+    async def admit(self, username: Optional[str], exclude=()) -> Optional[CredentialAccount]:
+        """
+        Acquire an account, waiting in the fair queue while every usable account is
+        at its concurrency limit.
+
+        Args:
+            username: Authenticated user the request is queued under
+            exclude: Accounts already tried for this request
+
+        Returns:
+            The account, or None if no account can serve the request (all tried or cooling down)
+
+        Raises:
+            AdmissionRejected: The queue is full or the wait timed out
+        """
+        # Never overtake requests that are still waiting
+        if not len(self._queue):
+            account = self.acquire(exclude)
+            if account is not None:
+                return account
+        now = time.monotonic()
+        if not any(account not in exclude and account.available(now) for account in self.accounts):
+            return None
+        if len(self._queue) >= self._queue.max_waiting:
+            self._queue.rejected += 1
+            raise AdmissionRejected("Too many requests are waiting for an upstream slot. Please retry later.")
+
+        waiter = self._queue.push(username or "anonymous", exclude)
+        # Serve it now if a slot is free for it (e.g. only its excluded accounts were busy)
+        self._dispatch()
+        started = time.monotonic()
+        deadline = started + ADMISSION_QUEUE_TIMEOUT_SECONDS
+        account = None
+        try:
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._queue.timed_out += 1
+                    raise AdmissionRejected("Timed out waiting for an upstream slot. Please retry later.")
+                try:
+                    account = await asyncio.wait_for(asyncio.shield(waiter.future), min(remaining, _DISPATCH_POLL_SECONDS))
+                    return account
+                except asyncio.TimeoutError:
+                    self._dispatch()
+                    if waiter.future.done():
+                        account = waiter.future.result()
+                        return account
+        finally:
+            waited = time.monotonic() - started
+            self._queue.leave(waiter, waited)
+            STAGE_ADMISSION_WAIT.observe(waited)
+            if account is None and waiter.future.done() and not waiter.future.cancelled():
+                # A slot was handed over after this request gave up
+                self.release(waiter.future.result())
+            waiter.future.cancel()
+
+    def release(self, account: CredentialAccount):
+        account.in_flight = max(0, account.in_flight - 1)
+        self._dispatch()
+
+    def _dispatch(self):
+        if self._queue._heap:
+            self._queue.dispatch(self.acquire)
+
+    def mark_exhausted(self, account: CredentialAccount, error_body: bytes = b"", retry_after: Optional[str] = None):
+        """Put an account on cooldown after a 429, using the upstream reset delay when present."""
+        delay = _parse_reset_delay(error_body, retry_after) or CREDENTIAL_COOLDOWN_SECONDS
+        account.cooldown_until = time.monotonic() + delay
+        logging.warning(f"Credential {account.name} hit its quota, skipping it for {delay:.0f}s")
+
+    def seconds_until_available(self) -> float:
+        """Time until some account's quota cooldown ends (0 if one is usable now)."""
+        if not self.accounts:
+            return 0.0
+        now = time.monotonic()
+        return max(0.0, min(account.cooldown_until for account in self.accounts) - now)
+
+    def status(self) -> dict:
+        now = time.monotonic()
+        return {
+            "total": len(self.accounts),
+            "available": sum(1 for account in self.accounts if account.available(now)),
+            "accounts": [account.status(now) for account in self.accounts],
+        }
+
+    def admission_status(self, detailed: bool = False) -> dict:
+        """
+        Admission queue statistics.
+
+        Args:
+            detailed: Include concurrency limits per credential and queued requests
+                per username (names that must not be shown without authentication)
+        """
+        queue = self._queue
+        status = {
+            "adaptive_concurrency": ADAPTIVE_CONCURRENCY_ENABLED,
+            "in_flight": sum(account.in_flight for account in self.accounts),
+            "queue_depth": len(queue),
+            "queue_max": queue.max_waiting,
+            "waited": queue.waited,
+            "rejected": queue.rejected,
+            "timed_out": queue.timed_out,
+            "avg_wait_ms": round(queue.total_wait / queue.waited * 1000, 1) if queue.waited else 0.0,
+            "max_wait_ms": round(queue.max_wait * 1000, 1),
+        }
+        if detailed:
+            status["limits"] = {account.name: round(account.concurrency_limit, 2) for account in self.accounts}
+            status["queued_by_user"] = dict(queue.per_user)
+        return status
+
+
+_background_tasks = set()
+
+
+def _spawn(coro):
+    """Run a fire-and-forget coroutine, keeping a reference until it finishes."""
+    task = asyncio.create_task(coro)
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+    return task
+
+
+def _parse_user_weights(spec: str) -> dict:
+    """Parse "alice:2,bob:0.5" into {"alice": 2.0, "bob": 0.5}, skipping invalid entries."""
+    weights = {}
+    for item in spec.split(","):
+        user, _, weight = item.strip().rpartition(":")
+        try:
+            if user and float(weight) > 0:
+                weights[user] = float(weight)
+        except ValueError:
+            logging.warning(f"Ignoring invalid ADMISSION_USER_WEIGHTS entry: {item}")
+    return weights
+
+
+def _read_project_id(path: str) -> Optional[str]:
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, "r") as f:
+            return json.load(f).get("project_id")
+    except Exception as e:
+        logging.warning(f"Could not read project_id from credential file: {e}")
+        return None
+
+
+def _load_pool_accounts() -> List[CredentialAccount]:
+    accounts = []
+    if GEMINI_CREDENTIALS_DIR and os.path.isdir(GEMINI_CREDENTIALS_DIR):
+        for file_name in sorted(os.listdir(GEMINI_CREDENTIALS_DIR)):
+            if not file_name.endswith(".json"):
+                continue
+            path = os.path.join(GEMINI_CREDENTIALS_DIR, file_name)
+            try:
+                with open(path, "r") as f:
+                    raw_creds_data = json.load(f)
+                creds = credentials_from_info(raw_creds_data)
+                accounts.append(CredentialAccount(file_name, creds, raw_creds_data.get("project_id"), path=path))
+            except Exception as e:
+                logging.error(f"Skipping credential file {path}: {e}")
+    elif GEMINI_CREDENTIALS_DIR:
+        logging.error(f"GEMINI_CREDENTIALS_DIR {GEMINI_CREDENTIALS_DIR} is not a directory")
+
+    if GEMINI_CREDENTIALS_LIST:
+        try:
+            raw_list = json.loads(GEMINI_CREDENTIALS_LIST)
+        except json.JSONDecodeError as e:
+            logging.error(f"Failed to parse GEMINI_CREDENTIALS_LIST: {e}")
+            raw_list = []
+        for index, raw_creds_data in enumerate(raw_list):
+            try:
+                creds = credentials_from_info(raw_creds_data)
+                accounts.append(CredentialAccount(f"env[{index}]", creds, raw_creds_data.get("project_id")))
+            except Exception as e:
+                logging.error(f"Skipping GEMINI_CREDENTIALS_LIST entry {index}: {e}")
+    return accounts
+
+
+def _parse_reset_delay(error_body: bytes, retry_after: Optional[str]) -> Optional[float]:
+    """Extract the quota reset delay from a 429 body (RetryInfo or message) or Retry-After header."""
+    try:
+        error = json.loads(error_body).get("error", {})
+    except (ValueError, AttributeError):
+        error = {}
+    if isinstance(error, dict):
+        for detail in error.get("details", []) or []:
+            if not isinstance(detail, dict):
+                continue
+            delay = detail.get("retryDelay") or (detail.get("metadata") or {}).get("quotaResetDelay")
+            match = _RETRY_DELAY_RE.match(delay or "")
+            if match:
+                seconds = float(match.group(1))
+                return seconds / 1000 if match.group(2) == "ms" else seconds
+        match = _RESET_AFTER_RE.search(error.get("message", "") or "")
+        if match:
+            return float(match.group(1))
+    if retry_after:
+        try:
+            return float(retry_after)
+        except ValueError:
+            pass
+    return None
+
+
+credential_pool = CredentialPool()
+
+# Pool state is read when /metrics is scraped
+registry.register(CallbackGauge(
+    "gemini_upstream_in_flight", "Upstream requests in flight, by credential.", ("credential",),
+    lambda: [((account.name,), account.in_flight) for account in credential_pool.accounts]))
+registry.register(CallbackGauge(
+    "gemini_credential_concurrency_limit", "Adaptive concurrency limit, by credential.", ("credential",),
+    lambda: [((account.name,), int(account.concurrency_limit)) for account in credential_pool.accounts]))
+registry.register(CallbackGauge(
+    "gemini_credential_available", "1 if the credential is not cooling down after a 429.", ("credential",),
+    lambda: [((account.name,), int(account.available(time.monotonic()))) for account in credential_pool.accounts]))
+registry.register(CallbackGauge(
+    "gemini_admission_queue_depth", "Requests waiting for an upstream slot.", (),
+    lambda: [((), len(credential_pool._queue))]))
@@ -4,12 +4,20 @@ This module provides native Gemini API endpoints that proxy directly to Google's
 without any format transformations.
 """
 import json
+import time
 import logging
 from fastapi import APIRouter, Request, Response, Depends
 
 from .auth import authenticate_user
-from .google_api_client import send_gemini_request, build_gemini_payload_from_native
-from .config import SUPPORTED_MODELS
+from .google_api_client import (
+    send_gemini_request,
+    build_gemini_payload_from_native,
+    build_gemini_payload_from_native_bytes
+)
+from .context_cache import context_cache
+from .token_counter import token_counter
+from .metrics import STAGE_TRANSFORM, set_request_model
+from .config import SUPPORTED_MODELS, GEMINI_MODELS_RESPONSE, resolve_model
 
 router = APIRouter()
 
@@ -24,13 +32,9 @@ async def gemini_list_models(request: Request, username: str = Depends(authentic
     try:
         logging.info("Gemini models list requested")
         
-        models_response = {
-            "models": SUPPORTED_MODELS
-        }
-        
         logging.info(f"Returning {len(SUPPORTED_MODELS)} Gemini models")
         return Response(
-            content=json.dumps(models_response),
+            content=GEMINI_MODELS_RESPONSE,
             status_code=200,
             media_type="application/json; charset=utf-8"
         )
@@ -87,30 +91,42 @@ async def gemini_proxy(request: Request, full_path: str, username: str = Depends
                 media_type="application/json"
             )
         
-        # Parse the incoming request
-        try:
-            if post_data:
-                incoming_request = json.loads(post_data)
-            else:
-                incoming_request = {}
-        except json.JSONDecodeError as e:
-            logging.error(f"Invalid JSON in request body: {str(e)}")
-            return Response(
-                content=json.dumps({
-                    "error": {
-                        "message": "Invalid JSON in request body",
-                        "code": 400
-                    }
-                }),
-                status_code=400,
-                media_type="application/json"
-            )
-        
-        # Build the payload for Google API
-        gemini_payload = build_gemini_payload_from_native(incoming_request, model_name)
+        set_request_model(request, model_name)
+        if full_path.endswith(":countTokens"):
+            return await _count_tokens(post_data, model_name, username)
+
+        transform_started = time.perf_counter()
+        # Fast path: forward the body as raw bytes, decoding only the members we edit.
+        # Context caching needs the decoded contents, so it takes the regular path.
+        gemini_payload = None
+        if post_data and not context_cache.enabled:
+            gemini_payload = build_gemini_payload_from_native_bytes(post_data, model_name)
+        if gemini_payload is None:
+            # Parse the incoming request
+            try:
+                if post_data:
+                    incoming_request = json.loads(post_data)
+                else:
+                    incoming_request = {}
+            except json.JSONDecodeError as e:
+                logging.error(f"Invalid JSON in request body: {str(e)}")
+                return Response(
+                    content=json.dumps({
+                        "error": {
+                            "message": "Invalid JSON in request body",
+                            "code": 400
+                        }
+                    }),
+                    status_code=400,
+                    media_type="application/json"
+                )
+
+            # Build the payload for Google API
+            gemini_payload = build_gemini_payload_from_native(incoming_request, model_name)
+        STAGE_TRANSFORM.observe(time.perf_counter() - transform_started)
         
         # Send the request to Google API
-        response = send_gemini_request(gemini_payload, is_streaming=is_streaming)
+        response = await send_gemini_request(gemini_payload, is_streaming=is_streaming, username=username)
         
         # Log the response status
         if hasattr(response, 'status_code'):
@@ -135,6 +151,31 @@ async def gemini_proxy(request: Request, full_path: str, username: str = Depends
         )
 
 
+async def _count_tokens(post_data: bytes, model_name: str, username: str) -> Response:
+    """Answer models/{model}:countTokens from the token counter instead of generating."""
+    try:
+        incoming_request = json.loads(post_data) if post_data else {}
+        # Either {"contents": [...]} or {"generateContentRequest": {...}}
+        request = incoming_request.get("generateContentRequest") or incoming_request
+        total_tokens = await token_counter.count(resolve_model(model_name).base_model, request, username=username)
+    except (json.JSONDecodeError, AttributeError) as e:
+        return Response(
+            content=json.dumps({
+                "error": {
+                    "message": f"Invalid countTokens request: {str(e)}",
+                    "code": 400
+                }
+            }),
+            status_code=400,
+            media_type="application/json"
+        )
+    return Response(
+        content=json.dumps({"totalTokens": total_tokens}),
+        status_code=200,
+        media_type="application/json"
+    )
+
+
 def _extract_model_from_path(path: str) -> str:
     """
     Extract the model name from a Gemini API path.
@@ -0,0 +1,710 @@
+"""
+Gemini Stream - Typed event pipeline for streamGenerateContent responses.
+Each upstream SSE line is unwrapped once into a GeminiEvent. Encoders turn events
+into native, OpenAI or Claude SSE frames: the native encoder forwards the upstream
+bytes untouched, the others parse each event exactly once and encode once.
+
+Response headers can go out before the upstream answers, and while no upstream
+output arrives (admission, time to first byte, long thinking) each encoder sends
+its keep-alive frame, so idle-timeout proxies do not drop the connection.
+"""
+import re
+import json
+import time
+import uuid
+import asyncio
+import logging
+from typing import AsyncIterator, Awaitable, Callable, Optional, Union
+
+import httpx
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
+
+from .openai_transformers import gemini_stream_chunk_to_openai, gemini_usage_to_openai
+from .claude_transformers import (
+    gemini_part_to_claude_block,
+    gemini_usage_to_claude,
+    map_finish_reason_to_claude,
+    new_message_id
+)
+from .token_counter import estimate_text_tokens
+from .metrics import CHUNK_SECONDS
+from .config import STREAM_HEARTBEAT_SECONDS, STREAM_EARLY_HEADERS
+
+# JSON strings (skipped whole) and structural brackets
+_TOKEN_RE = re.compile(rb'"[^"\\]*(?:\\.[^"\\]*)*"|[{}\[\]]')
+_WHITESPACE_RE = re.compile(rb"\s*")
+_WHITESPACE_BYTES = b" \t\r\n"
+# Above this size, documents are scanned with bytes.find over strings instead of _TOKEN_RE,
+# whose per-character string matching dominates on large base64 payloads
+_FIND_SCAN_MIN_BYTES = 16384
+# Keep-alive frame for SSE clients: a comment line, which SSE parsers ignore
+_SSE_COMMENT_HEARTBEAT = b": keep-alive\n\n"
+# Sent with every event stream so reverse proxies (e.g. nginx) forward frames as they are written
+_STREAM_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+# Characters that open JSON strings and containers, optionally with member separators
+_CONTAINER_RE = re.compile(rb'["{}\[\]]')
+_STRUCTURAL_RE = re.compile(rb'["{}\[\],:]')
+
+
+def _iter_tokens(body: bytes, pos: int = 0, pattern=_CONTAINER_RE):
+    """
+    Yield (token, start, end) for each string and structural character of a JSON
+    document. Strings are skipped with bytes.find, so large base64 values cost
+    little; string tokens are yielded as b'"' with their full span.
+    """
+    search = pattern.search
+    find = body.find
+    while True:
+        match = search(body, pos)
+        if match is None:
+            return
+        start = match.start()
+        token = match.group()
+        if token == b'"':
+            end = find(b'"', start + 1)
+            while end >= 0:
+                backslash = end - 1
+                while body[backslash] == 92:  # backslash
+                    backslash -= 1
+                if (end - backslash) % 2:
+                    break
+                end = find(b'"', end + 1)
+            if end < 0:
+                return
+            pos = end + 1
+        else:
+            pos = start + 1
+        yield token, start, pos
+
+
+def unwrap_response(envelope: bytes) -> Optional[bytes]:
+    """
+    Return the bytes of the top-level "response" value of a Code Assist envelope
+    ({"response": {...}, "traceId": ...}) without decoding it.
+
+    Args:
+        envelope: Raw JSON object bytes
+
+    Returns:
+        The slice holding the response object, or None if there is none
+    """
+    if len(envelope) >= _FIND_SCAN_MIN_BYTES:
+        return _unwrap_large_response(envelope)
+    depth = 0
+    value_start = None
+    for match in _TOKEN_RE.finditer(envelope):
+        token = match.group()
+        if token[:1] == b'"':
+            if value_start is None and depth == 1 and token == b'"response"':
+                value_start = _response_value_start(envelope, match.end())
+                if value_start == -1:
+                    return None
+            continue
+        if token in (b"{", b"["):
+            depth += 1
+        else:
+            depth -= 1
+            if value_start is not None and depth == 1:
+                return envelope[value_start:match.end()]
+    return None
+
+
+def _unwrap_large_response(envelope: bytes) -> Optional[bytes]:
+    depth = 0
+    value_start = None
+    for token, token_start, token_end in _iter_tokens(envelope):
+        if token == b'"':
+            if value_start is None and depth == 1 and envelope[token_start:token_end] == b'"response"':
+                value_start = _response_value_start(envelope, token_end)
+                if value_start == -1:
+                    return None
+            continue
+        if token in (b"{", b"["):
+            depth += 1
+        else:
+            depth -= 1
+            if value_start is not None and depth == 1:
+                return envelope[value_start:token_end]
+    return None
+
+
+def _response_value_start(envelope: bytes, key_end: int):
+    """Offset of the object/array following a "response" key, None if it is not a key, -1 if not a container."""
+    colon = _WHITESPACE_RE.match(envelope, key_end).end()
+    if envelope[colon:colon + 1] != b":":
+        return None
+    value_start = _WHITESPACE_RE.match(envelope, colon + 1).end()
+    if envelope[value_start:value_start + 1] not in (b"{", b"["):
+        return -1
+    return value_start
+
+
+def _member_value(body: bytes, view: memoryview, start: int, end: int) -> Optional[memoryview]:
+    start = _WHITESPACE_RE.match(body, start).end()
+    while end > start and body[end - 1] in _WHITESPACE_BYTES:
+        end -= 1
+    return view[start:end] if end > start else None
+
+
+def split_object_members(body: bytes) -> Optional[list]:
+    """
+    Split a JSON object into its top-level members without decoding or copying the values.
+    The top-level structure is validated (one ":" after each key, "," or "}" after
+    each value); strings and nested containers are not.
+
+    Args:
+        body: Raw JSON bytes
+
+    Returns:
+        List of (raw key bytes, memoryview of the raw value), or None if body is not
+        a well-formed object
+    """
+    start = _WHITESPACE_RE.match(body).end()
+    if body[start:start + 1] != b"{":
+        return None
+    view = memoryview(body)
+    members = []
+    depth = 0
+    key = None
+    value_start = None
+    # Start and end of the current value when it is a string or container
+    item_start = item_end = None
+    # End of the last top-level token; only whitespace may follow it before the next one
+    last_end = start + 1
+    for token, token_start, token_end in _iter_tokens(body, start + 1, _STRUCTURAL_RE):
+        if depth == 0:
+            if value_start is None:
+                if not _is_blank(body, last_end, token_start):
+                    return None
+                if key is None and token == b'"':
+                    key = body[token_start:token_end]
+                    last_end = token_end
+                    continue
+                if key is not None and token == b":":
+                    value_start = last_end = token_end
+                    continue
+                # Only "{}" may close the object without a member
+                if key is not None or members or token != b"}":
+                    return None
+                return members if _is_blank(body, token_end, len(body)) else None
+            if token in (b",", b"}"):
+                value = _member_value(body, view, value_start, token_start)
+                if value is None or not _is_single_value(body, value, value_start, token_start, item_start, item_end):
+                    return None
+                members.append((key, value))
+                if token == b"}":
+                    return members if _is_blank(body, token_end, len(body)) else None
+                key = value_start = item_start = item_end = None
+                last_end = token_end
+                continue
+            # Anything else starts the value; a value has exactly one string or container
+            if item_start is not None or token in (b":", b"]"):
+                return None
+            item_start = token_start
+            if token == b'"':
+                item_end = token_end
+                continue
+        if token in (b"{", b"["):
+            depth += 1
+        elif token in (b"}", b"]"):
+            depth -= 1
+            if depth == 0:
+                item_end = token_end
+    return None
+
+
+# Scalar JSON values: numbers and literals
+_SCALAR_RE = re.compile(rb"-?(?:0|[1-9][0-9]*)(?:\.[0-9]+)?(?:[eE][+-]?[0-9]+)?|true|false|null")
+
+
+def _is_blank(body: bytes, start: int, end: int) -> bool:
+    return _WHITESPACE_RE.match(body, start, end).end() == end
+
+
+def _is_single_value(body: bytes, value: memoryview, value_start: int, value_end: int, item_start, item_end) -> bool:
+    """Whether body[value_start:value_end] holds exactly one JSON value."""
+    if item_start is None:
+        return _SCALAR_RE.fullmatch(value) is not None
+    # The string or container must be the whole value
+    return item_end is not None and _is_blank(body, value_start, item_start) and _is_blank(body, item_end, value_end)
+
+
+class GeminiEvent:
+    """One streamed Gemini response chunk, decoded lazily and at most once."""
+
+    __slots__ = ("raw", "_data", "enveloped")
+
+    def __init__(self, raw: bytes, data: Optional[dict] = None, enveloped: bool = True):
+        self.raw = raw
+        self._data = data
+        # False for lines that were not a {"response": ...} envelope, e.g. errors
+        self.enveloped = enveloped
+
+    @property
+    def data(self) -> dict:
+        if self._data is None:
+            self._data = json.loads(self.raw)
+        return self._data
+
+    @classmethod
+    def error(cls, message: str, error_type: str = "api_error", code: int = 500) -> "GeminiEvent":
+        data = {"error": {"message": message, "type": error_type, "code": code}}
+        return cls(json.dumps(data).encode("utf-8"), data, enveloped=False)
+
+
+def _event_from_line(line: bytes) -> Optional[GeminiEvent]:
+    if not line.startswith(b"data:"):
+        return None
+    payload = line[5:].strip()
+    if not payload:
+        return None
+    raw = unwrap_response(payload)
+    # Lines without a response envelope (e.g. upstream error objects) pass through whole
+    if raw is None:
+        return GeminiEvent(payload, enveloped=False)
+    return GeminiEvent(raw)
+
+
+class GeminiStream:
+    """An open upstream stream, a replay of cached events, or the error that prevented opening it."""
+
+    def __init__(self, resp: Optional[httpx.Response] = None, close_upstream=None,
+                 status_code: int = 200, error_message: Optional[str] = None,
+                 on_complete=None):
+        self.resp = resp
+        self._close_upstream = close_upstream
+        self.status_code = status_code
+        self.error_message = error_message
+        self._replay = None
+        # Called with the raw events of a stream that finished without errors
+        self._on_complete = on_complete
+
+    @classmethod
+    def failed(cls, status_code: int, error_message: str) -> "GeminiStream":
+        return cls(status_code=status_code, error_message=error_message)
+
+    @classmethod
+    def replay(cls, raw_events: list) -> "GeminiStream":
+        stream = cls()
+        stream._replay = raw_events
+        return stream
+
+    async def events(self) -> AsyncIterator[GeminiEvent]:
+        if self._replay is not None:
+            for raw in self._replay:
+                yield GeminiEvent(raw)
+            return
+        if self._on_complete is None:
+            async for event in self._upstream_events():
+                yield event
+            return
+        recorded = []
+        async for event in self._upstream_events():
+            if recorded is not None:
+                if event.enveloped:
+                    recorded.append(event.raw)
+                else:
+                    # Streams carrying upstream errors are never cached
+                    recorded = None
+            yield event
+        if recorded:
+            self._on_complete(recorded)
+
+    async def _upstream_events(self) -> AsyncIterator[GeminiEvent]:
+        if self.resp is None:
+            return
+        buffer = bytearray()
+        async for chunk in self.resp.aiter_bytes():
+            search_from = len(buffer)
+            buffer += chunk
+            if buffer.find(b"\n", search_from) < 0:
+                continue
+            lines = buffer.split(b"\n")
+            buffer = lines.pop()
+            for line in lines:
+                event = _event_from_line(bytes(line))
+                if event is not None:
+                    yield event
+        if buffer:
+            event = _event_from_line(bytes(buffer))
+            if event is not None:
+                yield event
+
+    async def aclose(self):
+        if self._close_upstream is not None:
+            await self._close_upstream()
+
+
+class NativeStreamEncoder:
+    """Gemini SSE: forwards each unwrapped upstream event as-is."""
+
+    metrics_format = "gemini"
+    done = False
+
+    def start(self) -> bytes:
+        return b""
+
+    def encode(self, event: GeminiEvent) -> bytes:
+        return b"data: " + event.raw + b"\n\n"
+
+    def error(self, message: str, error_type: str = "api_error", code: int = 500) -> bytes:
+        return self.encode(GeminiEvent.error(message, error_type, code))
+
+    def heartbeat(self) -> bytes:
+        return _SSE_COMMENT_HEARTBEAT
+
+    def finish(self) -> bytes:
+        return b""
+
+
+class OpenAIStreamEncoder:
+    """
+    OpenAI chat.completion.chunk SSE. With include_usage (stream_options), a final
+    chunk carries usage from usageMetadata, or estimated when upstream sent none.
+    """
+
+    metrics_format = "openai"
+
+    def __init__(self, model: str, include_usage: bool = False, prompt_tokens: int = 0):
+        self.model = model
+        self.response_id = "chatcmpl-" + str(uuid.uuid4())
+        self.done = False
+        self.include_usage = include_usage
+        self._prompt_tokens = prompt_tokens
+        self._completion_estimate = 0
+        self._usage = None
+
+    def start(self) -> bytes:
+        logging.info(f"Starting streaming response: {self.response_id}")
+        return b""
+
+    def encode(self, event: GeminiEvent) -> bytes:
+        gemini_chunk = event.data
+        if "error" in gemini_chunk:
+            logging.error(f"Error in streaming response: {gemini_chunk['error']}")
+            error = gemini_chunk["error"]
+            return self.error(error.get("message", "Unknown error"), error.get("type", "api_error"), error.get("code"))
+        openai_chunk = gemini_stream_chunk_to_openai(gemini_chunk, self.model, self.response_id)
+        if self.include_usage:
+            if gemini_chunk.get("usageMetadata"):
+                self._usage = gemini_chunk["usageMetadata"]
+            for choice in openai_chunk["choices"]:
+                self._completion_estimate += estimate_text_tokens(choice["delta"].get("content"))
+        return f"data: {json.dumps(openai_chunk)}\n\n".encode("utf-8")
+
+    def error(self, message: str, error_type: str = "api_error", code: int = 500) -> bytes:
+        self.done = True
+        error_data = {"error": {"message": message, "type": error_type, "code": code}}
+        return f"data: {json.dumps(error_data)}\n\ndata: [DONE]\n\n".encode("utf-8")
+
+    def heartbeat(self) -> bytes:
+        return _SSE_COMMENT_HEARTBEAT
+
+    def finish(self) -> bytes:
+        logging.info(f"Completed streaming response: {self.response_id}")
+        if not self.include_usage:
+            return b"data: [DONE]\n\n"
+        usage = gemini_usage_to_openai(self._usage) or {
+            "prompt_tokens": self._prompt_tokens,
+            "completion_tokens": self._completion_estimate,
+            "total_tokens": self._prompt_tokens + self._completion_estimate,
+        }
+        usage_chunk = {
+            "id": self.response_id,
+            "object": "chat.completion.chunk",
+            "created": int(time.time()),
+            "model": self.model,
+            "choices": [],
+            "usage": usage,
+        }
+        return f"data: {json.dumps(usage_chunk)}\n\ndata: [DONE]\n\n".encode("utf-8")
+
+
+class ClaudeStreamEncoder:
+    """
+    Anthropic Messages SSE. Gemini parts map straight to content blocks: thought
+    parts to thinking blocks, text to text blocks and each functionCall to a
+    tool_use block. Usage comes from the last usageMetadata seen, or is estimated
+    when upstream sent none.
+    """
+
+    metrics_format = "claude"
+
+    def __init__(self, model: str, input_tokens: int = 0):
+        self.model = model
+        self.input_tokens = input_tokens
+        self._output_estimate = 0
+        self.message_id = new_message_id()
+        self.done = False
+        self._index = -1
+        self._block_type = None  # Type of the open content block, if any
+        self._finish_reason = None
+        self._has_tool_use = False
+        self._usage = None
+
+    @staticmethod
+    def _event(event_type: str, data: dict) -> str:
+        return f"event: {event_type}\ndata: {json.dumps(data)}\n\n"
+
+    def start(self) -> bytes:
+        logging.info(f"Starting Claude streaming response: {self.message_id}")
+        start_event = {
+            "type": "message_start",
+            "message": {
+                "id": self.message_id,
+                "type": "message",
+                "role": "assistant",
+                "content": [],
+                "model": self.model,
+                "stop_reason": None,
+                "stop_sequence": None,
+                "usage": {"input_tokens": self.input_tokens, "output_tokens": 0}
+            }
+        }
+        return self._event("message_start", start_event).encode("utf-8")
+
+    def _open(self, frames: list, content_block: dict):
+        self._close(frames)
+        self._index += 1
+        self._block_type = content_block["type"]
+        frames.append(self._event("content_block_start", {
+            "type": "content_block_start", "index": self._index, "content_block": content_block}))
+
+    def _close(self, frames: list):
+        if self._block_type is not None:
+            frames.append(self._event("content_block_stop", {"type": "content_block_stop", "index": self._index}))
+            self._block_type = None
+
+    def _delta(self, frames: list, delta: dict):
+        frames.append(self._event("content_block_delta", {
+            "type": "content_block_delta", "index": self._index, "delta": delta}))
+
+    def _signature(self, frames: list, signature: str):
+        if self._block_type != "thinking":
+            self._open(frames, {"type": "thinking", "thinking": ""})
+        self._delta(frames, {"type": "signature_delta", "signature": signature})
+        self._close(frames)
+
+    def encode(self, event: GeminiEvent) -> bytes:
+        gemini_chunk = event.data
+        if "error" in gemini_chunk:
+            logging.error(f"Error in streaming response: {gemini_chunk['error']}")
+            return self.error(gemini_chunk["error"].get("message", "Unknown error"))
+        if gemini_chunk.get("usageMetadata"):
+            self._usage = gemini_chunk["usageMetadata"]
+        candidates = gemini_chunk.get("candidates")
+        if not candidates:
+            return b""
+        candidate = candidates[0]
+        if candidate.get("finishReason"):
+            self._finish_reason = candidate["finishReason"]
+
+        frames = []
+        for part in candidate.get("content", {}).get("parts", []):
+            signature = part.get("thoughtSignature")
+            if part.get("thought"):
+                if part.get("text"):
+                    if self._block_type != "thinking":
+                        self._open(frames, {"type": "thinking", "thinking": ""})
+                    self._delta(frames, {"type": "thinking_delta", "thinking": part["text"]})
+                    self._output_estimate += estimate_text_tokens(part["text"])
+                if signature:
+                    self._signature(frames, signature)
+                continue
+            if signature:
+                # Signature of the preceding reasoning; it closes the thinking block
+                self._signature(frames, signature)
+            block = gemini_part_to_claude_block(part)
+            if block is None:
+                continue
+            if block["type"] == "tool_use":
+                self._has_tool_use = True
+                self._open(frames, dict(block, input={}))
+                self._delta(frames, {"type": "input_json_delta", "partial_json": json.dumps(block["input"])})
+                self._close(frames)
+            elif block["text"]:
+                if self._block_type != "text":
+                    self._open(frames, {"type": "text", "text": ""})
+                self._delta(frames, {"type": "text_delta", "text": block["text"]})
+                self._output_estimate += estimate_text_tokens(block["text"])
+        return "".join(frames).encode("utf-8")
+
+    def error(self, message: str, error_type: str = "api_error", code: int = 500) -> bytes:
+        self.done = True
+        error_event = {"type": "error", "error": {"type": error_type, "message": message}}
+        return self._event("error", error_event).encode("utf-8")
+
+    def heartbeat(self) -> bytes:
+        # Anthropic's own keep-alive event
+        return b'event: ping\ndata: {"type": "ping"}\n\n'
+
+    def finish(self) -> bytes:
+        logging.info(f"Completed Claude streaming response: {self.message_id}")
+        frames = []
+        if self._index < 0:
+            # Clients expect at least one content block
+            self._open(frames, {"type": "text", "text": ""})
+        self._close(frames)
+        delta_event = {
+            "type": "message_delta",
+            "delta": {
+                "stop_reason": map_finish_reason_to_claude(self._finish_reason, self._has_tool_use),
+                "stop_sequence": None
+            },
+            "usage": gemini_usage_to_claude(self._usage) if self._usage else {
+                "input_tokens": self.input_tokens,
+                "output_tokens": self._output_estimate
+            }
+        }
+        frames.append(self._event("message_delta", delta_event))
+        frames.append(self._event("message_stop", {"type": "message_stop"}))
+        return "".join(frames).encode("utf-8")
+
+
+async def _next_event(events: AsyncIterator[GeminiEvent]) -> GeminiEvent:
+    return await events.__anext__()
+
+
+async def _with_heartbeats(events: AsyncIterator[GeminiEvent], interval: float) -> AsyncIterator[Optional[GeminiEvent]]:
+    """Yield the events, and None each time interval seconds pass without one."""
+    events = events.__aiter__()
+    pending = None
+    try:
+        while True:
+            if pending is None:
+                pending = asyncio.ensure_future(_next_event(events))
+            done, _ = await asyncio.wait((pending,), timeout=interval)
+            if not done:
+                yield None
+                continue
+            task, pending = pending, None
+            try:
+                event = task.result()
+            except StopAsyncIteration:
+                return
+            yield event
+    finally:
+        if pending is not None:
+            pending.cancel()
+            try:
+                await pending
+            except (asyncio.CancelledError, StopAsyncIteration, Exception):
+                pass
+        await events.aclose()
+
+
+def _close_when_opened(opening: "asyncio.Future"):
+    """Close a stream whose opening outlived its client, once it is open."""
+    def close(task):
+        if not task.cancelled() and task.exception() is None:
+            asyncio.ensure_future(task.result().aclose())
+    opening.add_done_callback(close)
+
+
+async def encode_stream(stream: Union[GeminiStream, Callable[[], Awaitable[GeminiStream]]],
+                        encoder) -> AsyncIterator[bytes]:
+    """
+    Drive an upstream stream through an encoder, always closing the upstream.
+
+    Args:
+        stream: The stream, or a coroutine function opening it (so the wait for the
+            upstream happens after the response headers were sent)
+        encoder: Native/OpenAI/Claude stream encoder
+    """
+    chunk_seconds = CHUNK_SECONDS.labels(encoder.metrics_format)
+    heartbeat = STREAM_HEARTBEAT_SECONDS if STREAM_HEARTBEAT_SECONDS > 0 else None
+    opening = None
+    paced = None
+    try:
+        if callable(stream):
+            opening = asyncio.ensure_future(stream())
+            stream = None
+            while not (await asyncio.wait((opening,), timeout=heartbeat))[0]:
+                yield encoder.heartbeat()
+            stream, opening = opening.result(), None
+
+        if stream.error_message is not None:
+            logging.error(f"Streaming request failed: {stream.error_message}")
+            error_type = "invalid_request_error" if stream.status_code == 404 else "api_error"
+            yield encoder.error(stream.error_message, error_type, stream.status_code)
+            return
+
+        start = encoder.start()
+        if start:
+            yield start
+        events = stream.events()
+        if heartbeat is not None:
+            events = paced = _with_heartbeats(events, heartbeat)
+        async for event in events:
+            if event is None:
+                yield encoder.heartbeat()
+                continue
+            started = time.perf_counter()
+            try:
+                frame = encoder.encode(event)
+            except (json.JSONDecodeError, KeyError, UnicodeDecodeError) as e:
+                logging.warning(f"Failed to parse streaming chunk: {str(e)}")
+                continue
+            chunk_seconds.observe(time.perf_counter() - started)
+            if frame:
+                yield frame
+            if encoder.done:
+                return
+        yield encoder.finish()
+    except httpx.HTTPError as e:
+        logging.error(f"Streaming request failed: {str(e)}")
+        yield encoder.error(f"Upstream request failed: {str(e)}", "api_error", 502)
+    except Exception as e:
+        logging.error(f"Unexpected error during streaming: {str(e)}")
+        yield encoder.error(f"An unexpected error occurred: {str(e)}", "api_error", 500)
+    finally:
+        if paced is not None:
+            await paced.aclose()
+        if opening is not None:
+            # The client went away while the upstream was opening; close it once open
+            _close_when_opened(opening)
+        elif stream is not None:
+            await stream.aclose()
+
+
+def stream_response(stream: GeminiStream, encoder, headers: Optional[dict] = None,
+                    propagate_status: bool = False) -> StreamingResponse:
+    """
+    Wrap a GeminiStream in a StreamingResponse.
+
+    Args:
+        stream: Upstream stream from open_gemini_stream
+        encoder: Native/OpenAI/Claude stream encoder
+        headers: Extra response headers
+        propagate_status: Use the upstream error status instead of 200 on failure
+    """
+    status_code = stream.status_code if propagate_status and stream.error_message is not None else 200
+    return StreamingResponse(
+        encode_stream(stream, encoder),
+        media_type="text/event-stream",
+        headers={**_STREAM_HEADERS, **(headers or {})},
+        status_code=status_code,
+        background=BackgroundTask(stream.aclose)
+    )
+
+
+async def open_stream_response(open_stream: Callable[[], Awaitable[GeminiStream]], encoder,
+                               headers: Optional[dict] = None) -> StreamingResponse:
+    """
+    Stream an upstream response whose errors are rendered by the encoder (status 200).
+    With STREAM_EARLY_HEADERS the response starts at once and the upstream is
+    opened inside the body, covered by heartbeats; otherwise it is opened first.
+
+    Args:
+        open_stream: Coroutine function opening the upstream stream
+        encoder: OpenAI/Claude stream encoder
+        headers: Extra response headers
+    """
+    if not STREAM_EARLY_HEADERS:
+        return stream_response(await open_stream(), encoder, headers)
+    return StreamingResponse(
+        encode_stream(open_stream, encoder),
+        media_type="text/event-stream",
+        headers={**_STREAM_HEADERS, **(headers or {})}
+    )
@@ -3,229 +3,331 @@ Google API Client - Handles all communication with Google's Gemini API.
 This module is used by both OpenAI compatibility layer and native Gemini endpoints.
 """
 import json
+import time
 import logging
-import requests
+import httpx
 from fastapi import Response
-from fastapi.responses import StreamingResponse
-from google.auth.transport.requests import Request as GoogleAuthRequest
 
-from .auth import get_credentials, save_credentials, get_user_project_id, onboard_user
-from .utils import get_user_agent
+from .credential_pool import credential_pool, AdmissionRejected
+from .gemini_stream import GeminiStream, NativeStreamEncoder, stream_response, split_object_members, unwrap_response
+from .response_cache import response_cache
+from .context_cache import context_cache
+from .request_coalescing import request_coalescer
+from .http_client import get_http_client
+from .metrics import STAGE_UPSTREAM_TTFB, UPSTREAM_RESPONSES
+from .utils import get_user_agent, RawRequest
 from .config import (
     CODE_ASSIST_ENDPOINT,
     DEFAULT_SAFETY_SETTINGS,
-    get_base_model_name,
-    is_search_model,
-    get_thinking_budget,
-    should_include_thoughts
+    resolve_model
 )
-import asyncio
 
 
-def send_gemini_request(payload: dict, is_streaming: bool = False) -> Response:
+# Headers Google sends on native streamGenerateContent responses
+NATIVE_STREAM_HEADERS = {
+    "Content-Disposition": "attachment",
+    "Vary": "Origin, X-Origin, Referer",
+    "X-XSS-Protection": "0",
+    "X-Frame-Options": "SAMEORIGIN",
+    "X-Content-Type-Options": "nosniff",
+    "Server": "ESF"
+}
+
+
+async def send_gemini_request(payload: dict, is_streaming: bool = False, username: str = None) -> Response:
     """
     Send a request to Google's Gemini API.
 
     Args:
         payload: The request payload in Gemini format
         is_streaming: Whether this is a streaming request
+        username: Authenticated user, for fair queueing when all credentials are busy
 
     Returns:
-        FastAPI Response object
+        FastAPI Response object (native Gemini SSE when streaming)
     """
-    # Get and validate credentials
-    creds = get_credentials()
-    if not creds:
-        return Response(
+    if is_streaming:
+        stream = await open_gemini_stream(payload, username=username)
+        return stream_response(stream, NativeStreamEncoder(), headers=NATIVE_STREAM_HEADERS, propagate_status=True)
+
+    cache_key = response_cache.key(payload, is_streaming=False)
+    cached = response_cache.get(cache_key)
+    if cached is not None:
+        return Response(content=cached, status_code=200, media_type="application/json; charset=utf-8")
+
+    coalescing_key = request_coalescer.key(payload)
+    return await request_coalescer.call(coalescing_key, lambda: _generate(payload, cache_key, username))
+
+
+async def _generate(payload: dict, cache_key, username: str) -> Response:
+    resp, close_upstream, error = await _send_with_failover(payload, is_streaming=False, username=username)
+    if error is not None:
+        return error
+    await close_upstream()
+    response = _handle_non_streaming_response(resp)
+    if cache_key is not None and response.status_code == 200:
+        response_cache.put(cache_key, response.body, len(response.body))
+    return response
+
+
+async def open_gemini_stream(payload: dict, username: str = None) -> GeminiStream:
+    """
+    Start a streamGenerateContent request and return its typed event stream.
+    Upstream errors are reported through GeminiStream.error_message so every
+    encoder can render them in its own format.
+
+    Args:
+        payload: The request payload in Gemini format
+        username: Authenticated user, for fair queueing when all credentials are busy
+
+    Returns:
+        GeminiStream
+    """
+    cache_key = response_cache.key(payload, is_streaming=True)
+    cached = response_cache.get(cache_key)
+    if cached is not None:
+        return GeminiStream.replay(cached)
+
+    coalescing_key = request_coalescer.key(payload)
+    return await request_coalescer.stream(coalescing_key, lambda: _open_upstream_stream(payload, cache_key, username))
+
+
+async def _open_upstream_stream(payload: dict, cache_key, username: str) -> GeminiStream:
+    resp, close_upstream, error = await _send_with_failover(payload, is_streaming=True, username=username)
+    if error is not None:
+        return GeminiStream.failed(error.status_code, _error_message(error.body, f"Streaming request failed (status: {error.status_code})"))
+
+    if resp.status_code != 200:
+        try:
+            await resp.aread()
+        finally:
+            await close_upstream()
+        logging.error(f"Google API returned status {resp.status_code}: {resp.text}")
+        return GeminiStream.failed(resp.status_code, _error_message(resp.content, f"Google API error: {resp.status_code}"))
+
+    on_complete = None
+    if cache_key is not None:
+        def on_complete(raw_events):
+            response_cache.put(cache_key, raw_events, sum(len(raw) for raw in raw_events))
+    return GeminiStream(resp, close_upstream, on_complete=on_complete)
+
+
+def _error_message(body: bytes, default: str) -> str:
+    try:
+        error_data = json.loads(body)
+        if "error" in error_data:
+            return error_data["error"].get("message", default)
+    except (ValueError, AttributeError):
+        if body:
+            return body.decode("utf-8", "ignore")
+    return default
+
+
+async def _send_with_failover(payload: dict, is_streaming: bool, username: str = None):
+    """
+    Send the payload with the least-loaded pooled account, waiting in the admission
+    queue while every account is at its concurrency limit. If that account answers
+    429 before anything is streamed, its limit is lowered, it is put on cooldown and
+    the next one is tried; on 401/403 its cached token/setup is invalidated and the
+    next one is tried.
+
+    Returns:
+        (upstream response, coroutine function that closes it and releases the
+        account, None), or (None, None, error Response) if no request could be made
+    """
+    if not credential_pool.accounts and not await credential_pool.load():
+        return None, None, Response(
             content="Authentication failed. Please restart the proxy to log in.",
             status_code=500
         )
 
+    # Determine the action and URL
+    action = "streamGenerateContent" if is_streaming else "generateContent"
+    target_url = f"{CODE_ASSIST_ENDPOINT}/v1internal:{action}"
+    if is_streaming:
+        target_url += "?alt=sse"
+
+    client = get_http_client()
+    tried = []
+    last_error = None
+    while True:
+        try:
+            account = await credential_pool.admit(username, exclude=tried)
+        except AdmissionRejected as e:
+            return None, None, Response(
+                content=json.dumps({
+                    "error": {
+                        "message": str(e),
+                        "type": "api_error",
+                        "code": 429
+                    }
+                }),
+                status_code=429,
+                media_type="application/json"
+            )
+        if account is None:
+            break
+        tried.append(account)
+        epoch = account.limit_epoch
 
-    # Refresh credentials if needed
-    if creds.expired and creds.refresh_token:
         try:
-            creds.refresh(GoogleAuthRequest())
-            save_credentials(creds)
+            await account.ensure_ready()
         except Exception as e:
-            return Response(
-                content="Token refresh failed. Please restart the proxy to re-authenticate.",    
+            credential_pool.release(account)
+            logging.error(f"Credential {account.name} is not usable: {str(e)}")
+            last_error = Response(
+                content=f"Credential setup failed: {str(e)}. Please restart the proxy to re-authenticate.",
                 status_code=500
             )
-    elif not creds.token:
-        return Response(
-            content="No access token. Please restart the proxy to re-authenticate.",
-            status_code=500
-        )
+            continue
 
-    # Get project ID and onboard user
-    proj_id = get_user_project_id(creds)
-    if not proj_id:
-        return Response(content="Failed to get user project ID.", status_code=500)
+        request = payload.get("request", {})
+        request_to_send, cached_prefix = await context_cache.apply(account, payload.get("model"), request)
 
-    onboard_user(creds, proj_id)
+        try:
+            resp = await _post(client, target_url, is_streaming, account, payload.get("model"), request_to_send)
+            if cached_prefix is not None and resp.status_code in (400, 403, 404):
+                # The cached content expired or was deleted upstream; resend the full request
+                try:
+                    await resp.aread()
+                finally:
+                    await resp.aclose()
+                logging.warning(f"Request using context cache {cached_prefix.name} failed with {resp.status_code}, resending without it")
+                context_cache.invalidate(account, cached_prefix)
+                resp = await _post(client, target_url, is_streaming, account, payload.get("model"), request)
+        except httpx.HTTPError as e:
+            credential_pool.release(account)
+            logging.error(f"Request to Google API failed: {str(e)}")
+            return None, None, Response(
+                content=json.dumps({"error": {"message": f"Request failed: {str(e)}"}}),
+                status_code=500,
+                media_type="application/json"
+            )
+        except Exception as e:
+            credential_pool.release(account)
+            logging.error(f"Unexpected error during Google API request: {str(e)}")
+            return None, None, Response(
+                content=json.dumps({"error": {"message": f"Unexpected error: {str(e)}"}}),
+                status_code=500,
+                media_type="application/json"
+            )
 
+        if resp.status_code == 429:
+            # Nothing has been sent to the client yet, so try another account
+            try:
+                await resp.aread()
+                credential_pool.mark_exhausted(account, resp.content, resp.headers.get("Retry-After"))
+            finally:
+                await resp.aclose()
+                account.record_overload(epoch)
+                credential_pool.release(account)
+            last_error = resp
+            continue
+
+        if resp.status_code in (401, 403):
+            # Cached token or setup is stale for this account; re-resolve it later and try another
+            try:
+                await resp.aread()
+            finally:
+                await resp.aclose()
+                credential_pool.release(account)
+            account.invalidate(resp.status_code)
+            last_error = resp
+            continue
+
+        if resp.status_code < 500:
+            account.record_success()
+        return resp, _closer(resp, account), None
+
+    if isinstance(last_error, httpx.Response):
+        logging.error(f"No credential accepted the request (last status {last_error.status_code})")
+        return last_error, last_error.aclose, None
+    if last_error is not None:
+        return None, None, last_error
+    return None, None, Response(
+        content=json.dumps({
+            "error": {
+                "message": "All credentials are cooling down after hitting their quota. Please retry later.",
+                "type": "api_error",
+                "code": 429
+            }
+        }),
+        status_code=429,
+        media_type="application/json"
+    )
+
+
+async def _post(client: httpx.AsyncClient, target_url: str, is_streaming: bool, account, model: str,
+                request: dict) -> httpx.Response:
+    """Send one Code Assist request for the account's project, recording its time to response headers."""
     # Build the final payload with project info
     final_payload = {
-        "model": payload.get("model"),
-        "project": proj_id,
-        "request": payload.get("request", {})
+        "model": model,
+        "project": account.project_id,
+        "request": request
     }
 
-    # Determine the action and URL
-    action = "streamGenerateContent" if is_streaming else "generateContent"
-    target_url = f"{CODE_ASSIST_ENDPOINT}/v1internal:{action}"
-    if is_streaming:
-        target_url += "?alt=sse"
-
     # Build request headers
     request_headers = {
-        "Authorization": f"Bearer {creds.token}",
+        "Authorization": f"Bearer {account.creds.token}",
         "Content-Type": "application/json",
         "User-Agent": get_user_agent(),
     }
 
-    final_post_data = json.dumps(final_payload)
-
-    # Send the request
-    # Disable proxy to avoid proxy connection errors
-    proxies = {
-        'http': None,
-        'https': None
-    }
+    if isinstance(request, RawRequest):
+        # Splice the wrapper around the client's bytes instead of re-encoding them
+        final_post_data = b"".join([
+            b'{"model":%b,"project":%b,"request":' % (
+                json.dumps(model).encode("utf-8"), json.dumps(account.project_id).encode("utf-8")),
+            *request.parts,
+            b"}"
+        ])
+    else:
+        final_post_data = json.dumps(final_payload)
 
+    started = time.perf_counter()
     try:
         if is_streaming:
-            resp = requests.post(target_url, data=final_post_data, headers=request_headers, stream=True, proxies=proxies)
-            return _handle_streaming_response(resp)
+            upstream_request = client.build_request("POST", target_url, content=final_post_data, headers=request_headers)
+            resp = await client.send(upstream_request, stream=True)
         else:
-            resp = requests.post(target_url, data=final_post_data, headers=request_headers, proxies=proxies)
-            return _handle_non_streaming_response(resp)
-    except requests.exceptions.RequestException as e:
-        logging.error(f"Request to Google API failed: {str(e)}")
-        return Response(
-            content=json.dumps({"error": {"message": f"Request failed: {str(e)}"}}),
-            status_code=500,
-            media_type="application/json"
-        )
-    except Exception as e:
-        logging.error(f"Unexpected error during Google API request: {str(e)}")
-        return Response(
-            content=json.dumps({"error": {"message": f"Unexpected error: {str(e)}"}}),
-            status_code=500,
-            media_type="application/json"
-        )
+            resp = await client.post(target_url, content=final_post_data, headers=request_headers)
+    except httpx.HTTPError:
+        UPSTREAM_RESPONSES.labels(account.name, "error").inc()
+        raise
+    STAGE_UPSTREAM_TTFB.observe(time.perf_counter() - started)
+    UPSTREAM_RESPONSES.labels(account.name, str(resp.status_code)).inc()
+    return resp
 
 
-def _handle_streaming_response(resp) -> StreamingResponse:
-    """Handle streaming response from Google API."""
-
-    # Check for HTTP errors before starting to stream
-    if resp.status_code != 200:
-        logging.error(f"Google API returned status {resp.status_code}: {resp.text}")
-        error_message = f"Google API error: {resp.status_code}"
-        try:
-            error_data = resp.json()
-            if "error" in error_data:
-                error_message = error_data["error"].get("message", error_message)
-        except:
-            pass
-
-        # Return error as a streaming response
-        async def error_generator():
-            error_response = {
-                "error": {
-                    "message": error_message,
-                    "type": "invalid_request_error" if resp.status_code == 404 else "api_error", 
-                    "code": resp.status_code
-                }
-            }
-            yield f'data: {json.dumps(error_response)}\n\n'.encode('utf-8')
-
-        response_headers = {
-            "Content-Type": "text/event-stream",
-            "Content-Disposition": "attachment",
-            "Vary": "Origin, X-Origin, Referer",
-            "X-XSS-Protection": "0",
-            "X-Frame-Options": "SAMEORIGIN",
-            "X-Content-Type-Options": "nosniff",
-            "Server": "ESF"
-        }
-
-        return StreamingResponse(
-            error_generator(),
-            media_type="text/event-stream",
-            headers=response_headers,
-            status_code=resp.status_code
-        )
+def _closer(resp: httpx.Response, account):
+    """Build an idempotent close callback that returns the connection and the account."""
+    released = False
 
-    async def stream_generator():
-        try:
-            with resp:
-                for chunk in resp.iter_lines():
-                    if chunk:
-                        if not isinstance(chunk, str):
-                            chunk = chunk.decode('utf-8', "ignore")
-
-                        if chunk.startswith('data: '):
-                            chunk = chunk[len('data: '):]
-
-                            try:
-                                obj = json.loads(chunk)
-
-                                if "response" in obj:
-                                    response_chunk = obj["response"]
-                                    response_json = json.dumps(response_chunk, separators=(',', ':'))
-                                    response_line = f"data: {response_json}\n\n"
-                                    yield response_line.encode('utf-8', "ignore")
-                                    await asyncio.sleep(0)
-                                else:
-                                    obj_json = json.dumps(obj, separators=(',', ':'))
-                                    yield f"data: {obj_json}\n\n".encode('utf-8', "ignore")      
-                            except json.JSONDecodeError:
-                                continue
-
-        except requests.exceptions.RequestException as e:
-            logging.error(f"Streaming request failed: {str(e)}")
-            error_response = {
-                "error": {
-                    "message": f"Upstream request failed: {str(e)}",
-                    "type": "api_error",
-                    "code": 502
-                }
-            }
-            yield f'data: {json.dumps(error_response)}\n\n'.encode('utf-8', "ignore")
-        except Exception as e:
-            logging.error(f"Unexpected error during streaming: {str(e)}")
-            error_response = {
-                "error": {
-                    "message": f"An unexpected error occurred: {str(e)}",
-                    "type": "api_error",
-                    "code": 500
-                }
-            }
-            yield f'data: {json.dumps(error_response)}\n\n'.encode('utf-8', "ignore")
-
-    response_headers = {
-        "Content-Type": "text/event-stream",
-        "Content-Disposition": "attachment",
-        "Vary": "Origin, X-Origin, Referer",
-        "X-XSS-Protection": "0",
-        "X-Frame-Options": "SAMEORIGIN",
-        "X-Content-Type-Options": "nosniff",
-        "Server": "ESF"
-    }
+    async def close_upstream():
+        nonlocal released
+        await resp.aclose()
+        if not released:
+            released = True
+            credential_pool.release(account)
 
-    return StreamingResponse(
-        stream_generator(),
-        media_type="text/event-stream",
-        headers=response_headers
-    )
+    return close_upstream
 
 
-def _handle_non_streaming_response(resp) -> Response:
+def _handle_non_streaming_response(resp: httpx.Response) -> Response:
     """Handle non-streaming response from Google API."""
     if resp.status_code == 200:
+        body = resp.content
+        if body.startswith(b"data: "):
+            body = body[len(b"data: "):]
+        # Forward the "response" member byte-for-byte when the envelope allows it
+        standard_gemini_response = unwrap_response(body)
+        if standard_gemini_response is not None:
+            return Response(
+                content=standard_gemini_response,
+                status_code=200,
+                media_type="application/json; charset=utf-8"
+            )
         try:
             google_api_response = resp.text
             if google_api_response.startswith('data: '):
@@ -312,6 +414,7 @@ def build_gemini_payload_from_native(native_request: dict, model_from_path: str)
     Build a Gemini API payload from a native Gemini request.
     This is used for direct Gemini API calls.
     """
+    variant = resolve_model(model_from_path)
     native_request["safetySettings"] = DEFAULT_SAFETY_SETTINGS
 
     if "generationConfig" not in native_request:
@@ -322,26 +425,64 @@ def build_gemini_payload_from_native(native_request: dict, model_from_path: str)
     if "thinkingConfig" not in native_request["generationConfig"]:
         native_request["generationConfig"]["thinkingConfig"] = {}
 
-    if "gemini-2.5-flash-image" not in model_from_path:
+    if variant.thinking_config:
         # Configure thinking based on model variant
-        thinking_budget = get_thinking_budget(model_from_path)
-        include_thoughts = should_include_thoughts(model_from_path)
-
-        native_request["generationConfig"]["thinkingConfig"]["includeThoughts"] = include_thoughts
+        native_request["generationConfig"]["thinkingConfig"]["includeThoughts"] = variant.include_thoughts
         if "thinkingBudget" in native_request["generationConfig"]["thinkingConfig"]:
             pass
         else:
-            native_request["generationConfig"]["thinkingConfig"]["thinkingBudget"] = thinking_budget
+            native_request["generationConfig"]["thinkingConfig"]["thinkingBudget"] = variant.thinking_budget
 
-    # Add Google Search grounding for search models
-    if is_search_model(model_from_path):
+    # Add the variant's tools (Google Search grounding for search models)
+    if variant.tools:
         if "tools" not in native_request:
             native_request["tools"] = []
-        # Add googleSearch tool if not already present
-        if not any(tool.get("googleSearch") for tool in native_request["tools"]):
-            native_request["tools"].append({"googleSearch": {}})
+        # Skip tools the request already declares
+        declared = {name for tool in native_request["tools"] for name in tool}
+        native_request["tools"].extend(
+            tool for tool in variant.request_tools() if not declared.intersection(tool)
+        )
 
     return {
-        "model": get_base_model_name(model_from_path),  # Use base model name for API call       
+        "model": variant.base_model,  # Use base model name for API call       
         "request": native_request
-    }
\ No newline at end of file
+    }
+
+
+# Members build_gemini_payload_from_native edits; all others are forwarded as raw bytes
+_NATIVE_EDITED_MEMBERS = ("safetySettings", "generationConfig", "tools")
+
+
+def build_gemini_payload_from_native_bytes(body: bytes, model_from_path: str):
+    """
+    Build a Gemini API payload from a raw native request body without decoding it.
+    Only the members the proxy edits are decoded; contents, systemInstruction and
+    everything else are spliced into the upstream request unchanged.
+
+    Returns:
+        Payload whose "request" is a RawRequest, or None if the body is not a JSON
+        object (the caller then takes the regular path)
+    """
+    members = split_object_members(body)
+    if members is None:
+        return None
+    edited = {}
+    parts = [b"{"]
+    for raw_key, raw_value in members:
+        key = raw_key[1:-1].decode("utf-8", "replace") if b"\\" not in raw_key else json.loads(raw_key)
+        if key in _NATIVE_EDITED_MEMBERS:
+            try:
+                edited[key] = json.loads(bytes(raw_value))
+            except ValueError:
+                return None
+        else:
+            parts.extend((raw_key, b":", raw_value, b","))
+
+    payload = build_gemini_payload_from_native(edited, model_from_path)
+    request = payload["request"]
+    for key, value in request.items():
+        parts.extend((json.dumps(key).encode("utf-8"), b":", json.dumps(value).encode("utf-8"), b","))
+    # build_gemini_payload_from_native always sets safetySettings, so there is a trailing comma to replace
+    parts[-1] = b"}"
+    payload["request"] = RawRequest(parts, request)
+    return payload
@@ -0,0 +1,50 @@
+"""
+Shared async HTTP client for all upstream Google API calls.
+A single pooled client keeps connections to the Code Assist endpoint alive
+(multiplexed over HTTP/2 when available) instead of opening one per request.
+"""
+import logging
+import httpx
+
+from .config import (
+    HTTP2_ENABLED,
+    HTTP_MAX_CONNECTIONS,
+    HTTP_MAX_KEEPALIVE_CONNECTIONS,
+    HTTP_KEEPALIVE_EXPIRY,
+    HTTP_CONNECT_TIMEOUT,
+    HTTP_READ_TIMEOUT
+)
+
+_client = None
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """
+    Return the process-wide upstream client, creating it on first use.
+
+    Returns:
+        Pooled httpx.AsyncClient
+    """
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            http2=HTTP2_ENABLED,
+            limits=httpx.Limits(
+                max_connections=HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=HTTP_KEEPALIVE_EXPIRY
+            ),
+            timeout=httpx.Timeout(HTTP_READ_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT),
+            # Ignore proxy environment variables, matching the previous requests setup
+            trust_env=False
+        )
+        logging.info(f"Upstream HTTP client ready (http2={HTTP2_ENABLED}, max_connections={HTTP_MAX_CONNECTIONS})")
+    return _client
+
+
+async def close_http_client():
+    """Close the shared client and release pooled connections."""
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
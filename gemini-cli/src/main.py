@@ -1,11 +1,22 @@
 import logging
 import os
-from fastapi import FastAPI, Request, Response
+from fastapi import FastAPI, Request, Response, Depends
 from fastapi.middleware.cors import CORSMiddleware
 from .gemini_routes import router as gemini_router
 from .openai_routes import router as openai_router
 from .claude_routes import router as claude_router
-from .auth import get_credentials, get_user_project_id, onboard_user
+from .batch_routes import router as batch_router
+from .credential_pool import credential_pool
+from .response_cache import response_cache
+from .context_cache import context_cache
+from .request_coalescing import request_coalescer
+from .batch import batch_manager
+from .shared_state import shared_state
+from .token_counter import token_counter
+from .http_client import close_http_client
+from .metrics import registry, MetricsMiddleware
+from .auth import authenticate_user
+from .config import METRICS_ENABLED
 
 # Load environment variables from .env file
 try:
@@ -34,6 +45,9 @@ app.add_middleware(
     allow_headers=["*"],  # Allow all headers
 )
 
+if METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
+
 @app.on_event("startup")
 async def startup_event():
     try:
@@ -41,58 +55,50 @@ async def startup_event():
         
         # Check if credentials exist
         import os
-        from .config import CREDENTIAL_FILE
+        from .config import CREDENTIAL_FILE, GEMINI_CREDENTIALS_DIR, GEMINI_CREDENTIALS_LIST
         
         env_creds_json = os.getenv("GEMINI_CREDENTIALS")
         creds_file_exists = os.path.exists(CREDENTIAL_FILE)
+        pool_configured = bool(GEMINI_CREDENTIALS_DIR or GEMINI_CREDENTIALS_LIST)
         
-        if env_creds_json or creds_file_exists:
-            try:
-                # Try to load existing credentials without OAuth flow first
-                creds = get_credentials(allow_oauth_flow=False)
-                if creds:
-                    try:
-                        proj_id = get_user_project_id(creds)
-                        if proj_id:
-                            onboard_user(creds, proj_id)
-                            logging.info(f"Successfully onboarded with project ID: {proj_id}")
-                        logging.info("Gemini proxy server started successfully")
-                        logging.info("Authentication required - Password: see .env file")
-                    except Exception as e:
-                        logging.error(f"Setup failed: {str(e)}")
-                        logging.warning("Server started but may not function properly until setup issues are resolved.")
-                else:
-                    logging.warning("Credentials file exists but could not be loaded. Server started - authentication will be required on first request.")
-            except Exception as e:
-                logging.error(f"Credential loading error: {str(e)}")
-                logging.warning("Server started but credentials need to be set up.")
-        else:
+        if not (env_creds_json or creds_file_exists or pool_configured):
             # No credentials found - prompt user to authenticate
             logging.info("No credentials found. Starting OAuth authentication flow...")
-            try:
-                creds = get_credentials(allow_oauth_flow=True)
-                if creds:
-                    try:
-                        proj_id = get_user_project_id(creds)
-                        if proj_id:
-                            onboard_user(creds, proj_id)
-                            logging.info(f"Successfully onboarded with project ID: {proj_id}")
-                        logging.info("Gemini proxy server started successfully")
-                    except Exception as e:
-                        logging.error(f"Setup failed: {str(e)}")
-                        logging.warning("Server started but may not function properly until setup issues are resolved.")
+        
+        try:
+            # Only start the OAuth flow when there is nothing to load
+            allow_oauth_flow = not (env_creds_json or creds_file_exists or pool_configured)
+            if await credential_pool.load(allow_oauth_flow=allow_oauth_flow):
+                await credential_pool.prepare_all()
+                status = credential_pool.status()
+                ready = sum(1 for account in status["accounts"] if account["onboarded"])
+                if ready:
+                    logging.info(f"Gemini proxy server started successfully with {ready}/{status['total']} credential(s) ready")
                 else:
-                    logging.error("Authentication failed. Server started but will not function until credentials are provided.")
-            except Exception as e:
-                logging.error(f"Authentication error: {str(e)}")
-                logging.warning("Server started but authentication failed.")
+                    logging.warning("Server started but may not function properly until setup issues are resolved.")
+            elif allow_oauth_flow:
+                logging.error("Authentication failed. Server started but will not function until credentials are provided.")
+            else:
+                logging.warning("Credentials exist but could not be loaded. Server started - authentication will be required on first request.")
+        except Exception as e:
+            logging.error(f"Credential loading error: {str(e)}")
+            logging.warning("Server started but credentials need to be set up.")
         
         logging.info("Authentication required - Password: see .env file")
+
+        # Pick up batches that were running when the server stopped, or whose worker exited
+        batch_manager.start_resumer()
         
     except Exception as e:
         logging.error(f"Startup error: {str(e)}")
         logging.warning("Server may not function properly.")
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    await batch_manager.stop()
+    await credential_pool.stop_refresher()
+    await close_http_client()
+
 @app.options("/{full_path:path}")
 async def handle_preflight(request: Request, full_path: str):
     """Handle CORS preflight requests without authentication."""
@@ -121,19 +127,25 @@ async def root():
         "endpoints": {
             "openai_compatible": {
                 "chat_completions": "/v1/chat/completions",
-                "models": "/v1/models"
+                "count_tokens": "/v1/chat/completions/count_tokens",
+                "models": "/v1/models",
+                "files": "/v1/files",
+                "batches": "/v1/batches"
             },
             "claude_compatible": {
-                "messages": "/v1/messages"
+                "messages": "/v1/messages",
+                "count_tokens": "/v1/messages/count_tokens"
             },
             "native_gemini": {
                 "models": "/v1beta/models",
                 "generate": "/v1beta/models/{model}/generateContent",
-                "stream": "/v1beta/models/{model}/streamGenerateContent"
+                "stream": "/v1beta/models/{model}/streamGenerateContent",
+                "count_tokens": "/v1beta/models/{model}:countTokens"
             },
-            "health": "/health"
+            "health": "/health",
+            "metrics": "/metrics"
         },
-        "authentication": "Required for all endpoints except root and health",
+        "authentication": "Required for all endpoints except root, health and metrics",
         "repository": "https://github.com/user/geminicli2api"
     }
 
@@ -141,8 +153,31 @@ async def root():
 @app.get("/health")
 async def health_check():
     """Health check endpoint for container orchestration."""
-    return {"status": "healthy", "service": "geminicli2api"}
+    pool_status = credential_pool.status()
+    return {
+        "status": "healthy",
+        "service": "geminicli2api",
+        "credentials": {"total": pool_status["total"], "available": pool_status["available"]},
+        "response_cache": response_cache.stats(),
+        "context_cache": context_cache.stats(),
+        "coalescing": request_coalescer.stats(),
+        "admission": credential_pool.admission_status(),
+        "token_counter": token_counter.stats(),
+        "worker": shared_state.stats()
+    }
+
+@app.get("/health/admission")
+async def admission_details(username: str = Depends(authenticate_user)):
+    """Admission queue with limits per credential and queued requests per user. Requires authentication."""
+    return credential_pool.admission_status(detailed=True)
+
+if METRICS_ENABLED:
+    @app.get("/metrics")
+    async def metrics():
+        """Prometheus metrics in the text exposition format. No authentication required."""
+        return Response(content=registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
 
 app.include_router(openai_router)
 app.include_router(claude_router)
+app.include_router(batch_router)
 app.include_router(gemini_router)
\ No newline at end of file
@@ -0,0 +1,294 @@
+"""
+Metrics - Prometheus counters, gauges and latency histograms.
+Rendered in the Prometheus text format on /metrics without extra dependencies.
+Label children are created once and kept, and call sites hold on to the
+children they use, so recording a sample is a dict lookup at most plus a few
+arithmetic operations.
+"""
+import time
+from bisect import bisect_left
+from typing import Callable, Iterable, Optional, Tuple
+
+from .config import SUPPORTED_MODELS
+
+# Request stages, from seconds to minutes
+STAGE_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+# Per-chunk transform cost, from microseconds to milliseconds
+CHUNK_BUCKETS = (0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.05)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels_text(names: tuple, values: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+
+    def labels(self, *values):
+        """Return the child for these label values, creating it on first use."""
+        child = self._children.get(values)
+        if child is None:
+            child = self._children[values] = self._new_child()
+        return child
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for values, child in list(self._children.items()):
+            lines.extend(self._render_child(values, child))
+        return lines
+
+    def _render_child(self, values: tuple, child) -> list:
+        return [f"{self.name}{_labels_text(self.labelnames, values)} {_number(child.value)}"]
+
+
+class _Value:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, amount: float = 1):
+        self.value += amount
+
+    def dec(self, amount: float = 1):
+        self.value -= amount
+
+    def set(self, value: float):
+        self.value = value
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _new_child(self):
+        return _Value()
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def _new_child(self):
+        return _Value()
+
+
+class CallbackGauge(_Metric):
+    """A gauge read at scrape time; fn returns (label values, value) pairs."""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple,
+                 fn: Callable[[], Iterable[Tuple[tuple, float]]]):
+        super().__init__(name, documentation, labelnames)
+        self._fn = fn
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for values, value in self._fn():
+            lines.append(f"{self.name}{_labels_text(self.labelnames, values)} {_number(value)}")
+        return lines
+
+
+class _HistogramChild:
+    __slots__ = ("bounds", "counts", "sum", "count")
+
+    def __init__(self, bounds: tuple):
+        self.bounds = bounds
+        # counts[i] holds samples <= bounds[i] and > bounds[i - 1]; the last slot is +Inf
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def time(self) -> "_Timer":
+        return _Timer(self)
+
+
+class _Timer:
+    """Context manager observing the elapsed time of its block."""
+
+    __slots__ = ("child", "start")
+
+    def __init__(self, child: _HistogramChild):
+        self.child = child
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.child.observe(time.perf_counter() - self.start)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = (), buckets: tuple = STAGE_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def _render_child(self, values: tuple, child: _HistogramChild) -> list:
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float("inf"),), child.counts):
+            cumulative += count
+            le = 'le="' + _number(bound) + '"'
+            lines.append(f"{self.name}_bucket{_labels_text(self.labelnames, values, le)} {cumulative}")
+        labels = _labels_text(self.labelnames, values)
+        lines.append(f"{self.name}_sum{labels} {_number(child.sum)}")
+        lines.append(f"{self.name}_count{labels} {child.count}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> bytes:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return ("\n".join(lines) + "\n").encode("utf-8")
+
+
+registry = Registry()
+
+REQUESTS = registry.register(Counter(
+    "gemini_requests_total", "Client requests by API, model variant and status code.",
+    ("api", "model", "status")))
+REQUESTS_IN_FLIGHT = registry.register(Gauge(
+    "gemini_requests_in_flight", "Client requests being served, by API.", ("api",)))
+STAGE_SECONDS = registry.register(Histogram(
+    "gemini_stage_duration_seconds", "Time spent in each request stage.", ("stage",)))
+UPSTREAM_RESPONSES = registry.register(Counter(
+    "gemini_upstream_responses_total", "Upstream responses by credential and status code.",
+    ("credential", "status")))
+CHUNK_SECONDS = registry.register(Histogram(
+    "gemini_chunk_transform_seconds", "Time to transform one streamed chunk, by output format.",
+    ("format",), CHUNK_BUCKETS))
+CREDENTIAL_REFRESHES = registry.register(Counter(
+    "gemini_credential_refreshes_total", "Access token refreshes by credential and result.",
+    ("credential", "result")))
+
+# Stage children used on hot paths
+STAGE_TOTAL = STAGE_SECONDS.labels("total")
+STAGE_TRANSFORM = STAGE_SECONDS.labels("transform")
+STAGE_UPSTREAM_TTFB = STAGE_SECONDS.labels("upstream_ttfb")
+STAGE_STREAM = STAGE_SECONDS.labels("stream")
+STAGE_ADMISSION_WAIT = STAGE_SECONDS.labels("admission_wait")
+STAGE_CREDENTIAL_REFRESH = STAGE_SECONDS.labels("credential_refresh")
+
+
+# Listed model variants; any other name is labelled "other" so clients cannot grow the label set
+_MODEL_LABELS = frozenset(model["name"].replace("models/", "") for model in SUPPORTED_MODELS)
+
+
+def model_label(model: Optional[str]) -> str:
+    """Metrics label for a requested model name."""
+    if not model:
+        return "unknown"
+    if model.startswith("models/"):
+        model = model[len("models/"):]
+    return model if model in _MODEL_LABELS else "other"
+
+
+def set_request_model(request, model: Optional[str]):
+    """Record the requested model variant for the request metrics."""
+    request.state.metrics_model = model_label(model)
+
+
+# Path prefixes of the APIs whose requests are measured
+_API_PREFIXES = (
+    ("/v1/chat/", "openai"),
+    ("/v1/messages", "claude"),
+    ("/v1/batches", "batch"),
+    ("/v1/files", "batch"),
+    ("/v1beta/", "gemini"),
+    ("/v1/models/", "gemini"),
+)
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware recording per-request counts, in-flight gauges, total
+    duration and, for event streams, time from response headers to the last byte.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self._in_flight = {api: REQUESTS_IN_FLIGHT.labels(api) for _, api in _API_PREFIXES}
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        path = scope["path"]
+        api = None
+        for prefix, name in _API_PREFIXES:
+            if path.startswith(prefix):
+                api = name
+                break
+        if api is None:
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        status = 500
+        streaming = False
+        headers_at = start
+
+        async def send_wrapper(message):
+            nonlocal status, streaming, headers_at
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                headers_at = time.perf_counter()
+                for name, value in message.get("headers", ()):
+                    if name == b"content-type":
+                        streaming = value.startswith(b"text/event-stream")
+                        break
+            await send(message)
+
+        in_flight = self._in_flight[api]
+        in_flight.inc()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            in_flight.dec()
+            end = time.perf_counter()
+            STAGE_TOTAL.observe(end - start)
+            if streaming:
+                STAGE_STREAM.observe(end - headers_at)
+            model = scope.get("state", {}).get("metrics_model", "unknown")
+            REQUESTS.labels(api, model, str(status)).inc()
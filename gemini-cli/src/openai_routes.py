@@ -4,20 +4,20 @@ This module provides OpenAI-compatible endpoints that transform requests/respons
 and delegate to the Google API client.
 """
 import json
-import uuid
-import asyncio
 import logging
 from fastapi import APIRouter, Request, Response, Depends
-from fastapi.responses import StreamingResponse
 
 from .auth import authenticate_user
 from .models import OpenAIChatCompletionRequest
 from .openai_transformers import (
     openai_request_to_gemini,
-    gemini_response_to_openai,
-    gemini_stream_chunk_to_openai
+    gemini_response_to_openai
 )
-from .google_api_client import send_gemini_request, build_gemini_payload_from_openai
+from .google_api_client import send_gemini_request, open_gemini_stream, build_gemini_payload_from_openai
+from .gemini_stream import OpenAIStreamEncoder, open_stream_response
+from .token_counter import token_counter, estimate_text_tokens
+from .metrics import STAGE_TRANSFORM, set_request_model
+from .config import SUPPORTED_MODELS, OPENAI_MODELS_RESPONSE
 
 router = APIRouter()
 
@@ -34,14 +34,16 @@ async def openai_chat_completions(
     and transforms responses back to OpenAI format.
     """
     
+    set_request_model(http_request, request.model)
     try:
         logging.info(f"OpenAI chat completion request: model={request.model}, stream={request.stream}")
         
-        # Transform OpenAI request to Gemini format
-        gemini_request_data = openai_request_to_gemini(request)
-        
-        # Build the payload for Google API
-        gemini_payload = build_gemini_payload_from_openai(gemini_request_data)
+        with STAGE_TRANSFORM.time():
+            # Transform OpenAI request to Gemini format
+            gemini_request_data = openai_request_to_gemini(request)
+            
+            # Build the payload for Google API
+            gemini_payload = build_gemini_payload_from_openai(gemini_request_data)
         
     except Exception as e:
         logging.error(f"Error processing OpenAI request: {str(e)}")
@@ -58,110 +60,16 @@ async def openai_chat_completions(
         )
     
     if request.stream:
-        # Handle streaming response
-        async def openai_stream_generator():
-            try:
-                response = send_gemini_request(gemini_payload, is_streaming=True)
-                
-                if isinstance(response, StreamingResponse):
-                    response_id = "chatcmpl-" + str(uuid.uuid4())
-                    logging.info(f"Starting streaming response: {response_id}")
-                    
-                    async for chunk in response.body_iterator:
-                        if isinstance(chunk, bytes):
-                            chunk = chunk.decode('utf-8', "ignore")
-                        
-                        if chunk.startswith('data: '):
-                            try:
-                                # Parse the Gemini streaming chunk
-                                chunk_data = chunk[6:]  # Remove 'data: ' prefix
-                                gemini_chunk = json.loads(chunk_data)
-                                
-                                # Check if this is an error chunk
-                                if "error" in gemini_chunk:
-                                    logging.error(f"Error in streaming response: {gemini_chunk['error']}")
-                                    # Transform error to OpenAI format
-                                    error_data = {
-                                        "error": {
-                                            "message": gemini_chunk["error"].get("message", "Unknown error"),
-                                            "type": gemini_chunk["error"].get("type", "api_error"),
-                                            "code": gemini_chunk["error"].get("code")
-                                        }
-                                    }
-                                    yield f"data: {json.dumps(error_data)}\n\n"
-                                    yield "data: [DONE]\n\n"
-                                    return
-                                
-                                # Transform to OpenAI format
-                                openai_chunk = gemini_stream_chunk_to_openai(
-                                    gemini_chunk,
-                                    request.model,
-                                    response_id
-                                )
-                                
-                                # Send as OpenAI streaming format
-                                yield f"data: {json.dumps(openai_chunk)}\n\n"
-                                await asyncio.sleep(0)
-                                
-                            except (json.JSONDecodeError, KeyError, UnicodeDecodeError) as e:
-                                logging.warning(f"Failed to parse streaming chunk: {str(e)}")
-                                continue
-                    
-                    # Send the final [DONE] marker
-                    yield "data: [DONE]\n\n"
-                    logging.info(f"Completed streaming response: {response_id}")
-                else:
-                    # Error case - handle Response object with error
-                    error_msg = "Streaming request failed"
-                    status_code = 500
-                    
-                    if hasattr(response, 'status_code'):
-                        status_code = response.status_code
-                        error_msg += f" (status: {status_code})"
-                    
-                    if hasattr(response, 'body'):
-                        try:
-                            # Try to parse error response
-                            error_body = response.body
-                            if isinstance(error_body, bytes):
-                                error_body = error_body.decode('utf-8', "ignore")
-                            error_data = json.loads(error_body)
-                            if "error" in error_data:
-                                error_msg = error_data["error"].get("message", error_msg)
-                        except:
-                            pass
-                    
-                    logging.error(f"Streaming request failed: {error_msg}")
-                    error_data = {
-                        "error": {
-                            "message": error_msg,
-                            "type": "invalid_request_error" if status_code == 404 else "api_error",
-                            "code": status_code
-                        }
-                    }
-                    yield f"data: {json.dumps(error_data)}\n\n"
-                    yield "data: [DONE]\n\n"
-            except Exception as e:
-                logging.error(f"Streaming error: {str(e)}")
-                error_data = {
-                    "error": {
-                        "message": f"Streaming failed: {str(e)}",
-                        "type": "api_error",
-                        "code": 500
-                    }
-                }
-                yield f"data: {json.dumps(error_data)}\n\n"
-                yield "data: [DONE]\n\n"
-
-        return StreamingResponse(
-            openai_stream_generator(), 
-            media_type="text/event-stream"
-        )
+        # Handle streaming response: Gemini events are parsed once and encoded as OpenAI chunks
+        include_usage = bool((getattr(request, "stream_options", None) or {}).get("include_usage"))
+        prompt_tokens = token_counter.estimate(gemini_request_data["model"], gemini_request_data) if include_usage else 0
+        encoder = OpenAIStreamEncoder(request.model, include_usage, prompt_tokens)
+        return await open_stream_response(lambda: open_gemini_stream(gemini_payload, username=username), encoder)
     
     else:
         # Handle non-streaming response
         try:
-            response = send_gemini_request(gemini_payload, is_streaming=False)
+            response = await send_gemini_request(gemini_payload, is_streaming=False, username=username)
             
             if isinstance(response, Response) and response.status_code != 200:
                 # Handle error responses from Google API
@@ -208,6 +116,16 @@ async def openai_chat_completions(
                 # Parse Gemini response and transform to OpenAI format
                 gemini_response = json.loads(response.body)
                 openai_response = gemini_response_to_openai(gemini_response, request.model)
+                if "usage" not in openai_response:
+                    # Upstream sent no usageMetadata; estimate it
+                    prompt_tokens = token_counter.estimate(gemini_request_data["model"], gemini_request_data)
+                    completion_tokens = sum(estimate_text_tokens(choice["message"]["content"])
+                                            for choice in openai_response["choices"])
+                    openai_response["usage"] = {
+                        "prompt_tokens": prompt_tokens,
+                        "completion_tokens": completion_tokens,
+                        "total_tokens": prompt_tokens + completion_tokens
+                    }
                 
                 logging.info(f"Successfully processed non-streaming response for model: {request.model}")
                 return openai_response
@@ -240,6 +158,34 @@ async def openai_chat_completions(
             )
 
 
+@router.post("/v1/chat/completions/count_tokens")
+async def openai_count_tokens(
+    request: OpenAIChatCompletionRequest,
+    username: str = Depends(authenticate_user)
+):
+    """
+    Count the prompt tokens of a chat completion request without running it.
+    Returns {"object": "chat.completion.token_count", "model": ..., "prompt_tokens": N}.
+    """
+    try:
+        gemini_request_data = openai_request_to_gemini(request)
+        prompt_tokens = await token_counter.count(gemini_request_data["model"], gemini_request_data, username=username)
+    except Exception as e:
+        logging.error(f"Error counting OpenAI request tokens: {str(e)}")
+        return Response(
+            content=json.dumps({
+                "error": {
+                    "message": f"Request processing failed: {str(e)}",
+                    "type": "invalid_request_error",
+                    "code": 400
+                }
+            }),
+            status_code=400,
+            media_type="application/json"
+        )
+    return {"object": "chat.completion.token_count", "model": request.model, "prompt_tokens": prompt_tokens}
+
+
 @router.get("/v1/models")
 async def openai_list_models(username: str = Depends(authenticate_user)):
     """
@@ -250,43 +196,12 @@ async def openai_list_models(username: str = Depends(authenticate_user)):
     try:
         logging.info("OpenAI models list requested")
         
-        # Convert our Gemini models to OpenAI format
-        from .config import SUPPORTED_MODELS
-        
-        openai_models = []
-        for model in SUPPORTED_MODELS:
-            # Remove "models/" prefix for OpenAI compatibility
-            model_id = model["name"].replace("models/", "")
-            openai_models.append({
-                "id": model_id,
-                "object": "model",
-                "created": 1677610602,  # Static timestamp
-                "owned_by": "google",
-                "permission": [
-                    {
-                        "id": "modelperm-" + model_id.replace("/", "-"),
-                        "object": "model_permission",
-                        "created": 1677610602,
-                        "allow_create_engine": False,
-                        "allow_sampling": True,
-                        "allow_logprobs": False,
-                        "allow_search_indices": False,
-                        "allow_view": True,
-                        "allow_fine_tuning": False,
-                        "organization": "*",
-                        "group": None,
-                        "is_blocking": False
-                    }
-                ],
-                "root": model_id,
-                "parent": None
-            })
-        
-        logging.info(f"Returning {len(openai_models)} models")
-        return {
-            "object": "list",
-            "data": openai_models
-        }
+        logging.info(f"Returning {len(SUPPORTED_MODELS)} models")
+        return Response(
+            content=OPENAI_MODELS_RESPONSE,
+            status_code=200,
+            media_type="application/json"
+        )
         
     except Exception as e:
         logging.error(f"Failed to list models: {str(e)}")
@@ -6,20 +6,196 @@ import json
 import time
 import uuid
 import re
-from typing import Dict, Any
+from collections import OrderedDict
+from typing import Dict, Any, Optional
 
 from .models import OpenAIChatCompletionRequest, OpenAIChatCompletionResponse
 from .config import (
     DEFAULT_SAFETY_SETTINGS,
-    is_search_model,
-    get_base_model_name,
-    get_thinking_budget,
-    should_include_thoughts,
-    is_nothinking_model,
-    is_maxthinking_model
+    resolve_model,
+    TRANSFORM_CACHE_MAX_CHARS
 )
 
 
+# Opening of a Markdown image "![alt](" - the closing ")" is located with str.find
+_MARKDOWN_IMAGE_RE = re.compile(r'!\[[^\]]*\]\(')
+_URL_STRIP_CHARS = (None, '"', "'")
+
+# Messages shorter than this convert faster than they hash, so they are not cached
+_CACHE_MIN_CHARS = 1024
+
+
+class _MessageKey:
+    """
+    Cache key for one converted message. Hashes a cheap fingerprint (length and
+    edges of each string) and compares full content on lookup, so multi-MB
+    payloads are compared with a memcmp rather than hashed on every turn.
+    """
+
+    __slots__ = ("role", "content", "_hash")
+
+    def __init__(self, role: str, content):
+        self.role = role
+        self.content = content
+        if isinstance(content, str):
+            fingerprint = _fingerprint(content)
+        else:
+            fingerprint = tuple((kind, _fingerprint(value)) for kind, value in content)
+        self._hash = hash((role, fingerprint))
+
+    def __hash__(self):
+        return self._hash
+
+    def __eq__(self, other):
+        return self.role == other.role and self.content == other.content
+
+
+def _fingerprint(value) -> tuple:
+    if not isinstance(value, str):
+        return (value,)
+    return (len(value), value[:64], value[-64:])
+
+
+class _ContentCache:
+    """LRU of converted Gemini contents, bounded by the characters it retains."""
+
+    def __init__(self, max_chars: int):
+        self.max_chars = max_chars
+        self.chars = 0
+        self._entries = OrderedDict()
+
+    def get(self, key: _MessageKey):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        self._entries.move_to_end(key)
+        return entry[0]
+
+    def put(self, key: _MessageKey, converted: dict, size: int):
+        if size > self.max_chars or key in self._entries:
+            return
+        self._entries[key] = (converted, size)
+        self.chars += size
+        while self.chars > self.max_chars:
+            _, (_, evicted_size) = self._entries.popitem(last=False)
+            self.chars -= evicted_size
+
+
+# Converted messages are shared between requests and must not be mutated
+_content_cache = _ContentCache(TRANSFORM_CACHE_MAX_CHARS)
+
+
+def _data_uri_image(text: str, start: int, end: int):
+    """
+    Build an inlineData part from a Markdown image URL in text[start:end].
+    The base64 payload is sliced out exactly once.
+
+    Returns:
+        The part, or None if the URL is not an image data URI
+    """
+    # Same as url.strip().strip('"').strip("'") without copying the URL
+    for chars in _URL_STRIP_CHARS:
+        while start < end and (text[start].isspace() if chars is None else text[start] == chars):
+            start += 1
+        while end > start and (text[end - 1].isspace() if chars is None else text[end - 1] == chars):
+            end -= 1
+    if not text.startswith("data:", start, end):
+        return None
+    comma = text.find(",", start, end)
+    if comma < 0:
+        return None
+    # header looks like: data:image/png;base64
+    mime_type = text[start + 5:comma].split(";", 1)[0]
+    if not mime_type.startswith("image/"):
+        return None
+    return {"inlineData": {"mimeType": mime_type, "data": text[comma + 1:end]}}
+
+
+def _text_to_parts(text: str) -> list:
+    """Split text into parts, turning Markdown data-URI images into inline image parts."""
+    if "![" not in text:
+        return [{"text": text}]
+    parts = []
+    last_idx = 0
+    pos = 0
+    while True:
+        match = _MARKDOWN_IMAGE_RE.search(text, pos)
+        if match is None:
+            break
+        close = text.find(")", match.end())
+        if close < 0:
+            break
+        if close == match.end():
+            # "![alt]()" is not an image; keep scanning after the "!"
+            pos = match.start() + 1
+            continue
+        # Emit text before the image
+        if match.start() > last_idx:
+            parts.append({"text": text[last_idx:match.start()]})
+        # Non-image or non-data URIs stay as markdown text (cannot inline without fetching)
+        parts.append(_data_uri_image(text, match.end(), close) or {"text": text[match.start():close + 1]})
+        last_idx = pos = close + 1
+    # Tail text after last image
+    if last_idx < len(text):
+        parts.append({"text": text[last_idx:]})
+    return parts or [{"text": text}]
+
+
+def _image_url_part(url: str):
+    """Parse "data:image/jpeg;base64,{base64_image}" into an inlineData part."""
+    semicolon = url.find(";")
+    colon = url.find(":", 0, semicolon)
+    comma = url.find(",", semicolon + 1)
+    if semicolon < 0 or colon < 0 or comma < 0:
+        return None
+    return {"inlineData": {"mimeType": url[colon + 1:semicolon], "data": url[comma + 1:]}}
+
+
+def _convert_message(role: str, content) -> Dict[str, Any]:
+    """Convert one OpenAI message to a Gemini content, reusing earlier conversions."""
+    # Map OpenAI roles to Gemini roles
+    if role == "assistant":
+        role = "model"
+    elif role == "system":
+        role = "user"  # Gemini treats system messages as user messages
+
+    # Handle different content types (string vs list of parts)
+    if isinstance(content, list):
+        key_content = tuple(
+            (part.get("type"), part.get("text") if part.get("type") == "text" else (part.get("image_url") or {}).get("url"))
+            for part in content
+        )
+        size = sum(len(value) for _, value in key_content if isinstance(value, str))
+    else:
+        key_content = content or ""
+        size = len(key_content)
+
+    key = None
+    if size >= _CACHE_MIN_CHARS:
+        key = _MessageKey(role, key_content)
+        cached = _content_cache.get(key)
+        if cached is not None:
+            return cached
+
+    if isinstance(content, list):
+        parts = []
+        for kind, value in key_content:
+            if kind == "text":
+                parts.extend(_text_to_parts(value or ""))
+            elif kind == "image_url" and value:
+                image_part = _image_url_part(value)
+                if image_part:
+                    parts.append(image_part)
+    else:
+        parts = _text_to_parts(key_content)
+
+    converted = {"role": role, "parts": parts}
+    if key is not None:
+        # Keys retain the original strings and parts hold the sliced copies
+        _content_cache.put(key, converted, size * 2)
+    return converted
+
+
 def openai_request_to_gemini(openai_request: OpenAIChatCompletionRequest) -> Dict[str, Any]:
     """
     Transform an OpenAI chat completion request to Gemini format.
@@ -30,132 +206,10 @@ def openai_request_to_gemini(openai_request: OpenAIChatCompletionRequest) -> Dic
     Returns:
         Dictionary in Gemini API format
     """
-    contents = []
-    
-    # Process each message in the conversation
-    for message in openai_request.messages:
-        role = message.role
-        
-        # Map OpenAI roles to Gemini roles
-        if role == "assistant":
-            role = "model"
-        elif role == "system":
-            role = "user"  # Gemini treats system messages as user messages
-        
-        # Handle different content types (string vs list of parts)
-        if isinstance(message.content, list):
-            parts = []
-            for part in message.content:
-                if part.get("type") == "text":
-                    text_value = part.get("text", "") or ""
-                    # Extract Markdown images (data URIs) into inline image parts, preserving surrounding text
-                    pattern = re.compile(r'!\[[^\]]*\]\(([^)]+)\)')
-                    matches = list(pattern.finditer(text_value))
-                    if not matches:
-                        parts.append({"text": text_value})
-                    else:
-                        last_idx = 0
-                        for m in matches:
-                            url = m.group(1).strip().strip('"').strip("'")
-                            # Emit text before the image
-                            if m.start() > last_idx:
-                                before = text_value[last_idx:m.start()]
-                                if before:
-                                    parts.append({"text": before})
-                            # Handle data URI images: data:image/png;base64,xxxx
-                            if url.startswith("data:"):
-                                try:
-                                    header, base64_data = url.split(",", 1)
-                                    # header looks like: data:image/png;base64
-                                    mime_type = ""
-                                    if ":" in header:
-                                        mime_type = header.split(":", 1)[1].split(";", 1)[0] or ""
-                                    # Only convert to inlineData if it's an image
-                                    if mime_type.startswith("image/"):
-                                        parts.append({
-                                            "inlineData": {
-                                                "mimeType": mime_type,
-                                                "data": base64_data
-                                            }
-                                        })
-                                    else:
-                                        # Non-image data URIs: keep as markdown text
-                                        parts.append({"text": text_value[m.start():m.end()]})
-                                except Exception:
-                                    # Fallback: keep original markdown as text if parsing fails
-                                    parts.append({"text": text_value[m.start():m.end()]})
-                            else:
-                                # Non-data URIs: keep markdown as text (cannot inline without fetching)
-                                parts.append({"text": text_value[m.start():m.end()]})
-                            last_idx = m.end()
-                        # Tail text after last image
-                        if last_idx < len(text_value):
-                            tail = text_value[last_idx:]
-                            if tail:
-                                parts.append({"text": tail})
-                elif part.get("type") == "image_url":
-                    image_url = part.get("image_url", {}).get("url")
-                    if image_url:
-                        # Parse data URI: "data:image/jpeg;base64,{base64_image}"
-                        try:
-                            mime_type, base64_data = image_url.split(";")
-                            _, mime_type = mime_type.split(":")
-                            _, base64_data = base64_data.split(",")
-                            parts.append({
-                                "inlineData": {
-                                    "mimeType": mime_type,
-                                    "data": base64_data
-                                }
-                            })
-                        except ValueError:
-                            continue
-            contents.append({"role": role, "parts": parts})
-        else:
-            # Simple text content; extract Markdown images (data URIs) into inline image parts
-            text = message.content or ""
-            parts = []
-            # Convert Markdown images: ![alt](data:<mimeType>;base64,<data>)
-            pattern = re.compile(r'!\[[^\]]*\]\(([^)]+)\)')
-            last_idx = 0
-            for m in pattern.finditer(text):
-                url = m.group(1).strip().strip('"').strip("'")
-                # Emit text before the image
-                if m.start() > last_idx:
-                    before = text[last_idx:m.start()]
-                    if before:
-                        parts.append({"text": before})
-                # Handle data URI images: data:image/png;base64,xxxx
-                if url.startswith("data:"):
-                    try:
-                        header, base64_data = url.split(",", 1)
-                        # header looks like: data:image/png;base64
-                        mime_type = ""
-                        if ":" in header:
-                            mime_type = header.split(":", 1)[1].split(";", 1)[0] or ""
-                        # Only convert to inlineData if it's an image
-                        if mime_type.startswith("image/"):
-                            parts.append({
-                                "inlineData": {
-                                    "mimeType": mime_type,
-                                    "data": base64_data
-                                }
-                            })
-                        else:
-                            # Non-image data URIs: keep as markdown text
-                            parts.append({"text": text[m.start():m.end()]})
-                    except Exception:
-                        # Fallback: keep original markdown as text if parsing fails
-                        parts.append({"text": text[m.start():m.end()]})
-                else:
-                    # Non-data URIs: keep markdown as text (cannot inline without fetching)
-                    parts.append({"text": text[m.start():m.end()]})
-                last_idx = m.end()
-            # Tail text after last image
-            if last_idx < len(text):
-                tail = text[last_idx:]
-                if tail:
-                    parts.append({"text": tail})
-            contents.append({"role": role, "parts": parts if parts else [{"text": text}]})
+    variant = resolve_model(openai_request.model)
+
+    # Unchanged messages from earlier turns come from the conversion cache
+    contents = [_convert_message(message.role, message.content) for message in openai_request.messages]
     
     # Map OpenAI generation parameters to Gemini format
     generation_config = {}
@@ -195,26 +249,26 @@ def openai_request_to_gemini(openai_request: OpenAIChatCompletionRequest) -> Dic
         "contents": contents,
         "generationConfig": generation_config,
         "safetySettings": DEFAULT_SAFETY_SETTINGS,
-        "model": get_base_model_name(openai_request.model)  # Use base model name for API call
+        "model": variant.base_model  # Use base model name for API call
     }
     
     # Add Google Search grounding for search models
-    if is_search_model(openai_request.model):
-        request_payload["tools"] = [{"googleSearch": {}}]
+    if variant.tools:
+        request_payload["tools"] = variant.request_tools()
     
-    if "gemini-2.5-flash-image" not in openai_request.model:
+    if variant.thinking_config:
         # Add thinking configuration for thinking models
         thinking_budget = None
         
         # Check if model is an explicit thinking variant (nothinking or maxthinking)
-        if is_nothinking_model(openai_request.model) or is_maxthinking_model(openai_request.model):
+        if variant.nothinking or variant.maxthinking:
             # For explicit thinking variants, ignore reasoning_effort and use variant-specific budget
-            thinking_budget = get_thinking_budget(openai_request.model)
+            thinking_budget = variant.thinking_budget
         else:
             # For regular models, check if reasoning_effort was provided in the request
             reasoning_effort = getattr(openai_request, 'reasoning_effort', None)
             if reasoning_effort:
-                base_model = get_base_model_name(openai_request.model)
+                base_model = variant.base_model
                 if reasoning_effort == "minimal":
                     # Use same budget as nothinking variants
                     if "gemini-2.5-flash" in base_model:
@@ -235,12 +289,12 @@ def openai_request_to_gemini(openai_request: OpenAIChatCompletionRequest) -> Dic
                         thinking_budget = 45000
             else:
                 # No reasoning_effort provided, use default thinking budget
-                thinking_budget = get_thinking_budget(openai_request.model)
+                thinking_budget = variant.thinking_budget
         
         if thinking_budget is not None:
             request_payload["generationConfig"]["thinkingConfig"] = {
                 "thinkingBudget": thinking_budget,
-                "includeThoughts": should_include_thoughts(openai_request.model)
+                "includeThoughts": variant.include_thoughts
             }
     
     return request_payload
@@ -311,13 +365,35 @@ def gemini_response_to_openai(gemini_response: Dict[str, Any], model: str) -> Di
             "finish_reason": _map_finish_reason(candidate.get("finishReason")),
         })
     
-    return {
+    openai_response = {
         "id": str(uuid.uuid4()),
         "object": "chat.completion",
         "created": int(time.time()),
         "model": model,
         "choices": choices,
     }
+    usage = gemini_usage_to_openai(gemini_response.get("usageMetadata"))
+    if usage is not None:
+        openai_response["usage"] = usage
+    return openai_response
+
+
+def gemini_usage_to_openai(usage_metadata) -> Optional[Dict[str, Any]]:
+    """
+    Map Gemini usageMetadata to OpenAI usage (thinking tokens count as completion).
+
+    Returns:
+        The usage object, or None if there is no usageMetadata
+    """
+    if not usage_metadata:
+        return None
+    prompt_tokens = usage_metadata.get("promptTokenCount", 0)
+    completion_tokens = usage_metadata.get("candidatesTokenCount", 0) + usage_metadata.get("thoughtsTokenCount", 0)
+    return {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "total_tokens": usage_metadata.get("totalTokenCount", prompt_tokens + completion_tokens),
+    }
 
 
 def gemini_stream_chunk_to_openai(gemini_chunk: Dict[str, Any], model: str, response_id: str) -> Dict[str, Any]:
@@ -0,0 +1,241 @@
+"""
+Request Coalescing - In-flight deduplication of identical Gemini requests.
+Concurrent deterministic requests (temperature 0 or an explicit seed) with the
+same final payload share one upstream call: the first becomes the leader, later
+ones attach to it. Sampled requests are never coalesced, since each caller
+expects an independent output. Non-streaming followers await
+the leader's response; streaming followers read the leader's upstream events
+through a bounded buffer that every subscriber consumes at its own pace.
+"""
+import asyncio
+import logging
+from typing import Optional
+
+from fastapi import Response
+
+from .gemini_stream import GeminiStream
+from .utils import payload_digest
+from .config import REQUEST_COALESCING_ENABLED, REQUEST_COALESCING_BUFFER_EVENTS
+
+
+class _Broadcast:
+    """One upstream stream fanned out to any number of subscribers."""
+
+    def __init__(self, open_stream, max_events: int, on_done):
+        self.max_events = max_events
+        self.stream = None
+        self.events = []  # Buffered events; events[i] has absolute position base + i
+        self.base = 0
+        self.positions = {}  # subscriber -> absolute position of its next event
+        self.finished = False
+        self.error = None
+        self._on_done = on_done
+        self._pump_waiting = False
+        self._wakeup = asyncio.Event()
+        self.opened = asyncio.get_running_loop().create_future()
+        self._task = asyncio.create_task(self._run(open_stream))
+        self._task.add_done_callback(self._task_done)
+
+    def joinable(self) -> bool:
+        # Late subscribers need every event from the start
+        return self.base == 0 and not self.finished
+
+    def subscribe(self) -> "_Subscriber":
+        subscriber = _Subscriber(self)
+        self.positions[subscriber] = self.base
+        return subscriber
+
+    def unsubscribe(self, subscriber: "_Subscriber"):
+        self.positions.pop(subscriber, None)
+        if not self.positions and not self.finished:
+            # Nobody is listening any more; stop reading and close the upstream
+            self._task.cancel()
+        elif self._pump_waiting:
+            self._notify()
+
+    async def read(self, subscriber: "_Subscriber"):
+        while subscriber in self.positions:
+            position = self.positions[subscriber]
+            if position < self.base + len(self.events):
+                event = self.events[position - self.base]
+                self.positions[subscriber] = position + 1
+                if self._pump_waiting:
+                    self._notify()
+                yield event
+            elif self.finished:
+                if self.error is not None:
+                    raise self.error
+                return
+            else:
+                await self._wakeup.wait()
+
+    def _notify(self):
+        self._wakeup.set()
+        self._wakeup = asyncio.Event()
+
+    def _trim(self) -> bool:
+        """Drop events every subscriber has read. Returns whether space was freed."""
+        consumed = min(self.positions.values(), default=self.base + len(self.events)) - self.base
+        if consumed <= 0:
+            return False
+        del self.events[:consumed]
+        self.base += consumed
+        return True
+
+    def _task_done(self, task: asyncio.Task):
+        # A cancel before the stream opened (even before _run started) must still
+        # release subscribers waiting on opened and retire the broadcast
+        if not self.opened.done():
+            self.opened.cancel()
+        if not self.finished:
+            self.finished = True
+            self._notify()
+            self._on_done()
+
+    async def _run(self, open_stream):
+        try:
+            stream = await open_stream()
+            self.stream = stream
+            self.opened.set_result(stream)
+            if stream.resp is None:
+                # A failed or replayed stream; callers use it directly
+                return
+            async for event in stream.events():
+                # Bounded buffer: wait for the slowest subscriber before growing past it
+                while len(self.events) >= self.max_events and not self._trim():
+                    self._pump_waiting = True
+                    await self._wakeup.wait()
+                self._pump_waiting = False
+                self.events.append(event)
+                self._notify()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            if self.opened.done():
+                self.error = e
+            else:
+                self.opened.set_exception(e)
+        finally:
+            self.finished = True
+            self._notify()
+            if self.stream is not None:
+                await self.stream.aclose()
+            self._on_done()
+
+
+class _Subscriber(GeminiStream):
+    """A GeminiStream view of a shared upstream stream."""
+
+    def __init__(self, broadcast: _Broadcast):
+        super().__init__()
+        self._broadcast = broadcast
+
+    async def events(self):
+        async for event in self._broadcast.read(self):
+            yield event
+
+    async def aclose(self):
+        self._broadcast.unsubscribe(self)
+
+
+class RequestCoalescer:
+    """Shares upstream calls between concurrent requests with identical payloads."""
+
+    def __init__(self, enabled: bool, max_events: int):
+        self.enabled = enabled
+        self.max_events = max_events
+        self.leaders = 0
+        self.followers = 0
+        self._calls = {}  # payload digest -> task of a non-streaming call
+        self._streams = {}  # payload digest -> _Broadcast
+
+    def key(self, payload: dict) -> Optional[str]:
+        """
+        Build the coalescing key for a payload, or None if it must not be shared.
+
+        Args:
+            payload: Output of build_gemini_payload_*
+
+        Returns:
+            Hex digest of the canonical payload, or None
+        """
+        if not self.enabled:
+            return None
+        generation_config = payload.get("request", {}).get("generationConfig") or {}
+        if generation_config.get("temperature") != 0 and generation_config.get("seed") is None:
+            return None
+        return payload_digest(payload)
+
+    async def call(self, key: Optional[str], send) -> Response:
+        """
+        Run send() once for all concurrent callers with the same key.
+
+        Args:
+            key: Payload digest, or None to bypass coalescing
+            send: Coroutine function performing the upstream call
+
+        Returns:
+            A Response of its own for each caller
+        """
+        if not self.enabled or key is None:
+            return await send()
+        task = self._calls.get(key)
+        if task is None:
+            task = asyncio.ensure_future(send())
+            self._calls[key] = task
+            task.add_done_callback(lambda done: self._forget(self._calls, key, done))
+            self.leaders += 1
+        else:
+            self.followers += 1
+        # A caller disconnecting must not cancel the call the others are waiting for
+        response = await asyncio.shield(task)
+        return Response(content=response.body, status_code=response.status_code, media_type=response.media_type)
+
+    async def stream(self, key: Optional[str], open_stream) -> GeminiStream:
+        """
+        Open a stream once for all concurrent callers with the same key.
+
+        Args:
+            key: Payload digest, or None to bypass coalescing
+            open_stream: Coroutine function returning the upstream GeminiStream
+
+        Returns:
+            A GeminiStream of its own for each caller
+        """
+        if not self.enabled or key is None:
+            return await open_stream()
+        broadcast = self._streams.get(key)
+        if broadcast is None or not broadcast.joinable():
+            broadcast = _Broadcast(open_stream, self.max_events, lambda: self._forget(self._streams, key, broadcast))
+            self._streams[key] = broadcast
+            self.leaders += 1
+        else:
+            self.followers += 1
+            logging.debug(f"Coalesced stream request {key[:12]}")
+
+        subscriber = broadcast.subscribe()
+        try:
+            stream = await asyncio.shield(broadcast.opened)
+        except BaseException:
+            await subscriber.aclose()
+            raise
+        if stream.resp is None:
+            await subscriber.aclose()
+            return stream
+        return subscriber
+
+    @staticmethod
+    def _forget(entries: dict, key: str, entry):
+        if entries.get(key) is entry:
+            del entries[key]
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "leaders": self.leaders,
+            "followers": self.followers,
+            "in_flight": len(self._calls) + len(self._streams),
+        }
+
+
+request_coalescer = RequestCoalescer(REQUEST_COALESCING_ENABLED, REQUEST_COALESCING_BUFFER_EVENTS)
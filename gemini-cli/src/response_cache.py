@@ -0,0 +1,102 @@
+"""
+Response Cache - Opt-in cache for deterministic Gemini requests.
+Requests with temperature 0 are keyed by a canonical hash of the final Gemini
+payload. Non-streaming responses are cached as response bodies; streams are
+cached as their upstream events and replayed as SSE.
+"""
+import time
+import logging
+from collections import OrderedDict
+from typing import Optional
+
+from .utils import payload_digest
+from .config import (
+    RESPONSE_CACHE_ENABLED,
+    RESPONSE_CACHE_TTL_SECONDS,
+    RESPONSE_CACHE_MAX_ENTRIES,
+    RESPONSE_CACHE_MAX_BYTES
+)
+
+
+class ResponseCache:
+    """LRU cache with TTL and size eviction plus hit/miss counters."""
+
+    def __init__(self, enabled: bool, ttl: float, max_entries: int, max_bytes: int):
+        self.enabled = enabled
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+
+    def key(self, payload: dict, is_streaming: bool) -> Optional[str]:
+        """
+        Build the cache key for a payload, or None if it must not be cached.
+
+        Args:
+            payload: Output of build_gemini_payload_*
+            is_streaming: Streams and single responses are cached separately
+
+        Returns:
+            Hex digest of the canonical payload, or None
+        """
+        if not self.enabled:
+            return None
+        generation_config = payload.get("request", {}).get("generationConfig") or {}
+        if generation_config.get("temperature") != 0:
+            return None
+        return f"{'stream' if is_streaming else 'generate'}:{payload_digest(payload)}"
+
+    def get(self, key: Optional[str]):
+        if key is None:
+            return None
+        entry = self._entries.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            if entry is not None:
+                self._remove(key)
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def put(self, key: Optional[str], value, size: int):
+        if key is None or size > self.max_bytes:
+            return
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = (time.monotonic() + self.ttl, value, size)
+        self.bytes += size
+        while len(self._entries) > self.max_entries or self.bytes > self.max_bytes:
+            self._remove(next(iter(self._entries)))
+            self.evictions += 1
+
+    def _remove(self, key: str):
+        _, _, size = self._entries.pop(key)
+        self.bytes -= size
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "entries": len(self._entries),
+            "bytes": self.bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+response_cache = ResponseCache(
+    RESPONSE_CACHE_ENABLED,
+    RESPONSE_CACHE_TTL_SECONDS,
+    RESPONSE_CACHE_MAX_ENTRIES,
+    RESPONSE_CACHE_MAX_BYTES
+)
+
+if RESPONSE_CACHE_ENABLED:
+    logging.info(f"Response cache enabled (ttl={RESPONSE_CACHE_TTL_SECONDS}s, max_entries={RESPONSE_CACHE_MAX_ENTRIES})")
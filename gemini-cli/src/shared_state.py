@@ -0,0 +1,125 @@
+"""
+Shared State - Credential state shared between worker processes.
+In multi-worker mode (see run.py) every worker loads the same accounts. Each
+credential's access token, project ID and onboarding status are published to a
+JSON file in SHARED_STATE_DIR. Refresh and setup run under an exclusive lock
+on that credential and re-check the published state first, so a token one
+worker refreshed or an account it onboarded is adopted by the others instead
+of being redone. One worker at a time holds the leader lock and renews tokens
+in the background; when it exits the lock is released and another worker
+takes over.
+"""
+import os
+import json
+import asyncio
+import hashlib
+import logging
+from contextlib import asynccontextmanager
+from typing import Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows: no flock, state cannot be shared
+    fcntl = None
+
+from .config import SHARED_STATE_DIR
+
+# Interval between attempts to take a credential lock held by another worker
+_LOCK_POLL_SECONDS = 0.05
+
+
+def _file_stem(name: str) -> str:
+    """File name for a credential name, keeping distinct names distinct."""
+    safe = "".join(c if c.isalnum() or c in "-_." else "_" for c in name)
+    if safe != name:
+        safe += "-" + hashlib.sha256(name.encode("utf-8")).hexdigest()[:8]
+    return "credential-" + safe
+
+
+class SharedStateStore:
+    """Per-credential state files guarded by flock, plus the refresh leader lock."""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.enabled = bool(directory) and fcntl is not None
+        self.adopted = 0
+        self._leader_fd = None
+        if directory and fcntl is None:
+            logging.warning("SHARED_STATE_DIR is set but file locking is unavailable on this platform; credential state will not be shared")
+        if self.enabled:
+            os.makedirs(directory, exist_ok=True)
+
+    @property
+    def is_leader(self) -> bool:
+        return not self.enabled or self._leader_fd is not None
+
+    def _path(self, name: str, suffix: str) -> str:
+        return os.path.join(self.directory, _file_stem(name) + suffix)
+
+    def read(self, name: str) -> Optional[dict]:
+        """Published state of a credential, or None if there is none yet."""
+        try:
+            with open(self._path(name, ".json"), "r") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logging.warning(f"Could not read shared state for credential {name}: {e}")
+            return None
+
+    def update(self, name: str, fields: dict):
+        """Merge fields into a credential's published state. Call while holding its lock."""
+        state = self.read(name) or {}
+        state.update(fields)
+        path = self._path(name, ".json")
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        # The state holds access tokens, so keep it private to the service user
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "w") as f:
+            json.dump(state, f)
+        os.replace(tmp_path, path)
+
+    @asynccontextmanager
+    async def locked(self, name: str):
+        """Hold the cross-process lock of one credential."""
+        fd = os.open(self._path(name, ".lock"), os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            # Polled instead of blocking in a thread, so a cancelled waiter leaves nothing behind
+            while True:
+                try:
+                    fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    break
+                except BlockingIOError:
+                    await asyncio.sleep(_LOCK_POLL_SECONDS)
+            yield
+        finally:
+            # Closing the descriptor releases the lock
+            os.close(fd)
+
+    def try_lead(self) -> bool:
+        """
+        Become the leader if no other worker is. The leader lock is held until the
+        process exits. Always True when state is not shared (a single process).
+        """
+        if self.is_leader:
+            return True
+        fd = os.open(os.path.join(self.directory, "leader.lock"), os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            return False
+        self._leader_fd = fd
+        logging.info(f"Worker {os.getpid()} is now the credential refresh leader")
+        return True
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "pid": os.getpid(),
+            "leader": self.is_leader,
+            "adopted": self.adopted,
+        }
+
+
+shared_state = SharedStateStore(SHARED_STATE_DIR)
@@ -0,0 +1,208 @@
+"""
+Token Counter - Prompt token counts without a generation round trip.
+Estimates are computed locally from characters and never hashed or cached, so
+they stay cheap for requests with large inline media. Exact counts come from the
+upstream countTokens endpoint, one request for all turns not counted before
+(falling back to the estimate if that fails). The exact total is split over
+those turns in proportion to their estimates and cached per turn, so counting a
+growing conversation only sends the new turns.
+"""
+import json
+import hashlib
+import logging
+from collections import OrderedDict
+from typing import Optional
+
+from .credential_pool import credential_pool
+from .http_client import get_http_client
+from .utils import get_user_agent
+from .config import (
+    CODE_ASSIST_ENDPOINT,
+    TOKEN_COUNT_UPSTREAM,
+    TOKEN_COUNT_CACHE_MAX_ENTRIES
+)
+
+# Gemini bills each image at a flat rate (up to 384x384; larger ones are tiled)
+_IMAGE_TOKENS = 258
+# Average characters per token for ASCII text; other scripts are close to one token per character
+_ASCII_CHARS_PER_TOKEN = 4
+# Characters of inline media data that go into a cache key, next to its length
+_INLINE_KEY_PREFIX = 256
+
+
+def estimate_text_tokens(text: str) -> int:
+    """Estimate the tokens of a string from its length and script."""
+    if not text:
+        return 0
+    if text.isascii():
+        return -(-len(text) // _ASCII_CHARS_PER_TOKEN)
+    # Every non-ASCII character adds 1-3 UTF-8 bytes; most are CJK (3 bytes, about 1 token)
+    non_ascii = (len(text.encode("utf-8", "surrogatepass")) - len(text)) // 2
+    ascii_chars = max(0, len(text) - non_ascii)
+    return -(-ascii_chars // _ASCII_CHARS_PER_TOKEN) + non_ascii
+
+
+def estimate_parts_tokens(parts: list) -> int:
+    tokens = 0
+    for part in parts:
+        if not isinstance(part, dict):
+            continue
+        if part.get("text") is not None:
+            tokens += estimate_text_tokens(part["text"])
+        elif "inlineData" in part or "fileData" in part:
+            tokens += _IMAGE_TOKENS
+        else:
+            # functionCall / functionResponse / executableCode...: count their JSON
+            tokens += estimate_text_tokens(json.dumps(part, ensure_ascii=False))
+    return tokens
+
+
+def _key_part(part):
+    """A part as it goes into a cache key: inline media by type, size and a prefix instead of all its data."""
+    inline = part.get("inlineData") if isinstance(part, dict) else None
+    if not isinstance(inline, dict) or not isinstance(inline.get("data"), str):
+        return part
+    data = inline["data"]
+    return {"inlineData": {"mimeType": inline.get("mimeType"), "size": len(data), "prefix": data[:_INLINE_KEY_PREFIX]}}
+
+
+def _content_key(model: str, content: dict) -> str:
+    if isinstance(content.get("parts"), list):
+        content = dict(content, parts=[_key_part(part) for part in content["parts"]])
+    encoded = json.dumps(content, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(f"{model}\n{encoded}".encode("utf-8", "surrogatepass")).hexdigest()
+
+
+def _request_items(request: dict) -> list:
+    """The cacheable units of a Gemini request: system instruction, tools and each content."""
+    items = []
+    system = request.get("systemInstruction")
+    if isinstance(system, dict) and system.get("parts"):
+        items.append({"role": "user", "parts": system["parts"]})
+    elif isinstance(system, str) and system:
+        items.append({"role": "user", "parts": [{"text": system}]})
+    if request.get("tools"):
+        # Declarations are counted as their JSON text
+        items.append({"role": "user", "parts": [{"text": json.dumps(request["tools"], ensure_ascii=False)}]})
+    items.extend(content for content in request.get("contents") or [] if isinstance(content, dict))
+    return items
+
+
+class TokenCounter:
+    """Counts prompt tokens, with an LRU of exact per-content counts."""
+
+    def __init__(self, upstream: bool, max_entries: int):
+        self.upstream = upstream
+        self.max_entries = max_entries
+        self.hits = 0
+        self.estimated = 0
+        self.upstream_counted = 0
+        self.upstream_failures = 0
+        self._entries = OrderedDict()  # content key -> exact tokens
+
+    def estimate(self, model: str, request: dict) -> int:
+        """Estimate a Gemini request's prompt tokens locally."""
+        items = _request_items(request)
+        self.estimated += len(items)
+        return sum(estimate_parts_tokens(content.get("parts") or []) for content in items)
+
+    async def count(self, model: str, request: dict, exact: bool = True, username: Optional[str] = None) -> int:
+        """
+        Count a Gemini request's prompt tokens.
+
+        Args:
+            model: Base model name
+            request: Gemini request with contents and optionally systemInstruction/tools
+            exact: Count uncached contents upstream (when enabled) instead of estimating
+            username: Authenticated user the upstream call is queued under
+
+        Returns:
+            Total prompt tokens
+        """
+        if not (exact and self.upstream):
+            return self.estimate(model, request)
+
+        total = 0
+        missing = []
+        for content in _request_items(request):
+            key = _content_key(model, content)
+            cached = self._get(key)
+            if cached is not None:
+                total += cached
+            else:
+                missing.append((key, estimate_parts_tokens(content.get("parts") or []), content))
+        if not missing:
+            return total
+
+        counted = await self._count_upstream(model, [content for _, _, content in missing], username)
+        if counted is None:
+            self.estimated += len(missing)
+            return total + sum(estimate for _, estimate, _ in missing)
+
+        # Split the exact total by the estimates; the shares add up to it exactly
+        weights = [max(1, estimate) for _, estimate, _ in missing]
+        weight_total = sum(weights)
+        assigned = cumulative = 0
+        for (key, _, _), weight in zip(missing, weights):
+            cumulative += weight
+            share = round(counted * cumulative / weight_total) - assigned
+            assigned += share
+            self._put(key, share)
+        self.upstream_counted += len(missing)
+        return total + counted
+
+    async def _count_upstream(self, model: str, contents: list, username: Optional[str]) -> Optional[int]:
+        """Count contents together with one v1internal:countTokens call. Returns None if that fails."""
+        if not credential_pool.accounts and not await credential_pool.load():
+            return None
+        account = None
+        try:
+            account = await credential_pool.admit(username)
+            if account is None:
+                return None
+            await account.ensure_ready()
+            resp = await get_http_client().post(
+                f"{CODE_ASSIST_ENDPOINT}/v1internal:countTokens",
+                content=json.dumps({"request": {"model": f"models/{model}", "contents": contents}}),
+                headers={
+                    "Authorization": f"Bearer {account.creds.token}",
+                    "Content-Type": "application/json",
+                    "User-Agent": get_user_agent(),
+                }
+            )
+            if resp.status_code == 200:
+                return int(resp.json()["totalTokens"])
+            logging.warning(f"countTokens returned status {resp.status_code}: {resp.text[:200]}")
+        except Exception as e:
+            logging.warning(f"countTokens unavailable, estimating locally: {str(e)}")
+        finally:
+            if account is not None:
+                credential_pool.release(account)
+        self.upstream_failures += 1
+        return None
+
+    def _get(self, key: str) -> Optional[int]:
+        tokens = self._entries.get(key)
+        if tokens is not None:
+            self._entries.move_to_end(key)
+            self.hits += 1
+        return tokens
+
+    def _put(self, key: str, tokens: int):
+        self._entries[key] = tokens
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        return {
+            "upstream": self.upstream,
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "estimated": self.estimated,
+            "upstream_counted": self.upstream_counted,
+            "upstream_failures": self.upstream_failures,
+        }
+
+
+token_counter = TokenCounter(TOKEN_COUNT_UPSTREAM, TOKEN_COUNT_CACHE_MAX_ENTRIES)
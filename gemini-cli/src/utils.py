@@ -1,3 +1,5 @@
+import json
+import hashlib
 import platform
 from .config import CLI_VERSION
 
@@ -35,4 +37,33 @@ def get_client_metadata(project_id=None):
         "platform": get_platform_string(),
         "pluginType": "GEMINI",
         "duetProject": project_id,
-    }
\ No newline at end of file
+    }
+
+class RawRequest:
+    """
+    A Gemini request forwarded as the client's original JSON bytes. parts holds
+    the serialized object as bytes-like pieces (mostly views into the client body)
+    so it is copied only once, when the upstream request is assembled. Only the
+    members the proxy edits are decoded, and get() reads those.
+    """
+
+    __slots__ = ("parts", "members")
+
+    def __init__(self, parts: list, members: dict):
+        self.parts = parts
+        self.members = members
+
+    def get(self, key, default=None):
+        return self.members.get(key, default)
+
+
+def payload_digest(payload: dict) -> str:
+    """Hex sha256 of a canonical JSON encoding of a request payload."""
+    request = payload.get("request")
+    if isinstance(request, RawRequest):
+        digest = hashlib.sha256(json.dumps(payload.get("model")).encode("utf-8"))
+        for part in request.parts:
+            digest.update(part)
+        return digest.hexdigest()
+    canonical = json.dumps(payload, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
@@ -0,0 +1,92 @@
+import asyncio
+import json
+import os
+from unittest.mock import patch
+
+import pytest
+
+from src.batch import BatchManager
+
+
+def rows(count: int) -> bytes:
+    lines = [{"custom_id": f"r{i}", "body": {"model": "m", "messages": []}} for i in range(count)]
+    return "\n".join(json.dumps(line) for line in lines).encode()
+
+
+def on_disk(manager: BatchManager, batch_id: str) -> dict:
+    with open(manager._batch_path(batch_id), encoding="utf-8") as f:
+        return json.load(f)
+
+
+@pytest.mark.asyncio
+async def test_cancel_through_another_worker_is_not_overwritten(tmp_path):
+    owner, other = BatchManager(str(tmp_path)), BatchManager(str(tmp_path))
+    release = asyncio.Event()
+
+    async def execute(endpoint, row, expires_at):
+        await release.wait()
+        return True, {"custom_id": row["custom_id"]}
+
+    with patch.object(owner, "_execute", execute), patch("src.batch._CANCEL_POLL_SECONDS", 0.01):
+        input_file = owner.create_file(rows(3), "in.jsonl", "batch")
+        batch = owner.create_batch(input_file["id"], "/v1/chat/completions")
+        task = owner._tasks[batch["id"]]
+        await asyncio.sleep(0.05)
+
+        assert other.cancel_batch(batch["id"])["status"] == "cancelling"
+        # The owner's progress save must not bring the batch back to in_progress
+        owner._save(owner._running[batch["id"]])
+        assert other.get_batch(batch["id"])["status"] == "cancelling"
+
+        await asyncio.gather(task, return_exceptions=True)
+
+    assert on_disk(owner, batch["id"])["status"] == "cancelled"
+    assert not os.path.exists(owner._cancel_marker_path(batch["id"]))
+
+
+@pytest.mark.asyncio
+async def test_resume_picks_up_only_batches_without_a_live_owner(tmp_path):
+    dead, leader = BatchManager(str(tmp_path)), BatchManager(str(tmp_path))
+    input_file = dead.create_file(rows(2), "in.jsonl", "batch")
+    with patch.object(dead, "_start"):
+        batch = dead.create_batch(input_file["id"], "/v1/chat/completions")
+    batch["status"] = "in_progress"
+    dead._save(batch)
+
+    async def execute(endpoint, row, expires_at):
+        return True, {"custom_id": row["custom_id"]}
+
+    with patch.object(leader, "_execute", execute):
+        leader.resume()
+        assert batch["id"] not in leader._tasks
+
+        # The owning worker exits and its lock goes with it
+        dead._release(batch["id"])
+        leader.resume()
+        await asyncio.gather(leader._tasks[batch["id"]])
+
+    assert on_disk(leader, batch["id"])["status"] == "completed"
+
+
+def test_progress_is_throttled_per_batch(tmp_path):
+    manager = BatchManager(str(tmp_path))
+    first = {"id": "batch_a", "status": "in_progress"}
+    second = {"id": "batch_b", "status": "in_progress"}
+    os.makedirs(manager.batches_dir)
+
+    with patch.object(manager, "_save") as save:
+        manager._save_progress(first)
+        manager._save_progress(second)
+        manager._save_progress(first)
+
+    assert [call.args[0]["id"] for call in save.call_args_list] == ["batch_a", "batch_b"]
+
+
+def test_batch_stores_the_checked_input_file_id(tmp_path):
+    manager = BatchManager(str(tmp_path))
+    input_file = manager.create_file(rows(1), "in.jsonl", "batch")
+
+    with patch.object(manager, "_start"):
+        batch = manager.create_batch(f"../../elsewhere/{input_file['id']}", "/v1/chat/completions")
+
+    assert batch["input_file_id"] == input_file["id"]
@@ -0,0 +1,47 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from src.context_cache import ContextCacheManager
+
+
+def conversation(turns: int) -> dict:
+    return {"contents": [{"role": "user", "parts": [{"text": f"turn {i} " + "x" * 100}]} for i in range(turns)]}
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    manager = ContextCacheManager(True, "http://cache", min_chars=10, min_hits=2,
+                                  ttl=3600, max_entries=10, retry_seconds=600)
+    creations = []
+
+    async def create(account, model, request, length, key, chars):
+        creations.append(key)
+        manager._entries[key] = SimpleNamespace(name=f"cachedContents/{len(creations)}", key=key,
+                                                length=length, chars=chars, expires_at=float("inf"))
+
+    monkeypatch.setattr(manager, "_create", create)
+    manager.creations = creations
+    return manager
+
+
+@pytest.mark.asyncio
+async def test_rejected_cache_is_not_created_again_straight_away(cache):
+    account = SimpleNamespace(name="a")
+    request = conversation(3)
+
+    await cache.apply(account, "m", request)
+    await cache.apply(account, "m", request)
+    await asyncio.sleep(0)
+    assert len(cache.creations) == 1
+
+    _, used = await cache.apply(account, "m", request)
+    assert used is not None
+    cache.invalidate(account, used)
+
+    for _ in range(3):
+        sent, used = await cache.apply(account, "m", request)
+        await asyncio.sleep(0)
+        assert used is None and sent is request
+    assert len(cache.creations) == 1
@@ -0,0 +1,71 @@
+import asyncio
+from unittest.mock import patch
+
+import pytest
+
+from src.credential_pool import CredentialAccount, CredentialPool, FairWaitQueue
+
+
+@pytest.fixture
+def pool():
+    """Two accounts with one slot each."""
+    with patch("src.credential_pool.ADAPTIVE_CONCURRENCY_ENABLED", True):
+        credential_pool = CredentialPool()
+        credential_pool.accounts = [CredentialAccount("a", None), CredentialAccount("b", None)]
+        for account in credential_pool.accounts:
+            account.concurrency_limit = 1
+        yield credential_pool
+
+
+@pytest.mark.asyncio
+async def test_dispatch_skips_waiters_it_cannot_serve():
+    queue = FairWaitQueue(max_waiting=10, weights={})
+    blocked = queue.push("u1", exclude={"a"})
+    served = queue.push("u2", exclude=())
+    free = ["a"]
+
+    queue.dispatch(lambda exclude: next((name for name in free if name not in exclude), None))
+
+    assert served.future.result() == "a"
+    assert not blocked.future.done()
+    assert len(queue._heap) == 1
+
+
+@pytest.mark.asyncio
+async def test_admit_ignores_stale_queue_entries(pool):
+    stale = pool._queue.push("u1", exclude=())
+    pool._queue.leave(stale, 0.0)
+    stale.future.cancel()
+
+    account = await asyncio.wait_for(pool.admit("u2"), 0.1)
+
+    assert account is not None
+
+
+@pytest.mark.asyncio
+async def test_queued_request_is_served_without_waiting_for_the_poll(pool):
+    first, second = pool.accounts
+    second.in_flight = 1
+    # Only the first account is free, and this request already tried it
+    waiting = asyncio.create_task(pool.admit("u1", exclude={first}))
+    await asyncio.sleep(0)
+
+    account = await asyncio.wait_for(pool.admit("u2"), 0.5)
+
+    assert account is first
+    assert not waiting.done()
+    pool.release(second)
+    assert await asyncio.wait_for(waiting, 0.5) is second
+
+
+@pytest.mark.asyncio
+async def test_admission_status_hides_names_unless_detailed(pool):
+    pool._queue.push("alice", exclude=())
+
+    public = pool.admission_status()
+    assert public["queue_depth"] == 1
+    assert "queued_by_user" not in public and "limits" not in public
+
+    detailed = pool.admission_status(detailed=True)
+    assert detailed["queued_by_user"] == {"alice": 1}
+    assert set(detailed["limits"]) == {"a", "b"}
@@ -0,0 +1,49 @@
+import pytest
+
+from src.gemini_stream import split_object_members
+
+
+def members(body: bytes):
+    result = split_object_members(body)
+    return None if result is None else [(key, bytes(value)) for key, value in result]
+
+
+def test_splits_top_level_members_without_decoding():
+    body = b'{"contents" : [{"parts":[{"text":"},:"}]}] , "n":-1.5e3,"s":"q\\"x","e":{}}'
+
+    assert members(body) == [
+        (b'"contents"', b'[{"parts":[{"text":"},:"}]}]'),
+        (b'"n"', b"-1.5e3"),
+        (b'"s"', b'"q\\"x"'),
+        (b'"e"', b"{}"),
+    ]
+
+
+def test_empty_object():
+    assert members(b" { } ") == []
+
+
+@pytest.mark.parametrize(
+    "body",
+    [
+        b'{"a":1 "b":2}',
+        b'{"a"::1}',
+        b'{"a":}',
+        b'{"a"}',
+        b'{"a" 5:1}',
+        b'{x"a":1}',
+        b'{"a":1,}',
+        b'{,"a":1}',
+        b'{"a":1,,"b":2}',
+        b'{"a":1 2}',
+        b'{"a":"x" 1}',
+        b'{"a":[1] [2]}',
+        b'{"a":01}',
+        b'{"a":1]',
+        b'{"a":{"b":1}',
+        b'{"a":1}x',
+        b"[1]",
+    ],
+)
+def test_malformed_bodies_are_left_to_the_json_parser(body):
+    assert split_object_members(body) is None
@@ -0,0 +1,21 @@
+from src.config import resolve_model
+from src.google_api_client import build_gemini_payload_from_native, build_gemini_payload_from_native_bytes
+
+
+def test_request_tools_are_independent_copies():
+    variant = resolve_model("gemini-2.5-pro-search")
+
+    tools = variant.request_tools()
+    tools[0]["googleSearch"]["mutated"] = True
+
+    assert variant.request_tools() == [{"googleSearch": {}}]
+
+
+def test_native_paths_add_variant_tools_once():
+    body = b'{"contents":[],"tools":[{"googleSearch":{}}]}'
+
+    fast = build_gemini_payload_from_native_bytes(body, "gemini-2.5-pro-search")
+    slow = build_gemini_payload_from_native({"contents": [], "tools": []}, "gemini-2.5-pro-search")
+
+    assert fast["request"].get("tools") == [{"googleSearch": {}}]
+    assert slow["request"]["tools"] == [{"googleSearch": {}}]
@@ -0,0 +1,44 @@
+import asyncio
+
+import pytest
+
+from src.request_coalescing import RequestCoalescer
+
+
+def payload(**generation_config) -> dict:
+    return {"model": "gemini-2.5-pro", "request": {"contents": [], "generationConfig": generation_config}}
+
+
+def test_only_deterministic_requests_are_coalesced():
+    coalescer = RequestCoalescer(enabled=True, max_events=8)
+
+    assert coalescer.key(payload(temperature=0)) is not None
+    assert coalescer.key(payload(temperature=1, seed=7)) is not None
+    assert coalescer.key(payload(temperature=0.7)) is None
+    assert coalescer.key(payload()) is None
+
+
+def test_disabled_coalescer_has_no_keys():
+    assert RequestCoalescer(enabled=False, max_events=8).key(payload(temperature=0)) is None
+
+
+@pytest.mark.asyncio
+async def test_followers_are_released_when_stream_is_cancelled_before_opening():
+    coalescer = RequestCoalescer(enabled=True, max_events=8)
+    never = asyncio.Event()
+
+    async def open_stream():
+        await never.wait()
+
+    leader = asyncio.create_task(coalescer.stream("key", open_stream))
+    follower = asyncio.create_task(coalescer.stream("key", open_stream))
+    await asyncio.sleep(0)
+    assert coalescer.followers == 1
+
+    coalescer._streams["key"]._task.cancel()
+
+    done, _ = await asyncio.wait([leader, follower], timeout=1)
+    assert done == {leader, follower}
+    for task in (leader, follower):
+        assert task.cancelled()
+    assert coalescer.stats()["in_flight"] == 0
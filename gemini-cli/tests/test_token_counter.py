@@ -0,0 +1,73 @@
+import json
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, patch
+
+import pytest
+
+from src import token_counter as token_counter_module
+from src.token_counter import TokenCounter
+
+
+def turn(text: str) -> dict:
+    return {"role": "user", "parts": [{"text": text}]}
+
+
+@pytest.fixture
+def upstream():
+    """countTokens answering 10 tokens per content, through a single fake account."""
+    account = SimpleNamespace(ensure_ready=AsyncMock(), creds=SimpleNamespace(token="t"))
+    requests = []
+
+    async def post(url, content, headers):
+        contents = json.loads(content)["request"]["contents"]
+        requests.append(contents)
+        return SimpleNamespace(status_code=200, json=lambda: {"totalTokens": 10 * len(contents)})
+
+    pool = token_counter_module.credential_pool
+    with patch.object(pool, "accounts", [account]), \
+            patch.object(pool, "admit", AsyncMock(return_value=account)) as admit, \
+            patch.object(pool, "release") as release, \
+            patch.object(token_counter_module, "get_http_client", return_value=SimpleNamespace(post=post)):
+        yield SimpleNamespace(requests=requests, admit=admit, release=release)
+
+
+@pytest.mark.asyncio
+async def test_uncounted_turns_go_upstream_in_one_request(upstream):
+    counter = TokenCounter(upstream=True, max_entries=100)
+    conversation = [turn("a"), turn("a much longer turn of text"), turn("b")]
+
+    assert await counter.count("m", {"contents": conversation}, username="u") == 30
+    assert len(upstream.requests) == 1
+    upstream.admit.assert_awaited_once_with("u")
+    upstream.release.assert_called_once()
+
+    # Only the new turn is sent; the cached shares still add up to the earlier total
+    assert await counter.count("m", {"contents": conversation + [turn("c")]}) == 40
+    assert upstream.requests[1] == [turn("c")]
+
+
+@pytest.mark.asyncio
+async def test_failed_upstream_count_falls_back_to_estimate(upstream):
+    upstream.admit.return_value = None
+    counter = TokenCounter(upstream=True, max_entries=100)
+
+    assert await counter.count("m", {"contents": [turn("abcdefgh")]}) == 2
+    assert counter.stats()["entries"] == 0
+
+
+def test_estimate_does_not_hash_contents():
+    counter = TokenCounter(upstream=True, max_entries=100)
+    image = {"role": "user", "parts": [{"inlineData": {"mimeType": "image/png", "data": "A" * 1_000_000}}]}
+
+    with patch.object(token_counter_module, "_content_key") as content_key:
+        assert counter.estimate("m", {"contents": [image, turn("abcd")]}) == 258 + 1
+    content_key.assert_not_called()
+
+
+def test_inline_data_is_keyed_by_size_and_prefix():
+    small = {"parts": [{"inlineData": {"mimeType": "image/png", "data": "A" * 300}}]}
+    same = {"parts": [{"inlineData": {"mimeType": "image/png", "data": "A" * 300}}]}
+    longer = {"parts": [{"inlineData": {"mimeType": "image/png", "data": "A" * 301}}]}
+
+    assert token_counter_module._content_key("m", small) == token_counter_module._content_key("m", same)
+    assert token_counter_module._content_key("m", small) != token_counter_module._content_key("m", longer)